@@ -71,6 +71,14 @@ from gslib.exception import ControlCException
 import apitools.base.py.exceptions as apitools_exceptions
 from gslib.utils import boto_util
 from gslib.utils import constants
+from gslib.utils import observer_util
+# Imported so that their observers are registered.
+# pylint: disable=unused-import
+from gslib.utils import live_metrics
+from gslib.utils import perf_util
+from gslib.utils import profile_util
+from gslib.utils import trace_util
+# pylint: enable=unused-import
 from gslib.sig_handling import GetCaughtSignals
 from gslib.sig_handling import InitializeSignalHandling
 from gslib.sig_handling import RegisterSignalHandler
@@ -282,11 +290,8 @@ def main():
 
   try:
     try:
-      opts, args = getopt.getopt(sys.argv[1:], 'dDvo:h:u:mq',
-                                 ['debug', 'detailedDebug', 'version', 'option',
-                                  'help', 'header', 'multithreaded', 'quiet',
-                                  'testexceptiontraces', 'trace-token=',
-                                  'perf-trace-token='])
+      opts, args = getopt.getopt(sys.argv[1:], constants.GSUTIL_SHORT_OPTS,
+                                 constants.GSUTIL_LONG_OPTS)
     except getopt.GetoptError as e:
       _HandleCommandException(CommandException(e.msg))
     for o, a in opts:
@@ -337,6 +342,7 @@ def main():
           boto.config.add_section(opt_section)
         boto.config.set(opt_section, opt_name, opt_value)
     metrics.LogCommandParams(global_opts=opts)
+    observer_util.StartConfiguredObservers()
     httplib2.debuglevel = debug_level
     if trace_token:
       sys.stderr.write(TRACE_WARNING)
@@ -34,6 +34,8 @@ _DETAILED_HELP_TEXT = ("""
 <B>OPTIONS</B>
   -D          Shows HTTP requests/headers and additional debug info needed when
               posting support requests, including exception stack traces.
+              When run via the gsutil script, also lists the modules that
+              took the longest to import at startup.
 
   -DD         Shows HTTP requests/headers, additional debug info,
               exception stack traces, plus HTTP upstream payload.
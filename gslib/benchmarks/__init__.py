@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Offline benchmarks of gsutil's transfer and listing code.
+
+Unlike perfdiag, which measures the network path to a real bucket, these
+benchmarks measure gsutil's own overhead: transfers run against a local
+FakeGcsServer, and the rest run on the local file system. Run them with:
+
+  python -m gslib.benchmarks --output results.json
+  python -m gslib.benchmarks --baseline results.json
+
+See gslib.benchmarks.runner for the options.
+"""
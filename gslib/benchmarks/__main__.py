@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Entry point for python -m gslib.benchmarks."""
+
+from __future__ import absolute_import
+
+import sys
+
+import gslib.command
+from gslib.utils import parallelism_framework_util
+
+# pylint: disable=g-import-not-at-top
+if __name__ == '__main__':
+  # Like gslib.__main__, set up the parallelism framework before any command
+  # runs; on Windows this must be done from the main module.
+  if (parallelism_framework_util.CheckMultiprocessingAvailableAndInit()
+      .is_available):
+    gslib.command.InitializeMultiprocessingVariables()
+  else:
+    gslib.command.InitializeThreadingVariables()
+  from gslib.benchmarks import runner
+  sys.exit(runner.main(sys.argv[1:]))
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Registration of benchmarks, and the environment they run in.
+
+A benchmark is a function that takes a BenchmarkEnvironment, sets up its
+inputs, and returns a Measurement of the part it benchmarks. Benchmarks are
+registered with the Benchmark decorator, in the order they run.
+"""
+
+from __future__ import absolute_import
+
+from collections import namedtuple
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from gslib.fake_gcs_server import FakeGcsServer
+
+# Bucket that transfer benchmarks use on the fake server.
+BENCHMARK_BUCKET = 'gsutil-benchmarks'
+
+# Metrics a benchmark's results are compared by.
+OBJECTS_METRIC = 'objects_per_second'
+BYTES_METRIC = 'bytes_per_second'
+
+# Result of running a benchmark once: the time taken by the benchmarked
+# operation, and the number of objects (files, listing entries, tasks) and
+# bytes it processed.
+Measurement = namedtuple('Measurement', ['seconds', 'objects', 'bytes'])
+
+BenchmarkSpec = namedtuple('BenchmarkSpec',
+                           ['name', 'func', 'metric', 'description'])
+
+# Registered benchmarks, in the order they run.
+BENCHMARKS = []
+
+
+class BenchmarkError(Exception):
+  """Raised when a benchmark can't be run."""
+
+
+def Benchmark(name, metric=OBJECTS_METRIC):
+  """Returns a decorator that registers a benchmark function.
+
+  Args:
+    name: Name of the benchmark, used in results.
+    metric: Metric the benchmark's results are compared by; OBJECTS_METRIC
+        or BYTES_METRIC.
+
+  Returns:
+    Decorator that registers the function and returns it unchanged.
+  """
+
+  def Decorator(func):
+    description = (func.__doc__ or '').strip().split('\n')[0]
+    BENCHMARKS.append(BenchmarkSpec(name, func, metric, description))
+    return func
+
+  return Decorator
+
+
+class BenchmarkEnvironment(object):
+  """Scale, scratch space and fake service shared by a run's benchmarks."""
+
+  def __init__(self, scale=1.0):
+    """Initializes the environment.
+
+    Args:
+      scale: Factor the benchmarks' default object counts and sizes are
+          multiplied by.
+    """
+    self.scale = scale
+    self._temp_dir = tempfile.mkdtemp(prefix='gsutil-benchmarks-')
+    self._fake_server = None
+    self._boto_config_path = None
+
+  def Close(self):
+    """Stops the fake server and deletes scratch files."""
+    if self._fake_server:
+      self._fake_server.Stop()
+      self._fake_server = None
+    shutil.rmtree(self._temp_dir, ignore_errors=True)
+
+  def Scaled(self, count, minimum=1):
+    """Returns count multiplied by the scale, and at least minimum."""
+    return max(int(count * self.scale), minimum)
+
+  def MakeTempDir(self, name):
+    """Creates an empty scratch directory and returns its path."""
+    path = os.path.join(self._temp_dir, name)
+    if os.path.exists(path):
+      shutil.rmtree(path)
+    os.makedirs(path)
+    return path
+
+  def CreateFiles(self, name, count, size, files_per_dir=1000):
+    """Creates a scratch directory tree of count files of size bytes each.
+
+    Args:
+      name: Name of the scratch directory.
+      count: Number of files.
+      size: Size of each file.
+      files_per_dir: Number of files in each subdirectory.
+
+    Returns:
+      Path of the directory.
+    """
+    path = self.MakeTempDir(name)
+    data = os.urandom(size)
+    for i in xrange(count):
+      dir_path = os.path.join(path, 'dir%04d' % (i // files_per_dir))
+      if not i % files_per_dir:
+        os.mkdir(dir_path)
+      with open(os.path.join(dir_path, 'file%07d' % i), 'wb') as fp:
+        fp.write(data)
+    return path
+
+  @property
+  def fake_server(self):
+    """FakeGcsServer holding BENCHMARK_BUCKET, started on first use."""
+    if self._fake_server is None:
+      self._fake_server = FakeGcsServer()
+      self._fake_server.Start()
+      self._fake_server.CreateBucket(BENCHMARK_BUCKET)
+    return self._fake_server
+
+  def ResetBucket(self):
+    """Deletes the fake server's objects, keeping the bucket."""
+    listing = self.fake_server.ListObjects(BENCHMARK_BUCKET, {})
+    while True:
+      for item in listing.get('items', []):
+        self.fake_server.DeleteObject(BENCHMARK_BUCKET, item['name'], {})
+      if 'nextPageToken' not in listing:
+        return
+      listing = self.fake_server.ListObjects(
+          BENCHMARK_BUCKET, {'pageToken': listing['nextPageToken']})
+
+  def _GetBotoConfigPath(self):
+    """Writes a boto config file that points gsutil at the fake server."""
+    if self._boto_config_path is None:
+      self._boto_config_path = os.path.join(self._temp_dir, 'boto')
+      self.fake_server.WriteBotoConfig(self._boto_config_path, [
+          ('GSUtil', 'state_dir', os.path.join(self._temp_dir, 'state')),
+          ('GSUtil', 'software_update_check_period', '0'),
+          ('GSUtil', 'disable_analytics_prompt', 'True')])
+    return self._boto_config_path
+
+  def RunGsutil(self, args):
+    """Runs a gsutil command against the fake server, in a new process.
+
+    The command uses a boto config file of its own, so the user's credentials
+    and settings don't affect it.
+
+    Args:
+      args: Command-line arguments, e.g. ['-m', 'cp', src, dst].
+
+    Raises:
+      BenchmarkError: if the command fails.
+    """
+    env = os.environ.copy()
+    env['BOTO_CONFIG'] = self._GetBotoConfigPath()
+    env.pop('BOTO_PATH', None)
+    cmd = [sys.executable, '-m', 'gslib.__main__'] + args
+    process = subprocess.Popen(cmd, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               env=env)
+    _, stderr = process.communicate()
+    if process.returncode:
+      raise BenchmarkError('Command failed with status %d: %s\n%s' %
+                           (process.returncode, ' '.join(cmd), stderr))
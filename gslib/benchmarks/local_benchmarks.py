@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmarks of gsutil code that runs without the service.
+
+These run in the benchmark process, on synthetic inputs, so that their
+measurements don't include process startup or transfer time.
+"""
+
+from __future__ import absolute_import
+
+import hashlib
+import os
+import random
+import time
+
+from boto.storage_uri import BucketStorageUri
+import crcmod
+
+from gslib.benchmarks.framework import Benchmark
+from gslib.benchmarks.framework import BENCHMARK_BUCKET
+from gslib.benchmarks.framework import BYTES_METRIC
+from gslib.benchmarks.framework import Measurement
+from gslib.command import Command
+from gslib.command import CreateGsutilLogger
+from gslib.command import DummyArgChecker
+# pylint: disable=protected-access
+from gslib.commands.rsync import _AvoidChecksumAndListingDiffIterator
+from gslib.commands.rsync import _BatchSort
+from gslib.commands.rsync import _EncodeUrl
+# pylint: enable=protected-access
+from gslib.cs_api_map import GsutilApiClassMapFactory
+from gslib.storage_url import StorageUrlFromString
+from gslib.utils.copy_helper import CreateCopyHelperOpts
+from gslib.utils.hashing_helper import CalculateHashesFromContents
+from gslib.utils.hashing_helper import HashingFileUploadWrapper
+from gslib.utils.unit_util import ONE_MIB
+from gslib.wildcard_iterator import CreateWildcardIterator
+
+# Listing entries are in the format of rsync's _BuildTmpOutputLine: URL,
+# size, creation time, atime, mtime, mode, uid, gid, crc32c and MD5.
+_FILE_LISTING_LINE = '%s %d -1 %d %d 420 1000 1000 - -\n'
+_CLOUD_LISTING_LINE = (
+    '%s %d %d %d %d 420 1000 1000 AAAAAA== 1B2M2Y8AsgTpgAmY7PhCfg==\n')
+
+
+def _SyntheticListings(count, src_dir, dst_url_str):
+  """Returns sorted rsync listings of a synced tree and its out-of-date copy.
+
+  Of every 20 source files, one is missing from the destination and one has
+  a different mtime there; the destination also has an extra object for
+  every 50 source files.
+
+  Args:
+    count: Number of source files.
+    src_dir: Local directory the source URLs are under.
+    dst_url_str: Cloud URL the destination URLs are under.
+
+  Returns:
+    (source listing lines, destination listing lines)
+  """
+  src_lines = []
+  dst_lines = []
+  mtime = int(time.time()) - 86400
+  src_url_str = StorageUrlFromString(src_dir).url_string
+  for i in xrange(count):
+    name = 'dir%04d/file%07d' % (i // 1000, i)
+    size = i % 4096
+    src_lines.append(_FILE_LISTING_LINE % (
+        _EncodeUrl('%s/%s' % (src_url_str, name)), size, mtime, mtime))
+    if i % 20 != 0:
+      dst_mtime = mtime + 1 if i % 20 == 7 else mtime
+      dst_lines.append(_CLOUD_LISTING_LINE % (
+          _EncodeUrl('%s/%s' % (dst_url_str, name)), size, mtime, dst_mtime,
+          dst_mtime))
+    if i % 50 == 0:
+      dst_lines.append(_CLOUD_LISTING_LINE % (
+          _EncodeUrl('%s/%s.extra' % (dst_url_str, name)), size, mtime, mtime,
+          mtime))
+  src_lines.sort()
+  dst_lines.sort()
+  return src_lines, dst_lines
+
+
+class _ListedDiffIterator(object):
+  """The parts of an rsync _DiffIterator that its listing step produces."""
+
+  def __init__(self, base_src_url, base_dst_url, src_file_name, dst_file_name):
+    self.delete_extras = True
+    self.base_src_url = base_src_url
+    self.base_dst_url = base_dst_url
+    self.sorted_list_src_file_name = src_file_name
+    self.sorted_list_dst_file_name = dst_file_name
+
+
+def _WriteLines(path, lines):
+  with open(path, 'w') as fp:
+    fp.writelines(lines)
+  return sum(len(line) for line in lines)
+
+
+@Benchmark('rsync_diff')
+def RsyncDiff(env):
+  """rsync -d diff computation for sorted listings of 1M files."""
+  count = env.Scaled(1000000)
+  work_dir = env.MakeTempDir('rsync_diff')
+  src_dir = env.MakeTempDir('rsync_diff_src')
+  dst_url_str = 'gs://%s/rsync_diff' % BENCHMARK_BUCKET
+  src_lines, dst_lines = _SyntheticListings(count, src_dir, dst_url_str)
+  src_file_name = os.path.join(work_dir, 'src')
+  dst_file_name = os.path.join(work_dir, 'dst')
+  num_bytes = (_WriteLines(src_file_name, src_lines) +
+               _WriteLines(dst_file_name, dst_lines))
+  num_lines = len(src_lines) + len(dst_lines)
+  del src_lines, dst_lines
+  # The diff is computed like rsync's, but from the listings written above
+  # instead of listing the source and destination.
+  CreateCopyHelperOpts()
+  diff_iterator = _AvoidChecksumAndListingDiffIterator(_ListedDiffIterator(
+      StorageUrlFromString(src_dir), StorageUrlFromString(dst_url_str),
+      src_file_name, dst_file_name))
+  start_time = time.time()
+  for _ in diff_iterator:
+    pass
+  seconds = time.time() - start_time
+  diff_iterator.sorted_list_src_file.close()
+  diff_iterator.sorted_list_dst_file.close()
+  return Measurement(seconds, num_lines, num_bytes)
+
+
+@Benchmark('batch_sort')
+def BatchSort(env):
+  """rsync's _BatchSort of a shuffled 1M-line listing."""
+  count = env.Scaled(1000000)
+  src_dir = env.MakeTempDir('batch_sort_src')
+  lines, _ = _SyntheticListings(count, src_dir, 'gs://%s' % BENCHMARK_BUCKET)
+  random.Random(0).shuffle(lines)
+  num_bytes = sum(len(line) for line in lines)
+  out_path = os.path.join(env.MakeTempDir('batch_sort'), 'sorted')
+  with open(out_path, 'w') as out_file:
+    start_time = time.time()
+    _BatchSort(iter(lines), out_file)
+    seconds = time.time() - start_time
+  return Measurement(seconds, count, num_bytes)
+
+
+@Benchmark('file_wildcard_walk')
+def FileWildcardWalk(env):
+  """Recursive FileWildcardIterator walk of 100k files, with sizes."""
+  count = env.Scaled(100000)
+  src_dir = env.CreateFiles('file_wildcard_walk', count, 0)
+  start_time = time.time()
+  walked = 0
+  wildcard_iterator = CreateWildcardIterator(os.path.join(src_dir, '**'), None)
+  for _ in wildcard_iterator.IterObjects(bucket_listing_fields=['size']):
+    walked += 1
+  seconds = time.time() - start_time
+  return Measurement(seconds, walked, 0)
+
+
+def _CreateHashingInput(env, name):
+  size = env.Scaled(256 * ONE_MIB, minimum=ONE_MIB)
+  src_dir = env.CreateFiles(name, 1, size)
+  return os.path.join(src_dir, 'dir0000', 'file0000000'), size
+
+
+@Benchmark('hash_upload_md5', metric=BYTES_METRIC)
+def HashUploadMd5(env):
+  """MD5 of a 256MiB file, read through HashingFileUploadWrapper."""
+  path, size = _CreateHashingInput(env, 'hash_upload_md5')
+  with open(path, 'rb') as fp:
+    wrapper = HashingFileUploadWrapper(
+        fp, {'md5': hashlib.md5()}, {'md5': hashlib.md5},
+        StorageUrlFromString(path), CreateGsutilLogger('benchmarks'))
+    start_time = time.time()
+    while wrapper.read(ONE_MIB):
+      pass
+    seconds = time.time() - start_time
+  return Measurement(seconds, 1, size)
+
+
+@Benchmark('hash_download_crc32c_md5', metric=BYTES_METRIC)
+def HashDownloadCrc32cMd5(env):
+  """CRC32C and MD5 of a 256MiB file, as checked after sliced downloads."""
+  path, size = _CreateHashingInput(env, 'hash_download_crc32c_md5')
+  with open(path, 'rb') as fp:
+    start_time = time.time()
+    CalculateHashesFromContents(fp, {
+        'crc32c': crcmod.predefined.Crc('crc-32c'), 'md5': hashlib.md5()})
+    seconds = time.time() - start_time
+  return Measurement(seconds, 1, size)
+
+
+class _BenchmarkCommand(Command):
+  """Command whose Apply calls are benchmarked."""
+  command_spec = Command.CreateCommandSpec('benchmark',
+                                           command_name_aliases=[])
+  help_spec = Command.HelpSpec(
+      help_name='benchmark',
+      help_name_aliases=[],
+      help_type='command_help',
+      help_one_line_summary='Benchmarks the parallelism framework.',
+      help_text='Benchmarks the parallelism framework.',
+      subcommand_help_text={},
+  )
+
+  def RunCommand(self):
+    pass
+
+
+def _NoOpFunc(cls, args, thread_state=None):  # pylint: disable=unused-argument
+  pass
+
+
+def _NoOpExceptionHandler(cls, e):  # pylint: disable=unused-argument
+  pass
+
+
+@Benchmark('apply_overhead')
+def ApplyOverhead(env):
+  """Command.Apply of 100k no-op tasks, with the default parallelism."""
+  count = env.Scaled(100000)
+  command = _BenchmarkCommand(None, [], {}, 0, None, True, BucketStorageUri,
+                              GsutilApiClassMapFactory)
+  start_time = time.time()
+  command.Apply(_NoOpFunc, iter(xrange(count)), _NoOpExceptionHandler,
+                arg_checker=DummyArgChecker)
+  seconds = time.time() - start_time
+  return Measurement(seconds, count, 0)
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Runs the offline benchmarks and compares their results with a baseline."""
+
+from __future__ import absolute_import
+
+import getopt
+import json
+import platform
+import re
+import sys
+import time
+
+import gslib
+# Imported to register their benchmarks.
+# pylint: disable=unused-import
+from gslib.benchmarks import local_benchmarks
+from gslib.benchmarks import transfer_benchmarks
+# pylint: enable=unused-import
+from gslib.benchmarks.framework import BENCHMARKS
+from gslib.benchmarks.framework import BenchmarkEnvironment
+from gslib.benchmarks.framework import BYTES_METRIC
+from gslib.benchmarks.framework import OBJECTS_METRIC
+from gslib.utils.unit_util import MakeHumanReadable
+
+# Version of the results file format.
+RESULTS_FORMAT_VERSION = 1
+
+# Default fraction by which a benchmark's metric must fall below the
+# baseline's to count as a regression.
+DEFAULT_REGRESSION_THRESHOLD = 0.1
+
+_USAGE = """Usage: python -m gslib.benchmarks [options]
+
+Options:
+  -f, --filter REGEX       Only run benchmarks whose names match REGEX.
+  -l, --list               List the benchmarks and exit.
+  -s, --scale FACTOR       Multiply object counts and sizes by FACTOR
+                           (default: 1).
+  -r, --repeat N           Run each benchmark N times and report the median
+                           (default: 1).
+  -o, --output FILE        Write results to FILE, as JSON.
+  -b, --baseline FILE      Compare results with those in FILE, a results
+                           file from an earlier run.
+  -t, --threshold FRACTION Report benchmarks whose metric is more than
+                           FRACTION below the baseline's as regressions
+                           (default: %s).
+
+Exits with status 1 if any benchmark regressed.
+""" % DEFAULT_REGRESSION_THRESHOLD
+
+
+def _Median(values):
+  values = sorted(values)
+  middle = len(values) // 2
+  if len(values) % 2:
+    return values[middle]
+  return (values[middle - 1] + values[middle]) / 2.0
+
+
+def _Rate(amount, seconds):
+  return float(amount) / seconds if seconds > 0 else 0.0
+
+
+def RunBenchmarks(benchmarks, env, repeat=1, out=None):
+  """Runs benchmarks and returns their results.
+
+  Args:
+    benchmarks: BenchmarkSpecs to run.
+    env: BenchmarkEnvironment to run them in.
+    repeat: Number of times to run each benchmark.
+    out: If set, stream that progress is written to.
+
+  Returns:
+    Dict of benchmark name to result dict, with the median measurement's
+    seconds, objects, bytes and rates, the metric results are compared by,
+    and the seconds taken by each run.
+  """
+  results = {}
+  for spec in benchmarks:
+    if out:
+      out.write('Running %s: %s\n' % (spec.name, spec.description))
+      out.flush()
+    measurements = [spec.func(env) for _ in xrange(repeat)]
+    median_seconds = _Median([m.seconds for m in measurements])
+    measurement = min(measurements,
+                      key=lambda m: abs(m.seconds - median_seconds))
+    results[spec.name] = {
+        'seconds': measurement.seconds,
+        'objects': measurement.objects,
+        'bytes': measurement.bytes,
+        OBJECTS_METRIC: _Rate(measurement.objects, measurement.seconds),
+        BYTES_METRIC: _Rate(measurement.bytes, measurement.seconds),
+        'metric': spec.metric,
+        'runs': [m.seconds for m in measurements],
+    }
+  return results
+
+
+def CompareWithBaseline(results, baseline_results, threshold):
+  """Compares results with a baseline's.
+
+  Args:
+    results: Dict of benchmark results, as returned by RunBenchmarks.
+    baseline_results: Benchmark results from a baseline results file.
+    threshold: Fraction by which a metric must fall below the baseline's to
+        count as a regression.
+
+  Returns:
+    Dict of benchmark name to (baseline metric value, relative change,
+    regressed), for the benchmarks in both results.
+  """
+  comparison = {}
+  for name, result in results.iteritems():
+    baseline_result = baseline_results.get(name)
+    if not baseline_result:
+      continue
+    metric = result['metric']
+    baseline_value = baseline_result.get(metric)
+    if not baseline_value:
+      continue
+    change = float(result[metric]) / baseline_value - 1
+    comparison[name] = (baseline_value, change, change < -threshold)
+  return comparison
+
+
+def _FormatMetric(metric, value):
+  if metric == BYTES_METRIC:
+    return '%s/s' % MakeHumanReadable(value)
+  return '%.1f objects/s' % value
+
+
+def FormatResults(results, comparison=None):
+  """Returns a table of results, and their changes from a baseline."""
+  lines = []
+  for spec in BENCHMARKS:
+    result = results.get(spec.name)
+    if not result:
+      continue
+    line = '%-28s %9.3fs %20s' % (
+        spec.name, result['seconds'],
+        _FormatMetric(result['metric'], result[result['metric']]))
+    if comparison and spec.name in comparison:
+      baseline_value, change, regressed = comparison[spec.name]
+      line += '  %+6.1f%% vs %s%s' % (
+          100 * change, _FormatMetric(result['metric'], baseline_value),
+          '  REGRESSION' if regressed else '')
+    lines.append(line)
+  return '\n'.join(lines) + '\n'
+
+
+def main(argv):
+  """Runs the benchmarks selected by argv; see _USAGE."""
+  try:
+    opts, args = getopt.getopt(
+        argv, 'f:ls:r:o:b:t:h',
+        ['filter=', 'list', 'scale=', 'repeat=', 'output=', 'baseline=',
+         'threshold=', 'help'])
+    if args:
+      raise getopt.GetoptError('Unexpected arguments: %s' % ' '.join(args))
+  except getopt.GetoptError as e:
+    sys.stderr.write('%s\n%s' % (e, _USAGE))
+    return 2
+  name_filter = None
+  list_only = False
+  scale = 1.0
+  repeat = 1
+  output_path = None
+  baseline_path = None
+  threshold = DEFAULT_REGRESSION_THRESHOLD
+  for option, value in opts:
+    if option in ('-f', '--filter'):
+      name_filter = re.compile(value)
+    elif option in ('-l', '--list'):
+      list_only = True
+    elif option in ('-s', '--scale'):
+      scale = float(value)
+    elif option in ('-r', '--repeat'):
+      repeat = int(value)
+    elif option in ('-o', '--output'):
+      output_path = value
+    elif option in ('-b', '--baseline'):
+      baseline_path = value
+    elif option in ('-t', '--threshold'):
+      threshold = float(value)
+    else:
+      sys.stdout.write(_USAGE)
+      return 0
+
+  benchmarks = [spec for spec in BENCHMARKS
+                if not name_filter or name_filter.search(spec.name)]
+  if list_only:
+    for spec in benchmarks:
+      sys.stdout.write('%-28s %s\n' % (spec.name, spec.description))
+    return 0
+
+  baseline = None
+  if baseline_path:
+    with open(baseline_path) as fp:
+      baseline = json.load(fp)
+    if baseline.get('scale') != scale:
+      sys.stderr.write(
+          'Warning: the baseline was run with --scale %s, so per-object '
+          'overheads may not be comparable.\n' % baseline.get('scale'))
+
+  env = BenchmarkEnvironment(scale=scale)
+  try:
+    results = RunBenchmarks(benchmarks, env, repeat=repeat, out=sys.stderr)
+  finally:
+    env.Close()
+
+  comparison = None
+  if baseline:
+    comparison = CompareWithBaseline(results, baseline['results'], threshold)
+  sys.stdout.write(FormatResults(results, comparison))
+
+  if output_path:
+    with open(output_path, 'w') as fp:
+      json.dump({
+          'format_version': RESULTS_FORMAT_VERSION,
+          'gsutil_version': gslib.VERSION,
+          'python_version': platform.python_version(),
+          'platform': platform.platform(),
+          'time': int(time.time()),
+          'scale': scale,
+          'repeat': repeat,
+          'results': results,
+      }, fp, indent=2, separators=(',', ': '), sort_keys=True)
+      fp.write('\n')
+  if comparison and any(regressed for _, _, regressed
+                         in comparison.itervalues()):
+    return 1
+  return 0
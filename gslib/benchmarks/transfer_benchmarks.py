@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmarks of gsutil cp against a local fake of the JSON API.
+
+Each benchmark runs a gsutil command in a new process, so measurements
+include gsutil's startup time as well as the transfer.
+"""
+
+from __future__ import absolute_import
+
+import os
+import time
+
+from gslib.benchmarks.framework import Benchmark
+from gslib.benchmarks.framework import BENCHMARK_BUCKET
+from gslib.benchmarks.framework import BYTES_METRIC
+from gslib.benchmarks.framework import Measurement
+from gslib.utils.unit_util import ONE_KIB
+from gslib.utils.unit_util import ONE_MIB
+
+# Options that turn off parallel composite uploads and sliced downloads, so
+# that benchmarks of other transfer types aren't affected by their defaults.
+_NO_PARALLEL_TRANSFERS_OPTIONS = [
+    '-o', 'GSUtil:parallel_composite_upload_threshold=0',
+    '-o', 'GSUtil:sliced_object_download_threshold=0']
+
+
+def _TimeGsutil(env, args):
+  """Runs a gsutil command and returns the seconds it took."""
+  start_time = time.time()
+  env.RunGsutil(args)
+  return time.time() - start_time
+
+
+def _BucketUrl(path):
+  return 'gs://%s/%s' % (BENCHMARK_BUCKET, path)
+
+
+@Benchmark('cp_small_files')
+def CpSmallFiles(env):
+  """gsutil -m cp -r of 100k 1KiB files."""
+  count = env.Scaled(100000)
+  size = ONE_KIB
+  src_dir = env.CreateFiles('cp_small_files', count, size)
+  env.ResetBucket()
+  seconds = _TimeGsutil(env, _NO_PARALLEL_TRANSFERS_OPTIONS + [
+      '-m', 'cp', '-r', src_dir, _BucketUrl('cp_small_files')])
+  return Measurement(seconds, count, count * size)
+
+
+@Benchmark('cp_large_files', metric=BYTES_METRIC)
+def CpLargeFiles(env):
+  """gsutil -m cp -r of 4 64MiB files, as resumable uploads."""
+  count = 4
+  size = env.Scaled(64 * ONE_MIB, minimum=ONE_MIB)
+  src_dir = env.CreateFiles('cp_large_files', count, size)
+  env.ResetBucket()
+  seconds = _TimeGsutil(env, _NO_PARALLEL_TRANSFERS_OPTIONS + [
+      '-o', 'GSUtil:resumable_threshold=%d' % ONE_MIB,
+      '-m', 'cp', '-r', src_dir, _BucketUrl('cp_large_files')])
+  return Measurement(seconds, count, count * size)
+
+
+@Benchmark('sliced_download', metric=BYTES_METRIC)
+def SlicedDownload(env):
+  """gsutil cp of a 256MiB object, as a sliced download of 4 slices."""
+  size = env.Scaled(256 * ONE_MIB, minimum=2 * ONE_MIB)
+  env.ResetBucket()
+  env.fake_server.CreateObject(BENCHMARK_BUCKET, 'sliced_download',
+                               os.urandom(size))
+  dst_path = os.path.join(env.MakeTempDir('sliced_download'), 'object')
+  seconds = _TimeGsutil(env, [
+      '-o', 'GSUtil:sliced_object_download_threshold=%d' % ONE_MIB,
+      '-o', 'GSUtil:sliced_object_download_max_components=4',
+      'cp', _BucketUrl('sliced_download'), dst_path])
+  return Measurement(seconds, 1, size)
+
+
+@Benchmark('parallel_composite_upload', metric=BYTES_METRIC)
+def ParallelCompositeUpload(env):
+  """gsutil cp of a 256MiB file, as a parallel composite upload."""
+  size = env.Scaled(256 * ONE_MIB, minimum=2 * ONE_MIB)
+  src_dir = env.CreateFiles('parallel_composite_upload', 1, size)
+  src_path = os.path.join(src_dir, 'dir0000', 'file0000000')
+  env.ResetBucket()
+  seconds = _TimeGsutil(env, [
+      '-o', 'GSUtil:parallel_composite_upload_threshold=%d' % ONE_MIB,
+      '-o', 'GSUtil:parallel_composite_upload_component_size=%d' %
+      max(size // 8, ONE_MIB),
+      'cp', src_path, _BucketUrl('parallel_composite_upload')])
+  return Measurement(seconds, 1, size)
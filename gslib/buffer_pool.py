@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Memory-budgeted pool of buffers for data in transit.
+
+Transfers that hold object data in memory (daisy chain copies, streaming
+uploads and direct I/O sliced downloads) take their buffers from the
+process's TransferBufferPool, in fixed-size chunks. The total size of the
+chunks in use by all gsutil processes is limited by the
+GSUtil:transfer_buffer_memory budget; a transfer whose buffer doesn't fit
+waits until other transfers release theirs. Every buffer is acquired all at
+once, so transfers never hold part of a buffer while waiting for the rest.
+
+Released chunks are kept for reuse, up to MAX_CACHED_CHUNKS per process, and
+don't count against the budget while they're idle. Chunks are page-aligned
+anonymous memory maps, private to the process that created them.
+"""
+
+from __future__ import absolute_import
+
+import mmap
+import threading
+
+from gslib.exception import CommandException
+from gslib.utils import parallelism_framework_util
+from gslib.utils.boto_util import GetTransferBufferMemory
+from gslib.utils.parallelism_framework_util import AtomicDict
+from gslib.utils.parallelism_framework_util import CheckMultiprocessingAvailableAndInit
+from gslib.utils.unit_util import DivideAndCeil
+from gslib.utils.unit_util import MakeHumanReadable
+from gslib.utils.unit_util import ONE_MIB
+
+# Size of each chunk of a transfer buffer.
+TRANSFER_BUFFER_CHUNK_SIZE = ONE_MIB
+
+# Number of released chunks each process keeps for reuse.
+MAX_CACHED_CHUNKS = 4
+
+# Number of chunks in use by all processes, and a condition that's notified
+# whenever chunks are released.
+global transfer_buffer_usage, transfer_buffer_cond
+if CheckMultiprocessingAvailableAndInit().is_available:
+  _manager = parallelism_framework_util.top_level_manager
+  transfer_buffer_usage = AtomicDict(manager=_manager)
+  transfer_buffer_cond = _manager.Condition()
+else:
+  transfer_buffer_usage = AtomicDict()
+  transfer_buffer_cond = threading.Condition()
+
+_transfer_buffer_pool = None
+_transfer_buffer_pool_lock = threading.Lock()
+
+
+def GetTransferBufferChunkCount():
+  """Returns the number of chunks that fit in the transfer buffer budget."""
+  return max(GetTransferBufferMemory() // TRANSFER_BUFFER_CHUNK_SIZE, 1)
+
+
+def GetTransferBufferPool():
+  """Returns this process's TransferBufferPool."""
+  global _transfer_buffer_pool  # pylint: disable=global-statement
+  with _transfer_buffer_pool_lock:
+    if _transfer_buffer_pool is None:
+      _transfer_buffer_pool = TransferBufferPool()
+    return _transfer_buffer_pool
+
+
+def _NewChunk():
+  if hasattr(mmap, 'MAP_PRIVATE'):
+    # Keep forked processes from sharing the chunk.
+    return mmap.mmap(-1, TRANSFER_BUFFER_CHUNK_SIZE, mmap.MAP_PRIVATE)
+  return mmap.mmap(-1, TRANSFER_BUFFER_CHUNK_SIZE)
+
+
+class TransferBuffer(object):
+  """A ring buffer made of chunks from a TransferBufferPool.
+
+  Positions in the buffer are taken modulo its size, so callers can address
+  the buffer with object offsets as long as they never hold more than size
+  bytes at once.
+  """
+
+  def __init__(self, pool, chunks):
+    self.chunks = chunks
+    self.size = len(chunks) * TRANSFER_BUFFER_CHUNK_SIZE
+    self._pool = pool
+
+  def Write(self, position, data):
+    """Copies data into the buffer, starting at position."""
+    if not isinstance(data, bytes):
+      # Memory maps only accept strings.
+      data = bytes(data)
+    data_offset = 0
+    while data_offset < len(data):
+      chunk_index, chunk_offset = divmod(
+          (position + data_offset) % self.size, TRANSFER_BUFFER_CHUNK_SIZE)
+      length = min(len(data) - data_offset,
+                   TRANSFER_BUFFER_CHUNK_SIZE - chunk_offset)
+      if length < len(data):
+        self.chunks[chunk_index][chunk_offset:chunk_offset + length] = (
+            data[data_offset:data_offset + length])
+      else:
+        self.chunks[chunk_index][chunk_offset:chunk_offset + length] = data
+      data_offset += length
+
+  def Read(self, position, length):
+    """Returns length bytes of the buffer, starting at position."""
+    pieces = []
+    while length > 0:
+      chunk_index, chunk_offset = divmod(position % self.size,
+                                         TRANSFER_BUFFER_CHUNK_SIZE)
+      piece_length = min(length, TRANSFER_BUFFER_CHUNK_SIZE - chunk_offset)
+      pieces.append(
+          self.chunks[chunk_index][chunk_offset:chunk_offset + piece_length])
+      position += piece_length
+      length -= piece_length
+    return b''.join(pieces)
+
+  def Release(self):
+    """Returns the buffer's chunks to the pool. Later calls have no effect."""
+    if self.chunks is not None:
+      chunks = self.chunks
+      self.chunks = None
+      self._pool.Release(chunks)
+
+  def __del__(self):
+    # Buffers that are dropped without being released, e.g. by wrappers that
+    # are never closed, still return their share of the budget.
+    try:
+      self.Release()
+    except Exception:  # pylint: disable=broad-except
+      # The budget may already be gone at interpreter shutdown.
+      pass
+
+
+class TransferBufferPool(object):
+  """Hands out transfer buffers within the budget shared by all processes."""
+
+  def __init__(self):
+    self._free_chunks = []
+    self._lock = threading.Lock()
+
+  def Acquire(self, size, blocking=True):
+    """Waits until a buffer of at least size bytes fits the budget.
+
+    Args:
+      size: Number of bytes the caller needs.
+      blocking: If False, don't wait; return None if the buffer doesn't fit.
+
+    Returns:
+      TransferBuffer, whose size is size rounded up to a whole number of
+      chunks. The caller must call its Release method once done with it.
+
+    Raises:
+      CommandException if size is larger than the whole budget.
+    """
+    num_chunks = max(DivideAndCeil(size, TRANSFER_BUFFER_CHUNK_SIZE), 1)
+    budget_chunks = GetTransferBufferChunkCount()
+    if num_chunks > budget_chunks:
+      raise CommandException(
+          'A transfer needs a %s buffer, which is more than the %s allowed by '
+          'the transfer_buffer_memory option in the [GSUtil] section of your '
+          'boto configuration file.' %
+          (MakeHumanReadable(num_chunks * TRANSFER_BUFFER_CHUNK_SIZE),
+           MakeHumanReadable(GetTransferBufferMemory())))
+    with transfer_buffer_cond:
+      while (transfer_buffer_usage.get('chunks', 0) + num_chunks >
+             budget_chunks):
+        if not blocking:
+          return None
+        transfer_buffer_cond.wait()
+      transfer_buffer_usage.Increment('chunks', num_chunks)
+    with self._lock:
+      num_reused = min(num_chunks, len(self._free_chunks))
+      chunks = self._free_chunks[len(self._free_chunks) - num_reused:]
+      del self._free_chunks[len(self._free_chunks) - num_reused:]
+    chunks.extend(_NewChunk() for _ in xrange(num_chunks - num_reused))
+    return TransferBuffer(self, chunks)
+
+  def Release(self, chunks):
+    """Returns chunks from a TransferBuffer and their share of the budget."""
+    with self._lock:
+      num_cached = min(len(chunks),
+                       MAX_CACHED_CHUNKS - len(self._free_chunks))
+      self._free_chunks.extend(chunks[:num_cached])
+    for chunk in chunks[num_cached:]:
+      chunk.close()
+    with transfer_buffer_cond:
+      transfer_buffer_usage.Increment('chunks', -len(chunks))
+      transfer_buffer_cond.notify_all()
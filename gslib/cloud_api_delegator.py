@@ -16,6 +16,8 @@
 
 from __future__ import absolute_import
 
+from contextlib import contextmanager
+
 import boto
 from boto import config
 from gslib.cloud_api import ArgumentException
@@ -23,6 +25,7 @@ from gslib.cloud_api import CloudApi
 from gslib.cs_api_map import ApiMapConstants
 from gslib.cs_api_map import ApiSelector
 from gslib.exception import CommandException
+from gslib.object_metadata_cache import GetObjectMetadataCache
 
 
 class CloudApiDelegator(CloudApi):
@@ -72,6 +75,7 @@ class CloudApiDelegator(CloudApi):
     self.api_map = gsutil_api_map
     self.prefer_api = boto.config.get('GSUtil', 'prefer_api', '').upper()
     self.loaded_apis = {}
+    self.metadata_caches = {}
 
     if not self.api_map[ApiMapConstants.API_MAP]:
       raise ArgumentException('No apiclass supplied for gsutil Cloud API map.')
@@ -200,6 +204,56 @@ class CloudApiDelegator(CloudApi):
       api = self.prefer_api
     return api
 
+  def _GetMetadataCache(self, provider):
+    """Returns the object metadata cache to use for provider, or None.
+
+    Only JSON API responses are cached, since XML API listings may omit
+    requested fields.
+
+    Args:
+      provider: Provider to return the cache for. If None, class-wide default
+                is used.
+
+    Returns:
+      ObjectMetadataCache, or None if metadata should not be cached.
+    """
+    provider = str(provider or self.provider)
+    if provider not in self.metadata_caches:
+      cache = GetObjectMetadataCache()
+      if (not cache.enabled or
+          self.GetApiSelector(provider) != ApiSelector.JSON):
+        cache = None
+      self.metadata_caches[provider] = cache
+    return self.metadata_caches[provider]
+
+  def _InvalidateCachedObject(self, bucket_name, object_name, provider):
+    cache = self._GetMetadataCache(provider)
+    if cache:
+      cache.InvalidateObject(str(provider or self.provider), bucket_name,
+                             object_name)
+
+  @contextmanager
+  def _WritingObject(self, bucket_name, object_name, provider):
+    """Wrapped code writes or deletes an object.
+
+    The object's cached metadata is invalidated both before and after the
+    write, since listings running in other threads may cache the old
+    metadata while the write is in progress.
+
+    Args:
+      bucket_name: Bucket containing the object.
+      object_name: Name of the object.
+      provider: Provider of the object. If None, class-wide default is used.
+
+    Yields:
+      None.
+    """
+    self._InvalidateCachedObject(bucket_name, object_name, provider)
+    try:
+      yield
+    finally:
+      self._InvalidateCachedObject(bucket_name, object_name, provider)
+
   # For function docstrings, see CloudApi class.
   def GetBucket(self, bucket_name, provider=None, fields=None):
     return self._GetApi(provider).GetBucket(bucket_name, fields=fields)
@@ -234,8 +288,15 @@ class CloudApiDelegator(CloudApi):
         bucket_name, project_id=project_id, metadata=metadata, fields=fields)
 
   def DeleteBucket(self, bucket_name, preconditions=None, provider=None):
-    return self._GetApi(provider).DeleteBucket(bucket_name,
-                                               preconditions=preconditions)
+    cache = self._GetMetadataCache(provider)
+    if cache:
+      cache.InvalidateBucket(str(provider or self.provider), bucket_name)
+    try:
+      return self._GetApi(provider).DeleteBucket(bucket_name,
+                                                 preconditions=preconditions)
+    finally:
+      if cache:
+        cache.InvalidateBucket(str(provider or self.provider), bucket_name)
 
   def GetObjectIamPolicy(self, bucket_name, object_name,
                          generation=None, provider=None, fields=None):
@@ -249,21 +310,39 @@ class CloudApiDelegator(CloudApi):
 
   def ListObjects(self, bucket_name, prefix=None, delimiter=None,
                   all_versions=None, provider=None, fields=None):
-    return self._GetApi(provider).ListObjects(
+    objects_iter = self._GetApi(provider).ListObjects(
         bucket_name, prefix=prefix, delimiter=delimiter,
         all_versions=all_versions, fields=fields)
+    cache = self._GetMetadataCache(provider)
+    if cache:
+      objects_iter = cache.AddListing(
+          str(provider or self.provider), bucket_name, objects_iter, fields,
+          all_versions=all_versions)
+    return objects_iter
 
   def GetObjectMetadata(self, bucket_name, object_name, generation=None,
                         provider=None, fields=None):
-    return self._GetApi(provider).GetObjectMetadata(
+    cache = self._GetMetadataCache(provider)
+    if cache:
+      cached_metadata = cache.GetObject(
+          str(provider or self.provider), bucket_name, object_name,
+          generation=generation, fields=fields)
+      if cached_metadata:
+        return cached_metadata
+    object_metadata = self._GetApi(provider).GetObjectMetadata(
         bucket_name, object_name, generation=generation, fields=fields)
+    if cache:
+      cache.AddObject(str(provider or self.provider), bucket_name,
+                      object_metadata, fields, is_live=not generation)
+    return object_metadata
 
   def PatchObjectMetadata(self, bucket_name, object_name, metadata,
                           canned_acl=None, generation=None, preconditions=None,
                           provider=None, fields=None):
-    return self._GetApi(provider).PatchObjectMetadata(
-        bucket_name, object_name, metadata, canned_acl=canned_acl,
-        generation=generation, preconditions=preconditions, fields=fields)
+    with self._WritingObject(bucket_name, object_name, provider):
+      return self._GetApi(provider).PatchObjectMetadata(
+          bucket_name, object_name, metadata, canned_acl=canned_acl,
+          generation=generation, preconditions=preconditions, fields=fields)
 
   def GetObjectMedia(
       self, bucket_name, object_name, download_stream, provider=None,
@@ -285,59 +364,71 @@ class CloudApiDelegator(CloudApi):
                    canned_acl=None, preconditions=None, progress_callback=None,
                    encryption_tuple=None, provider=None, fields=None,
                    gzip_encoded=False):
-    return self._GetApi(provider).UploadObject(
-        upload_stream, object_metadata, size=size, canned_acl=canned_acl,
-        preconditions=preconditions, progress_callback=progress_callback,
-        encryption_tuple=encryption_tuple, fields=fields,
-        gzip_encoded=gzip_encoded)
+    with self._WritingObject(object_metadata.bucket, object_metadata.name,
+                             provider):
+      return self._GetApi(provider).UploadObject(
+          upload_stream, object_metadata, size=size, canned_acl=canned_acl,
+          preconditions=preconditions, progress_callback=progress_callback,
+          encryption_tuple=encryption_tuple, fields=fields,
+          gzip_encoded=gzip_encoded)
 
   def UploadObjectStreaming(self, upload_stream, object_metadata,
                             canned_acl=None, preconditions=None,
                             progress_callback=None, encryption_tuple=None,
                             provider=None, fields=None, gzip_encoded=False):
-    return self._GetApi(provider).UploadObjectStreaming(
-        upload_stream, object_metadata, canned_acl=canned_acl,
-        preconditions=preconditions, progress_callback=progress_callback,
-        encryption_tuple=encryption_tuple, fields=fields,
-        gzip_encoded=gzip_encoded)
+    with self._WritingObject(object_metadata.bucket, object_metadata.name,
+                             provider):
+      return self._GetApi(provider).UploadObjectStreaming(
+          upload_stream, object_metadata, canned_acl=canned_acl,
+          preconditions=preconditions, progress_callback=progress_callback,
+          encryption_tuple=encryption_tuple, fields=fields,
+          gzip_encoded=gzip_encoded)
 
   def UploadObjectResumable(
       self, upload_stream, object_metadata, canned_acl=None, preconditions=None,
       size=None, serialization_data=None, tracker_callback=None,
       progress_callback=None, encryption_tuple=None, provider=None,
       fields=None, gzip_encoded=False):
-    return self._GetApi(provider).UploadObjectResumable(
-        upload_stream, object_metadata, canned_acl=canned_acl,
-        preconditions=preconditions, size=size,
-        serialization_data=serialization_data,
-        tracker_callback=tracker_callback, progress_callback=progress_callback,
-        encryption_tuple=encryption_tuple, fields=fields,
-        gzip_encoded=gzip_encoded)
+    with self._WritingObject(object_metadata.bucket, object_metadata.name,
+                             provider):
+      return self._GetApi(provider).UploadObjectResumable(
+          upload_stream, object_metadata, canned_acl=canned_acl,
+          preconditions=preconditions, size=size,
+          serialization_data=serialization_data,
+          tracker_callback=tracker_callback,
+          progress_callback=progress_callback,
+          encryption_tuple=encryption_tuple, fields=fields,
+          gzip_encoded=gzip_encoded)
 
   def CopyObject(self, src_obj_metadata, dst_obj_metadata, src_generation=None,
                  canned_acl=None, preconditions=None, progress_callback=None,
                  max_bytes_per_call=None, encryption_tuple=None,
                  decryption_tuple=None, provider=None, fields=None):
-    return self._GetApi(provider).CopyObject(
-        src_obj_metadata, dst_obj_metadata, src_generation=src_generation,
-        canned_acl=canned_acl, preconditions=preconditions,
-        progress_callback=progress_callback,
-        max_bytes_per_call=max_bytes_per_call,
-        encryption_tuple=encryption_tuple, decryption_tuple=decryption_tuple,
-        fields=fields)
+    with self._WritingObject(dst_obj_metadata.bucket, dst_obj_metadata.name,
+                             provider):
+      return self._GetApi(provider).CopyObject(
+          src_obj_metadata, dst_obj_metadata, src_generation=src_generation,
+          canned_acl=canned_acl, preconditions=preconditions,
+          progress_callback=progress_callback,
+          max_bytes_per_call=max_bytes_per_call,
+          encryption_tuple=encryption_tuple, decryption_tuple=decryption_tuple,
+          fields=fields)
 
   def ComposeObject(self, src_objs_metadata, dst_obj_metadata,
                     preconditions=None, encryption_tuple=None, provider=None,
                     fields=None):
-    return self._GetApi(provider).ComposeObject(
-        src_objs_metadata, dst_obj_metadata, preconditions=preconditions,
-        encryption_tuple=encryption_tuple, fields=fields)
+    with self._WritingObject(dst_obj_metadata.bucket, dst_obj_metadata.name,
+                             provider):
+      return self._GetApi(provider).ComposeObject(
+          src_objs_metadata, dst_obj_metadata, preconditions=preconditions,
+          encryption_tuple=encryption_tuple, fields=fields)
 
   def DeleteObject(self, bucket_name, object_name, preconditions=None,
                    generation=None, provider=None):
-    return self._GetApi(provider).DeleteObject(
-        bucket_name, object_name, preconditions=preconditions,
-        generation=generation)
+    with self._WritingObject(bucket_name, object_name, provider):
+      return self._GetApi(provider).DeleteObject(
+          bucket_name, object_name, preconditions=preconditions,
+          generation=generation)
 
   def WatchBucket(self, bucket_name, address, channel_id, token=None,
                   provider=None, fields=None):
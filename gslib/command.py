@@ -83,12 +83,18 @@ from gslib.utils.constants import NO_MAX
 from gslib.utils.constants import UTF8
 import gslib.utils.parallelism_framework_util
 from gslib.utils.parallelism_framework_util import AtomicDict
+from gslib.utils.parallelism_framework_util import BatchingStatusQueue
 from gslib.utils.parallelism_framework_util import CheckMultiprocessingAvailableAndInit
 from gslib.utils.parallelism_framework_util import ProcessAndThreadSafeInt
 from gslib.utils.parallelism_framework_util import PutToQueueWithTimeout
 from gslib.utils.parallelism_framework_util import SEEK_AHEAD_JOIN_TIMEOUT
 from gslib.utils.parallelism_framework_util import UI_THREAD_JOIN_TIMEOUT
+from gslib.utils.parallelism_framework_util import WaitForStatusBatches
 from gslib.utils.parallelism_framework_util import ZERO_TASKS_TO_DO_ARGUMENT
+from gslib.utils import live_metrics
+from gslib.utils import observer_util
+from gslib.utils import perf_util
+from gslib.utils import trace_util
 from gslib.utils.rsync_util import RsyncDiffToApply
 from gslib.utils.system_util import IS_WINDOWS
 from gslib.utils.system_util import GetTermLines
@@ -160,6 +166,17 @@ def SetAclExceptionHandler(cls, e):
 # However, this also lets us shut down somewhat more cleanly when interrupted.
 queues = []
 
+# Number of tasks that resulted in an exception in calls to Apply() in this
+# worker process, or None in the main process. Unlike failure_count, this
+# isn't shared with other processes, so that commands run in worker processes
+# (e.g., by a parallel batch) can tell their own failures from those of the
+# commands running in other processes.
+process_failure_count = None
+
+# The BatchingStatusQueue that this worker process's status messages are sent
+# through, or None in the main process.
+worker_status_queue = None
+
 
 def _NewMultiprocessingQueue():
   new_queue = multiprocessing.Queue(MAX_QUEUE_SIZE)
@@ -223,6 +240,7 @@ global need_pool_or_done_cond, caller_id_finished_count, new_pool_needed
 global current_max_recursive_level, shared_vars_map, shared_vars_list_map
 global class_map, worker_checking_level_lock, failure_count, thread_stats
 global glob_status_queue, ui_controller, concurrent_compressed_upload_lock
+global pending_status_batches
 
 
 def InitializeMultiprocessingVariables():
@@ -296,7 +314,7 @@ def InitializeMultiprocessingVariables():
   global need_pool_or_done_cond, caller_id_finished_count, new_pool_needed
   global current_max_recursive_level, shared_vars_map, shared_vars_list_map
   global class_map, worker_checking_level_lock, failure_count, glob_status_queue
-  global concurrent_compressed_upload_lock
+  global concurrent_compressed_upload_lock, pending_status_batches
 
   manager = multiprocessing.Manager()
 
@@ -354,21 +372,19 @@ def InitializeMultiprocessingVariables():
   failure_count = ProcessAndThreadSafeInt(True)
 
   # Central queue for status reporting across multiple processes and threads.
-  # It's possible that if many processes and threads are executing small file
-  # writes or metadata changes quickly, performance may be bounded by lock
-  # contention on the queue. Initial testing conducted with
-  # 12 processes * 5 threads per process showed little difference.  If this
-  # becomes a performance bottleneck in the future, consider creating a queue
-  # per-process and having the UI thread poll all of the queues; that approach
-  # would need to address:
-  # - Queue fairness if one queue grows to be disproportionately large
-  # - Reasonable time correlation with events as they occur
+  # Worker processes put their messages on it in batches (see
+  # BatchingStatusQueue), so that its lock and the round trips to the manager
+  # process are paid per batch rather than per object.
   #
   # This queue must be torn down after worker processes/threads and the
   # UI thread have been torn down. Otherwise, these threads may have
   # undefined behavior when trying to interact with a non-existent queue.
   glob_status_queue = manager.Queue(MAX_QUEUE_SIZE)
 
+  # Number of worker processes' status message buffers with messages that
+  # haven't been put on glob_status_queue yet.
+  pending_status_batches = ProcessAndThreadSafeInt(True)
+
   # Semaphore lock used to prevent resource exhaustion when running many
   # compressed uploads in parallel.
   concurrent_compressed_upload_lock = manager.BoundedSemaphore(
@@ -401,7 +417,7 @@ def InitializeThreadingVariables():
   global need_pool_or_done_cond, call_completed_map, class_map, thread_stats
   global task_queues, caller_id_lock, caller_id_counter, glob_status_queue
   global worker_checking_level_lock, current_max_recursive_level
-  global concurrent_compressed_upload_lock
+  global concurrent_compressed_upload_lock, pending_status_batches
   caller_id_counter = ProcessAndThreadSafeInt(False)
   caller_id_finished_count = AtomicDict()
   caller_id_lock = threading.Lock()
@@ -412,6 +428,7 @@ def InitializeThreadingVariables():
   glob_status_queue = Queue.Queue(MAX_QUEUE_SIZE)
   global_return_values_map = AtomicDict()
   need_pool_or_done_cond = threading.Condition()
+  pending_status_batches = ProcessAndThreadSafeInt(False)
   shared_vars_list_map = AtomicDict()
   shared_vars_map = AtomicDict()
   thread_stats = AtomicDict()
@@ -460,6 +477,7 @@ class Command(HelpProvider):
   command_spec = None
 
   _commands_with_subcommands_and_subopts = ('acl',
+                                            'daemon',
                                             'defacl',
                                             'kms',
                                             'label',
@@ -1178,20 +1196,24 @@ class Command(HelpProvider):
       (process_count, thread_count): The number of processes and threads to use,
                                      respectively.
     """
+    # Imported here to avoid a circular import. Command modules are loaded
+    # lazily, so the config command's module may not have been loaded yet.
+    # pylint: disable=g-import-not-at-top
+    from gslib.commands.config import DEFAULT_PARALLEL_PROCESS_COUNT
+    from gslib.commands.config import DEFAULT_PARALLEL_THREAD_COUNT
+    # pylint: enable=g-import-not-at-top
     # Set OS process and python thread count as a function of options
     # and config.
     if self.parallel_operations or parallel_operations_override:
       if not process_count:
         process_count = boto.config.getint(
-            'GSUtil', 'parallel_process_count',
-            gslib.commands.config.DEFAULT_PARALLEL_PROCESS_COUNT)
+            'GSUtil', 'parallel_process_count', DEFAULT_PARALLEL_PROCESS_COUNT)
       if process_count < 1:
         raise CommandException('Invalid parallel_process_count "%d".' %
                                process_count)
       if not thread_count:
         thread_count = boto.config.getint(
-            'GSUtil', 'parallel_thread_count',
-            gslib.commands.config.DEFAULT_PARALLEL_THREAD_COUNT)
+            'GSUtil', 'parallel_thread_count', DEFAULT_PARALLEL_THREAD_COUNT)
       if thread_count < 1:
         raise CommandException('Invalid parallel_thread_count "%d".' %
                                thread_count)
@@ -1211,8 +1233,17 @@ class Command(HelpProvider):
 
     return (process_count, thread_count)
 
-  def _SetUpPerCallerState(self):
-    """Set up the state for a caller id, corresponding to one Apply call."""
+  def _SetUpPerCallerState(self, is_parallel):
+    """Set up the state for a caller id, corresponding to one Apply call.
+
+    Args:
+      is_parallel: Whether the call's tasks are performed by worker threads,
+          which need a copy of this command. Sequential calls perform their
+          tasks with the command itself.
+
+    Returns:
+      The caller id.
+    """
     # pylint: disable=global-variable-undefined,global-variable-not-assigned
     # These variables are initialized in InitializeMultiprocessingVariables or
     # InitializeThreadingVariables
@@ -1225,23 +1256,24 @@ class Command(HelpProvider):
       caller_id_counter.Increment()
       caller_id = caller_id_counter.GetValue()
 
-    # Create a copy of self with an incremented recursive level. This allows
-    # the class to report its level correctly if the function called from it
-    # also needs to call Apply.
-    cls = copy.copy(self)
-    cls.recursive_apply_level += 1
+    if is_parallel:
+      # Create a copy of self with an incremented recursive level. This allows
+      # the class to report its level correctly if the function called from
+      # it also needs to call Apply.
+      cls = copy.copy(self)
+      cls.recursive_apply_level += 1
 
-    # Thread-safe loggers can't be pickled, so we will remove it here and
-    # recreate it later in the WorkerThread. This is not a problem since any
-    # logger with the same name will be treated as a singleton.
-    cls.logger = None
+      # Thread-safe loggers can't be pickled, so we will remove it here and
+      # recreate it later in the WorkerThread. This is not a problem since any
+      # logger with the same name will be treated as a singleton.
+      cls.logger = None
 
-    # Likewise, the default API connection(s) can't be pickled, but are unused
-    # anyway as each thread gets its own API delegator.
-    cls.gsutil_api = None
-    cls.seek_ahead_gsutil_api = None
+      # Likewise, the default API connection(s) can't be pickled, but are
+      # unused anyway as each thread gets its own API delegator.
+      cls.gsutil_api = None
+      cls.seek_ahead_gsutil_api = None
 
-    class_map[caller_id] = cls
+      class_map[caller_id] = cls
     total_tasks[caller_id] = -1  # -1 => the producer hasn't finished yet.
     call_completed_map[caller_id] = False
     caller_id_finished_count[caller_id] = 0
@@ -1359,7 +1391,10 @@ class Command(HelpProvider):
       # threads or processes.
       CheckMultiprocessingAvailableAndInit(logger=self.logger)
 
-    caller_id = self._SetUpPerCallerState()
+    usable_processes_count = (process_count if self.multiprocessing_is_available
+                              else 1)
+    is_parallel = thread_count * usable_processes_count > 1
+    caller_id = self._SetUpPerCallerState(is_parallel)
 
     # If any shared attributes passed by caller, create a dictionary of
     # shared memory variables for every element in the list of shared
@@ -1370,9 +1405,7 @@ class Command(HelpProvider):
         shared_vars_map[(caller_id, name)] = 0
 
     # Make all of the requested function calls.
-    usable_processes_count = (process_count if self.multiprocessing_is_available
-                              else 1)
-    if thread_count * usable_processes_count > 1:
+    if is_parallel:
       self._ParallelApply(
           func, args_iterator, exception_handler, caller_id, arg_checker,
           usable_processes_count, thread_count, should_return_results,
@@ -1381,6 +1414,8 @@ class Command(HelpProvider):
       if is_main_thread:
         _AggregateThreadStats()
     else:
+      if is_main_thread:
+        live_metrics.SetWorkers(1)
       self._SequentialApply(func, args_iterator, exception_handler, caller_id,
                             arg_checker, should_return_results, fail_on_error)
 
@@ -1427,6 +1462,7 @@ class Command(HelpProvider):
     while True:
 
       # Try to get the next argument, handling any exceptions that arise.
+      iteration_start_time = time.time()
       try:
         args = args_iterator.next()
       except StopIteration, e:
@@ -1443,6 +1479,7 @@ class Command(HelpProvider):
                 'Caught exception while handling exception for %s:\n%s',
                 func, traceback.format_exc())
           continue
+      _RecordArgIterationTime(args, time.time() - iteration_start_time)
 
       sequential_call_count += 1
       if sequential_call_count == OFFER_GSUTIL_M_SUGGESTION_THRESHOLD:
@@ -1611,6 +1648,12 @@ class Command(HelpProvider):
     if seek_ahead_iterator and not is_main_thread:
       seek_ahead_iterator = None
 
+    if not is_main_thread and worker_status_queue:
+      # Tasks in other processes may report on parts of the object this task
+      # has reported starting (e.g., the components of a sliced download), so
+      # the UI must get this process's buffered messages first.
+      worker_status_queue.Flush()
+
     # Kick off a producer thread to throw tasks in the global task queue. We
     # do this asynchronously so that the main thread can be free to create new
     # consumer pools when needed (otherwise, any thread with a task that needs
@@ -1627,6 +1670,9 @@ class Command(HelpProvider):
     # (aggregated across processes and threads) to the user.
     ui_thread = None
     if is_main_thread:
+      live_metrics.SetWorkers(process_count * thread_count,
+                              task_queue=task_queue,
+                              status_queue=glob_status_queue)
       ui_thread = UIThread(glob_status_queue, sys.stderr, ui_controller)
 
     # Wait here until either:
@@ -1656,8 +1702,10 @@ class Command(HelpProvider):
         need_pool_or_done_cond.wait()
 
     # We've completed all tasks (or excepted), so signal the UI thread to
-    # terminate.
+    # terminate once the worker processes' last status messages have arrived.
     if is_main_thread:
+      if process_count > 1:
+        WaitForStatusBatches(pending_status_batches)
       PutToQueueWithTimeout(glob_status_queue, ZERO_TASKS_TO_DO_ARGUMENT)
       ui_thread.join(timeout=UI_THREAD_JOIN_TIMEOUT)
       # Now that all the work is done, log the types of source URLs encountered.
@@ -1704,6 +1752,7 @@ class Command(HelpProvider):
       status_queue: Multiprocessing/threading queue for progress reporting and
           performance aggregation.
     """
+    global worker_status_queue
     assert process_count > 1, (
         'Invalid state, calling command._ApplyThreads with only one process.')
 
@@ -1714,8 +1763,14 @@ class Command(HelpProvider):
     for catch_signal in GetCaughtSignals():
       signal.signal(catch_signal, ChildProcessSignalHandler)
 
+    observer_util.ResetForWorkerProcess()
+    _StartProcessFailureCount()
     self._ResetConnectionPool()
     self.recursive_apply_level = recursive_apply_level
+    # Traces need each file's messages.
+    status_queue = BatchingStatusQueue(status_queue, pending_status_batches,
+                                       count_files=not trace_util.IsEnabled())
+    worker_status_queue = status_queue
 
     task_queue = task_queues[recursive_apply_level]
 
@@ -1757,6 +1812,14 @@ class Command(HelpProvider):
         worker_semaphore.release()
 
 
+def _RecordArgIterationTime(args, seconds):
+  """Records the time an Apply call's args iterator took to produce args."""
+  # rsync's arguments are the differences it computes as it iterates.
+  perf_util.Record(
+      perf_util.PHASE_DIFF if isinstance(args, RsyncDiffToApply)
+      else perf_util.PHASE_LISTING, seconds)
+
+
 # Below here lie classes and functions related to controlling the flow of tasks
 # between various threads and processes.
 class _ConsumerPool(object):
@@ -1887,6 +1950,7 @@ class ProducerThread(threading.Thread):
       total_size = 0
       self.args_iterator = iter(self.args_iterator)
       while True:
+        iteration_start_time = time.time()
         try:
           args = self.args_iterator.next()
         except StopIteration, e:
@@ -1905,6 +1969,7 @@ class ProducerThread(threading.Thread):
                   self.func, traceback.format_exc())
             self.shared_variables_updater.Update(self.caller_id, self.cls)
             continue
+        _RecordArgIterationTime(args, time.time() - iteration_start_time)
 
         if self.arg_checker(self.cls, args):
           num_tasks += 1
@@ -1952,7 +2017,8 @@ class ProducerThread(threading.Thread):
                           self.exception_handler, self.should_return_results,
                           self.arg_checker, self.fail_on_error)
           if last_task:
-            self.task_queue.put(last_task)
+            with perf_util.PhaseTimer(perf_util.PHASE_QUEUEING):
+              self.task_queue.put(last_task)
     except Exception, e:  # pylint: disable=broad-except
       # This will also catch any exception raised due to an error in the
       # iterator when fail_on_error is set, so check that we failed for some
@@ -2079,6 +2145,7 @@ class WorkerThread(threading.Thread):
     self.daemon = True
     self.cached_classes = {}
     self.shared_vars_updater = _SharedVariablesUpdater()
+    self.status_queue = status_queue
     self.user_project = user_project
 
     # Note that thread_gsutil_api is not initialized in the sequential
@@ -2119,7 +2186,9 @@ class WorkerThread(threading.Thread):
     """
     caller_id = task.caller_id
     try:
-      results = task.func(cls, task.args, thread_state=self.thread_gsutil_api)
+      with perf_util.PhaseTimer(perf_util.PHASE_TASK):
+        results = task.func(cls, task.args,
+                            thread_state=self.thread_gsutil_api)
       if task.should_return_results:
         global_return_values_map.Increment(caller_id, [results],
                                            default_value=[])
@@ -2140,6 +2209,15 @@ class WorkerThread(threading.Thread):
       if self.worker_semaphore:
         self.worker_semaphore.release()
       self.shared_vars_updater.Update(caller_id, cls)
+      # Send the data this task's observers collected before it's counted as
+      # finished, so that it reaches the main process before the command
+      # completes.
+      observer_util.SendToMainProcess(self.status_queue)
+      if cls.recursive_apply_level > 1 and worker_status_queue:
+        # The task was part of an object (e.g., a slice of a sliced download),
+        # so the UI must get its messages before the caller reports the
+        # object finished.
+        worker_status_queue.Flush()
 
       # Even if we encounter an exception, we still need to claim that that
       # the function finished executing. Otherwise, we won't know when to
@@ -2309,6 +2387,16 @@ def ShutDownGsutil():
     pass
 
 
+def GetConsumerProcessIds():
+  """Returns the IDs of the worker processes this process has started."""
+  try:
+    pools = consumer_pools
+  except NameError:
+    # Multiprocessing isn't available, so there are no worker processes.
+    return []
+  return [process.pid for pool in pools for process in pool.processes]
+
+
 def _GetCurrentMaxRecursiveLevel():
   global current_max_recursive_level
   return current_max_recursive_level.GetValue()
@@ -2319,14 +2407,24 @@ def _IncrementCurrentMaxRecursiveLevel():
   current_max_recursive_level.Increment()
 
 
+def _StartProcessFailureCount():
+  """Starts counting the failures in this worker process on their own."""
+  global process_failure_count
+  process_failure_count = ProcessAndThreadSafeInt(False)
+
+
 def _IncrementFailureCount():
   global failure_count
   failure_count.Increment()
+  if process_failure_count is not None:
+    process_failure_count.Increment()
 
 
 def DecrementFailureCount():
   global failure_count
   failure_count.Decrement()
+  if process_failure_count is not None:
+    process_failure_count.Decrement()
 
 
 def GetFailureCount():
@@ -2335,6 +2433,18 @@ def GetFailureCount():
   return failure_count.GetValue()
 
 
+def GetProcessFailureCount():
+  """Returns the number of failures processed in this process.
+
+  In a worker process, this only counts the failures of the tasks the process
+  performed, while GetFailureCount counts those of all processes. In the main
+  process, the two are the same.
+  """
+  if process_failure_count is not None:
+    return process_failure_count.GetValue()
+  return GetFailureCount()
+
+
 def ResetFailureCount():
   """Resets the failure_count variable to 0 - useful if error is expected."""
   global failure_count
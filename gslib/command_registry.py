@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Precomputed registry of gsutil commands, used to lazily load commands.
+
+Importing every module under gslib.commands on startup is expensive, since
+several of them (perfdiag, notification, kms, iam, signurl, ...) pull in
+additional API clients and libraries. Instead, we keep a static map from each
+command name and alias to the module implementing it, and only import the
+module for the command actually being run.
+
+COMMAND_MODULE_MAP is generated from the command sources by
+BuildCommandModuleMap(), which reads each command's CreateCommandSpec call
+without importing the module. A unit test verifies that the map below is in
+sync with the sources; if you add a command or alias, regenerate it by running:
+
+  python gslib/command_registry.py
+"""
+
+from __future__ import absolute_import
+
+import ast
+import os
+import pkgutil
+import pprint
+import sys
+
+# The map below is generated; do not edit it by hand.
+# BEGIN GENERATED COMMAND_MODULE_MAP
+COMMAND_MODULE_MAP = {
+    '?': 'gslib.commands.help',
+    'acl': 'gslib.commands.acl',
+    'batch': 'gslib.commands.batch',
+    'cat': 'gslib.commands.cat',
+    'cfg': 'gslib.commands.config',
+    'chacl': 'gslib.commands.acl',
+    'chdefacl': 'gslib.commands.defacl',
+    'compose': 'gslib.commands.compose',
+    'concat': 'gslib.commands.compose',
+    'conf': 'gslib.commands.config',
+    'config': 'gslib.commands.config',
+    'configure': 'gslib.commands.config',
+    'copy': 'gslib.commands.cp',
+    'cors': 'gslib.commands.cors',
+    'cp': 'gslib.commands.cp',
+    'createbucket': 'gslib.commands.mb',
+    'daemon': 'gslib.commands.daemon',
+    'defacl': 'gslib.commands.defacl',
+    'defstorageclass': 'gslib.commands.defstorageclass',
+    'del': 'gslib.commands.rm',
+    'delete': 'gslib.commands.rm',
+    'deletebucket': 'gslib.commands.rb',
+    'diag': 'gslib.commands.perfdiag',
+    'diagnostic': 'gslib.commands.perfdiag',
+    'dir': 'gslib.commands.ls',
+    'disablelogging': 'gslib.commands.logging',
+    'du': 'gslib.commands.du',
+    'enablelogging': 'gslib.commands.logging',
+    'getacl': 'gslib.commands.acl',
+    'getcors': 'gslib.commands.cors',
+    'getdefacl': 'gslib.commands.defacl',
+    'getlogging': 'gslib.commands.logging',
+    'getversioning': 'gslib.commands.versioning',
+    'getwebcfg': 'gslib.commands.web',
+    'hash': 'gslib.commands.hash',
+    'help': 'gslib.commands.help',
+    'iam': 'gslib.commands.iam',
+    'kms': 'gslib.commands.kms',
+    'label': 'gslib.commands.label',
+    'lifecycle': 'gslib.commands.lifecycle',
+    'lifecycleconfig': 'gslib.commands.lifecycle',
+    'list': 'gslib.commands.ls',
+    'logging': 'gslib.commands.logging',
+    'ls': 'gslib.commands.ls',
+    'makebucket': 'gslib.commands.mb',
+    'man': 'gslib.commands.help',
+    'mb': 'gslib.commands.mb',
+    'md': 'gslib.commands.mb',
+    'mkdir': 'gslib.commands.mb',
+    'move': 'gslib.commands.mv',
+    'mv': 'gslib.commands.mv',
+    'notif': 'gslib.commands.notification',
+    'notification': 'gslib.commands.notification',
+    'notifications': 'gslib.commands.notification',
+    'notify': 'gslib.commands.notification',
+    'notifyconfig': 'gslib.commands.notification',
+    'perf': 'gslib.commands.perfdiag',
+    'perfdiag': 'gslib.commands.perfdiag',
+    'performance': 'gslib.commands.perfdiag',
+    'queryauth': 'gslib.commands.signurl',
+    'rb': 'gslib.commands.rb',
+    'refresh': 'gslib.commands.update',
+    'remove': 'gslib.commands.rm',
+    'removebucket': 'gslib.commands.rb',
+    'removebuckets': 'gslib.commands.rb',
+    'ren': 'gslib.commands.mv',
+    'rename': 'gslib.commands.mv',
+    'requesterpays': 'gslib.commands.requesterpays',
+    'retention': 'gslib.commands.retention',
+    'rewrite': 'gslib.commands.rewrite',
+    'rm': 'gslib.commands.rm',
+    'rmdir': 'gslib.commands.rb',
+    'rsync': 'gslib.commands.rsync',
+    'setacl': 'gslib.commands.acl',
+    'setcors': 'gslib.commands.cors',
+    'setdefacl': 'gslib.commands.defacl',
+    'setheader': 'gslib.commands.setmeta',
+    'setmeta': 'gslib.commands.setmeta',
+    'setversioning': 'gslib.commands.versioning',
+    'setwebcfg': 'gslib.commands.web',
+    'signedurl': 'gslib.commands.signurl',
+    'signurl': 'gslib.commands.signurl',
+    'stat': 'gslib.commands.stat',
+    'test': 'gslib.commands.test',
+    'update': 'gslib.commands.update',
+    'ver': 'gslib.commands.version',
+    'version': 'gslib.commands.version',
+    'versioning': 'gslib.commands.versioning',
+    'web': 'gslib.commands.web',
+}
+# END GENERATED COMMAND_MODULE_MAP
+
+_COMMANDS_PACKAGE = 'gslib.commands'
+_BEGIN_MARKER = '# BEGIN GENERATED COMMAND_MODULE_MAP'
+_END_MARKER = '# END GENERATED COMMAND_MODULE_MAP'
+
+
+def _GetCommandSpecNames(source):
+  """Returns the command name and aliases declared in a command's source.
+
+  Args:
+    source: Python source code of a gslib.commands module.
+
+  Returns:
+    List of command name and aliases, with the command name first, or an empty
+    list if the source does not declare a command spec.
+  """
+  for node in ast.walk(ast.parse(source)):
+    if not (isinstance(node, ast.Call) and
+            isinstance(node.func, ast.Attribute) and
+            node.func.attr == 'CreateCommandSpec'):
+      continue
+    names = [node.args[0].s]
+    for keyword in node.keywords:
+      if keyword.arg == 'command_name_aliases':
+        names.extend(elt.s for elt in keyword.value.elts)
+    return names
+  return []
+
+
+def BuildCommandModuleMap(commands_dir=None):
+  """Builds the command registry by parsing the gslib.commands sources.
+
+  Args:
+    commands_dir: Directory containing the command modules. Defaults to the
+        gslib/commands directory next to this module.
+
+  Returns:
+    Dict mapping each command name and alias to its module path.
+  """
+  if commands_dir is None:
+    commands_dir = os.path.join(
+        os.path.dirname(os.path.realpath(__file__)), 'commands')
+  command_module_map = {}
+  for filename in sorted(os.listdir(commands_dir)):
+    module_name, ext = os.path.splitext(filename)
+    if ext != '.py' or module_name == '__init__':
+      continue
+    with open(os.path.join(commands_dir, filename), 'r') as f:
+      names = _GetCommandSpecNames(f.read())
+    for name in names:
+      command_module_map[name] = '%s.%s' % (_COMMANDS_PACKAGE, module_name)
+  return command_module_map
+
+
+def WriteCommandModuleMap(command_module_map, registry_path=None):
+  """Rewrites the generated COMMAND_MODULE_MAP section of this module.
+
+  Args:
+    command_module_map: Dict as returned by BuildCommandModuleMap.
+    registry_path: Path of the file to rewrite. Defaults to this module.
+  """
+  if registry_path is None:
+    registry_path = os.path.splitext(os.path.realpath(__file__))[0] + '.py'
+  with open(registry_path, 'r') as f:
+    contents = f.read()
+  prefix, _, rest = contents.partition(_BEGIN_MARKER + '\n')
+  _, _, suffix = rest.partition(_END_MARKER)
+  formatted_map = pprint.pformat(command_module_map, indent=4)
+  # pprint emits {   'a': ..., so normalize to the repo's 4-space indent.
+  formatted_map = formatted_map.replace('{   ', '{\n    ', 1)
+  formatted_map = formatted_map[:-1] + ',\n}'
+  with open(registry_path, 'w') as f:
+    f.write('%s%s\nCOMMAND_MODULE_MAP = %s\n%s%s' % (
+        prefix, _BEGIN_MARKER, formatted_map, _END_MARKER, suffix))
+
+
+class LazyCommandMap(object):
+  """Dict-like map of command names to classes that imports commands lazily.
+
+  Only the methods CommandRunner and its callers rely on are provided. Looking
+  up a command imports its module; iterating over values imports all of them.
+  """
+
+  def __init__(self, command_module_map=None):
+    """Instantiates a LazyCommandMap.
+
+    Args:
+      command_module_map: Dict mapping command names and aliases to module
+          paths. Defaults to COMMAND_MODULE_MAP.
+    """
+    self._command_module_map = (COMMAND_MODULE_MAP if command_module_map is None
+                                else command_module_map)
+    self._loaded_commands = {}
+
+  def _IsAvailable(self, command_name):
+    """Returns True if the module for command_name is present.
+
+    Some installs deliberately omit command modules (e.g., package installs do
+    not include the update command), so registry entries may be stale.
+
+    Args:
+      command_name: Command name or alias.
+
+    Returns:
+      True if the command's module can be imported.
+    """
+    module_path = self._command_module_map.get(command_name)
+    if not module_path:
+      return False
+    if module_path in sys.modules:
+      return True
+    return pkgutil.find_loader(module_path) is not None
+
+  def _LoadCommand(self, command_name):
+    """Imports the module for command_name and returns its Command class."""
+    if command_name in self._loaded_commands:
+      return self._loaded_commands[command_name]
+    # pylint: disable=g-import-not-at-top
+    from gslib.command import Command
+    module_path = self._command_module_map[command_name]
+    __import__(module_path)
+    module = sys.modules[module_path]
+    for value in vars(module).values():
+      if (isinstance(value, type) and issubclass(value, Command) and
+          value is not Command and value.__module__ == module_path and
+          command_name in _AllNames(value)):
+        self._loaded_commands[command_name] = value
+        return value
+    raise KeyError(command_name)
+
+  def __contains__(self, command_name):
+    return self._IsAvailable(command_name)
+
+  def __getitem__(self, command_name):
+    if not self._IsAvailable(command_name):
+      raise KeyError(command_name)
+    return self._LoadCommand(command_name)
+
+  def __iter__(self):
+    return iter(self.keys())
+
+  def __len__(self):
+    return len(self.keys())
+
+  def get(self, command_name, default=None):
+    try:
+      return self[command_name]
+    except KeyError:
+      return default
+
+  def keys(self):
+    return [name for name in self._command_module_map
+            if self._IsAvailable(name)]
+
+  def values(self):
+    return [self._LoadCommand(name) for name in self.keys()]
+
+  def items(self):
+    return [(name, self._LoadCommand(name)) for name in self.keys()]
+
+
+def _AllNames(command_class):
+  spec = command_class.command_spec
+  return [spec.command_name] + list(spec.command_name_aliases)
+
+
+if __name__ == '__main__':
+  WriteCommandModuleMap(BuildCommandModuleMap())
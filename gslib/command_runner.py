@@ -19,7 +19,6 @@ from __future__ import absolute_import
 import difflib
 import logging
 import os
-import pkgutil
 import sys
 import textwrap
 import time
@@ -29,22 +28,24 @@ from boto.storage_uri import BucketStorageUri
 import gslib
 from gslib import metrics
 from gslib.cloud_api_delegator import CloudApiDelegator
-from gslib.command import Command
 from gslib.command import CreateGsutilLogger
-from gslib.command import GetFailureCount
+from gslib.command import GetProcessFailureCount
 from gslib.command import OLD_ALIAS_MAP
 from gslib.command import ShutDownGsutil
-import gslib.commands
+from gslib.command_registry import LazyCommandMap
 from gslib.cs_api_map import ApiSelector
 from gslib.cs_api_map import GsutilApiClassMapFactory
 from gslib.cs_api_map import GsutilApiMapFactory
 from gslib.discard_messages_queue import DiscardMessagesQueue
 from gslib.exception import CommandException
 from gslib.gcs_json_api import GcsJsonApi
+from gslib.hedged_download import GetHedgedDownloadCounts
 from gslib.no_op_credentials import NoOpCredentials
+from gslib.object_metadata_cache import GetObjectMetadataCache
 from gslib.tab_complete import MakeCompleter
 from gslib.utils import boto_util
 from gslib.utils import system_util
+from gslib.utils.constants import DEBUGLEVEL_DUMP_REQUESTS
 from gslib.utils.constants import GSUTIL_PUB_TARBALL
 from gslib.utils.constants import RELEASE_NOTES_URL
 from gslib.utils.constants import UTF8
@@ -146,18 +147,16 @@ class CommandRunner(object):
       self.command_map = self._LoadCommandMap()
 
   def _LoadCommandMap(self):
-    """Returns dict mapping each command_name to implementing class."""
-    # Import all gslib.commands submodules.
-    for _, module_name, _ in pkgutil.iter_modules(gslib.commands.__path__):
-      __import__('gslib.commands.%s' % module_name)
-
-    command_map = {}
-    # Only include Command subclasses in the dict.
-    for command in Command.__subclasses__():
-      command_map[command.command_spec.command_name] = command
-      for command_name_aliases in command.command_spec.command_name_aliases:
-        command_map[command_name_aliases] = command
-    return command_map
+    """Returns dict-like map of each command_name to implementing class.
+
+    Command modules are imported only when their command is looked up, so
+    running a single command doesn't pay for importing every command (and the
+    API clients and libraries some of them depend on).
+
+    Returns:
+      LazyCommandMap of command names and aliases to Command subclasses.
+    """
+    return LazyCommandMap()
 
   def _GetTabCompleteLogger(self):
     """Returns a logger for tab completion."""
@@ -369,11 +368,25 @@ class CommandRunner(object):
                                sub_opts=command_inst.sub_opts,
                                command_alias=command_name)
 
+    # Only count failures from this command, so that commands run atop other
+    # commands (e.g., batch) report each nested command's outcome separately.
+    # Commands run in worker processes only count the failures in their own
+    # process, as commands in other processes may be failing at the same time.
+    initial_failure_count = GetProcessFailureCount()
     return_code = command_inst.RunCommand()
 
     if CheckMultiprocessingAvailableAndInit().is_available and do_shutdown:
       ShutDownGsutil()
-    if GetFailureCount() > 0:
+    if debug >= DEBUGLEVEL_DUMP_REQUESTS:
+      cache_stats = GetObjectMetadataCache().GetStats()
+      if cache_stats.hits or cache_stats.misses:
+        logging.debug('Object metadata cache: %d hits, %d misses.',
+                      cache_stats.hits, cache_stats.misses)
+      hedge_counts = GetHedgedDownloadCounts()
+      if hedge_counts.issued:
+        logging.debug('Hedged download requests: %d issued, %d won.',
+                      hedge_counts.issued, hedge_counts.won)
+    if GetProcessFailureCount() > initial_failure_count:
       return_code = 1
     if command_changed_to_update:
       # If the command changed to update, the user's original command was
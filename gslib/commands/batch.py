@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Implementation of batch command for running many gsutil commands at once."""
+
+from __future__ import absolute_import
+
+import collections
+import json
+import shlex
+import sys
+import time
+
+from gslib.command import Command
+from gslib.command import DummyArgChecker
+from gslib.exception import CommandException
+
+_SYNOPSIS = """
+  gsutil batch [-c] [-r results_file] [commands_file]
+"""
+
+_DETAILED_HELP_TEXT = ("""
+<B>SYNOPSIS</B>
+""" + _SYNOPSIS + """
+
+
+<B>DESCRIPTION</B>
+  The batch command runs a list of gsutil commands, one per line, read from
+  commands_file (or from stdin if commands_file is "-" or omitted). For
+  example, if the file cmds.txt contains:
+
+    # Lines starting with '#' are comments.
+    mb gs://my-bucket
+    wait
+    cp file1.txt gs://my-bucket
+    cp file2.txt gs://my-bucket
+    setmeta -h "Content-Type:text/plain" gs://my-bucket/file1.txt
+
+  then running:
+
+    gsutil batch cmds.txt
+
+  runs those commands in order. Each line is split into arguments the way a
+  shell would (including quoting), and may optionally begin with "gsutil".
+
+  All of the commands run in a single gsutil process, so gsutil's startup,
+  configuration and credential setup happen only once, and connections are
+  reused across commands. This is much faster than invoking gsutil separately
+  for each of many small operations.
+
+  Top-level options such as -h, -o and -u are given before "batch" and apply
+  to every command in the batch; they can't be given on individual lines.
+
+
+<B>PARALLEL BATCHES</B>
+  If you run "gsutil -m batch", the commands in the batch run in parallel in
+  gsutil's worker processes (see the -m option in "gsutil help options", and
+  the parallel_process_count option in your boto config file). Each process
+  runs one command at a time, so commands don't share process-wide settings
+  such as cp's options, and each command runs its own operations
+  sequentially. On systems where gsutil can't use multiple processes, the
+  commands run one after another.
+
+  To require some commands to finish before others start (for example, to
+  create a bucket before copying to it, as above), add a line containing just
+  "wait": every command before the "wait" line finishes before any command
+  after it starts.
+
+  Lines after a "wait" line also run only if all of the commands before it
+  succeeded, unless the -c option is given.
+
+
+<B>RESULTS</B>
+  When the -r option is given, gsutil writes one JSON object per command to
+  results_file ("-" for stdout) as the commands complete, for example:
+
+    {"line": 3, "command": "cp file1.txt gs://my-bucket", "status": 0,
+     "elapsed_seconds": 0.41, "error": null}
+
+  "status" is the command's exit status (0 for success), and "error" is the
+  error message if the command raised an error. In parallel batches, results
+  for the commands between two "wait" lines are written when all of them have
+  finished, ordered by line number.
+
+  The exit status of the batch command is 0 if all commands succeeded, and 1
+  otherwise.
+
+
+<B>OPTIONS</B>
+  -c          Continue running the remaining commands after a command fails.
+              By default, the batch stops after the first failing command (or,
+              for parallel batches, after the group of commands containing
+              it).
+
+  -r file     Writes a JSON result record for each command to the given file
+              ("-" for stdout).
+""")
+
+# Line that separates groups of commands that may run in parallel.
+_BARRIER = 'wait'
+
+BatchEntry = collections.namedtuple('BatchEntry', 'line_num args')
+
+
+def _RunBatchEntryFunc(cls, entry, thread_state=None):
+  return cls.RunBatchEntry(entry, thread_state=thread_state)
+
+
+def _BatchExceptionHandler(cls, e):
+  cls.logger.error(str(e))
+
+
+def _ParseBatchLine(line):
+  """Parses a line from a batch commands file.
+
+  Args:
+    line: The line to parse.
+
+  Returns:
+    List of the line's arguments (with the command name first and any leading
+    "gsutil" removed), or None if the line contains no command. A barrier line
+    is returned as [_BARRIER].
+
+  Raises:
+    CommandException if the line can't be parsed.
+  """
+  try:
+    args = shlex.split(line, comments=True)
+  except ValueError as e:
+    raise CommandException('Could not parse "%s": %s' % (line.strip(), e))
+  if args and args[0] == 'gsutil':
+    args = args[1:]
+  if not args:
+    return None
+  if args[0].startswith('-'):
+    raise CommandException(
+        'Top-level gsutil options can\'t be used within a batch ("%s"). Give '
+        'them before "batch" instead.' % line.strip())
+  return args
+
+
+def _ParseBatch(lines):
+  """Parses batch lines into groups of commands separated by barriers.
+
+  Args:
+    lines: Iterable of lines.
+
+  Returns:
+    List of lists of BatchEntry tuples.
+  """
+  groups = [[]]
+  for line_num, line in enumerate(lines, start=1):
+    args = _ParseBatchLine(line)
+    if args is None:
+      continue
+    if args == [_BARRIER]:
+      if groups[-1]:
+        groups.append([])
+      continue
+    groups[-1].append(BatchEntry(line_num, args))
+  return [group for group in groups if group]
+
+
+class BatchCommand(Command):
+  """Implementation of gsutil batch command."""
+
+  # Command specification. See base class for documentation.
+  command_spec = Command.CreateCommandSpec(
+      'batch',
+      command_name_aliases=[],
+      usage_synopsis=_SYNOPSIS,
+      min_args=0,
+      max_args=1,
+      supported_sub_args='cr:',
+      file_url_ok=True,
+      provider_url_ok=False,
+      urls_start_arg=0,
+  )
+  # Help specification. See help_provider.py for documentation.
+  help_spec = Command.HelpSpec(
+      help_name='batch',
+      help_name_aliases=[],
+      help_type='command_help',
+      help_one_line_summary='Run many gsutil commands in one process',
+      help_text=_DETAILED_HELP_TEXT,
+      subcommand_help_text={},
+  )
+
+  def RunBatchEntry(self, entry, thread_state=None, parallel_operations=False):
+    """Runs a single command from the batch.
+
+    Args:
+      entry: BatchEntry for the command.
+      thread_state: Unused; nested commands create their own API instances.
+      parallel_operations: Whether the command may run its operations in
+          parallel. This is False for commands run in parallel with others.
+
+    Returns:
+      Result dict for the command, as written to the results file.
+    """
+    command_name, args = entry.args[0], entry.args[1:]
+    error = None
+    start_time = time.time()
+    try:
+      status = self.command_runner.RunNamedCommand(
+          command_name, args=args, headers=dict(self.headers or {}),
+          debug=self.debug, trace_token=self.trace_token,
+          parallel_operations=parallel_operations,
+          skip_update_check=True, do_shutdown=False,
+          perf_trace_token=self.perf_trace_token,
+          user_project=self.user_project)
+    except Exception as e:  # pylint: disable=broad-except
+      status = 1
+      error = str(e)
+      self.logger.error('Line %d: %s', entry.line_num, error)
+    return {
+        'line': entry.line_num,
+        'command': ' '.join(entry.args),
+        'status': status or 0,
+        'elapsed_seconds': round(time.time() - start_time, 3),
+        'error': error,
+    }
+
+  def _WriteResult(self, result):
+    if self.results_file:
+      self.results_file.write(json.dumps(result, sort_keys=True) + '\n')
+      self.results_file.flush()
+
+  def _RunGroup(self, group):
+    """Runs a group of commands and returns True if they all succeeded."""
+    if self.parallel_operations and len(group) > 1:
+      # The parallelism is across commands, so each command runs its own
+      # operations sequentially. Commands keep some of their state in module
+      # globals (e.g., cp's copy helper options) and count their failures per
+      # process, so each worker process runs only one command at a time.
+      results = self.Apply(_RunBatchEntryFunc, group, _BatchExceptionHandler,
+                           arg_checker=DummyArgChecker, thread_count=1,
+                           should_return_results=True)
+      results.sort(key=lambda result: result['line'])
+      for result in results:
+        self._WriteResult(result)
+      # Commands that died in a worker don't return results.
+      return (len(results) == len(group) and
+              all(result['status'] == 0 for result in results))
+
+    all_succeeded = True
+    for entry in group:
+      result = self.RunBatchEntry(
+          entry, parallel_operations=self.parallel_operations)
+      self._WriteResult(result)
+      if result['status'] != 0:
+        all_succeeded = False
+        if not self.continue_on_error:
+          break
+    return all_succeeded
+
+  def RunCommand(self):
+    """Command entry point for the batch command."""
+    self.continue_on_error = False
+    results_path = None
+    for o, a in self.sub_opts:
+      if o == '-c':
+        self.continue_on_error = True
+      elif o == '-r':
+        results_path = a
+
+    commands_path = self.args[0] if self.args else '-'
+    if commands_path == '-':
+      groups = _ParseBatch(sys.stdin)
+    else:
+      try:
+        with open(commands_path, 'r') as f:
+          groups = _ParseBatch(f)
+      except IOError as e:
+        raise CommandException('Could not read commands file %s: %s' %
+                               (commands_path, e.strerror))
+
+    if results_path is None:
+      self.results_file = None
+    elif results_path == '-':
+      self.results_file = sys.stdout
+    else:
+      self.results_file = open(results_path, 'w')
+
+    all_succeeded = True
+    try:
+      for group in groups:
+        if not self._RunGroup(group):
+          all_succeeded = False
+          if not self.continue_on_error:
+            break
+    finally:
+      if self.results_file and self.results_file is not sys.stdout:
+        self.results_file.close()
+    return 0 if all_succeeded else 1
@@ -43,6 +43,8 @@ from gslib.cred_types import CredTypes
 from gslib.exception import AbortException
 from gslib.exception import CommandException
 from gslib.metrics import CheckAndMaybePromptForAnalyticsEnabling
+from gslib.object_metadata_cache import DEFAULT_METADATA_CACHE_MAX_ENTRIES
+from gslib.object_metadata_cache import DEFAULT_METADATA_CACHE_TTL
 from gslib.sig_handling import RegisterSignalHandler
 from gslib.utils import constants
 from gslib.utils import system_util
@@ -228,29 +230,49 @@ _DETAILED_HELP_TEXT = ("""
     [GSUtil]
       check_hashes
       content_language
+      daisy_chain_buffer_size
+      daisy_chain_download_streams
       decryption_key1 ... 100
       default_api_version
       default_project_id
       disable_analytics_prompt
       encryption_key
+      hedged_download_percentile
       json_api_version
+      json_resumable_max_chunk_size
+      manifest_store
       max_upload_compression_buffer_size
+      metadata_cache_max_entries
+      metadata_cache_ttl
+      metrics_textfile
+      no_clobber_prefetch_max_objects
       parallel_composite_upload_component_size
+      parallel_composite_upload_max_components
+      parallel_composite_upload_pipelined
       parallel_composite_upload_threshold
       sliced_object_download_component_size
+      sliced_object_download_direct_io
       sliced_object_download_max_components
+      sliced_object_download_slice_size
       sliced_object_download_threshold
       parallel_process_count
       parallel_thread_count
+      perf_report
       prefer_api
+      profile
       resumable_threshold
       resumable_tracker_dir (deprecated in 4.6, use state_dir)
+      resumable_upload_pipelined
       rsync_buffer_lines
+      small_file_upload_threshold
       software_update_check_period
       state_dir
       tab_completion_time_logs
       tab_completion_timeout
       task_estimation_threshold
+      trace_file
+      tracker_store
+      transfer_buffer_memory
       use_magicfile
 
     [OAuth2]
@@ -358,15 +380,25 @@ else:
 # revert DEFAULT_PARALLEL_COMPOSITE_UPLOAD_THRESHOLD value to '150M'.
 DEFAULT_PARALLEL_COMPOSITE_UPLOAD_THRESHOLD = '0'
 DEFAULT_PARALLEL_COMPOSITE_UPLOAD_COMPONENT_SIZE = '50M'
+DEFAULT_PARALLEL_COMPOSITE_UPLOAD_MAX_COMPONENTS = MAX_COMPONENT_COUNT
 DEFAULT_SLICED_OBJECT_DOWNLOAD_THRESHOLD = '150M'
 DEFAULT_SLICED_OBJECT_DOWNLOAD_COMPONENT_SIZE = '200M'
 DEFAULT_SLICED_OBJECT_DOWNLOAD_MAX_COMPONENTS = 4
+DEFAULT_SLICED_OBJECT_DOWNLOAD_SLICE_SIZE = '16M'
+DEFAULT_NO_CLOBBER_PREFETCH_MAX_OBJECTS = 1000000
+DEFAULT_DAISY_CHAIN_BUFFER_SIZE = '16M'
+DEFAULT_DAISY_CHAIN_DOWNLOAD_STREAMS = 4
 
 # Compressed transport encoded uploads buffer chunks of compressed data. When
 # running many uploads in parallel, compression may consume more memory than
 # available. This restricts the number of compressed transport encoded uploads
 # running in parallel such that they don't consume more memory than set here.
 DEFAULT_MAX_UPLOAD_COMPRESSION_BUFFER_SIZE = '2G'
+DEFAULT_TRANSFER_BUFFER_MEMORY = '512M'
+DEFAULT_TRACKER_STORE = 'files'
+DEFAULT_MANIFEST_STORE = 'csv'
+DEFAULT_RESUMABLE_UPLOAD_PIPELINED = True
+DEFAULT_SMALL_FILE_UPLOAD_THRESHOLD = 64 * 1024
 
 CONFIG_BOTO_SECTION_CONTENT = """
 [Boto]
@@ -434,6 +466,42 @@ CONFIG_INPUTLESS_GSUTIL_SECTION_CONTENT = """
 # (8 MiB).
 #resumable_threshold = %(resumable_threshold)d
 
+# 'small_file_upload_threshold' specifies the file size [bytes] below which
+# uploads are treated as small files: they are never resumable, and they
+# don't report progress while they're sent, which makes uploading many small
+# files (e.g., with gsutil -m cp) faster. The default is 65536 (64 KiB).
+#small_file_upload_threshold = %(small_file_upload_threshold)d
+
+# 'tracker_store' specifies where gsutil keeps the state of resumable
+# transfers. With 'files' (the default), each transfer has its own tracker
+# file in the tracker directory. With 'sqlite', tracker data is kept in a
+# single database in the tracker directory instead, and progress updates from
+# many concurrent transfers are committed together, which reduces file system
+# load for large parallel copies. Tracker files left by earlier runs are still
+# used to resume transfers.
+#tracker_store = %(tracker_store)s
+
+# 'manifest_store' specifies how cp -L finds the files and objects that an
+# earlier run already copied. With 'csv' (the default), gsutil reads the whole
+# manifest file into memory when it starts. With 'sqlite', gsutil keeps an
+# index of the manifest in a database in the tracker directory, and only reads
+# the rows added since the index was last updated. This makes resuming copies
+# with very large manifests start faster and use less memory. The manifest
+# file itself is written the same way with either setting.
+#manifest_store = %(manifest_store)s
+
+# Resumable uploads that are sent in chunks (those that are compressed with
+# -j/-J, or when 'json_resumable_chunk_size' is set) wait for the response to
+# each chunk before sending the next one. If 'resumable_upload_pipelined' is
+# True, the next chunk is read and hashed while the previous one is being
+# sent. Setting 'json_resumable_max_chunk_size' (in bytes) larger than
+# 'json_resumable_chunk_size' lets pipelined uploads grow their chunks, up to
+# that size, until waiting for each response takes a small part of the
+# upload time. This helps single uploads over high-latency links that can't
+# use parallel composite uploads.
+#resumable_upload_pipelined = %(resumable_upload_pipelined)s
+#json_resumable_max_chunk_size = 67108864
+
 # 'rsync_buffer_lines' specifies the number of lines of bucket or directory
 # listings saved in each temp file during sorting. (The complete set is
 # split across temp files and separately sorted/merged, to avoid needing to
@@ -491,8 +559,19 @@ CONFIG_INPUTLESS_GSUTIL_SECTION_CONTENT = """
 # into a single object.
 # The number of components will be the smaller of
 # ceil(file_size / parallel_composite_upload_component_size) and
+# 'parallel_composite_upload_max_components', which can be at most
 # MAX_COMPONENT_COUNT. The current value of MAX_COMPONENT_COUNT is
-# %(max_component_count)d.
+# %(max_component_count)d. Uploads with more than 32 components are composed
+# in two levels: each group of up to 32 components is composed into an
+# intermediate object as soon as the group has been uploaded, while the rest of
+# the file is still uploading, and the intermediate objects are then composed
+# into the final object.
+# If 'parallel_composite_upload_pipelined' is set to True, smaller groups of
+# about sqrt(number of components) components are used even for uploads with
+# 32 or fewer components, and each group's components are deleted as soon as
+# the group has been composed. This reduces the time spent composing and
+# deleting after the last byte is uploaded, and the number of temporary objects
+# that exist at once, at the cost of a few more compose requests.
 # If 'parallel_composite_upload_threshold' is set to 0, then automatic parallel
 # uploads will never occur.
 # Setting an extremely low threshold is unadvisable. The vast majority of
@@ -523,6 +602,8 @@ CONFIG_INPUTLESS_GSUTIL_SECTION_CONTENT = """
 
 #parallel_composite_upload_threshold = %(parallel_composite_upload_threshold)s
 #parallel_composite_upload_component_size = %(parallel_composite_upload_component_size)s
+#parallel_composite_upload_max_components = %(parallel_composite_upload_max_components)s
+#parallel_composite_upload_pipelined = False
 
 # 'sliced_object_download_threshold' and
 # 'sliced_object_download_component_size' have analogous functionality to
@@ -534,6 +615,41 @@ CONFIG_INPUTLESS_GSUTIL_SECTION_CONTENT = """
 #sliced_object_download_component_size = %(sliced_object_download_component_size)s
 #sliced_object_download_max_components = %(sliced_object_download_max_components)s
 
+# Rather than giving each of its parallel streams one fixed part of the object,
+# a sliced download divides the object into slices of up to
+# 'sliced_object_download_slice_size' bytes, and each stream downloads the
+# next unclaimed slice whenever it finishes one. Once all slices are claimed,
+# streams that run out of work take over the second half of the largest
+# unfinished range of another stream, so one slow connection doesn't hold up
+# the whole download.
+#sliced_object_download_slice_size = %(sliced_object_download_slice_size)s
+
+# Sliced downloads write each slice to its offset in the destination file with
+# pwrite, after preallocating the file's disk space where the filesystem
+# supports it. If 'sliced_object_download_direct_io' is set to True, slices
+# are also written with O_DIRECT (where supported), bypassing the page cache.
+# This can reduce CPU and memory use when downloading very large objects to
+# fast local disks.
+#sliced_object_download_direct_io = False
+
+# If 'hedged_download_percentile' is set (e.g., to 95), a download request
+# that receives nothing for longer than that percentile of the longest pauses
+# seen by recent downloads gets a second request for the rest of its range,
+# sent on a new connection. Whichever request finishes first is used and the
+# other is cancelled. This bounds the tail latency of small object and slice
+# downloads at the cost of some duplicate traffic. 0 (the default) disables
+# hedging.
+#hedged_download_percentile = 0
+
+# Daisy chain copies (e.g., between S3 and Google Cloud Storage) download
+# 'daisy_chain_download_streams' ranges of the source object at once into a
+# buffer of 'daisy_chain_buffer_size' bytes, from which the upload reads the
+# object in order. Each range is at most the buffer size divided by the
+# number of streams. Values for the buffer size can be provided either in
+# bytes or as human-readable values (e.g., "16M").
+#daisy_chain_download_streams = %(daisy_chain_download_streams)s
+#daisy_chain_buffer_size = %(daisy_chain_buffer_size)s
+
 # Compressed transport encoded uploads buffer chunks of compressed data. When
 # running a composite upload and/or many uploads in parallel, compression may
 # consume more memory than available. This setting restricts the number of
@@ -543,6 +659,33 @@ CONFIG_INPUTLESS_GSUTIL_SECTION_CONTENT = """
 # (e.g., "2G" to represent 2 gibibytes)
 #max_upload_compression_buffer_size = %(max_upload_compression_buffer_size)s
 
+# Daisy chain copies, streaming uploads and sliced downloads that write with
+# O_DIRECT hold object data in memory buffers. 'transfer_buffer_memory' limits
+# the total size of these buffers across all gsutil processes and threads;
+# transfers wait for memory to be freed before starting once the limit is
+# reached. A streaming upload needs a buffer as large as its resumable upload
+# chunk size, and daisy chain buffers are limited to this size. Values can be
+# provided either in bytes or as human-readable values (e.g., "512M").
+#transfer_buffer_memory = %(transfer_buffer_memory)s
+
+# gsutil caches the object metadata returned by listings (e.g., when expanding
+# wildcards), so that later requests for the same objects' metadata within
+# the same gsutil process don't need to be sent. 'metadata_cache_ttl'
+# specifies the number of seconds for which cached metadata is used (0
+# disables the cache), and 'metadata_cache_max_entries' limits the number of
+# objects cached per process. Lower the TTL if other writers may change the
+# objects you operate on while gsutil is running.
+#metadata_cache_ttl = %(metadata_cache_ttl)s
+#metadata_cache_max_entries = %(metadata_cache_max_entries)s
+
+# When copying to a bucket or prefix with 'cp -n' or 'mv -n', gsutil lists the
+# destination once, instead of checking whether each destination object
+# exists with a separate request. 'no_clobber_prefetch_max_objects' limits the
+# number of listed object names kept in memory; destination objects whose
+# names sort after the last name kept are checked individually. Set it to 0 to
+# always check each destination object individually.
+#no_clobber_prefetch_max_objects = %(no_clobber_prefetch_max_objects)s
+
 # 'task_estimation_threshold' controls how many files or objects gsutil
 # processes before it attempts to estimate the total work that will be
 # performed by the command. Estimation makes extra directory listing or API
@@ -551,6 +694,44 @@ CONFIG_INPUTLESS_GSUTIL_SECTION_CONTENT = """
 # listing calls; to disable it entirely, set this value to 0.
 #task_estimation_threshold=%(task_estimation_threshold)s
 
+# 'perf_report' specifies a file that gsutil writes a performance breakdown
+# to when it exits: how many times each phase of the command (listing,
+# hashing, connection setup, requests, object data transfer, tracker writes,
+# etc.) ran and how long it took in total, across all of the command's
+# processes and threads. Phases overlap, so their times don't add up to the
+# command's run time. This is usually set for a single command, e.g.
+# gsutil -o GSUtil:perf_report=report.txt -m cp -r dir gs://bucket
+#perf_report =
+
+# 'trace_file' specifies a file that gsutil writes a trace of the command to
+# when it exits, in the Chrome trace event format that chrome://tracing and
+# https://ui.perfetto.dev load. The trace has a span for each object transfer
+# and each component or slice of one, each task, connection, request and data
+# transfer, and a marker for each retried request, on a track per process and
+# thread. This is usually set for a single command, e.g.
+# gsutil -o GSUtil:trace_file=trace.json -m cp -r dir gs://bucket
+#trace_file =
+
+# 'metrics_textfile' specifies a file that gsutil rewrites every few seconds
+# while a command runs with metrics of its progress, in the Prometheus text
+# format: objects and bytes done, throughput, retries by error type,
+# transfers in flight, task and status queue depths, and how much of the time
+# worker threads spent idle. Point the Prometheus node exporter's textfile
+# collector at the file's directory (the file name must end in .prom) to
+# monitor long-running commands, e.g.
+# gsutil -o GSUtil:metrics_textfile=/var/lib/node_exporter/rsync.prom \
+#   -m rsync -r dir gs://bucket
+#metrics_textfile =
+
+# 'profile' specifies a file that gsutil writes a sampling profile of the
+# command to when it exits. Each of the command's processes samples the stacks
+# of its threads 100 times per second, and the samples of all processes are
+# written in the collapsed stack format that flamegraph.pl and
+# https://www.speedscope.app read. Threads are sampled while they wait as well
+# as while they run. This is usually set for a single command, e.g.
+# gsutil -o GSUtil:profile=profile.txt -m cp -r dir gs://bucket
+#profile =
+
 # 'use_magicfile' specifies if the 'file --mime <filename>' command should be
 # used to guess content types instead of the default filename extension-based
 # mechanism. Available on UNIX and MacOS (and possibly on Windows, if you're
@@ -625,22 +806,37 @@ content_language = en
        'hash_always': CHECK_HASH_ALWAYS,
        'hash_never': CHECK_HASH_NEVER,
        'resumable_threshold': constants.RESUMABLE_THRESHOLD_B,
+       'small_file_upload_threshold': DEFAULT_SMALL_FILE_UPLOAD_THRESHOLD,
+       'tracker_store': DEFAULT_TRACKER_STORE,
+       'manifest_store': DEFAULT_MANIFEST_STORE,
+       'resumable_upload_pipelined': DEFAULT_RESUMABLE_UPLOAD_PIPELINED,
        'parallel_process_count': DEFAULT_PARALLEL_PROCESS_COUNT,
        'parallel_thread_count': DEFAULT_PARALLEL_THREAD_COUNT,
        'parallel_composite_upload_threshold': (
            DEFAULT_PARALLEL_COMPOSITE_UPLOAD_THRESHOLD),
        'parallel_composite_upload_component_size': (
            DEFAULT_PARALLEL_COMPOSITE_UPLOAD_COMPONENT_SIZE),
+       'parallel_composite_upload_max_components': (
+           DEFAULT_PARALLEL_COMPOSITE_UPLOAD_MAX_COMPONENTS),
        'sliced_object_download_threshold': (
            DEFAULT_PARALLEL_COMPOSITE_UPLOAD_THRESHOLD),
        'sliced_object_download_component_size': (
            DEFAULT_PARALLEL_COMPOSITE_UPLOAD_COMPONENT_SIZE),
        'sliced_object_download_max_components': (
            DEFAULT_SLICED_OBJECT_DOWNLOAD_MAX_COMPONENTS),
+       'sliced_object_download_slice_size': (
+           DEFAULT_SLICED_OBJECT_DOWNLOAD_SLICE_SIZE),
+       'daisy_chain_download_streams': DEFAULT_DAISY_CHAIN_DOWNLOAD_STREAMS,
+       'daisy_chain_buffer_size': DEFAULT_DAISY_CHAIN_BUFFER_SIZE,
        'max_component_count': MAX_COMPONENT_COUNT,
        'task_estimation_threshold': DEFAULT_TASK_ESTIMATION_THRESHOLD,
        'max_upload_compression_buffer_size': (
-           DEFAULT_MAX_UPLOAD_COMPRESSION_BUFFER_SIZE)}
+           DEFAULT_MAX_UPLOAD_COMPRESSION_BUFFER_SIZE),
+       'transfer_buffer_memory': DEFAULT_TRANSFER_BUFFER_MEMORY,
+       'metadata_cache_ttl': DEFAULT_METADATA_CACHE_TTL,
+       'metadata_cache_max_entries': DEFAULT_METADATA_CACHE_MAX_ENTRIES,
+       'no_clobber_prefetch_max_objects': (
+           DEFAULT_NO_CLOBBER_PREFETCH_MAX_OBJECTS)}
 
 CONFIG_OAUTH2_CONFIG_CONTENT = """
 [OAuth2]
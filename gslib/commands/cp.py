@@ -652,6 +652,11 @@ _OPTIONS_TEXT = """
                  status indicates there was at least one failure during the
                  gsutil run).
 
+                 For very large manifests, set the "manifest_store" option in
+                 your boto config file to "sqlite". gsutil then keeps an index
+                 of the manifest, so that resuming a copy doesn't have to read
+                 the whole log file into memory.
+
                  Note: If you're trying to synchronize the contents of a
                  directory and a bucket (or two buckets), see
                  "gsutil help rsync".
@@ -662,7 +667,12 @@ _OPTIONS_TEXT = """
                  will perform an additional GET request to check if an item
                  exists before attempting to upload the data. This will save
                  retransmitting data, but the additional HTTP requests may make
-                 small object transfers slower and more expensive.
+                 small object transfers slower and more expensive. When
+                 copying multiple items to a bucket or prefix, gsutil instead
+                 lists the destination once before copying, and only checks
+                 individual objects not covered by that listing (see the
+                 "no_clobber_prefetch_max_objects" option in your boto config
+                 file).
 
   -p             Causes ACLs to be preserved when copying in the cloud. Note
                  that this option has performance and cost implications when
@@ -1102,6 +1112,23 @@ class CpCommand(Command):
 
       yield name_expansion_iterator_dst_tuple
 
+  def _CopiesMultipleItems(self, dst_url):
+    """Returns True if this command likely copies multiple items to dst_url.
+
+    Args:
+      dst_url: StorageUrl of the destination argument.
+
+    Returns:
+      True if the destination names a bucket or directory, or the sources
+      may expand to more than one item.
+    """
+    if dst_url.IsCloudUrl() and (dst_url.IsBucket() or
+                                 dst_url.object_name.endswith('/')):
+      return True
+    copy_helper_opts = copy_helper.GetCopyHelperOpts()
+    return (self.recursion_requested or copy_helper_opts.read_args_from_stdin
+            or len(self.args) > 2 or ContainsWildcard(self.args[0]))
+
   # Command entry point.
   def RunCommand(self):
     copy_helper_opts = self._ParseOpts()
@@ -1158,6 +1185,14 @@ class CpCommand(Command):
     # multi-threading/multi-processing.
     self.stats_lock = parallelism_framework_util.CreateLock()
 
+    # For no-clobber copies of many items, list the destination once rather
+    # than checking for each destination object. This happens before Apply
+    # so that worker processes inherit the listing.
+    self.dst_name_set = None
+    if copy_helper_opts.no_clobber and self._CopiesMultipleItems(dst_url):
+      self.dst_name_set = copy_helper.PrefetchDestinationNames(
+          dst_url, self.gsutil_api, self.logger)
+
     # Tracks if any copies failed.
     self.op_failure_count = 0
 
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Implementation of daemon command for managing a local gsutil daemon."""
+
+from __future__ import absolute_import
+
+import getopt
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import gslib
+from gslib import metrics
+from gslib.command import Command
+from gslib.daemon import DAEMON_SOCKET_ENV_VAR
+from gslib.daemon import DAEMON_SOCKET_FILENAME
+from gslib.daemon import GetDaemonPidFile
+from gslib.exception import CommandException
+from gslib.help_provider import CreateHelpText
+from gslib.utils.boto_util import GetGsutilStateDir
+from gslib.utils.constants import NO_MAX
+from gslib.utils.system_util import IS_WINDOWS
+
+_START_SYNOPSIS = """
+  gsutil daemon start [-f] [-s socket_path]
+"""
+
+_STOP_SYNOPSIS = """
+  gsutil daemon stop [-s socket_path]
+"""
+
+_STATUS_SYNOPSIS = """
+  gsutil daemon status [-s socket_path]
+"""
+
+_SYNOPSIS = (_START_SYNOPSIS + _STOP_SYNOPSIS.lstrip('\n') +
+             _STATUS_SYNOPSIS.lstrip('\n'))
+
+_START_DESCRIPTION = """
+<B>START</B>
+  The "start" sub-command starts a daemon listening on a Unix domain socket.
+  By default the socket is created in gsutil's state directory (see the
+  "state_dir" option in your boto config file). To run gsutil commands via the
+  daemon, point the GSUTIL_DAEMON_SOCKET environment variable at the socket,
+  for example:
+
+    gsutil daemon start
+    export GSUTIL_DAEMON_SOCKET=~/.gsutil/daemon.sock
+
+<B>START OPTIONS</B>
+  -f          Runs the daemon in the foreground rather than in the background.
+
+  -s path     Creates the daemon's socket at the given path.
+
+"""
+
+_STOP_DESCRIPTION = """
+<B>STOP</B>
+  The "stop" sub-command stops the daemon listening on the given socket (or
+  the default socket). Commands already running on the daemon are allowed to
+  finish.
+
+"""
+
+_STATUS_DESCRIPTION = """
+<B>STATUS</B>
+  The "status" sub-command reports whether a daemon is listening on the given
+  socket (or the default socket).
+"""
+
+_DESCRIPTION = """
+  The daemon command manages a long-lived local gsutil process that runs
+  gsutil commands on behalf of the gsutil script. Scripts that run many small
+  gsutil commands (for example, a "stat" or "cp" per file) normally spend most
+  of their time starting Python, importing gsutil's libraries and reading
+  configuration files. The daemon does this once; each command it runs starts
+  from that pre-initialized state, in its own process, with the working
+  directory, environment and standard input/output of the invoking gsutil.
+
+  When the GSUTIL_DAEMON_SOCKET environment variable is set, the gsutil script
+  sends commands to the daemon listening on that socket. If no daemon is
+  listening, or the daemon was started with a different gsutil version, boto
+  config file, or BOTO_CONFIG/BOTO_PATH settings (or the boto config file
+  changed since it started), commands run in-process as usual. Interactive
+  commands such as "config" and "update" always run in-process, and commands
+  run via the daemon from a terminal see an empty standard input.
+
+  The daemon is only available on Linux and macOS, and only accepts
+  connections from the user that started it.
+
+  The gsutil daemon command has three sub-commands:
+""" + _START_DESCRIPTION + _STOP_DESCRIPTION + _STATUS_DESCRIPTION
+
+_DETAILED_HELP_TEXT = CreateHelpText(_SYNOPSIS, _DESCRIPTION)
+
+_start_help_text = CreateHelpText(_START_SYNOPSIS, _START_DESCRIPTION)
+_stop_help_text = CreateHelpText(_STOP_SYNOPSIS, _STOP_DESCRIPTION)
+_status_help_text = CreateHelpText(_STATUS_SYNOPSIS, _STATUS_DESCRIPTION)
+
+# Seconds to wait for a newly started daemon to start accepting connections.
+_DAEMON_START_TIMEOUT = 30
+
+
+def _IsDaemonListening(socket_path):
+  sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  try:
+    sock.connect(socket_path)
+    return True
+  except socket.error:
+    return False
+  finally:
+    sock.close()
+
+
+class DaemonCommand(Command):
+  """Implementation of gsutil daemon command."""
+
+  # Command specification. See base class for documentation.
+  command_spec = Command.CreateCommandSpec(
+      'daemon',
+      command_name_aliases=[],
+      usage_synopsis=_SYNOPSIS,
+      min_args=1,
+      max_args=NO_MAX,
+      supported_sub_args='fs:',
+      file_url_ok=False,
+      provider_url_ok=False,
+      urls_start_arg=1,
+  )
+  # Help specification. See help_provider.py for documentation.
+  help_spec = Command.HelpSpec(
+      help_name='daemon',
+      help_name_aliases=[],
+      help_type='command_help',
+      help_one_line_summary=(
+          'Run gsutil commands in a long-lived local process'),
+      help_text=_DETAILED_HELP_TEXT,
+      subcommand_help_text={
+          'start': _start_help_text,
+          'stop': _stop_help_text,
+          'status': _status_help_text,
+      },
+  )
+
+  def _StartDaemon(self):
+    """Starts a daemon process listening on self.socket_path."""
+    if _IsDaemonListening(self.socket_path):
+      raise CommandException(
+          'A gsutil daemon is already listening on %s.' % self.socket_path)
+    # Serve in a fresh interpreter, so the daemon's processes start from a
+    # clean state rather than from inside this command.
+    serve_code = (
+        'import sys; sys.argv = [%r]; import gslib.daemon; '
+        'gslib.daemon.Serve(%r)' % (gslib.GSUTIL_PATH, self.socket_path))
+    env = os.environ.copy()
+    env['PYTHONPATH'] = os.pathsep.join(sys.path)
+    env.pop(DAEMON_SOCKET_ENV_VAR, None)
+    args = [sys.executable, '-c', serve_code]
+    if self.foreground:
+      self.logger.info('Serving gsutil commands on %s.', self.socket_path)
+      return subprocess.call(args, env=env)
+
+    log_path = os.path.join(os.path.dirname(self.socket_path), 'daemon.log')
+    with open(log_path, 'a') as log_file:
+      with open(os.devnull, 'r') as devnull:
+        process = subprocess.Popen(
+            args, env=env, stdin=devnull, stdout=log_file, stderr=log_file,
+            close_fds=True, preexec_fn=os.setsid)
+    deadline = time.time() + _DAEMON_START_TIMEOUT
+    while not _IsDaemonListening(self.socket_path):
+      if process.poll() is not None or time.time() > deadline:
+        raise CommandException(
+            'The gsutil daemon failed to start; see %s for details.' %
+            log_path)
+      time.sleep(0.1)
+    self.logger.info('Started gsutil daemon (pid %d) on %s.', process.pid,
+                     self.socket_path)
+    self.logger.info('To use it, run:\n  export %s=%s', DAEMON_SOCKET_ENV_VAR,
+                     self.socket_path)
+    return 0
+
+  def _ReadDaemonPid(self):
+    try:
+      with open(GetDaemonPidFile(self.socket_path), 'r') as f:
+        return int(f.read().strip())
+    except (IOError, ValueError):
+      return None
+
+  def _StopDaemon(self):
+    """Stops the daemon listening on self.socket_path."""
+    pid = self._ReadDaemonPid()
+    if not pid or not _IsDaemonListening(self.socket_path):
+      raise CommandException(
+          'No gsutil daemon is listening on %s.' % self.socket_path)
+    os.kill(pid, signal.SIGTERM)
+    self.logger.info('Stopped gsutil daemon (pid %d) on %s.', pid,
+                     self.socket_path)
+    return 0
+
+  def _GetDaemonStatus(self):
+    """Prints whether a daemon is listening on self.socket_path."""
+    if _IsDaemonListening(self.socket_path):
+      print 'gsutil daemon listening on %s (pid %s)' % (
+          self.socket_path, self._ReadDaemonPid())
+      return 0
+    print 'No gsutil daemon listening on %s' % self.socket_path
+    return 1
+
+  def RunCommand(self):
+    """Command entry point for the daemon command."""
+    if IS_WINDOWS:
+      raise CommandException('The daemon command is not supported on Windows.')
+    action_subcommand = self.args.pop(0)
+    try:
+      (self.sub_opts, self.args) = getopt.getopt(
+          self.args, self.command_spec.supported_sub_args)
+    except getopt.GetoptError:
+      self.RaiseInvalidArgumentException()
+    if self.args:
+      self.RaiseWrongNumberOfArgumentsException()
+    # Commands with both suboptions and subcommands need to reparse for
+    # suboptions, so we log again.
+    metrics.LogCommandParams(sub_opts=self.sub_opts)
+
+    self.foreground = False
+    self.socket_path = os.path.join(GetGsutilStateDir(), DAEMON_SOCKET_FILENAME)
+    for o, a in self.sub_opts:
+      if o == '-f':
+        self.foreground = True
+      elif o == '-s':
+        self.socket_path = os.path.abspath(os.path.expanduser(a))
+
+    if action_subcommand == 'start':
+      func = self._StartDaemon
+    elif action_subcommand == 'stop':
+      func = self._StopDaemon
+    elif action_subcommand == 'status':
+      func = self._GetDaemonStatus
+    else:
+      raise CommandException((
+          'Invalid subcommand "%s" for the %s command.\n'
+          'See "gsutil help %s".') % (
+              action_subcommand, self.command_name, self.command_name))
+    metrics.LogCommandParams(subcommands=[action_subcommand])
+    return func()
@@ -30,9 +30,11 @@ import multiprocessing
 import os
 import random
 import re
+import shutil
 import socket
 import string
 import subprocess
+import sys
 import tempfile
 import time
 
@@ -44,10 +46,12 @@ from gslib.cloud_api import NotFoundException
 from gslib.cloud_api import ServiceException
 from gslib.command import Command
 from gslib.command import DummyArgChecker
+from gslib.command import GetConsumerProcessIds
 from gslib.command_argument import CommandArgument
 from gslib.commands import config
 from gslib.cs_api_map import ApiSelector
 from gslib.exception import CommandException
+from gslib.fake_gcs_server import FakeGcsServer
 from gslib.file_part import FilePart
 from gslib.storage_url import StorageUrlFromString
 from gslib.third_party.storage_apitools import storage_v1_messages as apitools_messages
@@ -55,15 +59,20 @@ from gslib.utils.boto_util import GetMaxRetryDelay
 from gslib.utils.boto_util import ResumableThreshold
 from gslib.utils.cloud_api_helper import GetCloudApiInstance
 from gslib.utils.cloud_api_helper import GetDownloadSerializationData
+from gslib.utils import perf_util
 from gslib.utils.hashing_helper import CalculateB64EncodedMd5FromContents
 from gslib.utils.system_util import CheckFreeSpace
 from gslib.utils.system_util import GetDiskCounters
 from gslib.utils.system_util import GetFileSize
+from gslib.utils.system_util import GetProcessCpuSeconds
+from gslib.utils.system_util import GetProcessSyscallCount
 from gslib.utils.system_util import IS_LINUX
+from gslib.utils.system_util import IS_WINDOWS
 from gslib.utils.unit_util import DivideAndCeil
 from gslib.utils.unit_util import HumanReadableToBytes
 from gslib.utils.unit_util import MakeBitsHumanReadable
 from gslib.utils.unit_util import MakeHumanReadable
+from gslib.utils.unit_util import ONE_GIB
 from gslib.utils.unit_util import Percentile
 
 _SYNOPSIS = """
@@ -71,6 +80,9 @@ _SYNOPSIS = """
   gsutil perfdiag [-o out.json] [-n objects] [-c processes]
       [-k threads] [-p parallelism type] [-y slices] [-s size] [-d directory]
       [-t tests] [-j ratio] url...
+  gsutil perfdiag -l [-o out.json] [-n objects] [-c processes]
+      [-k threads] [-p parallelism type] [-y slices] [-s size] [-d directory]
+      [-t tests] [-j ratio]
 """
 
 _DETAILED_HELP_TEXT = ("""
@@ -109,11 +121,13 @@ _DETAILED_HELP_TEXT = ("""
               files during tests. Defaults to 5.
 
   -c          Sets the number of processes to use while running throughput
-              experiments. The default value is 1.
+              experiments. The default value is 1. A comma-separated list of
+              values runs a sweep (see CONCURRENCY SWEEPS).
 
   -k          Sets the number of threads per process to use while running
               throughput experiments. Each process will receive an equal number
-              of threads. The default value is 1.
+              of threads. The default value is 1. A comma-separated list of
+              values runs a sweep (see CONCURRENCY SWEEPS).
 
               Note: All specified threads and processes will be created, but may
               not by saturated with work if too few objects (specified with -n)
@@ -121,7 +135,9 @@ _DETAILED_HELP_TEXT = ("""
 
   -p          Sets the type of parallelism to be used (only applicable when
               threads or processes are specified and threads * processes > 1).
-              The default is to use fan. Must be one of the following:
+              The default is to use fan. Must be one of the following, or a
+              comma-separated list of them to run a sweep (see CONCURRENCY
+              SWEEPS):
 
               fan
                  Use one thread per object. This is akin to using gsutil -m cp,
@@ -142,7 +158,8 @@ _DETAILED_HELP_TEXT = ("""
 
   -y          Sets the number of slices to divide each file/object into while
               transferring data. Only applicable with the slice (or both)
-              parallelism type. The default is 4 slices.
+              parallelism type. The default is 4 slices. A comma-separated
+              list of values runs a sweep (see CONCURRENCY SWEEPS).
 
   -s          Sets the size (in bytes) for each of the N (set with -n) objects
               used in the read and write throughput tests. The default is 1 MiB.
@@ -152,6 +169,8 @@ _DETAILED_HELP_TEXT = ("""
               Note: If rthru_file or wthru_file are performed, N (set with -n)
               times as much disk space as specified will be required for the
               operation.
+              A comma-separated list of sizes runs a sweep (see CONCURRENCY
+              SWEEPS).
 
   -d          Sets the directory to store temporary local files in. If not
               specified, a default temporary directory will be used.
@@ -210,6 +229,56 @@ _DETAILED_HELP_TEXT = ("""
               the -j option, files being uploaded are compressed in-memory and
               on-the-wire only. See cp -j for specific semantics.
 
+  -l          Runs the tests against a local fake of the Cloud Storage JSON API
+              instead of a bucket, to measure gsutil's client-side overhead
+              (see MEASURING CLIENT-SIDE OVERHEAD). No url may be given with
+              this option.
+
+
+<B>CONCURRENCY SWEEPS</B>
+  If more than one value is given to any of the -c, -k, -p, -y or -s options,
+  perfdiag runs the throughput tests at each point of the grid those values
+  describe, and recommends the settings that gave the best throughput for each
+  object size. For example, the following command measures read and write
+  throughput for 1 MiB and 64 MiB objects using 1, 2 and 4 processes with 1, 4
+  and 16 threads each:
+
+    gsutil perfdiag -c 1,2,4 -k 1,4,16 -s 1M,64M -o sweep.json gs://bucketname
+
+  The slice counts given to -y are only swept for the slice and both
+  parallelism strategies. Only the rthru, rthru_file, wthru and wthru_file tests
+  can be run in a sweep, and rthru and wthru are run if -t isn't specified.
+  Each point is run by a separate perfdiag process, so a sweep's total running
+  time grows with the number of points.
+
+  For each point and test, perfdiag reports the throughput along with the 50th,
+  90th and 99th percentile latencies of transferring a single object. The
+  recommended settings are printed in boto configuration file format, and the
+  full results, including the recommendations, are written to the file named
+  by -o.
+
+
+<B>MEASURING CLIENT-SIDE OVERHEAD</B>
+  For the rthru, rthru_file, wthru, wthru_file and list tests, perfdiag reports
+  the CPU time gsutil used per GiB transferred, the number of read and write
+  system calls it made per object, and the CPU time it used per HTTP request.
+  These cover the perfdiag process and the worker processes it starts. System
+  call counts, and the CPU time of worker processes, are only available on
+  Linux.
+
+  Against a real bucket, these numbers also depend on the network and the
+  service. The -l option runs the tests against a local fake of the JSON API
+  instead, started in the perfdiag process and reached over a loopback
+  connection, so the numbers reflect only gsutil's own costs:
+
+    gsutil perfdiag -l -n 20 -s 8M -c 1 -k 4 -t rthru,wthru,list -o base.json
+
+  The tests run in a separate perfdiag process with a boto configuration file
+  of its own, so credentials and other settings in your configuration aren't
+  used, and the fake server's CPU time isn't counted. Comparing the output of
+  the same command run with two versions of gsutil shows whether an upgrade
+  changes gsutil's efficiency.
+
 
 <B>MEASURING AVAILABILITY</B>
   The perfdiag command ignores the boto num_retries configuration parameter.
@@ -263,6 +332,13 @@ SliceUploadTuple = namedtuple(
     'SliceUploadTuple',
     'file_name object_name use_file file_start file_size gzip_encoded')
 
+# Describes one point in a sweep (see PerfDiagCommand._RunSweep). parallelism
+# is None for sequential points, and slices is None unless parallelism is
+# slice or both.
+SweepPoint = namedtuple(
+    'SweepPoint',
+    'processes threads parallelism slices file_size')
+
 # Dict storing file_path:FileDataTuple for each temporary file used by
 # perfdiag. This data should be kept outside of the PerfDiagCommand class
 # since calls to Apply will make copies of all member data.
@@ -286,14 +362,19 @@ def _DownloadObject(cls, args, thread_state=None):
     cls: The calling PerfDiagCommand class instance.
     args: A FanDownloadTuple object describing this download.
     thread_state: gsutil Cloud API instance to use for the operation.
+
+  Returns:
+    The number of seconds the download took.
   """
   gsutil_api = GetCloudApiInstance(cls, thread_state)
+  start_time = time.time()
   if args.need_to_slice:
     cls.PerformSlicedDownload(args.object_name, args.file_name,
                               args.serialization_data)
   else:
     cls.Download(args.object_name, gsutil_api, args.file_name,
                  args.serialization_data)
+  return time.time() - start_time
 
 
 def _DownloadSlice(cls, args, thread_state=None):
@@ -316,14 +397,19 @@ def _UploadObject(cls, args, thread_state=None):
     cls: The calling PerfDiagCommand class instance.
     args: A FanUploadTuple object describing this upload.
     thread_state: gsutil Cloud API instance to use for the operation.
+
+  Returns:
+    The number of seconds the upload took.
   """
   gsutil_api = GetCloudApiInstance(cls, thread_state)
+  start_time = time.time()
   if args.need_to_slice:
     cls.PerformSlicedUpload(args.file_name, args.object_name, args.use_file,
                             gsutil_api, gzip_encoded=args.gzip_encoded)
   else:
     cls.Upload(args.file_name, args.object_name, gsutil_api, args.use_file,
                gzip_encoded=args.gzip_encoded)
+  return time.time() - start_time
 
 
 def _UploadSlice(cls, args, thread_state=None):
@@ -370,6 +456,129 @@ class DummyFile(object):
     pass
 
 
+def GetLatencyPercentiles(latencies):
+  """Returns the 50th, 90th and 99th percentiles of a list of latencies.
+
+  Args:
+    latencies: A list of latencies, in seconds.
+
+  Returns:
+    A dict mapping 'p50', 'p90' and 'p99' to the corresponding percentile, or
+    to None if latencies is empty.
+  """
+  latencies = sorted(latencies)
+  return {'p50': Percentile(latencies, 0.5),
+          'p90': Percentile(latencies, 0.9),
+          'p99': Percentile(latencies, 0.99)}
+
+
+def _FormatOptionalValue(value, value_format, scale=1):
+  """Formats a value that may be None for display in a table."""
+  if value is None:
+    return '-'
+  return value_format % (value * scale)
+
+
+def _GetSweepPoints(processes, threads, strategies, slices, sizes):
+  """Returns the points of a sweep over the given perfdiag parameters.
+
+  Points that would run sequentially (one process and one thread) don't use a
+  parallelism strategy, and only points that use the slice or both strategy
+  vary the number of slices, so the grid has no redundant points.
+
+  Args:
+    processes: List of process counts (from -c).
+    threads: List of thread counts (from -k).
+    strategies: List of parallelism strategies (from -p). None means the
+        default strategy, fan.
+    slices: List of slice counts (from -y).
+    sizes: List of object sizes, in bytes (from -s).
+
+  Returns:
+    A list of SweepPoints, in the order they should be run.
+  """
+  points = []
+  for file_size in sizes:
+    for process_count in processes:
+      for thread_count in threads:
+        if process_count == 1 and thread_count == 1:
+          point_strategies = [None]
+        else:
+          point_strategies = [strategy or PerfDiagCommand.FAN
+                              for strategy in strategies]
+        for strategy in point_strategies:
+          if strategy in (PerfDiagCommand.SLICE, PerfDiagCommand.BOTH):
+            point_slices = slices
+          else:
+            point_slices = [None]
+          for num_slices in point_slices:
+            point = SweepPoint(process_count, thread_count, strategy,
+                               num_slices, file_size)
+            if point not in points:
+              points.append(point)
+  return points
+
+
+def _RecommendSweepSettings(points):
+  """Recommends boto configuration settings from the results of a sweep.
+
+  For each object size, the point whose throughput is closest to the best seen
+  for that size across all of the tests that were run is recommended. Ties go
+  to the point using the fewest threads in total.
+
+  Args:
+    points: List of point result dicts, as stored in the 'points' list of the
+        sweep results.
+
+  Returns:
+    A list of dicts, one per object size, describing the recommended point and
+    the GSUtil settings that correspond to it.
+  """
+  recommendations = []
+  for file_size in sorted(set(point['file_size'] for point in points)):
+    candidates = [point for point in points
+                  if point['file_size'] == file_size and point.get('results')]
+    if not candidates:
+      continue
+    best_throughputs = {}
+    for point in candidates:
+      for test, result in point['results'].iteritems():
+        best_throughputs[test] = max(best_throughputs.get(test, 0),
+                                     result['bytes_per_second'])
+
+    def _Score(point):
+      relative_throughput = sum(
+          point['results'][test]['bytes_per_second'] / best
+          for test, best in best_throughputs.iteritems()
+          if best and test in point['results'])
+      return (relative_throughput, -point['processes'] * point['threads'])
+
+    best_point = max(candidates, key=_Score)
+    settings = {'parallel_process_count': best_point['processes'],
+                'parallel_thread_count': best_point['threads']}
+    if best_point['parallelism'] in (PerfDiagCommand.SLICE,
+                                     PerfDiagCommand.BOTH):
+      tests = best_point['results']
+      if tests.viewkeys() & set([PerfDiagCommand.RTHRU,
+                                 PerfDiagCommand.RTHRU_FILE]):
+        settings['sliced_object_download_threshold'] = file_size
+        settings['sliced_object_download_max_components'] = (
+            best_point['slices'])
+      if tests.viewkeys() & set([PerfDiagCommand.WTHRU,
+                                 PerfDiagCommand.WTHRU_FILE]):
+        settings['parallel_composite_upload_threshold'] = file_size
+        settings['parallel_composite_upload_component_size'] = DivideAndCeil(
+            file_size, best_point['slices'])
+    recommendations.append({
+        'file_size': file_size,
+        'processes': best_point['processes'],
+        'threads': best_point['threads'],
+        'parallelism': best_point['parallelism'],
+        'slices': best_point['slices'],
+        'settings': settings})
+  return recommendations
+
+
 def _GenerateFileData(fp, file_size=0, random_ratio=100,
                       max_unique_random_bytes=5242883):
   """Writes data into a file like object.
@@ -414,7 +623,7 @@ class PerfDiagCommand(Command):
       usage_synopsis=_SYNOPSIS,
       min_args=0,
       max_args=1,
-      supported_sub_args='n:c:k:p:y:s:d:t:m:i:o:j:',
+      supported_sub_args='n:c:k:p:y:s:d:t:m:i:o:j:l',
       file_url_ok=False,
       provider_url_ok=False,
       urls_start_arg=0,
@@ -466,6 +675,21 @@ class PerfDiagCommand(Command):
   # List of parallelism strategies.
   PARALLEL_STRATEGIES = (FAN, SLICE, BOTH)
 
+  # Map of throughput test name to the key its results are stored under. These
+  # are the tests that can be run in a sweep.
+  THRU_RESULT_KEYS = {
+      RTHRU: 'read_throughput',
+      RTHRU_FILE: 'read_throughput_file',
+      WTHRU: 'write_throughput',
+      WTHRU_FILE: 'write_throughput_file',
+  }
+
+  # List of diagnostic tests to run by default in a sweep.
+  DEFAULT_SWEEP_TESTS = (RTHRU, WTHRU)
+
+  # Name of the bucket used on the local fake server by -l.
+  OFFLINE_BUCKET = 'gsutil-perfdiag-offline'
+
   # Google Cloud Storage XML API endpoint host.
   XML_API_HOST = boto.config.get(
       'Credentials', 'gs_host', boto.gs.connection.GSConnection.DefaultHost)
@@ -487,7 +711,7 @@ class PerfDiagCommand(Command):
   MAX_LISTING_WAIT_TIME = 60.0
 
   def _Exec(self, cmd, raise_on_error=True, return_output=False,
-            mute_stderr=False):
+            mute_stderr=False, env=None):
     """Executes a command in a subprocess.
 
     Args:
@@ -498,6 +722,8 @@ class PerfDiagCommand(Command):
           stdout of the process.
       mute_stderr: If set to True, the stderr of the process is not printed to
           the console.
+      env: Environment variables for the process. If None, the process
+          inherits this process's environment.
 
     Returns:
       The return code of the process or the stdout if return_output is set.
@@ -508,7 +734,7 @@ class PerfDiagCommand(Command):
     """
     self.logger.debug('Running command: %s', cmd)
     stderr = subprocess.PIPE if mute_stderr else None
-    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr)
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr, env=env)
     (stdoutdata, _) = p.communicate()
     if raise_on_error and p.returncode:
       raise CommandException("Received non-zero return code (%d) from "
@@ -724,6 +950,72 @@ class PerfDiagCommand(Command):
           self.connection_breaks += 1
     return return_val
 
+  def _GetClientUsage(self):
+    """Returns the resources gsutil's processes have used so far.
+
+    Returns:
+      A (cpu_seconds, syscalls, requests) tuple. cpu_seconds and syscalls are
+      dicts mapping the ID of this process and, on Linux, of each worker
+      process to the CPU seconds it has used and the read and write system
+      calls it has made. syscalls is None if system call counts aren't
+      available. requests is the number of HTTP requests sent.
+    """
+    times = os.times()
+    cpu_seconds = {os.getpid(): times[0] + times[1]}
+    syscalls = None
+    if IS_LINUX:
+      syscalls = {}
+      for pid in [os.getpid()] + GetConsumerProcessIds():
+        if pid != os.getpid():
+          worker_cpu_seconds = GetProcessCpuSeconds(pid)
+          if worker_cpu_seconds is not None:
+            cpu_seconds[pid] = worker_cpu_seconds
+        syscalls[pid] = GetProcessSyscallCount(pid)
+      if None in syscalls.values():
+        syscalls = None
+    requests = perf_util.GetPhaseTotals(perf_util.PHASE_REQUEST)[0]
+    return (cpu_seconds, syscalls, requests)
+
+  def _GetClientUsageSince(self, start_usage, num_objects, num_bytes=None):
+    """Returns the resources gsutil used since start_usage was taken.
+
+    Args:
+      start_usage: Tuple returned by an earlier call to _GetClientUsage.
+      num_objects: The number of objects transferred since then.
+      num_bytes: The number of bytes transferred since then, or None if the
+          test's objects are too small to report CPU time per GiB.
+
+    Returns:
+      A dict of the CPU seconds, system calls and HTTP requests used, along
+      with the CPU seconds per GiB, system calls per object and CPU seconds
+      per request. System call values are None if they aren't available.
+    """
+    start_cpu_seconds, start_syscalls, start_requests = start_usage
+    cpu_seconds, syscalls, requests = self._GetClientUsage()
+    # Worker processes started during the test count from zero.
+    cpu_used = sum(seconds - start_cpu_seconds.get(pid, 0)
+                   for pid, seconds in cpu_seconds.iteritems())
+    syscalls_made = None
+    if syscalls is not None and start_syscalls is not None:
+      syscalls_made = sum(count - start_syscalls.get(pid, 0)
+                          for pid, count in syscalls.iteritems())
+    requests_sent = requests - start_requests
+    usage = {
+        'cpu_seconds': cpu_used,
+        'syscalls': syscalls_made,
+        'requests': requests_sent,
+        'cpu_seconds_per_gib': None,
+        'syscalls_per_object': None,
+        'cpu_seconds_per_request': None,
+    }
+    if num_bytes:
+      usage['cpu_seconds_per_gib'] = cpu_used * ONE_GIB / float(num_bytes)
+    if syscalls_made is not None and num_objects:
+      usage['syscalls_per_object'] = syscalls_made / float(num_objects)
+    if requests_sent:
+      usage['cpu_seconds_per_request'] = cpu_used / requests_sent
+    return usage
+
   def _RunLatencyTests(self):
     """Runs latency tests."""
     # Stores timing information for each category of operation.
@@ -800,6 +1092,9 @@ class PerfDiagCommand(Command):
                   for downloaded data. If None, discard downloaded data.
       serialization_data: A list, corresponding by index to object_names,
                           of serialization data for each object.
+
+    Returns:
+      A list of the number of seconds each successful download took.
     """
     args = []
     for i in range(len(object_names)):
@@ -807,11 +1102,12 @@ class PerfDiagCommand(Command):
       args.append(FanDownloadTuple(
           need_to_slice, object_names[i], file_name,
           serialization_data[i]))
-    self.Apply(
+    return self.Apply(
         _DownloadObject, args, _PerfdiagExceptionHandler,
         ('total_requests', 'request_errors'), arg_checker=DummyArgChecker,
         parallel_operations_override=self.ParallelOverrideReason.PERFDIAG,
-        process_count=self.processes, thread_count=self.threads)
+        process_count=self.processes, thread_count=self.threads,
+        should_return_results=True)
 
   def PerformSlicedDownload(self, object_name, file_name, serialization_data):
     """Performs a download of an object using the slice strategy.
@@ -856,17 +1152,21 @@ class PerfDiagCommand(Command):
       gzip_encoded: Flag for if the file will be uploaded with the gzip
                     transport encoding. If true, a lock is used to limit
                     resource usage.
+
+    Returns:
+      A list of the number of seconds each successful upload took.
     """
     args = []
     for i in range(len(file_names)):
       args.append(FanUploadTuple(
           need_to_slice, file_names[i], object_names[i], use_file,
           gzip_encoded))
-    self.Apply(
+    return self.Apply(
         _UploadObject, args, _PerfdiagExceptionHandler,
         ('total_requests', 'request_errors'), arg_checker=DummyArgChecker,
         parallel_operations_override=self.ParallelOverrideReason.PERFDIAG,
-        process_count=self.processes, thread_count=self.threads)
+        process_count=self.processes, thread_count=self.threads,
+        should_return_results=True)
 
   def PerformSlicedUpload(self, file_name, object_name, use_file, gsutil_api,
                           gzip_encoded=False):
@@ -989,22 +1289,29 @@ class PerfDiagCommand(Command):
     self.Upload(self.tcp_warmup_file, warmup_obj_name, self.gsutil_api)
     self.Download(warmup_obj_name, self.gsutil_api)
 
+    # The number of seconds each object took to download.
+    latencies = []
+    start_usage = self._GetClientUsage()
     t0 = time.time()
     if self.processes == 1 and self.threads == 1:
       for i in range(self.num_objects):
         file_name = file_names[i] if use_file else None
+        object_t0 = time.time()
         self.Download(object_names[i], self.gsutil_api, file_name,
                       serialization_data[i])
+        latencies.append(time.time() - object_t0)
     else:
       if self.parallel_strategy in (self.FAN, self.BOTH):
         need_to_slice = (self.parallel_strategy == self.BOTH)
-        self.PerformFannedDownload(need_to_slice, object_names, file_names,
-                                   serialization_data)
+        latencies = self.PerformFannedDownload(
+            need_to_slice, object_names, file_names, serialization_data)
       elif self.parallel_strategy == self.SLICE:
         for i in range(self.num_objects):
           file_name = file_names[i] if use_file else None
+          object_t0 = time.time()
           self.PerformSlicedDownload(
               object_names[i], file_name, serialization_data[i])
+          latencies.append(time.time() - object_t0)
     t1 = time.time()
 
     time_took = t1 - t0
@@ -1014,6 +1321,10 @@ class PerfDiagCommand(Command):
     self.results[test_name]['time_took'] = time_took
     self.results[test_name]['total_bytes_copied'] = total_bytes_copied
     self.results[test_name]['bytes_per_second'] = bytes_per_second
+    self.results[test_name]['latency_percentiles'] = GetLatencyPercentiles(
+        latencies)
+    self.results[test_name]['client_usage'] = self._GetClientUsageSince(
+        start_usage, self.num_objects, total_bytes_copied)
 
   def _RunWriteThruTests(self, use_file=False):
     """Runs write throughput tests."""
@@ -1052,23 +1363,30 @@ class PerfDiagCommand(Command):
     for object_name in object_names:
       self.temporary_objects.add(object_name)
 
+    # The number of seconds each object took to upload.
+    latencies = []
+    start_usage = self._GetClientUsage()
     t0 = time.time()
     if self.processes == 1 and self.threads == 1:
       for i in range(self.num_objects):
+        object_t0 = time.time()
         self.Upload(
             file_names[i], object_names[i], self.gsutil_api, use_file,
             gzip_encoded=self.gzip_encoded_writes)
+        latencies.append(time.time() - object_t0)
     else:
       if self.parallel_strategy in (self.FAN, self.BOTH):
         need_to_slice = (self.parallel_strategy == self.BOTH)
-        self.PerformFannedUpload(
+        latencies = self.PerformFannedUpload(
             need_to_slice, file_names, object_names, use_file,
             gzip_encoded=self.gzip_encoded_writes)
       elif self.parallel_strategy == self.SLICE:
         for i in range(self.num_objects):
+          object_t0 = time.time()
           self.PerformSlicedUpload(
               file_names[i], object_names[i], use_file,
               self.gsutil_api, gzip_encoded=self.gzip_encoded_writes)
+          latencies.append(time.time() - object_t0)
     t1 = time.time()
 
     time_took = t1 - t0
@@ -1078,10 +1396,15 @@ class PerfDiagCommand(Command):
     self.results[test_name]['time_took'] = time_took
     self.results[test_name]['total_bytes_copied'] = total_bytes_copied
     self.results[test_name]['bytes_per_second'] = bytes_per_second
+    self.results[test_name]['latency_percentiles'] = GetLatencyPercentiles(
+        latencies)
+    self.results[test_name]['client_usage'] = self._GetClientUsageSince(
+        start_usage, self.num_objects, total_bytes_copied)
 
   def _RunListTests(self):
     """Runs eventual consistency listing latency tests."""
     self.results['listing'] = {'num_files': self.num_objects}
+    start_usage = self._GetClientUsage()
 
     # Generate N random objects to put into the bucket.
     list_objects = []
@@ -1181,6 +1504,9 @@ class PerfDiagCommand(Command):
         'files_seen_after_listing': files_seen,
         'time_took': total_end_time - total_start_time,
     }
+    # The listing test's objects are empty, so there's no CPU time per GiB.
+    self.results['listing']['client_usage'] = self._GetClientUsageSince(
+        start_usage, self.num_objects)
 
   def Upload(self, file_name, object_name, gsutil_api, use_file=False,
              file_start=0, file_size=None, gzip_encoded=False):
@@ -1616,6 +1942,96 @@ class PerfDiagCommand(Command):
     print ('%.1f' % (Percentile(trials, 0.5) * 1000)).rjust(11), '',
     print ('%.1f' % (Percentile(trials, 0.9) * 1000)).rjust(11), ''
 
+  def _DisplayLatencyPercentiles(self, thru_results):
+    """Prints the per-object latency percentiles of a throughput test."""
+    percentiles = thru_results.get('latency_percentiles')
+    if percentiles and percentiles['p50'] is not None:
+      print 'Per-object latency: p50 %.1f ms, p90 %.1f ms, p99 %.1f ms.' % (
+          percentiles['p50'] * 1000, percentiles['p90'] * 1000,
+          percentiles['p99'] * 1000)
+
+  def _DisplayClientUsage(self, test_results):
+    """Prints the client-side overhead measured during a test."""
+    usage = test_results.get('client_usage')
+    if not usage:
+      return
+    print 'Client CPU time: %.2f seconds.' % usage['cpu_seconds']
+    if usage['cpu_seconds_per_gib'] is not None:
+      print '  CPU seconds per GiB: %.3f' % usage['cpu_seconds_per_gib']
+    if usage['cpu_seconds_per_request'] is not None:
+      print '  CPU ms per HTTP request: %.2f (%d requests)' % (
+          usage['cpu_seconds_per_request'] * 1000, usage['requests'])
+    if usage['syscalls_per_object'] is not None:
+      print '  Read and write system calls per object: %.1f' % (
+          usage['syscalls_per_object'])
+
+  def _DisplaySweepResults(self):
+    """Prints the results and recommended settings of a sweep."""
+    sweep = self.results['sweep']
+    print
+    print '-' * 78
+    print 'Sweep'.center(78)
+    print '-' * 78
+    print 'Copied %s object(s) at each point.' % sweep['num_objects']
+    print
+    row_format = '%9s %4s %3s %5s %2s %-10s %13s %7s %7s %7s'
+    print row_format % ('Size', 'Proc', 'Thr', 'Par', 'Sl', 'Test',
+                        'Throughput', 'p50 ms', 'p90 ms', 'p99 ms')
+    print row_format % ('=' * 9, '=' * 4, '=' * 3, '=' * 5, '=' * 2, '=' * 10,
+                        '=' * 13, '=' * 7, '=' * 7, '=' * 7)
+    for point in sweep['points']:
+      point_columns = (MakeHumanReadable(point['file_size']),
+                       point['processes'], point['threads'],
+                       point['parallelism'] or '-', point['slices'] or '-')
+      if 'error' in point:
+        print '%9s %4s %3s %5s %2s' % point_columns, point['error']
+        continue
+      for test in sweep['tests']:
+        result = point['results'][test]
+        percentiles = [
+            _FormatOptionalValue(result['latency_percentiles'][key], '%.1f',
+                                 1000)
+            for key in ('p50', 'p90', 'p99')]
+        print row_format % (point_columns + (
+            test, MakeBitsHumanReadable(result['bytes_per_second'] * 8) + '/s')
+                            + tuple(percentiles))
+
+    if any(result.get('client_usage')
+           for point in sweep['points']
+           for result in point.get('results', {}).itervalues()):
+      print
+      print 'Client-side overhead:'
+      print
+      row_format = '%9s %4s %3s %5s %2s %-10s %9s %11s %11s'
+      print row_format % ('Size', 'Proc', 'Thr', 'Par', 'Sl', 'Test',
+                          'CPU s/GiB', 'CPU ms/req', 'Syscall/obj')
+      print row_format % ('=' * 9, '=' * 4, '=' * 3, '=' * 5, '=' * 2,
+                          '=' * 10, '=' * 9, '=' * 11, '=' * 11)
+      for point in sweep['points']:
+        for test in sorted(point.get('results', {})):
+          usage = point['results'][test]['client_usage']
+          if not usage:
+            continue
+          print row_format % (
+              MakeHumanReadable(point['file_size']), point['processes'],
+              point['threads'], point['parallelism'] or '-',
+              point['slices'] or '-', test,
+              _FormatOptionalValue(usage['cpu_seconds_per_gib'], '%.3f'),
+              _FormatOptionalValue(usage['cpu_seconds_per_request'], '%.2f',
+                                   1000),
+              _FormatOptionalValue(usage['syscalls_per_object'], '%.1f'))
+
+    for recommendation in sweep['recommendations']:
+      print
+      print ('Recommended settings for %s objects (%d process(es), %d '
+             'thread(s), parallelism strategy: %s, slices: %s):' % (
+                 MakeHumanReadable(recommendation['file_size']),
+                 recommendation['processes'], recommendation['threads'],
+                 recommendation['parallelism'], recommendation['slices']))
+      print '  [GSUtil]'
+      for item in sorted(recommendation['settings'].iteritems()):
+        print '  %s = %s' % item
+
   def _DisplayResults(self):
     """Displays results collected from diagnostic run."""
     print
@@ -1623,6 +2039,11 @@ class PerfDiagCommand(Command):
     print 'DIAGNOSTIC RESULTS'.center(78)
     print '=' * 78
 
+    if self.results.get('offline'):
+      print
+      print ('These tests were run against a local fake of the Cloud Storage '
+             'JSON API.')
+
     if 'latency' in self.results:
       print
       print '-' * 78
@@ -1665,6 +2086,8 @@ class PerfDiagCommand(Command):
           MakeHumanReadable(write_thru['total_bytes_copied']))
       print 'Write throughput: %s/s.' % (
           MakeBitsHumanReadable(write_thru['bytes_per_second'] * 8))
+      self._DisplayLatencyPercentiles(write_thru)
+      self._DisplayClientUsage(write_thru)
       if 'parallelism' in write_thru:  # Compatibility with old versions.
         print 'Parallelism strategy: %s' % write_thru['parallelism']
 
@@ -1680,6 +2103,8 @@ class PerfDiagCommand(Command):
           MakeHumanReadable(write_thru_file['total_bytes_copied']))
       print 'Write throughput: %s/s.' % (
           MakeBitsHumanReadable(write_thru_file['bytes_per_second'] * 8))
+      self._DisplayLatencyPercentiles(write_thru_file)
+      self._DisplayClientUsage(write_thru_file)
       if 'parallelism' in write_thru_file:  # Compatibility with old versions.
         print 'Parallelism strategy: %s' % write_thru_file['parallelism']
 
@@ -1695,6 +2120,8 @@ class PerfDiagCommand(Command):
           MakeHumanReadable(read_thru['total_bytes_copied']))
       print 'Read throughput: %s/s.' % (
           MakeBitsHumanReadable(read_thru['bytes_per_second'] * 8))
+      self._DisplayLatencyPercentiles(read_thru)
+      self._DisplayClientUsage(read_thru)
       if 'parallelism' in read_thru:  # Compatibility with old versions.
         print 'Parallelism strategy: %s' % read_thru['parallelism']
 
@@ -1710,9 +2137,14 @@ class PerfDiagCommand(Command):
           MakeHumanReadable(read_thru_file['total_bytes_copied']))
       print 'Read throughput: %s/s.' % (
           MakeBitsHumanReadable(read_thru_file['bytes_per_second'] * 8))
+      self._DisplayLatencyPercentiles(read_thru_file)
+      self._DisplayClientUsage(read_thru_file)
       if 'parallelism' in read_thru_file:  # Compatibility with old versions.
         print 'Parallelism strategy: %s' % read_thru_file['parallelism']
 
+    if 'sweep' in self.results:
+      self._DisplaySweepResults()
+
     if 'listing' in self.results:
       print
       print '-' * 78
@@ -1739,6 +2171,7 @@ class PerfDiagCommand(Command):
              ', '.join('%.2gs' % lat for lat in delete['list_latencies']))
       print ('  Files reflected after each call: [%s]' %
              ', '.join(map(str, delete['files_seen_after_listing'])))
+      self._DisplayClientUsage(listing)
 
     if 'sysinfo' in self.results:
       print
@@ -1908,6 +2341,22 @@ class PerfDiagCommand(Command):
     except ValueError:
       raise CommandException(msg)
 
+  def _ParsePositiveIntegers(self, val, msg):
+    """Converts a comma-separated list of positive integers to a list.
+
+    Args:
+      val: The value (as a string) to convert to a list of positive integers.
+      msg: The error message to place in the CommandException on an error.
+
+    Returns:
+      A list of valid positive integers.
+
+    Raises:
+      CommandException: If any of the supplied values is not a valid positive
+          integer.
+    """
+    return [self._ParsePositiveInteger(v, msg) for v in val.split(',')]
+
   def _ParseArgs(self):
     """Parses arguments for perfdiag command."""
     # From -n.
@@ -1922,6 +2371,14 @@ class PerfDiagCommand(Command):
     self.num_slices = 4
     # From -s.
     self.thru_filesize = 1048576
+    # The lists of values given to -c, -k, -p, -y and -s. If they describe more
+    # than one point, a sweep is run over those points.
+    sweep_processes = [self.processes]
+    sweep_threads = [self.threads]
+    sweep_strategies = [self.parallel_strategy]
+    sweep_slices = [self.num_slices]
+    sweep_sizes = [self.thru_filesize]
+    tests_specified = False
     # From -d.
     self.directory = tempfile.gettempdir()
     # Keep track of whether or not to delete the directory upon completion.
@@ -1937,6 +2394,8 @@ class PerfDiagCommand(Command):
     # From -j.
     self.gzip_encoded_writes = False
     self.gzip_compression_ratio = 100
+    # From -l.
+    self.offline = False
 
     if self.sub_opts:
       for o, a in self.sub_opts:
@@ -1944,23 +2403,25 @@ class PerfDiagCommand(Command):
           self.num_objects = self._ParsePositiveInteger(
               a, 'The -n parameter must be a positive integer.')
         if o == '-c':
-          self.processes = self._ParsePositiveInteger(
-              a, 'The -c parameter must be a positive integer.')
+          sweep_processes = self._ParsePositiveIntegers(
+              a, 'The -c parameter must be a list of positive integers.')
         if o == '-k':
-          self.threads = self._ParsePositiveInteger(
-              a, 'The -k parameter must be a positive integer.')
+          sweep_threads = self._ParsePositiveIntegers(
+              a, 'The -k parameter must be a list of positive integers.')
         if o == '-p':
-          if a.lower() in self.PARALLEL_STRATEGIES:
-            self.parallel_strategy = a.lower()
-          else:
-            raise CommandException(
-                "'%s' is not a valid parallelism strategy." % a)
+          sweep_strategies = []
+          for strategy in a.split(','):
+            if strategy.lower() not in self.PARALLEL_STRATEGIES:
+              raise CommandException(
+                  "'%s' is not a valid parallelism strategy." % strategy)
+            sweep_strategies.append(strategy.lower())
         if o == '-y':
-          self.num_slices = self._ParsePositiveInteger(
-              a, 'The -y parameter must be a positive integer.')
+          sweep_slices = self._ParsePositiveIntegers(
+              a, 'The -y parameter must be a list of positive integers.')
         if o == '-s':
           try:
-            self.thru_filesize = HumanReadableToBytes(a)
+            sweep_sizes = [HumanReadableToBytes(size)
+                           for size in a.split(',')]
           except ValueError:
             raise CommandException('Invalid -s parameter.')
         if o == '-d':
@@ -1969,6 +2430,7 @@ class PerfDiagCommand(Command):
             self.delete_directory = True
             os.makedirs(self.directory)
         if o == '-t':
+          tests_specified = True
           self.diag_tests = set()
           for test_name in a.strip().split(','):
             if test_name.lower() not in self.ALL_DIAG_TESTS:
@@ -2006,14 +2468,47 @@ class PerfDiagCommand(Command):
               self.gzip_compression_ratio > 100):
             raise CommandException(
                 'The -j parameter must be between 0 and 100 (inclusive).')
-
-    # If parallelism is specified, default parallelism strategy to fan.
-    if (self.processes > 1 or self.threads > 1) and not self.parallel_strategy:
-      self.parallel_strategy = self.FAN
-    elif self.processes == 1 and self.threads == 1 and self.parallel_strategy:
+        if o == '-l':
+          self.offline = True
+
+    self.sweep_points = _GetSweepPoints(sweep_processes, sweep_threads,
+                                        sweep_strategies, sweep_slices,
+                                        sweep_sizes)
+    self.sweep = len(self.sweep_points) > 1
+    if (sweep_strategies != [None] and
+        all(point.parallelism is None for point in self.sweep_points)):
       raise CommandException(
           'Cannot specify parallelism strategy (-p) without also specifying '
           'multiple threads and/or processes (-c and/or -k).')
+    if self.sweep:
+      if not tests_specified:
+        self.diag_tests = set(self.DEFAULT_SWEEP_TESTS)
+      elif not self.diag_tests.issubset(self.THRU_RESULT_KEYS):
+        raise CommandException(
+            'Only the rthru, rthru_file, wthru and wthru_file tests can be run '
+            'when sweeping over multiple -c, -k, -p, -y or -s values.')
+    # The parameters of the first point are used when not sweeping, in which
+    # case the default parallelism strategy is fan if parallelism is
+    # specified.
+    self.processes = self.sweep_points[0].processes
+    self.threads = self.sweep_points[0].threads
+    self.parallel_strategy = self.sweep_points[0].parallelism
+    self.num_slices = sweep_slices[0]
+    self.thru_filesize = sweep_sizes[0]
+
+    if (max(sweep_sizes) > HumanReadableToBytes('2GiB') and
+        (self.RTHRU in self.diag_tests or self.WTHRU in self.diag_tests)):
+      raise CommandException(
+          'For in-memory tests maximum file size is 2GiB. For larger file '
+          'sizes, specify rthru_file and/or wthru_file with the -t option.')
+
+    if self.offline:
+      if self.args:
+        raise CommandException(
+            'The -l option runs perfdiag against a local fake bucket, so no '
+            'URL may be given with it.')
+      # The perfdiag process that runs the tests checks the other arguments.
+      return
 
     if not self.args:
       self.RaiseWrongNumberOfArgumentsException()
@@ -2025,13 +2520,8 @@ class PerfDiagCommand(Command):
                              'specifies a bucket.\n"%s" is not '
                              'valid.' % self.args[0])
 
-    if (self.thru_filesize > HumanReadableToBytes('2GiB') and
-        (self.RTHRU in self.diag_tests or self.WTHRU in self.diag_tests)):
-      raise CommandException(
-          'For in-memory tests maximum file size is 2GiB. For larger file '
-          'sizes, specify rthru_file and/or wthru_file with the -t option.')
-
-    perform_slice = self.parallel_strategy in (self.SLICE, self.BOTH)
+    perform_slice = any(point.parallelism in (self.SLICE, self.BOTH)
+                        for point in self.sweep_points)
     slice_not_available = (
         self.provider == 's3' and self.diag_tests.intersection(self.WTHRU,
                                                                self.WTHRU_FILE))
@@ -2047,6 +2537,130 @@ class PerfDiagCommand(Command):
                        socket.timeout, httplib.BadStatusLine,
                        ServiceException]
 
+  def _RunSweep(self):
+    """Runs the throughput tests at each point of a sweep.
+
+    The process and thread counts used by Apply can't change within a process,
+    so each point is run by a perfdiag subprocess, whose results are collected
+    in self.results['sweep'] along with recommended settings.
+    """
+    self.results = {}
+    tests = sorted(self.diag_tests)
+    points = []
+    try:
+      for i, point in enumerate(self.sweep_points):
+        self.logger.info(
+            '\nRunning sweep point %d of %d (%s objects of size %s, %d '
+            'process(es), %d thread(s), parallelism strategy: %s, slices: %s)',
+            i + 1, len(self.sweep_points), self.num_objects,
+            MakeHumanReadable(point.file_size), point.processes,
+            point.threads, point.parallelism, point.slices)
+        fd, output_file = tempfile.mkstemp(
+            prefix='gsutil_perfdiag_sweep_', suffix='.json', dir=self.directory)
+        os.close(fd)
+        cmd = ([sys.executable] if IS_WINDOWS else []) + [
+            gslib.GSUTIL_PATH, 'perfdiag', '-n', str(self.num_objects),
+            '-c', str(point.processes), '-k', str(point.threads),
+            '-s', str(point.file_size), '-t', ','.join(tests),
+            '-d', self.directory, '-o', output_file]
+        if point.parallelism:
+          cmd.extend(['-p', point.parallelism])
+        if point.slices:
+          cmd.extend(['-y', str(point.slices)])
+        if self.gzip_encoded_writes:
+          cmd.extend(['-j', str(self.gzip_compression_ratio)])
+        cmd.append(str(self.bucket_url))
+
+        point_result = point._asdict()
+        try:
+          returncode = self._Exec(cmd, raise_on_error=False)
+          if returncode:
+            point_result['error'] = (
+                'perfdiag exited with status %d.' % returncode)
+          else:
+            with open(output_file, 'r') as f:
+              point_results = json.load(f)
+            point_result['results'] = {}
+            for test in tests:
+              result = point_results[self.THRU_RESULT_KEYS[test]]
+              point_result['results'][test] = {
+                  'bytes_per_second': result['bytes_per_second'],
+                  'latency_percentiles': result['latency_percentiles'],
+                  'client_usage': result.get('client_usage')}
+            if 'sysinfo' in point_results and 'sysinfo' not in self.results:
+              self.results['sysinfo'] = point_results['sysinfo']
+        except (IOError, KeyError, ValueError) as e:
+          point_result['error'] = (
+              'Could not read perfdiag results: %s' % e)
+        finally:
+          os.remove(output_file)
+        if 'error' in point_result:
+          self.logger.warn('Sweep point %d failed: %s', i + 1,
+                           point_result['error'])
+        points.append(point_result)
+    finally:
+      if self.delete_directory:
+        try:
+          os.rmdir(self.directory)
+        except OSError:
+          pass
+
+    self.results['sweep'] = {
+        'num_objects': self.num_objects,
+        'tests': tests,
+        'points': points,
+        'recommendations': _RecommendSweepSettings(points)}
+    self.results['bucket_uri'] = str(self.bucket_url)
+    self.results['json_format'] = 'perfdiag'
+    self.results['metadata'] = self.metadata_keys
+    self.results['gsutil_version'] = gslib.VERSION
+    self.results['boto_version'] = boto.__version__
+
+  def _RunOffline(self):
+    """Runs the tests against a local fake of the JSON API.
+
+    The fake server runs on a thread in this process, and the tests run in a
+    perfdiag subprocess whose boto config file points it at the server, so
+    the client-side overhead that process measures doesn't include the
+    server's, and doesn't depend on the user's credentials or settings.
+    """
+    server = FakeGcsServer()
+    server.Start()
+    temp_dir = tempfile.mkdtemp(prefix='gsutil_perfdiag_offline_',
+                                dir=self.directory)
+    try:
+      server.CreateBucket(self.OFFLINE_BUCKET)
+      boto_config_path = os.path.join(temp_dir, 'boto')
+      server.WriteBotoConfig(boto_config_path, [
+          ('GSUtil', 'state_dir', os.path.join(temp_dir, 'state')),
+          ('GSUtil', 'software_update_check_period', '0'),
+          ('GSUtil', 'disable_analytics_prompt', 'True')])
+      output_file = os.path.join(temp_dir, 'results.json')
+      cmd = ([sys.executable] if IS_WINDOWS else []) + [
+          gslib.GSUTIL_PATH, 'perfdiag']
+      for o, a in self.sub_opts:
+        if o not in ('-l', '-o'):
+          cmd.extend([o, a])
+      cmd.extend(['-o', output_file, 'gs://%s' % self.OFFLINE_BUCKET])
+      env = os.environ.copy()
+      env['BOTO_CONFIG'] = boto_config_path
+      env.pop('BOTO_PATH', None)
+
+      self.logger.info('Running perfdiag against a local fake server on port '
+                       '%d.', server.port)
+      self._Exec(cmd, env=env)
+      with open(output_file, 'r') as f:
+        self.results = json.load(f)
+      self.results['offline'] = True
+    finally:
+      server.Stop()
+      shutil.rmtree(temp_dir, ignore_errors=True)
+      if self.delete_directory:
+        try:
+          os.rmdir(self.directory)
+        except OSError:
+          pass
+
   # Command entry point.
   def RunCommand(self):
     """Called by gsutil when the command is being invoked."""
@@ -2056,6 +2670,20 @@ class PerfDiagCommand(Command):
       self._DisplayResults()
       return 0
 
+    if self.offline:
+      self._RunOffline()
+      self._DisplayResults()
+      return 0
+
+    if self.sweep:
+      self._RunSweep()
+      self._DisplayResults()
+      return 0
+
+    # Count HTTP requests (in this process and its workers) for the client-side
+    # overhead measurements.
+    perf_util.StartCounters()
+
     # We turn off retries in the underlying boto library because the
     # _RunOperation function handles errors manually so it can count them.
     boto.config.set('Boto', 'num_retries', '0')
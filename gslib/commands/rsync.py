@@ -52,6 +52,7 @@ from gslib.third_party.storage_apitools import storage_v1_messages as apitools_m
 from gslib.utils import constants
 from gslib.utils import copy_helper
 from gslib.utils import parallelism_framework_util
+from gslib.utils import perf_util
 from gslib.utils.boto_util import UsingCrcmodExtension
 from gslib.utils.cloud_api_helper import GetCloudApiInstance
 from gslib.utils.copy_helper import CreateCopyHelperOpts
@@ -584,8 +585,9 @@ def _ListUrlRootFunc(cls, args_tuple, thread_state=None):
   # sorting with collecting the listing.
   out_file = io.open(out_filename, mode='w', encoding=constants.UTF8)
   try:
-    _BatchSort(_FieldedListingIterator(cls, gsutil_api, base_url_str, desc),
-               out_file)
+    with perf_util.PhaseTimer(perf_util.PHASE_LISTING):
+      _BatchSort(_FieldedListingIterator(cls, gsutil_api, base_url_str, desc),
+                 out_file)
   except Exception as e:  # pylint: disable=broad-except
     # Abandon rsync if an exception percolates up to this layer - retryable
     # exceptions are handled in the lower layers, so we got a non-retryable
@@ -703,7 +705,9 @@ def _BuildTmpOutputLine(blr):
   uid = NA_ID
   url = blr.storage_url
   if url.IsFileUrl():
-    mode, _, _, _, uid, gid, size, atime, mtime, _ = os.stat(url.object_name)
+    with perf_util.PhaseTimer(perf_util.PHASE_STAT):
+      mode, _, _, _, uid, gid, size, atime, mtime, _ = os.stat(
+          url.object_name)
     # atime/mtime can be a float, so it needs to be converted to a long.
     atime = long(atime)
     mtime = long(mtime)
@@ -0,0 +1,563 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Local gsutil daemon that runs commands in pre-initialized processes.
+
+Each gsutil invocation pays for interpreter startup, importing gslib and its
+dependencies, and parsing boto config files before it does any real work. For
+scripts that run many small commands this dominates the total run time. The
+daemon does that work once, then listens on a Unix domain socket. For each
+client connection it forks a worker process which runs gslib.__main__.main()
+with the client's argv, working directory and environment, relaying stdin,
+stdout and stderr over the socket and finally returning the exit status.
+
+Forking a fresh worker per command (rather than running commands on threads
+of one long-lived process) keeps gsutil's process-global state (boto config
+overrides from -o, failure counts, signal handlers, multiprocessing state)
+isolated between commands, exactly as for separate invocations. OAuth2 access
+tokens are already shared between invocations through the credential store in
+the state dir.
+
+The client side of this module (RunCommandViaDaemon) is used by the gsutil
+wrapper script and must only import the Python standard library and
+lightweight gslib modules.
+
+Wire protocol: both directions send frames consisting of a one-byte frame type,
+a 4-byte big-endian payload length, and the payload.
+"""
+
+from __future__ import absolute_import
+
+import atexit
+import errno
+import getopt
+import json
+import os
+import select
+import signal
+import socket
+import struct
+import sys
+import threading
+import traceback
+
+import gslib
+from gslib.utils.constants import GSUTIL_LONG_OPTS
+from gslib.utils.constants import GSUTIL_SHORT_OPTS
+from gslib.utils.constants import UTF8
+
+# Environment variable that tells the gsutil wrapper script which daemon
+# socket to send commands to. Commands run in-process if it is not set.
+DAEMON_SOCKET_ENV_VAR = 'GSUTIL_DAEMON_SOCKET'
+
+DAEMON_SOCKET_FILENAME = 'daemon.sock'
+DAEMON_PID_FILENAME = 'daemon.pid'
+
+# Commands that are always run in-process, because they interact with the user
+# or manage gsutil itself.
+LOCAL_ONLY_COMMANDS = frozenset([
+    'cfg', 'conf', 'config', 'configure', 'daemon', 'refresh', 'update'])
+
+# Environment variables that determine which boto config the daemon loaded.
+# Requests from clients whose values differ are run in-process instead.
+_CONFIG_ENV_VARS = ('BOTO_CONFIG', 'BOTO_PATH')
+
+# Frame types sent by the client.
+FRAME_REQUEST = 'R'
+FRAME_STDIN = 'I'
+FRAME_STDIN_EOF = 'i'
+FRAME_SIGNAL = 'S'
+# Frame types sent by the daemon.
+FRAME_STDOUT = 'O'
+FRAME_STDERR = 'E'
+FRAME_EXIT = 'X'
+FRAME_FALLBACK = 'F'
+
+_FRAME_HEADER = struct.Struct('!cI')
+_READ_SIZE = 64 * 1024
+# Seconds to keep draining output after the worker exits, in case processes it
+# started still hold its stdout/stderr open.
+_OUTPUT_DRAIN_TIMEOUT = 1
+# Seconds between checks for exited connection handlers in the daemon.
+_ACCEPT_POLL_INTERVAL = 1
+
+
+class DaemonProtocolError(Exception):
+  """Raised when the other end of a daemon connection misbehaves."""
+
+
+def _RecvExactly(sock, num_bytes):
+  """Reads exactly num_bytes from sock, or returns None on a clean EOF."""
+  chunks = []
+  remaining = num_bytes
+  while remaining:
+    chunk = sock.recv(remaining)
+    if not chunk:
+      if chunks:
+        raise DaemonProtocolError('Connection closed mid-frame.')
+      return None
+    chunks.append(chunk)
+    remaining -= len(chunk)
+  return ''.join(chunks)
+
+
+def SendFrame(sock, frame_type, payload=''):
+  sock.sendall(_FRAME_HEADER.pack(frame_type, len(payload)) + payload)
+
+
+def RecvFrame(sock):
+  """Reads one frame from sock.
+
+  Args:
+    sock: Connected socket.
+
+  Returns:
+    (frame_type, payload) tuple, or (None, None) if the connection was closed.
+  """
+  header = _RecvExactly(sock, _FRAME_HEADER.size)
+  if header is None:
+    return (None, None)
+  frame_type, length = _FRAME_HEADER.unpack(header)
+  payload = _RecvExactly(sock, length) if length else ''
+  if payload is None:
+    raise DaemonProtocolError('Connection closed mid-frame.')
+  return (frame_type, payload)
+
+
+def GetDaemonPidFile(socket_path):
+  return os.path.join(os.path.dirname(socket_path), DAEMON_PID_FILENAME)
+
+
+def _GetCommandName(argv):
+  """Returns the command name from gsutil's argv, or None if there is none."""
+  try:
+    _, args = getopt.getopt(argv, GSUTIL_SHORT_OPTS, GSUTIL_LONG_OPTS)
+  except getopt.GetoptError:
+    return None
+  return args[0] if args else None
+
+
+def ShouldRunViaDaemon(argv):
+  """Returns True if the command in argv may be sent to a daemon.
+
+  Args:
+    argv: gsutil command-line args, not including the program name.
+
+  Returns:
+    True if the command is non-interactive and not a LOCAL_ONLY_COMMAND.
+  """
+  if os.environ.get('_ARGCOMPLETE', '0') == '1':
+    return False
+  command_name = _GetCommandName(argv)
+  return bool(command_name) and command_name not in LOCAL_ONLY_COMMANDS
+
+
+# Client side.
+
+
+class _StdinForwarder(threading.Thread):
+  """Thread that copies this process's stdin to the daemon."""
+
+  def __init__(self, sock, send_lock):
+    super(_StdinForwarder, self).__init__()
+    self.daemon = True
+    self._sock = sock
+    self._send_lock = send_lock
+
+  def run(self):
+    try:
+      while True:
+        data = os.read(sys.stdin.fileno(), _READ_SIZE)
+        if not data:
+          break
+        with self._send_lock:
+          SendFrame(self._sock, FRAME_STDIN, data)
+      with self._send_lock:
+        SendFrame(self._sock, FRAME_STDIN_EOF)
+    except (OSError, socket.error):
+      # The command finished (and the connection closed) before stdin did.
+      pass
+
+
+def RunCommandViaDaemon(socket_path, argv):
+  """Runs a gsutil command on the daemon listening at socket_path.
+
+  Args:
+    socket_path: Path of the daemon's Unix domain socket.
+    argv: gsutil command-line args, not including the program name.
+
+  Returns:
+    The command's exit status, or None if the command was not run by the
+    daemon (no daemon listening, or the daemon can't serve this request) and
+    should be run in-process instead.
+  """
+  if not ShouldRunViaDaemon(argv):
+    return None
+  sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  try:
+    sock.connect(socket_path)
+  except socket.error:
+    sock.close()
+    return None
+  send_lock = threading.Lock()
+  request = {
+      'argv': argv,
+      'cwd': os.getcwd(),
+      'env': dict(os.environ),
+      'version': gslib.VERSION,
+  }
+  try:
+    try:
+      encoded_request = json.dumps(request)
+    except UnicodeDecodeError:
+      # Args or environment that aren't valid UTF-8; let gsutil report them.
+      return None
+    SendFrame(sock, FRAME_REQUEST, encoded_request)
+    # Interactive input can't be meaningfully forwarded (e.g., prompts would be
+    # written to a pipe), so commands see an empty stdin when run from a tty.
+    if sys.stdin is None or sys.stdin.isatty():
+      SendFrame(sock, FRAME_STDIN_EOF)
+    else:
+      _StdinForwarder(sock, send_lock).start()
+    while True:
+      try:
+        frame_type, payload = RecvFrame(sock)
+      except KeyboardInterrupt:
+        with send_lock:
+          SendFrame(sock, FRAME_SIGNAL, str(signal.SIGINT))
+        continue
+      if frame_type == FRAME_STDOUT:
+        sys.stdout.write(payload)
+        sys.stdout.flush()
+      elif frame_type == FRAME_STDERR:
+        sys.stderr.write(payload)
+        sys.stderr.flush()
+      elif frame_type == FRAME_EXIT:
+        return int(payload)
+      elif frame_type == FRAME_FALLBACK:
+        return None
+      elif frame_type is None:
+        sys.stderr.write('Lost connection to gsutil daemon at %s.\n' %
+                         socket_path)
+        return 1
+      else:
+        raise DaemonProtocolError('Unexpected frame type %r.' % frame_type)
+  finally:
+    sock.close()
+
+
+# Daemon side.
+
+
+def _GetConfigFileState():
+  """Returns the paths and modification times of loaded boto config files."""
+  # pylint: disable=g-import-not-at-top
+  from gslib.utils.boto_util import GetBotoConfigFileList
+  state = []
+  for path in GetBotoConfigFileList():
+    try:
+      state.append((path, os.path.getmtime(path)))
+    except OSError:
+      state.append((path, None))
+  return state
+
+
+def _GetFallbackReason(request, config_file_state):
+  """Returns why the daemon can't serve request, or None if it can."""
+  if request.get('version') != gslib.VERSION:
+    return 'gsutil version differs from the daemon\'s'
+  env = request.get('env', {})
+  for env_var in _CONFIG_ENV_VARS:
+    if env.get(env_var) != os.environ.get(env_var):
+      return '%s differs from the daemon\'s' % env_var
+  if _GetConfigFileState() != config_file_state:
+    return 'boto config files changed since the daemon started'
+  return None
+
+
+def _CheckPeerIsSameUser(conn):
+  """Returns False if conn's peer is known to be a different user."""
+  if not sys.platform.startswith('linux'):
+    # Rely on the socket file's permissions.
+    return True
+  # Python 2 doesn't define SO_PEERCRED; 17 is its value on Linux.
+  so_peercred = getattr(socket, 'SO_PEERCRED', 17)
+  creds = conn.getsockopt(socket.SOL_SOCKET, so_peercred,
+                          struct.calcsize('3i'))
+  _, uid, _ = struct.unpack('3i', creds)
+  return uid == os.getuid()
+
+
+def _RunWorker(request, stdin_fd, stdout_fd, stderr_fd):
+  """Runs the requested gsutil command. Called in a forked worker; never returns.
+
+  Args:
+    request: Request dict sent by the client.
+    stdin_fd: File descriptor to use as stdin.
+    stdout_fd: File descriptor to use as stdout.
+    stderr_fd: File descriptor to use as stderr.
+  """
+  exit_code = 1
+  try:
+    os.dup2(stdin_fd, 0)
+    os.dup2(stdout_fd, 1)
+    os.dup2(stderr_fd, 2)
+    for fd in (stdin_fd, stdout_fd, stderr_fd):
+      os.close(fd)
+    for signal_num in (signal.SIGINT, signal.SIGTERM, signal.SIGCHLD):
+      signal.signal(signal_num, signal.SIG_DFL)
+    # JSON decoding produced unicode; give the command the same byte strings
+    # a normal invocation would see.
+    os.chdir(request['cwd'].encode(UTF8))
+    os.environ.clear()
+    for key, value in request['env'].iteritems():
+      os.environ[key.encode(UTF8)] = value.encode(UTF8)
+    sys.argv = [sys.argv[0]] + [arg.encode(UTF8) for arg in request['argv']]
+    # pylint: disable=g-import-not-at-top
+    import gslib.__main__
+    try:
+      exit_code = gslib.__main__.main()
+    except SystemExit as e:
+      exit_code = e.code
+    if exit_code is None:
+      exit_code = 0
+    elif not isinstance(exit_code, int):
+      sys.stderr.write('%s\n' % exit_code)
+      exit_code = 1
+    # We can't let SystemExit unwind through the daemon's frames, so run the
+    # exit handlers the command registered ourselves.
+    atexit._run_exitfuncs()  # pylint: disable=protected-access
+  except:  # pylint: disable=bare-except
+    traceback.print_exc()
+  finally:
+    try:
+      sys.stdout.flush()
+      sys.stderr.flush()
+    finally:
+      os._exit(exit_code)  # pylint: disable=protected-access
+
+
+def _RelayWorkerIo(conn, worker_pid, stdin_w, stdout_r, stderr_r):
+  """Relays data between the client connection and a worker's stdio pipes.
+
+  Args:
+    conn: Client connection.
+    worker_pid: Process ID of the worker.
+    stdin_w: Write end of the worker's stdin pipe.
+    stdout_r: Read end of the worker's stdout pipe.
+    stderr_r: Read end of the worker's stderr pipe.
+
+  Returns:
+    The worker's exit status.
+  """
+  output_fds = {stdout_r: FRAME_STDOUT, stderr_r: FRAME_STDERR}
+  pending_stdin = []
+  stdin_eof = False
+  client_connected = True
+  exit_status = None
+  while output_fds:
+    read_fds = list(output_fds)
+    if client_connected:
+      read_fds.append(conn)
+    write_fds = [stdin_w] if stdin_w is not None and pending_stdin else []
+    timeout = _OUTPUT_DRAIN_TIMEOUT if exit_status is not None else None
+    try:
+      readable, writable, _ = select.select(read_fds, write_fds, [], timeout)
+    except select.error as e:
+      if e.args[0] == errno.EINTR:
+        continue
+      raise
+    if not readable and not writable:
+      break  # Worker exited and nothing more arrived.
+    for fd in readable:
+      if fd is conn:
+        frame_type, payload = RecvFrame(conn)
+        if frame_type is None:
+          # Client went away; stop the command as if it got ^C.
+          client_connected = False
+          stdin_eof = True
+          _KillWorker(worker_pid, signal.SIGTERM)
+        elif frame_type == FRAME_STDIN:
+          pending_stdin.append(payload)
+        elif frame_type == FRAME_STDIN_EOF:
+          stdin_eof = True
+        elif frame_type == FRAME_SIGNAL:
+          _KillWorker(worker_pid, int(payload))
+        continue
+      data = os.read(fd, _READ_SIZE)
+      if data:
+        if client_connected:
+          SendFrame(conn, output_fds[fd], data)
+      else:
+        os.close(fd)
+        del output_fds[fd]
+    if stdin_w in writable:
+      try:
+        written = os.write(stdin_w, pending_stdin[0])
+        if written < len(pending_stdin[0]):
+          pending_stdin[0] = pending_stdin[0][written:]
+        else:
+          pending_stdin.pop(0)
+      except OSError as e:
+        if e.errno != errno.EPIPE:
+          raise
+        # The worker isn't reading stdin.
+        pending_stdin = []
+        stdin_eof = True
+    if stdin_eof and not pending_stdin and stdin_w is not None:
+      os.close(stdin_w)
+      stdin_w = None
+    if exit_status is None:
+      pid, status = os.waitpid(worker_pid, os.WNOHANG)
+      if pid:
+        exit_status = status
+  if stdin_w is not None:
+    os.close(stdin_w)
+  if exit_status is None:
+    _, exit_status = os.waitpid(worker_pid, 0)
+  if os.WIFSIGNALED(exit_status):
+    return 128 + os.WTERMSIG(exit_status)
+  return os.WEXITSTATUS(exit_status)
+
+
+def _KillWorker(worker_pid, signal_num):
+  try:
+    os.kill(worker_pid, signal_num)
+  except OSError:
+    pass
+
+
+def _HandleConnection(conn, config_file_state):
+  """Serves one client connection. Runs in a process forked per connection.
+
+  Args:
+    conn: Client connection.
+    config_file_state: Boto config file state from when the daemon started.
+  """
+  signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+  if not _CheckPeerIsSameUser(conn):
+    return
+  frame_type, payload = RecvFrame(conn)
+  if frame_type != FRAME_REQUEST:
+    return
+  request = json.loads(payload)
+  fallback_reason = _GetFallbackReason(request, config_file_state)
+  if fallback_reason:
+    SendFrame(conn, FRAME_FALLBACK, fallback_reason)
+    return
+  stdin_r, stdin_w = os.pipe()
+  stdout_r, stdout_w = os.pipe()
+  stderr_r, stderr_w = os.pipe()
+  worker_pid = os.fork()
+  if not worker_pid:
+    conn.close()
+    for fd in (stdin_w, stdout_r, stderr_r):
+      os.close(fd)
+    _RunWorker(request, stdin_r, stdout_w, stderr_w)
+  for fd in (stdin_r, stdout_w, stderr_w):
+    os.close(fd)
+  exit_code = _RelayWorkerIo(conn, worker_pid, stdin_w, stdout_r, stderr_r)
+  try:
+    SendFrame(conn, FRAME_EXIT, str(exit_code))
+  except socket.error:
+    pass
+
+
+class _DaemonShutdown(Exception):
+  """Raised from the daemon's signal handler to stop serving."""
+
+
+def _RaiseDaemonShutdown(signal_num, cur_stack_frame):  # pylint: disable=unused-argument
+  raise _DaemonShutdown()
+
+
+def _ReapConnectionHandlers():
+  while True:
+    try:
+      pid, _ = os.waitpid(-1, os.WNOHANG)
+    except OSError as e:
+      if e.errno == errno.ECHILD:
+        return
+      raise
+    if not pid:
+      return
+
+
+def Serve(socket_path):
+  """Runs the daemon, serving commands on socket_path until terminated.
+
+  Args:
+    socket_path: Path at which to create the daemon's Unix domain socket.
+  """
+  # Do the expensive initialization every command would otherwise repeat. The
+  # import also loads the boto config.
+  # pylint: disable=g-import-not-at-top,unused-variable
+  import gslib.__main__
+  from gslib.command_registry import LazyCommandMap
+  LazyCommandMap().values()
+  config_file_state = _GetConfigFileState()
+
+  socket_dir = os.path.dirname(socket_path)
+  if not os.path.isdir(socket_dir):
+    os.makedirs(socket_dir, 0700)
+  if os.path.exists(socket_path):
+    os.unlink(socket_path)
+  listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  old_umask = os.umask(0177)
+  try:
+    listener.bind(socket_path)
+  finally:
+    os.umask(old_umask)
+  listener.listen(socket.SOMAXCONN)
+  pid_file = GetDaemonPidFile(socket_path)
+  with open(pid_file, 'w') as f:
+    f.write('%d\n' % os.getpid())
+
+  signal.signal(signal.SIGTERM, _RaiseDaemonShutdown)
+  signal.signal(signal.SIGINT, _RaiseDaemonShutdown)
+  try:
+    while True:
+      _ReapConnectionHandlers()
+      try:
+        readable, _, _ = select.select([listener], [], [],
+                                       _ACCEPT_POLL_INTERVAL)
+      except select.error as e:
+        if e.args[0] == errno.EINTR:
+          continue
+        raise
+      if not readable:
+        continue
+      conn, _ = listener.accept()
+      if os.fork():
+        conn.close()
+        continue
+      # Connection handler process.
+      listener.close()
+      for signal_num in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signal_num, signal.SIG_DFL)
+      try:
+        _HandleConnection(conn, config_file_state)
+      except:  # pylint: disable=bare-except
+        traceback.print_exc()
+      finally:
+        os._exit(0)  # pylint: disable=protected-access
+  except _DaemonShutdown:
+    pass
+  finally:
+    listener.close()
+    for path in (socket_path, pid_file):
+      try:
+        os.unlink(path)
+      except OSError:
+        pass
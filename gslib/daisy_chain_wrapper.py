@@ -14,17 +14,17 @@
 # limitations under the License.
 """Wrapper for use in daisy-chained copies."""
 
-from collections import deque
-from contextlib import contextmanager
 import os
 import threading
-import time
 
+from gslib.buffer_pool import GetTransferBufferPool
 from gslib.cloud_api import BadRequestException
 from gslib.cloud_api import CloudApi
+from gslib.cloud_api import ResumableDownloadException
+from gslib.cloud_api_delegator import CloudApiDelegator
 from gslib.utils import constants
-from gslib.utils import parallelism_framework_util
 from gslib.utils.encryption_helper import CryptoKeyWrapperFromKey
+from gslib.utils.unit_util import DivideAndCeil
 
 # This controls the amount of bytes downloaded per download request.
 # We do not buffer this many bytes in memory at a time - that is controlled by
@@ -32,50 +32,64 @@ from gslib.utils.encryption_helper import CryptoKeyWrapperFromKey
 # be unnecessarily downloaded if there is a break in the resumable upload.
 _DEFAULT_DOWNLOAD_CHUNK_SIZE = 1024*1024*100
 
+_DEFAULT_MAX_BUFFER_SIZE = 1024 * 1024  # 1 MiB
+
+
+class _DownloadStoppedException(Exception):
+  """Raised in a download thread to stop a download that is no longer needed."""
+
 
 class BufferWrapper(object):
-  """Wraps the download file pointer to use our in-memory buffer."""
+  """Wraps the download file pointer to use our in-memory ring buffer."""
 
-  def __init__(self, daisy_chain_wrapper):
-    """Provides a buffered write interface for a file download.
+  def __init__(self, daisy_chain_wrapper, start_byte, generation):
+    """Provides a buffered write interface for one range of a download.
 
     Args:
       daisy_chain_wrapper: DaisyChainWrapper instance to use for buffer and
                            locking.
+      start_byte: Byte of the object at which this range starts.
+      generation: Download generation of the wrapper this range belongs to.
     """
     self.daisy_chain_wrapper = daisy_chain_wrapper
+    self.position = start_byte
+    self.start_byte = start_byte
+    self.generation = generation
 
   def write(self, data):  # pylint: disable=invalid-name
     """Waits for space in the buffer, then writes data to the buffer."""
-    while True:
-      with self.daisy_chain_wrapper.lock:
-        if (self.daisy_chain_wrapper.bytes_buffered <
-            self.daisy_chain_wrapper.max_buffer_size):
-          break
-      # Buffer was full, yield thread priority so the upload can pull from it.
-      time.sleep(0)
-    data_len = len(data)
-    if data_len:
-      with self.daisy_chain_wrapper.lock:
-        self.daisy_chain_wrapper.buffer.append(data)
-        self.daisy_chain_wrapper.bytes_buffered += data_len
-
-
-@contextmanager
-def AcquireLockWithTimeout(lock, timeout):
-  result = lock.acquire(timeout=timeout)
-  yield result
-  if result:
-    lock.release()
+    wrapper = self.daisy_chain_wrapper
+    data_offset = 0
+    while data_offset < len(data):
+      with wrapper.cond:
+        # Wait until the upload has read far enough for the next bytes to fit.
+        while (self.generation == wrapper.generation and
+               self.position + 1 > wrapper.buffer_start +
+               wrapper.max_buffer_size):
+          wrapper.cond.wait()
+        if self.generation != wrapper.generation:
+          raise _DownloadStoppedException()
+        write_len = min(
+            len(data) - data_offset,
+            wrapper.buffer_start + wrapper.max_buffer_size - self.position)
+        wrapper.WriteToBuffer(self.position,
+                              data[data_offset:data_offset + write_len])
+        data_offset += write_len
+        self.position += write_len
+        wrapper.range_positions[self.start_byte] = self.position
+        wrapper.cond.notify_all()
 
 
 class DaisyChainWrapper(object):
   """Wrapper class for daisy-chaining a cloud download to an upload.
 
-  This class instantiates a BufferWrapper object to buffer the download into
-  memory, consuming a maximum of max_buffer_size. It implements intelligent
-  behavior around read and seek that allow for all of the operations necessary
-  to copy a file.
+  This class downloads the source object with one or more download threads,
+  each of which downloads the next unclaimed range of the object into a ring
+  buffer of max_buffer_size bytes. The upload reads the buffer in order; the
+  download threads wait (on a condition variable) for the upload to free
+  space for the bytes they're writing, and the upload waits for the next
+  bytes to arrive. It implements intelligent behavior around read and seek
+  that allow for all of the operations necessary to copy a file.
 
   This class is coupled with the XML and JSON implementations in that it
   expects that small buffers (maximum of constants.TRANSFER_BUFFER_SIZE) in
@@ -85,7 +99,8 @@ class DaisyChainWrapper(object):
   def __init__(self, src_url, src_obj_size, gsutil_api,
                compressed_encoding=False, progress_callback=None,
                download_chunk_size=_DEFAULT_DOWNLOAD_CHUNK_SIZE,
-               decryption_key=None):
+               decryption_key=None, num_download_streams=1,
+               max_buffer_size=_DEFAULT_MAX_BUFFER_SIZE):
     """Initializes the daisy chain wrapper.
 
     Args:
@@ -101,109 +116,207 @@ class DaisyChainWrapper(object):
           unnecessarily downloaded if there is a break in the resumable upload.
       decryption_key: Base64-encoded decryption key for the source object,
           if any.
+      num_download_streams: Number of ranges of the object to download
+          concurrently. With more than one stream, each request downloads at
+          most max_buffer_size / num_download_streams bytes, so that all of
+          the streams can write to the buffer at once.
+      max_buffer_size: Size in bytes of the in-memory ring buffer. The buffer
+          is taken from the process's TransferBufferPool, so this waits until
+          it fits in the transfer buffer memory budget.
     """
     # Current read position for the upload file pointer.
     self.position = 0
-    self.buffer = deque()
 
-    self.bytes_buffered = 0
     # Maximum amount of bytes in memory at a time.
-    self.max_buffer_size = 1024 * 1024  # 1 MiB
-
+    self.max_buffer_size = max_buffer_size
+    self.buffer = GetTransferBufferPool().Acquire(max_buffer_size)
+    # Byte of the object held at the start of the unread part of the buffer.
+    self.buffer_start = 0
+    # Maps the start byte of each range being downloaded to the next byte the
+    # range will write. Ranges are claimed in order and removed once done, so
+    # the first entry bounds the bytes that are ready to be read.
+    self.range_positions = {}
+    self.next_range_start = 0
+
+    self._num_download_streams = max(num_download_streams, 1)
     self._download_chunk_size = download_chunk_size
+    if self._num_download_streams > 1:
+      self._download_chunk_size = min(
+          download_chunk_size,
+          max(max_buffer_size // self._num_download_streams,
+              constants.TRANSFER_BUFFER_SIZE))
 
     # We save one buffer's worth of data as a special case for boto,
     # which seeks back one buffer and rereads to compute hashes. This is
     # unnecessary because we can just compare cloud hash digests at the end,
-    # but it allows this to work without modfiying boto.
+    # but it allows this to work without modfiying boto. When we seek back,
+    # the data is stored in replay_data until it has been read again.
     self.last_position = 0
     self.last_data = None
+    self.replay_data = None
 
-    # Protects buffer, position, bytes_buffered, last_position, and last_data.
-    self.lock = parallelism_framework_util.CreateLock()
-
-    # Protects download_exception.
-    self.download_exception_lock = parallelism_framework_util.CreateLock()
+    # Protects all of the above, as well as generation and
+    # download_exception. Download threads and the upload wait on it for
+    # space in and data from the buffer.
+    self.cond = threading.Condition()
 
     self.src_obj_size = src_obj_size
     self.src_url = src_url
     self.compressed_encoding = compressed_encoding
     self.decryption_tuple = CryptoKeyWrapperFromKey(decryption_key)
 
-    # This is safe to use the upload and download thread because the download
-    # thread calls only GetObjectMedia, which creates a new HTTP connection
-    # independent of gsutil_api. Thus, it will not share an HTTP connection
-    # with the upload.
+    # This is safe to use in the upload thread and the first download thread
+    # because the download thread calls only GetObjectMedia, which uses an
+    # HTTP connection independent of the upload's. Additional download threads
+    # each get their own gsutil API, since downloads on one API instance
+    # share a connection.
     self.gsutil_api = gsutil_api
+    self._download_apis = [gsutil_api]
+
+    # Incremented whenever the download restarts; download threads started
+    # for an earlier generation stop at their next write.
+    self.generation = 0
 
-    # If self.download_thread dies due to an exception, it is saved here so
+    # If a download thread dies due to an exception, it is saved here so
     # that it can also be raised in the upload thread.
     self.download_exception = None
-    self.download_thread = None
+    self.download_threads = []
+    self.num_running_download_threads = 0
     self.progress_callback = progress_callback
-    self.download_started = threading.Event()
-    self.stop_download = threading.Event()
-    self.StartDownloadThread(progress_callback=self.progress_callback)
-    if self.download_started.wait(60) == False:
-      raise Exception('Could not start download thread after 60 seconds.')
-
-  def StartDownloadThread(self, start_byte=0, progress_callback=None):
-    """Starts the download thread for the source object (from start_byte)."""
-
-    def PerformDownload(start_byte, progress_callback):
-      """Downloads the source object in chunks.
-
-      This function checks the stop_download event and exits early if it is set.
-      It should be set when there is an error during the daisy-chain upload,
-      then this function can be called again with the upload's current position
-      as start_byte.
+    self.StartDownloadThreads()
+
+  def _GetDownloadApi(self, stream_num):
+    """Returns the gsutil API for the given download stream."""
+    while len(self._download_apis) <= stream_num:
+      api = self.gsutil_api
+      if isinstance(api, CloudApiDelegator):
+        api = CloudApiDelegator(
+            api.bucket_storage_uri_class, api.api_map, api.logger,
+            api.status_queue, provider=api.provider, debug=api.debug,
+            trace_token=api.trace_token,
+            perf_trace_token=api.perf_trace_token,
+            user_project=api.user_project)
+      self._download_apis.append(api)
+    return self._download_apis[stream_num]
+
+  def StartDownloadThreads(self, start_byte=0):
+    """Starts the download threads for the source object (from start_byte)."""
+
+    def PerformDownload(gsutil_api, generation):
+      """Downloads ranges of the source object until none are left.
+
+      This function exits early once the wrapper's generation changes, which
+      happens when there is an error during the daisy-chain upload; the
+      download is then restarted from the upload's current position.
 
       Args:
-        start_byte: Byte from which to begin the download.
-        progress_callback: Optional callback function for progress
-            notifications. Receives calls with arguments
-            (bytes_transferred, total_size).
+        gsutil_api: gsutil Cloud API to download with.
+        generation: The wrapper's generation when this thread was started.
       """
       # TODO: Support resumable downloads. This would require the BufferWrapper
       # object to support seek() and tell() which requires coordination with
       # the upload.
-      self.download_started.set()
       try:
-        while start_byte + self._download_chunk_size < self.src_obj_size:
-          self.gsutil_api.GetObjectMedia(
+        while True:
+          with self.cond:
+            if (generation != self.generation or self.download_exception or
+                self.next_range_start >= self.src_obj_size):
+              return
+            range_start = self.next_range_start
+            range_end = min(range_start + self._download_chunk_size,
+                            self.src_obj_size) - 1
+            self.next_range_start = range_end + 1
+            self.range_positions[range_start] = range_start
+          gsutil_api.GetObjectMedia(
               self.src_url.bucket_name, self.src_url.object_name,
-              BufferWrapper(self), compressed_encoding=self.compressed_encoding,
-              start_byte=start_byte,
-              end_byte=start_byte + self._download_chunk_size - 1,
-              generation=self.src_url.generation, object_size=self.src_obj_size,
+              BufferWrapper(self, range_start, generation),
+              compressed_encoding=self.compressed_encoding,
+              start_byte=range_start,
+              # The last range is requested to the end of the object.
+              end_byte=(range_end if range_end < self.src_obj_size - 1
+                        else None),
+              generation=self.src_url.generation,
+              object_size=self.src_obj_size,
               download_strategy=CloudApi.DownloadStrategy.ONE_SHOT,
-              provider=self.src_url.scheme, progress_callback=progress_callback,
+              provider=self.src_url.scheme,
+              progress_callback=self.progress_callback,
               decryption_tuple=self.decryption_tuple)
-          if self.stop_download.is_set():
-            # Download thread needs to be restarted, so exit.
-            self.stop_download.clear()
-            return
-          start_byte += self._download_chunk_size
-        self.gsutil_api.GetObjectMedia(
-            self.src_url.bucket_name, self.src_url.object_name,
-            BufferWrapper(self), compressed_encoding=self.compressed_encoding,
-            start_byte=start_byte, generation=self.src_url.generation,
-            object_size=self.src_obj_size,
-            download_strategy=CloudApi.DownloadStrategy.ONE_SHOT,
-            provider=self.src_url.scheme, progress_callback=progress_callback,
-            decryption_tuple=self.decryption_tuple)
+          with self.cond:
+            if generation != self.generation:
+              return
+            if self.range_positions[range_start] != range_end + 1:
+              raise ResumableDownloadException(
+                  'Daisy chain download of bytes %d-%d ended at byte %d.' %
+                  (range_start, range_end, self.range_positions[range_start]))
+            del self.range_positions[range_start]
+            # Ranges after this one may already be done, so the upload may be
+            # able to read past the end of this range now.
+            self.cond.notify_all()
+      except _DownloadStoppedException:
+        pass
       # We catch all exceptions here because we want to store them.
       except Exception, e:  # pylint: disable=broad-except
         # Save the exception so that it can be seen in the upload thread.
-        with self.download_exception_lock:
-          self.download_exception = e
-          raise
-
+        with self.cond:
+          if generation == self.generation and not self.download_exception:
+            self.download_exception = e
+      finally:
+        # Wake the upload, which may be waiting on this thread.
+        with self.cond:
+          if generation == self.generation:
+            self.num_running_download_threads -= 1
+          self.cond.notify_all()
+
+    num_ranges = DivideAndCeil(self.src_obj_size - start_byte,
+                               self._download_chunk_size)
+    num_streams = min(self._num_download_streams, num_ranges)
+    with self.cond:
+      generation = self.generation
+      self.num_running_download_threads = num_streams
+    self.download_threads = []
     # TODO: If we do gzip encoding transforms mid-transfer, this will fail.
-    self.download_thread = threading.Thread(
-        target=PerformDownload,
-        args=(start_byte, progress_callback))
-    self.download_thread.start()
+    for stream_num in range(num_streams):
+      download_thread = threading.Thread(
+          target=PerformDownload,
+          args=(self._GetDownloadApi(stream_num), generation))
+      download_thread.daemon = True
+      download_thread.start()
+      self.download_threads.append(download_thread)
+
+  def WriteToBuffer(self, start_byte, data):
+    """Copies data for the given byte of the object into the ring buffer.
+
+    The caller must hold self.cond, and data must fit in the buffer.
+
+    Args:
+      start_byte: Byte of the object at which data starts.
+      data: Bytes to write.
+    """
+    self.buffer.Write(start_byte, data)
+
+  def _ReadFromBuffer(self, amt):
+    """Removes up to amt ready bytes from the ring buffer and returns them.
+
+    The caller must hold self.cond.
+
+    Args:
+      amt: Maximum number of bytes to read.
+
+    Returns:
+      The bytes read, or None if no bytes are ready.
+    """
+    if self.range_positions:
+      ready_end = self.range_positions[min(self.range_positions)]
+    else:
+      ready_end = self.next_range_start
+    read_len = min(amt, ready_end - self.buffer_start)
+    if read_len <= 0:
+      return None
+    data = self.buffer.Read(self.buffer_start, read_len)
+    self.buffer_start += read_len
+    # Wake download threads waiting for space.
+    self.cond.notify_all()
+    return data
 
   def read(self, amt=None):  # pylint: disable=invalid-name
     """Exposes a stream from the in-memory buffer to the upload."""
@@ -216,37 +329,29 @@ class DaisyChainWrapper(object):
           'Invalid HTTP read size %s during daisy chain operation, '
           'expected <= %s.' % (amt, constants.TRANSFER_BUFFER_SIZE))
 
-    while True:
-      with self.lock:
-        if self.buffer:
-          break
-        if AcquireLockWithTimeout(self.download_exception_lock, 30):
+    with self.cond:
+      if self.replay_data:
+        data = self.replay_data[:amt]
+        self.replay_data = self.replay_data[amt:]
+      else:
+        while True:
+          data = self._ReadFromBuffer(amt)
+          if data:
+            break
           if self.download_exception:
             # Download thread died, so we will never recover. Raise the
             # exception that killed it.
             raise self.download_exception  # pylint: disable=raising-bad-type
-        else:
-          if not self.download_thread.is_alive():
+          if not self.num_running_download_threads:
             raise Exception('Download thread died suddenly.')
-      # Buffer was empty, yield thread priority so the download thread can fill.
-      time.sleep(0)
-    with self.lock:
-      # TODO: Need to handle the caller requesting less than a
-      # transfer_buffer_size worth of data.
-      data = self.buffer.popleft()
+          self.cond.wait()
       self.last_position = self.position
       self.last_data = data
-      data_len = len(data)
-      self.position += data_len
-      self.bytes_buffered -= data_len
-    if data_len > amt:
-      raise BadRequestException(
-          'Invalid read during daisy chain operation, got data of size '
-          '%s, expected size %s.' % (data_len, amt))
+      self.position += len(data)
     return data
 
   def tell(self):  # pylint: disable=invalid-name
-    with self.lock:
+    with self.cond:
       return self.position
 
   def seek(self, offset, whence=os.SEEK_SET):  # pylint: disable=invalid-name
@@ -256,13 +361,13 @@ class DaisyChainWrapper(object):
         raise IOError(
             'Invalid seek during daisy chain operation. Non-zero offset %s '
             'from os.SEEK_END is not supported' % offset)
-      with self.lock:
+      with self.cond:
         self.last_position = self.position
         self.last_data = None
         # Safe because we check position against src_obj_size in read.
         self.position = self.src_obj_size
     elif whence == os.SEEK_SET:
-      with self.lock:
+      with self.cond:
         if offset == self.position:
           pass
         elif offset == self.last_position:
@@ -270,8 +375,7 @@ class DaisyChainWrapper(object):
           if self.last_data:
             # If we seek to end and then back, we won't have last_data; we'll
             # get it on the next call to read.
-            self.buffer.appendleft(self.last_data)
-            self.bytes_buffered += len(self.last_data)
+            self.replay_data = self.last_data + (self.replay_data or '')
         else:
           # Once a download is complete, boto seeks to 0 and re-reads to
           # compute the hash if an md5 isn't already present (for example a GCS
@@ -280,29 +384,38 @@ class DaisyChainWrapper(object):
           # service may have received any number of the bytes; the download
           # needs to be restarted from that point.
           restart_download = True
+          # Stop the download threads at their next write.
+          self.generation += 1
+          self.cond.notify_all()
 
       if restart_download:
-        self.stop_download.set()
-
-        # Consume any remaining bytes in the download thread so that
-        # the thread can exit, then restart the thread at the desired position.
-        while self.download_thread.is_alive():
-          with self.lock:
-            while self.bytes_buffered:
-              self.bytes_buffered -= len(self.buffer.popleft())
-          time.sleep(0)
+        # Each download thread's API may only be used by one thread at a time,
+        # so wait for the threads to exit before restarting.
+        for download_thread in self.download_threads:
+          download_thread.join()
 
-        with self.lock:
+        with self.cond:
           self.position = offset
-          self.buffer = deque()
-          self.bytes_buffered = 0
+          self.buffer_start = offset
+          self.range_positions = {}
+          self.next_range_start = offset
+          self.download_exception = None
           self.last_position = 0
           self.last_data = None
-        self.StartDownloadThread(start_byte=offset,
-                                 progress_callback=self.progress_callback)
+          self.replay_data = None
+        self.StartDownloadThreads(start_byte=offset)
     else:
       raise IOError('Daisy-chain download wrapper does not support '
                     'seek mode %s' % whence)
 
   def seekable(self):  # pylint: disable=invalid-name
     return True
+
+  def close(self):  # pylint: disable=invalid-name
+    """Stops the download threads and releases the buffer."""
+    with self.cond:
+      # Download threads only write to the buffer while holding the condition
+      # and after checking the generation, so none write to it after this.
+      self.generation += 1
+      self.buffer.Release()
+      self.cond.notify_all()
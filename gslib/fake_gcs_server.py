@@ -0,0 +1,869 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""A local fake of the Google Cloud Storage JSON API.
+
+Unlike MockCloudApi, which replaces the Cloud API, FakeGcsServer is an HTTPS
+server, so requests made against it go through GcsJsonApi, apitools, httplib2
+and the upload and download media handling, as they would against the real
+service. This makes it possible to measure gsutil's transfer performance
+reproducibly and without a bucket.
+
+The server keeps buckets and objects in memory and implements the JSON API
+methods gsutil uses for transfers: bucket insert/get/list/delete, object
+list/get/patch/delete, media downloads (with ranges), simple, multipart and
+resumable uploads, compose and rewrite. Only live object versions are kept,
+and requests aren't authenticated. Latency, per-connection bandwidth caps and
+errors can be injected into every request.
+
+The server's certificate is self-signed, so clients connect to it without
+validating certificates:
+
+  with FakeGcsServer(latency=0.05) as server:
+    server.CreateBucket('bucket')
+    with SetBotoConfigForTest(server.GetBotoConfig()):
+      ...
+
+It can also be run on its own, and selected with gsutil's gs_json_host and
+gs_json_port options:
+
+  python -m gslib.fake_gcs_server --port 8443 --bucket bucket &
+  gsutil -o Credentials:gs_json_host=localhost \\
+      -o Credentials:gs_json_port=8443 \\
+      -o Boto:https_validate_certificates=False -m cp -r dir gs://bucket
+"""
+
+from __future__ import absolute_import
+
+import BaseHTTPServer
+import base64
+import bisect
+import cStringIO
+import datetime
+import getopt
+import hashlib
+import itertools
+import json
+import os
+import random
+import re
+import socket
+import SocketServer
+import ssl
+import sys
+import threading
+import time
+import urllib
+import urlparse
+
+import gslib
+from gslib.utils.hashing_helper import CalculateB64EncodedCrc32cFromContents
+
+CERT_FILE = os.path.join(gslib.GSLIB_DIR, 'data', 'fake_gcs_server.pem')
+
+# Size of the pieces request and response bodies are read and written in.
+IO_CHUNK_SIZE = 64 * 1024
+
+_BUCKETS_PATH_RE = re.compile(r'^/storage/v1/b$')
+_BUCKET_PATH_RE = re.compile(r'^/storage/v1/b/([^/]+)$')
+_OBJECTS_PATH_RE = re.compile(r'^/storage/v1/b/([^/]+)/o$')
+_OBJECT_PATH_RE = re.compile(r'^/storage/v1/b/([^/]+)/o/([^/]+)$')
+_DOWNLOAD_PATH_RE = re.compile(r'^/download/storage/v1/b/([^/]+)/o/([^/]+)$')
+_COMPOSE_PATH_RE = re.compile(r'^/storage/v1/b/([^/]+)/o/([^/]+)/compose$')
+_REWRITE_PATH_RE = re.compile(
+    r'^/storage/v1/b/([^/]+)/o/([^/]+)/rewriteTo/b/([^/]+)/o/([^/]+)$')
+_UPLOAD_PATH_RE = re.compile(r'^(?:/resumable)?/upload/storage/v1/b/([^/]+)/o$')
+_CONTENT_RANGE_RE = re.compile(r'^bytes (?:(\d+)-\d+|\*)/(\d+|\*)$')
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+_MULTIPART_HEADERS_END_RE = re.compile(r'(\r?\n)\r?\n')
+
+# Metadata that rewrites copy from the source object.
+_REWRITE_COPIED_FIELDS = ('cacheControl', 'contentDisposition',
+                          'contentEncoding', 'contentLanguage', 'contentType',
+                          'metadata')
+
+
+class FakeGcsError(Exception):
+  """An error response from the fake server."""
+
+  def __init__(self, status, reason, message):
+    super(FakeGcsError, self).__init__(message)
+    self.status = status
+    self.reason = reason
+    self.message = message
+
+
+def _NotFound(message):
+  return FakeGcsError(404, 'notFound', message)
+
+
+def _FormatTime(timestamp):
+  return datetime.datetime.utcfromtimestamp(timestamp).strftime(
+      '%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+class _FakeObject(object):
+  """An object's metadata, as a JSON API resource dict, and its contents."""
+
+  def __init__(self, metadata, data):
+    self.metadata = metadata
+    self.data = data
+
+
+class _FakeBucket(object):
+  """A bucket's metadata and its live objects, by name."""
+
+  def __init__(self, metadata):
+    self.metadata = metadata
+    self.objects = {}
+    self._sorted_names = None
+
+  def SortedNames(self):
+    if self._sorted_names is None:
+      self._sorted_names = sorted(self.objects)
+    return self._sorted_names
+
+  def PutObject(self, fake_object):
+    if fake_object.metadata['name'] not in self.objects:
+      self._sorted_names = None
+    self.objects[fake_object.metadata['name']] = fake_object
+
+  def DeleteObject(self, name):
+    del self.objects[name]
+    self._sorted_names = None
+
+
+class _UploadSession(object):
+  """The state of a resumable upload."""
+
+  def __init__(self, bucket_name, metadata, preconditions, total_size):
+    self.bucket_name = bucket_name
+    self.metadata = metadata
+    self.preconditions = preconditions
+    self.total_size = total_size
+    self.data = cStringIO.StringIO()
+    self.result = None
+
+
+class FakeGcsServer(object):
+  """In-memory fake of the GCS JSON API, served over HTTPS on localhost.
+
+  The public methods other than Start and Stop implement the JSON API
+  methods, with resources as JSON-style dicts, and are thread-safe.
+
+  Fault injection settings are attributes, and may be changed while the
+  server is running:
+
+    latency: Seconds to wait before handling each request.
+    bandwidth: Bytes per second each connection may send or receive request
+        and response bodies at, or None for no limit.
+    error_rate: Fraction of requests that fail with error_status instead of
+        being handled. Failed requests don't change any state.
+    error_status: HTTP status of injected errors.
+  """
+
+  def __init__(self, port=0, latency=0, bandwidth=None, error_rate=0,
+               error_status=503, seed=None):
+    self.port = port
+    self.latency = latency
+    self.bandwidth = bandwidth
+    self.error_rate = error_rate
+    self.error_status = error_status
+    self.request_count = 0
+    self.injected_error_count = 0
+    self._random = random.Random(seed)
+    self._lock = threading.Lock()
+    self._buckets = {}
+    self._uploads = {}
+    self._upload_ids = itertools.count()
+    self._last_generation = 0
+    self._http_server = None
+    self._thread = None
+
+  def __enter__(self):
+    self.Start()
+    return self
+
+  def __exit__(self, unused_type, unused_value, unused_traceback):
+    self.Stop()
+
+  def Start(self):
+    """Starts serving on a background thread and returns the port."""
+    self._http_server = _ThreadingHttpsServer(('localhost', self.port), self)
+    self.port = self._http_server.server_address[1]
+    self._thread = threading.Thread(target=self._http_server.serve_forever)
+    self._thread.daemon = True
+    self._thread.start()
+    return self.port
+
+  def Stop(self):
+    if self._http_server:
+      self._http_server.shutdown()
+      self._http_server.server_close()
+      self._http_server.CloseConnections()
+      self._thread.join()
+      self._http_server = None
+
+  def GetBotoConfig(self):
+    """Returns boto config options that point the JSON API at this server."""
+    return [('Credentials', 'gs_json_host', 'localhost'),
+            ('Credentials', 'gs_json_port', str(self.port)),
+            ('Credentials', 'gs_host', None),
+            ('Credentials', 'gs_port', None),
+            ('GSUtil', 'prefer_api', 'json'),
+            ('Boto', 'https_validate_certificates', 'False')]
+
+  def WriteBotoConfig(self, path, extra_options=()):
+    """Writes a boto config file that points gsutil at this server.
+
+    Args:
+      path: Path of the file to write.
+      extra_options: (section, name, value) tuples of other options to set.
+          Options whose value is None are left out.
+    """
+    options = {}
+    for section, name, value in self.GetBotoConfig() + list(extra_options):
+      if value is not None:
+        options.setdefault(section, []).append('%s = %s' % (name, value))
+    with open(path, 'w') as fp:
+      for section in sorted(options):
+        fp.write('[%s]\n%s\n\n' % (section, '\n'.join(options[section])))
+
+  def ShouldInjectError(self):
+    """Counts a request, and returns True if it should fail."""
+    with self._lock:
+      self.request_count += 1
+      if self.error_rate and self._random.random() < self.error_rate:
+        self.injected_error_count += 1
+        return True
+      return False
+
+  def CreateBucket(self, bucket_name):
+    return self.InsertBucket({'name': bucket_name})
+
+  def CreateObject(self, bucket_name, object_name, data, metadata=None):
+    """Creates an object and returns its metadata."""
+    object_metadata = dict(metadata or {})
+    object_metadata['name'] = object_name
+    return self.InsertObject(bucket_name, object_metadata, data)
+
+  def InsertBucket(self, metadata):
+    with self._lock:
+      name = metadata['name']
+      if name in self._buckets:
+        raise FakeGcsError(409, 'conflict',
+                           'You already own this bucket: %s' % name)
+      now = _FormatTime(time.time())
+      metadata = dict(metadata)
+      metadata.update({
+          'kind': 'storage#bucket', 'id': name, 'projectNumber': '0',
+          'metageneration': '1', 'timeCreated': now, 'updated': now,
+          'etag': 'CAE='})
+      metadata.setdefault('location', 'US')
+      metadata.setdefault('storageClass', 'STANDARD')
+      self._buckets[name] = _FakeBucket(metadata)
+      return metadata
+
+  def GetBucket(self, bucket_name):
+    with self._lock:
+      return self._GetBucket(bucket_name).metadata
+
+  def ListBuckets(self):
+    with self._lock:
+      return {'kind': 'storage#buckets',
+              'items': [self._buckets[name].metadata
+                        for name in sorted(self._buckets)]}
+
+  def DeleteBucket(self, bucket_name):
+    with self._lock:
+      if self._GetBucket(bucket_name).objects:
+        raise FakeGcsError(409, 'conflict', 'The bucket is not empty.')
+      del self._buckets[bucket_name]
+
+  def ListObjects(self, bucket_name, query):
+    """Returns a page of objects and prefixes, like objects.list."""
+    prefix = query.get('prefix', '')
+    delimiter = query.get('delimiter')
+    max_results = int(query.get('maxResults', 1000))
+    page_token = query.get('pageToken')
+    items = []
+    prefixes = []
+    result = {'kind': 'storage#objects'}
+    with self._lock:
+      bucket = self._GetBucket(bucket_name)
+      names = bucket.SortedNames()
+      start = bisect.bisect_left(names, max(prefix, page_token or ''))
+      for name in itertools.islice(names, start, None):
+        if not name.startswith(prefix):
+          break
+        if page_token is not None and (
+            name <= page_token or
+            (delimiter and page_token.endswith(delimiter) and
+             name.startswith(page_token))):
+          continue
+        delimiter_index = (name.find(delimiter, len(prefix)) if delimiter
+                           else -1)
+        name_prefix = (name[:delimiter_index + len(delimiter)]
+                       if delimiter_index >= 0 else None)
+        if name_prefix and prefixes and prefixes[-1] == name_prefix:
+          continue
+        if len(items) + len(prefixes) >= max_results:
+          # Listing resumes after the last name or prefix on this page.
+          result['nextPageToken'] = max(
+              [item['name'] for item in items[-1:]] + prefixes[-1:])
+          break
+        if name_prefix:
+          prefixes.append(name_prefix)
+        else:
+          items.append(bucket.objects[name].metadata)
+    if items:
+      result['items'] = items
+    if prefixes:
+      result['prefixes'] = prefixes
+    return result
+
+  def GetObject(self, bucket_name, object_name, generation=None):
+    """Returns the object's (metadata, data)."""
+    with self._lock:
+      fake_object = self._GetObject(bucket_name, object_name, generation)
+      return fake_object.metadata, fake_object.data
+
+  def InsertObject(self, bucket_name, metadata, data, preconditions=None):
+    with self._lock:
+      return self._PutObject(self._GetBucket(bucket_name), metadata, data,
+                             preconditions).metadata
+
+  def PatchObject(self, bucket_name, object_name, query, patch):
+    """Updates the object's metadata with the fields set in patch."""
+    with self._lock:
+      bucket = self._GetBucket(bucket_name)
+      fake_object = self._GetObject(bucket_name, object_name,
+                                    query.get('generation'))
+      self._CheckPreconditions(bucket, object_name, query)
+      metadata = dict(fake_object.metadata)
+      for key, value in patch.iteritems():
+        if value is None:
+          metadata.pop(key, None)
+        elif key == 'metadata' and isinstance(metadata.get(key), dict):
+          # Custom metadata is patched key by key.
+          custom_metadata = dict(metadata[key])
+          custom_metadata.update(value)
+          metadata[key] = dict((k, v) for k, v in custom_metadata.iteritems()
+                               if v is not None)
+        else:
+          metadata[key] = value
+      metadata['metageneration'] = str(int(metadata['metageneration']) + 1)
+      metadata['updated'] = _FormatTime(time.time())
+      fake_object.metadata = metadata
+      return metadata
+
+  def DeleteObject(self, bucket_name, object_name, query):
+    with self._lock:
+      bucket = self._GetBucket(bucket_name)
+      self._GetObject(bucket_name, object_name, query.get('generation'))
+      self._CheckPreconditions(bucket, object_name, query)
+      bucket.DeleteObject(object_name)
+
+  def Compose(self, bucket_name, object_name, query, request):
+    """Concatenates the request's source objects, like objects.compose."""
+    with self._lock:
+      bucket = self._GetBucket(bucket_name)
+      pieces = []
+      component_count = 0
+      for source in request.get('sourceObjects', []):
+        source_object = self._GetObject(bucket_name, source['name'],
+                                        source.get('generation'))
+        pieces.append(source_object.data)
+        component_count += source_object.metadata.get('componentCount', 1)
+      metadata = dict(request.get('destination') or {})
+      metadata['name'] = object_name
+      return self._PutObject(bucket, metadata, ''.join(pieces), query,
+                             component_count=component_count).metadata
+
+  def Rewrite(self, src_bucket_name, src_object_name, dst_bucket_name,
+              dst_object_name, query, metadata):
+    """Copies an object in a single call, like objects.rewrite."""
+    with self._lock:
+      source_object = self._GetObject(src_bucket_name, src_object_name,
+                                      query.get('sourceGeneration'))
+      new_metadata = dict(
+          (key, value) for key, value in source_object.metadata.iteritems()
+          if key in _REWRITE_COPIED_FIELDS)
+      new_metadata.update(metadata or {})
+      new_metadata['name'] = dst_object_name
+      preconditions = dict(
+          (key, value) for key, value in query.iteritems()
+          if key in ('ifGenerationMatch', 'ifMetagenerationMatch'))
+      new_object = self._PutObject(
+          self._GetBucket(dst_bucket_name), new_metadata, source_object.data,
+          preconditions,
+          component_count=source_object.metadata.get('componentCount'))
+    size = new_object.metadata['size']
+    return {'kind': 'storage#rewriteResponse', 'totalBytesRewritten': size,
+            'objectSize': size, 'done': True,
+            'resource': new_object.metadata}
+
+  def StartResumableUpload(self, bucket_name, query, metadata, headers):
+    """Starts a resumable upload and returns its upload ID."""
+    metadata = dict(metadata or {})
+    if 'name' in query:
+      metadata['name'] = query['name']
+    if 'contentType' not in metadata and headers.get('X-Upload-Content-Type'):
+      metadata['contentType'] = headers['X-Upload-Content-Type']
+    total_size = headers.get('X-Upload-Content-Length')
+    with self._lock:
+      self._GetBucket(bucket_name)
+      upload_id = str(next(self._upload_ids))
+      self._uploads[upload_id] = _UploadSession(
+          bucket_name, metadata, query,
+          int(total_size) if total_size else None)
+    return upload_id
+
+  def ContinueResumableUpload(self, upload_id, content_range, data):
+    """Adds data to a resumable upload.
+
+    Args:
+      upload_id: ID of the upload.
+      content_range: Content-Range header of the request, or None.
+      data: Request body.
+
+    Returns:
+      The uploaded object's metadata once the upload is complete, or else the
+      number of bytes received so far.
+    """
+    with self._lock:
+      session = self._uploads.get(upload_id)
+      if session is None:
+        raise _NotFound('No such upload: %s' % upload_id)
+      if session.result:
+        return session.result
+      received = session.data.tell()
+      first_byte = received
+      if content_range is None:
+        session.total_size = received + len(data)
+      else:
+        match = _CONTENT_RANGE_RE.match(content_range)
+        if not match:
+          raise FakeGcsError(400, 'invalid',
+                             'Invalid Content-Range: %s' % content_range)
+        if match.group(1):
+          first_byte = int(match.group(1))
+        if match.group(2) != '*':
+          session.total_size = int(match.group(2))
+      if first_byte > received:
+        raise FakeGcsError(
+            400, 'invalid',
+            'Upload skipped bytes %d-%d' % (received, first_byte - 1))
+      # Clients send bytes that were already received again after failures.
+      session.data.write(data[received - first_byte:])
+      if (session.total_size is not None and
+          session.data.tell() >= session.total_size):
+        session.result = self._PutObject(
+            self._GetBucket(session.bucket_name), session.metadata,
+            session.data.getvalue(), session.preconditions).metadata
+        session.data = None
+        return session.result
+      return session.data.tell()
+
+  # The methods below are called with the lock held.
+
+  def _NextGeneration(self):
+    self._last_generation = max(self._last_generation + 1,
+                                int(time.time() * 1000000))
+    return self._last_generation
+
+  def _GetBucket(self, bucket_name):
+    if bucket_name not in self._buckets:
+      raise _NotFound('The specified bucket does not exist: %s' % bucket_name)
+    return self._buckets[bucket_name]
+
+  def _GetObject(self, bucket_name, object_name, generation=None):
+    bucket = self._GetBucket(bucket_name)
+    fake_object = bucket.objects.get(object_name)
+    if fake_object is None or (
+        generation and fake_object.metadata['generation'] != str(generation)):
+      raise _NotFound('No such object: %s/%s' % (bucket_name, object_name))
+    return fake_object
+
+  def _CheckPreconditions(self, bucket, object_name, preconditions):
+    """Raises a 412 error if the object doesn't meet preconditions."""
+    fake_object = bucket.objects.get(object_name)
+    generation = fake_object.metadata['generation'] if fake_object else '0'
+    gen_match = preconditions.get('ifGenerationMatch')
+    meta_gen_match = preconditions.get('ifMetagenerationMatch')
+    if ((gen_match is not None and gen_match != generation) or
+        (meta_gen_match is not None and
+         (not fake_object or
+          meta_gen_match != fake_object.metadata['metageneration']))):
+      raise FakeGcsError(412, 'conditionNotMet', 'Precondition Failed')
+
+  def _PutObject(self, bucket, metadata, data, preconditions=None,
+                 component_count=None):
+    """Stores a new generation of an object and returns it."""
+    self._CheckPreconditions(bucket, metadata['name'], preconditions or {})
+    generation = str(self._NextGeneration())
+    now = _FormatTime(time.time())
+    metadata = dict((key, value) for key, value in metadata.iteritems()
+                    if value is not None)
+    object_path = 'storage/v1/b/%s/o/%s' % (
+        urllib.quote(bucket.metadata['name'], safe=''),
+        urllib.quote(metadata['name'].encode('utf-8'), safe=''))
+    metadata.update({
+        'kind': 'storage#object',
+        'id': '%s/%s/%s' % (bucket.metadata['name'], metadata['name'],
+                            generation),
+        # Resumable and sliced downloads fetch the media link.
+        'selfLink': 'https://localhost:%d/%s' % (self.port, object_path),
+        'mediaLink': 'https://localhost:%d/download/%s?generation=%s&alt=media'
+                     % (self.port, object_path, generation),
+        'bucket': bucket.metadata['name'], 'generation': generation,
+        'metageneration': '1', 'size': str(len(data)),
+        'crc32c': CalculateB64EncodedCrc32cFromContents(
+            cStringIO.StringIO(data)),
+        'timeCreated': now, 'updated': now,
+        'etag': base64.b64encode(generation)})
+    if component_count:
+      # Like the service, composite objects have no MD5 hash.
+      metadata['componentCount'] = component_count
+      metadata.pop('md5Hash', None)
+    else:
+      metadata['md5Hash'] = base64.b64encode(hashlib.md5(data).digest())
+    metadata.setdefault('contentType', 'application/octet-stream')
+    metadata.setdefault('storageClass', bucket.metadata['storageClass'])
+    fake_object = _FakeObject(metadata, data)
+    bucket.PutObject(fake_object)
+    return fake_object
+
+
+def _ParseMultipart(content_type, body):
+  """Returns the JSON metadata and media of a multipart/related upload."""
+  boundary = content_type.split('boundary=', 1)[1].strip('\'"')
+  parts = []
+  for part in body.split('--' + boundary)[1:-1]:
+    # Parts start with a line break, end with one, and have a blank line
+    # between their headers and body.
+    _, line_break, part = _MULTIPART_HEADERS_END_RE.split(part, 1)
+    parts.append(part[:-len(line_break)])
+  if len(parts) != 2:
+    raise FakeGcsError(400, 'invalid',
+                       'Expected 2 multipart parts, got %d' % len(parts))
+  return json.loads(parts[0] or '{}'), parts[1]
+
+
+class _ThreadingHttpsServer(SocketServer.ThreadingMixIn,
+                            BaseHTTPServer.HTTPServer):
+  """HTTPS server that handles each connection on its own thread."""
+
+  daemon_threads = True
+  allow_reuse_address = True
+
+  def __init__(self, server_address, fake_server):
+    BaseHTTPServer.HTTPServer.__init__(self, server_address,
+                                       _FakeGcsRequestHandler)
+    self.fake_server = fake_server
+    self.ssl_context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+    self.ssl_context.load_cert_chain(CERT_FILE)
+    self._connections = set()
+    self._connections_lock = threading.Lock()
+
+  def finish_request(self, request, client_address):
+    with self._connections_lock:
+      self._connections.add(request)
+    try:
+      # The TLS handshake is done on the connection's thread, so slow clients
+      # don't hold up accepting other connections.
+      try:
+        request = self.ssl_context.wrap_socket(request, server_side=True)
+      except (ssl.SSLError, IOError):
+        return
+      self.RequestHandlerClass(request, client_address, self)
+    finally:
+      with self._connections_lock:
+        self._connections.discard(request)
+
+  def CloseConnections(self):
+    """Closes open connections, ending their threads."""
+    with self._connections_lock:
+      connections = list(self._connections)
+    for connection in connections:
+      try:
+        connection.shutdown(socket.SHUT_RDWR)
+      except socket.error:
+        pass
+
+  def handle_error(self, request, client_address):
+    # Clients that close connections mid-request aren't worth reporting.
+    pass
+
+
+class _FakeGcsRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+  """Handles JSON API requests for a FakeGcsServer."""
+
+  protocol_version = 'HTTP/1.1'
+
+  # pylint: disable=invalid-name
+  def do_GET(self):
+    self._HandleRequest()
+
+  def do_POST(self):
+    self._HandleRequest()
+
+  def do_PUT(self):
+    self._HandleRequest()
+
+  def do_PATCH(self):
+    self._HandleRequest()
+
+  def do_DELETE(self):
+    self._HandleRequest()
+  # pylint: enable=invalid-name
+
+  def log_message(self, *unused_args):  # pylint: disable=arguments-differ
+    pass
+
+  @property
+  def fake_server(self):
+    return self.server.fake_server
+
+  def _Throttle(self, start_time, num_bytes):
+    """Waits until num_bytes fit the bandwidth cap since start_time."""
+    bandwidth = self.fake_server.bandwidth
+    if bandwidth:
+      delay = start_time + float(num_bytes) / bandwidth - time.time()
+      if delay > 0:
+        time.sleep(delay)
+
+  def _ReadBody(self):
+    length = int(self.headers.get('Content-Length') or 0)
+    pieces = []
+    start_time = time.time()
+    received = 0
+    while received < length:
+      piece = self.rfile.read(min(IO_CHUNK_SIZE, length - received))
+      if not piece:
+        break
+      pieces.append(piece)
+      received += len(piece)
+      self._Throttle(start_time, received)
+    return ''.join(pieces)
+
+  def _SendResponse(self, status, body='', headers=None):
+    self.send_response(status)
+    for name, value in (headers or {}).iteritems():
+      self.send_header(name, value)
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    start_time = time.time()
+    for offset in xrange(0, len(body), IO_CHUNK_SIZE):
+      piece = body[offset:offset + IO_CHUNK_SIZE]
+      self.wfile.write(piece)
+      self._Throttle(start_time, offset + len(piece))
+
+  def _SendJson(self, resource):
+    self._SendResponse(200, json.dumps(resource),
+                       {'Content-Type': 'application/json; charset=UTF-8'})
+
+  def _SendError(self, error):
+    self._SendResponse(error.status, json.dumps({'error': {
+        'code': error.status, 'message': error.message,
+        'errors': [{'domain': 'global', 'reason': error.reason,
+                    'message': error.message}]}}),
+                       {'Content-Type': 'application/json; charset=UTF-8'})
+
+  def _HandleRequest(self):
+    if self.fake_server.latency:
+      time.sleep(self.fake_server.latency)
+    body = self._ReadBody()
+    try:
+      if self.fake_server.ShouldInjectError():
+        raise FakeGcsError(self.fake_server.error_status, 'backendError',
+                           'Injected error')
+      self._Route(body)
+    except FakeGcsError as e:
+      self._SendError(e)
+
+  def _Route(self, body):
+    """Calls the handler for the request's method and path."""
+    url = urlparse.urlsplit(self.path)
+    query = dict(urlparse.parse_qsl(url.query, keep_blank_values=True))
+    for regex, methods, handler in (
+        (_UPLOAD_PATH_RE, ('POST', 'PUT'), self._HandleUpload),
+        (_REWRITE_PATH_RE, ('POST',), self._HandleRewrite),
+        (_COMPOSE_PATH_RE, ('POST',), self._HandleCompose),
+        (_OBJECT_PATH_RE, ('GET', 'PATCH', 'DELETE'), self._HandleObject),
+        (_DOWNLOAD_PATH_RE, ('GET',), self._HandleObject),
+        (_OBJECTS_PATH_RE, ('GET',), self._HandleListObjects),
+        (_BUCKET_PATH_RE, ('GET', 'DELETE'), self._HandleBucket),
+        (_BUCKETS_PATH_RE, ('GET', 'POST'), self._HandleBuckets)):
+      match = regex.match(url.path)
+      if match and self.command in methods:
+        names = [urllib.unquote(group).decode('utf-8')
+                 for group in match.groups()]
+        handler(query, body, *names)
+        return
+    raise _NotFound('No such method: %s %s' % (self.command, url.path))
+
+  def _HandleBuckets(self, unused_query, body):
+    if self.command == 'POST':
+      self._SendJson(self.fake_server.InsertBucket(json.loads(body)))
+    else:
+      self._SendJson(self.fake_server.ListBuckets())
+
+  def _HandleBucket(self, unused_query, unused_body, bucket_name):
+    if self.command == 'DELETE':
+      self.fake_server.DeleteBucket(bucket_name)
+      self._SendResponse(204)
+    else:
+      self._SendJson(self.fake_server.GetBucket(bucket_name))
+
+  def _HandleListObjects(self, query, unused_body, bucket_name):
+    self._SendJson(self.fake_server.ListObjects(bucket_name, query))
+
+  def _HandleObject(self, query, body, bucket_name, object_name):
+    """Handles object get, media download, patch and delete requests."""
+    if self.command == 'PATCH':
+      self._SendJson(self.fake_server.PatchObject(
+          bucket_name, object_name, query, json.loads(body)))
+      return
+    if self.command == 'DELETE':
+      self.fake_server.DeleteObject(bucket_name, object_name, query)
+      self._SendResponse(204)
+      return
+    metadata, data = self.fake_server.GetObject(bucket_name, object_name,
+                                                query.get('generation'))
+    if query.get('alt') != 'media':
+      self._SendJson(metadata)
+      return
+    object_hashes = ['crc32c=%s' % metadata['crc32c']]
+    if 'md5Hash' in metadata:
+      object_hashes.append('md5=%s' % metadata['md5Hash'])
+    headers = {'Content-Type': metadata['contentType'],
+               'X-Goog-Generation': metadata['generation'],
+               'X-Goog-Hash': ','.join(object_hashes)}
+    if 'contentEncoding' in metadata:
+      headers['Content-Encoding'] = metadata['contentEncoding']
+    range_match = _RANGE_RE.match(self.headers.get('Range') or '')
+    if not range_match or not data:
+      self._SendResponse(200, data, headers)
+      return
+    start, end = range_match.groups()
+    if not start:
+      # A suffix range, for the last bytes of the object.
+      start = max(len(data) - int(end), 0)
+      end = len(data) - 1
+    else:
+      start = int(start)
+      end = min(int(end), len(data) - 1) if end else len(data) - 1
+    if start >= len(data):
+      headers['Content-Range'] = 'bytes */%d' % len(data)
+      self._SendResponse(416, '', headers)
+      return
+    headers['Content-Range'] = 'bytes %d-%d/%d' % (start, end, len(data))
+    self._SendResponse(206, data[start:end + 1], headers)
+
+  def _HandleUpload(self, query, body, bucket_name):
+    """Handles simple, multipart and resumable uploads."""
+    upload_type = query.get('uploadType')
+    if upload_type == 'resumable' and self.command == 'POST':
+      upload_id = self.fake_server.StartResumableUpload(
+          bucket_name, query, json.loads(body) if body else None,
+          self.headers)
+      location = 'https://localhost:%d%s?uploadType=resumable&upload_id=%s' % (
+          self.fake_server.port, urlparse.urlsplit(self.path).path,
+          upload_id)
+      self._SendResponse(200, headers={'Location': location})
+    elif upload_type == 'resumable':
+      result = self.fake_server.ContinueResumableUpload(
+          query.get('upload_id'), self.headers.get('Content-Range'), body)
+      if isinstance(result, dict):
+        self._SendJson(result)
+      elif result:
+        self._SendResponse(308, headers={'Range': 'bytes=0-%d' % (result - 1)})
+      else:
+        self._SendResponse(308)
+    else:
+      if upload_type == 'multipart':
+        metadata, data = _ParseMultipart(self.headers.get('Content-Type'),
+                                         body)
+      else:
+        metadata, data = {}, body
+        if self.headers.get('Content-Type'):
+          metadata['contentType'] = self.headers['Content-Type']
+      if 'name' in query:
+        metadata['name'] = query['name']
+      self._SendJson(self.fake_server.InsertObject(bucket_name, metadata, data,
+                                                   query))
+
+  def _HandleCompose(self, query, body, bucket_name, object_name):
+    self._SendJson(self.fake_server.Compose(bucket_name, object_name, query,
+                                            json.loads(body)))
+
+  def _HandleRewrite(self, query, body, src_bucket_name, src_object_name,
+                     dst_bucket_name, dst_object_name):
+    self._SendJson(self.fake_server.Rewrite(
+        src_bucket_name, src_object_name, dst_bucket_name, dst_object_name,
+        query, json.loads(body) if body else None))
+
+
+_USAGE = """Usage: python -m gslib.fake_gcs_server [options]
+
+Options:
+  --port PORT          Port to listen on (default: any free port).
+  --bucket NAME        Bucket to create at startup; may be repeated.
+  --latency SECONDS    Delay before handling each request.
+  --bandwidth BYTES    Per-connection body transfer rate, in bytes/second.
+  --error_rate RATE    Fraction of requests that fail.
+  --error_status CODE  HTTP status of failed requests (default: 503).
+  --seed SEED          Seed for choosing which requests fail.
+"""
+
+
+def main(argv):
+  """Runs a FakeGcsServer until interrupted."""
+  try:
+    opts, _ = getopt.getopt(argv, '', [
+        'port=', 'bucket=', 'latency=', 'bandwidth=', 'error_rate=',
+        'error_status=', 'seed=', 'help'])
+  except getopt.GetoptError as e:
+    sys.stderr.write('%s\n%s' % (e, _USAGE))
+    return 1
+  kwargs = {}
+  buckets = []
+  for option, value in opts:
+    if option == '--help':
+      sys.stdout.write(_USAGE)
+      return 0
+    elif option == '--bucket':
+      buckets.append(value)
+    elif option in ('--latency', '--error_rate'):
+      kwargs[option[2:]] = float(value)
+    else:
+      kwargs[option[2:]] = int(value)
+  server = FakeGcsServer(**kwargs)
+  server.Start()
+  for bucket_name in buckets:
+    server.CreateBucket(bucket_name)
+  sys.stdout.write('Serving the fake GCS JSON API on localhost:%d\n' %
+                   server.port)
+  sys.stdout.flush()
+  try:
+    while True:
+      time.sleep(60)
+  except KeyboardInterrupt:
+    server.Stop()
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
@@ -23,6 +23,7 @@ import json
 import logging
 import socket
 import ssl
+import sys
 import time
 import traceback
 
@@ -55,10 +56,17 @@ from gslib.gcs_json_media import BytesTransferredContainer
 from gslib.gcs_json_media import DownloadCallbackConnectionClassFactory
 from gslib.gcs_json_media import HttpWithDownloadStream
 from gslib.gcs_json_media import HttpWithNoRetries
+from gslib.gcs_json_media import HttpWithPhaseTimes
 from gslib.gcs_json_media import UploadCallbackConnectionClassFactory
 from gslib.gcs_json_media import WrapDownloadHttpRequest
 from gslib.gcs_json_media import WrapUploadHttpRequest
+from gslib.hedged_download import GetHedgeDelay
+from gslib.hedged_download import HedgedDownload
 from gslib.no_op_credentials import NoOpCredentials
+from gslib.pipelined_upload import CanPipelineUpload
+from gslib.pipelined_upload import ChunkSizeTuner
+from gslib.pipelined_upload import GetReadAheadBufferSize
+from gslib.pipelined_upload import PipelinedUploadStream
 from gslib.progress_callback import ProgressCallbackWithTimeout
 from gslib.project_id import PopulateProjectId
 from gslib.third_party.storage_apitools import storage_v1_client as apitools_client
@@ -71,6 +79,7 @@ from gslib.tracker_file import WriteRewriteTrackerFile
 from gslib.utils.boto_util import GetCertsFile
 from gslib.utils.boto_util import GetGcsJsonApiVersion
 from gslib.utils.boto_util import GetJsonResumableChunkSize
+from gslib.utils.boto_util import GetJsonResumableMaxChunkSize
 from gslib.utils.boto_util import GetMaxRetryDelay
 from gslib.utils.boto_util import GetNewHttp
 from gslib.utils.boto_util import GetNumRetries
@@ -83,6 +92,7 @@ from gslib.utils.encryption_helper import CryptoKeyType
 from gslib.utils.encryption_helper import CryptoKeyWrapperFromKey
 from gslib.utils.encryption_helper import FindMatchingCSEKInBotoConfig
 from gslib.utils.metadata_util import AddAcceptEncodingGzipIfNeeded
+from gslib.utils import perf_util
 from gslib.utils.retry_util import LogAndHandleRetries
 from gslib.utils.text_util import GetPrintableExceptionString
 from gslib.utils.translation_helper import CreateBucketNotFoundException
@@ -173,13 +183,20 @@ class GcsJsonApi(CloudApi):
         user_project=user_project)
 
     self.certs_file = GetCertsFile()
-    self.http = GetNewHttp()
+    self.http = GetNewHttp(http_class=HttpWithPhaseTimes)
     SetUpJsonCredentialsAndCache(self, logger, credentials=credentials)
 
     # Re-use download and upload connections. This class is only called
     # sequentially, but we can share TCP warmed-up connections across calls.
     self.download_http = self._GetNewDownloadHttp()
     self.upload_http = self._GetNewUploadHttp()
+    # Uploads keep one connection class in upload_http's connection cache, so
+    # that small uploads don't each pay for a new TCP and TLS handshake.
+    self.upload_connection_factory = UploadCallbackConnectionClassFactory(
+        BytesTransferredContainer(), logger=self.logger, debug=self.debug)
+    upload_http_class = self.upload_connection_factory.GetConnectionClass()
+    self.upload_http.connections['http'] = upload_http_class
+    self.upload_http.connections['https'] = upload_http_class
     if self.credentials:
       self.authorized_download_http = self.credentials.authorize(
           self.download_http)
@@ -241,6 +258,9 @@ class GcsJsonApi(CloudApi):
     self.num_retries = GetNumRetries()
     self.api_client.num_retries = self.num_retries
 
+    self.hedged_download_percentile = config.getint(
+        'GSUtil', 'hedged_download_percentile', 0)
+
     self.api_client.retry_func = LogAndHandleRetries(
         status_queue=self.status_queue)
 
@@ -257,6 +277,14 @@ class GcsJsonApi(CloudApi):
   def _GetNewDownloadHttp(self):
     return GetNewHttp(http_class=HttpWithDownloadStream)
 
+  def _GetNewHedgedDownloadHttp(self):
+    """Returns a new download Http, for sending hedged range requests on."""
+    http = self._GetNewDownloadHttp()
+    if self.credentials:
+      http = self.credentials.authorize(http)
+    WrapDownloadHttpRequest(http)
+    return http
+
   def _GetNewUploadHttp(self):
     """Returns an upload-safe Http object (by disabling httplib2 retries)."""
     return GetNewHttp(http_class=HttpWithNoRetries)
@@ -977,7 +1005,9 @@ class GcsJsonApi(CloudApi):
             compressed_encoding=compressed_encoding,
             generation=generation, start_byte=start_byte, end_byte=end_byte,
             serialization_data=serialization_data,
-            decryption_tuple=decryption_tuple)
+            decryption_tuple=decryption_tuple, digesters=digesters,
+            progress_callback=progress_callback,
+            progress_total_size=outer_total_size)
       else:
         return self._PerformDownload(
             bucket_name, object_name, download_stream, apitools_request,
@@ -985,7 +1015,9 @@ class GcsJsonApi(CloudApi):
             compressed_encoding=compressed_encoding,
             start_byte=start_byte, end_byte=end_byte,
             serialization_data=serialization_data,
-            decryption_tuple=decryption_tuple)
+            decryption_tuple=decryption_tuple, digesters=digesters,
+            progress_callback=progress_callback,
+            progress_total_size=outer_total_size)
     except TRANSLATABLE_APITOOLS_EXCEPTIONS, e:
       self._TranslateExceptionAndRaise(e, bucket_name=bucket_name,
                                        object_name=object_name,
@@ -995,7 +1027,8 @@ class GcsJsonApi(CloudApi):
       self, bucket_name, object_name, download_stream, apitools_request,
       apitools_download, bytes_downloaded_container, generation=None,
       compressed_encoding=False, start_byte=0, end_byte=None,
-      serialization_data=None, decryption_tuple=None):
+      serialization_data=None, decryption_tuple=None, digesters=None,
+      progress_callback=None, progress_total_size=None):
     retries = 0
     last_progress_byte = start_byte
     while retries <= self.num_retries:
@@ -1005,7 +1038,9 @@ class GcsJsonApi(CloudApi):
             apitools_download, generation=generation,
             compressed_encoding=compressed_encoding, start_byte=start_byte,
             end_byte=end_byte, serialization_data=serialization_data,
-            decryption_tuple=decryption_tuple)
+            decryption_tuple=decryption_tuple, digesters=digesters,
+            progress_callback=progress_callback,
+            progress_total_size=progress_total_size)
       except HTTP_TRANSFER_EXCEPTIONS, e:
         self._ValidateHttpAccessTokenRefreshError(e)
         start_byte = download_stream.tell()
@@ -1032,7 +1067,14 @@ class GcsJsonApi(CloudApi):
       self, bucket_name, object_name, download_stream, apitools_request,
       apitools_download, generation=None, compressed_encoding=False,
       start_byte=0, end_byte=None, serialization_data=None,
-      decryption_tuple=None):
+      decryption_tuple=None, digesters=None, progress_callback=None,
+      progress_total_size=None):
+    """Downloads an object's bytes, hedging the request if configured to.
+
+    digesters, progress_callback and progress_total_size are the values the
+    download connection was set up with. They're also applied to the bytes
+    copied from a hedged request if it wins.
+    """
     if not serialization_data:
       try:
         self.api_client.objects.Get(apitools_request,
@@ -1067,14 +1109,61 @@ class GcsJsonApi(CloudApi):
     additional_headers.update(
         self._EncryptionHeadersFromTuple(decryption_tuple))
 
-    if start_byte or end_byte is not None:
-      apitools_download.GetRange(additional_headers=additional_headers,
-                                 start=start_byte, end=end_byte,
-                                 use_chunks=False)
-    else:
-      apitools_download.StreamMedia(
-          callback=_NoOpCallback, finish_callback=_NoOpCallback,
-          additional_headers=additional_headers, use_chunks=False)
+    def _DownloadMedia():
+      if start_byte or end_byte is not None:
+        apitools_download.GetRange(additional_headers=additional_headers,
+                                   start=start_byte, end=end_byte,
+                                   use_chunks=False)
+      else:
+        apitools_download.StreamMedia(
+            callback=_NoOpCallback, finish_callback=_NoOpCallback,
+            additional_headers=additional_headers, use_chunks=False)
+
+    # Byte ranges don't apply to the decompressed bytes of gzip-encoded
+    # objects, so those are never hedged.
+    hedge_end_byte = end_byte
+    if hedge_end_byte is None and apitools_download.total_size:
+      hedge_end_byte = apitools_download.total_size - 1
+    if (self.hedged_download_percentile <= 0 or compressed_encoding or
+        hedge_end_byte is None):
+      _DownloadMedia()
+      return apitools_download.encoding
+
+    def _DownloadHedgedRange(http, hedge_start_byte, hedge_end_byte):
+      hedge_download = apitools_transfer.Download.FromData(
+          http.stream, json.dumps(apitools_download.serialization_data), http,
+          num_retries=0)
+      hedge_download.bytes_http = http
+      hedge_download.retry_func = LogAndHandleRetries(is_data_transfer=True)
+      hedge_download.GetRange(additional_headers=additional_headers,
+                              start=hedge_start_byte, end=hedge_end_byte,
+                              use_chunks=False)
+
+    download_stream = self.download_http.stream
+    hedged_download = HedgedDownload(
+        download_stream, start_byte, hedge_end_byte,
+        GetHedgeDelay(self.hedged_download_percentile), self.download_http,
+        self._GetNewHedgedDownloadHttp, _DownloadHedgedRange, self.logger)
+    self.download_http.stream = hedged_download.stream
+    try:
+      hedged_download.Start()
+      try:
+        _DownloadMedia()
+      except Exception:  # pylint: disable=broad-except
+        exc_info = sys.exc_info()
+        hedged_download.Finish(False)
+        if not hedged_download.WaitForHedge():
+          raise exc_info[0], exc_info[1], exc_info[2]
+        # The primary request's connection was shut down or failed.
+        apitools_http_wrapper.RebuildHttpConnections(
+            apitools_download.bytes_http)
+        hedged_download.CopyHedgedBytes(digesters=digesters,
+                                        progress_callback=progress_callback,
+                                        total_size=progress_total_size)
+      else:
+        hedged_download.Finish(True)
+    finally:
+      self.download_http.stream = download_stream
     return apitools_download.encoding
 
   def PatchObjectMetadata(self, bucket_name, object_name, metadata,
@@ -1153,14 +1242,9 @@ class GcsJsonApi(CloudApi):
       total_size = size
       progress_callback(0, size)
 
-    callback_class_factory = UploadCallbackConnectionClassFactory(
+    self.upload_connection_factory.StartUpload(
         bytes_uploaded_container, total_size=total_size,
-        progress_callback=progress_callback, logger=self.logger,
-        debug=self.debug)
-
-    upload_http_class = callback_class_factory.GetConnectionClass()
-    self.upload_http.connections = {'http': upload_http_class,
-                                    'https': upload_http_class}
+        progress_callback=progress_callback)
 
     # Since bytes_http is created in this function, we don't get the
     # user-agent header from api_client's http automatically.
@@ -1233,7 +1317,40 @@ class GcsJsonApi(CloudApi):
       serialization_data, apitools_strategy, apitools_request, global_params,
       bytes_uploaded_container, tracker_callback, addl_headers,
       progress_callback, gzip_encoded):
+    # If size is known and the request doesn't need to be compressed, we can
+    # send it all in one request and avoid making a round-trip per chunk.
+    # Compression is not supported for non-chunked streaming uploads because
+    # supporting resumability for that feature results in degraded upload
+    # performance and adds significant complexity to the implementation.
+    stream_in_chunks = (gzip_encoded or not size or
+                        JsonResumableChunkSizeDefined())
+    pipelined = (stream_in_chunks and
+                 CanPipelineUpload(upload_stream, size) and
+                 config.getbool('GSUtil', 'resumable_upload_pipelined', True))
+    if pipelined:
+      upload_stream = PipelinedUploadStream(
+          upload_stream, size,
+          GetReadAheadBufferSize(GetJsonResumableChunkSize()))
+    try:
+      return self._PerformResumableUploadRequests(
+          upload_stream, authorized_upload_http, content_type, size,
+          serialization_data, apitools_strategy, apitools_request,
+          global_params, bytes_uploaded_container, tracker_callback,
+          addl_headers, progress_callback, gzip_encoded, stream_in_chunks,
+          pipelined)
+    finally:
+      if pipelined:
+        upload_stream.close()
+
+  def _PerformResumableUploadRequests(
+      self, upload_stream, authorized_upload_http, content_type, size,
+      serialization_data, apitools_strategy, apitools_request, global_params,
+      bytes_uploaded_container, tracker_callback, addl_headers,
+      progress_callback, gzip_encoded, stream_in_chunks, pipelined):
     try:
+      # The request that starts or resumes the upload sends no data, so its
+      # duration approximates the round trip time to the service.
+      request_start_time = time.time()
       if serialization_data:
         # Resuming an existing upload.
         apitools_upload = apitools_transfer.Upload.FromData(
@@ -1254,6 +1371,7 @@ class GcsJsonApi(CloudApi):
               apitools_request,
               upload=apitools_upload,
               global_params=global_params)
+      rtt = time.time() - request_start_time
       # Disable retries in apitools. We will handle them explicitly here.
       apitools_upload.retry_func = LogAndHandleRetries(
           is_data_transfer=True,
@@ -1263,6 +1381,13 @@ class GcsJsonApi(CloudApi):
       def _NoOpCallback(unused_response, unused_upload_object):
         pass
 
+      # Pipelined uploads can seek anywhere in the stream, so they can also
+      # grow their chunks.
+      chunk_size_tuner = None
+      max_chunk_size = GetJsonResumableMaxChunkSize()
+      if pipelined and max_chunk_size > apitools_upload.chunksize:
+        chunk_size_tuner = ChunkSizeTuner(apitools_upload, max_chunk_size, rtt)
+
       # If we're resuming an upload, apitools has at this point received
       # from the server how many bytes it already has. Update our
       # callback class with this information.
@@ -1278,13 +1403,7 @@ class GcsJsonApi(CloudApi):
           # TODO: On retry, this will seek to the bytes that the server has,
           # causing the hash to be recalculated. Make HashingFileUploadWrapper
           # save a digest according to json_resumable_chunk_size.
-          if not gzip_encoded and size and not JsonResumableChunkSizeDefined():
-            # If size is known and the request doesn't need to be compressed,
-            # we can send it all in one request and avoid making a
-            # round-trip per chunk. Compression is not supported for
-            # non-chunked streaming uploads because supporting resumability
-            # for that feature results in degraded upload performance and
-            # adds significant complexity to the implementation.
+          if not stream_in_chunks:
             http_response = apitools_upload.StreamMedia(
                 callback=_NoOpCallback, finish_callback=_NoOpCallback,
                 additional_headers=addl_headers)
@@ -1293,8 +1412,11 @@ class GcsJsonApi(CloudApi):
             # send the bytes in chunks so that we can guarantee that we never
             # need to seek backwards more than our buffer (and also that the
             # chunks are aligned to 256KB).
+            if chunk_size_tuner:
+              chunk_size_tuner.StartChunk()
             http_response = apitools_upload.StreamInChunks(
-                callback=_NoOpCallback, finish_callback=_NoOpCallback,
+                callback=chunk_size_tuner or _NoOpCallback,
+                finish_callback=_NoOpCallback,
                 additional_headers=addl_headers)
           processed_response = self.api_client.objects.ProcessHttpResponse(
               self.api_client.objects.GetMethodConfig('Insert'), http_response)
@@ -1562,8 +1684,9 @@ class GcsJsonApi(CloudApi):
           ifMetagenerationMatch=preconditions.meta_gen_match,
           userProject=self.user_project)
       try:
-        return self.api_client.objects.Compose(apitools_request,
-                                               global_params=global_params)
+        with perf_util.PhaseTimer(perf_util.PHASE_COMPOSE):
+          return self.api_client.objects.Compose(apitools_request,
+                                                 global_params=global_params)
       except TRANSLATABLE_APITOOLS_EXCEPTIONS, e:
         # We can't be sure which object was missing in the 404 case.
         if (isinstance(e, apitools_exceptions.HttpError)
@@ -33,6 +33,7 @@ from gslib.progress_callback import ProgressCallbackWithTimeout
 from gslib.utils.constants import DEBUGLEVEL_DUMP_REQUESTS
 from gslib.utils.constants import SSL_TIMEOUT_SEC
 from gslib.utils.constants import TRANSFER_BUFFER_SIZE
+from gslib.utils import perf_util
 import httplib2
 from httplib2 import parse_uri
 
@@ -69,6 +70,11 @@ class UploadCallbackConnectionClassFactory(object):
   This is used to provide progress callbacks and disable dumping the upload
   payload during debug statements. It can later be used to provide on-the-fly
   hash digestion during upload.
+
+  Connections of the class read the current upload's container, size and
+  progress callback from the factory, so one class can be kept in an
+  httplib2.Http's connection cache and its connections reused by later
+  uploads; StartUpload switches the factory to a new upload.
   """
 
   def __init__(self, bytes_uploaded_container,
@@ -81,35 +87,62 @@ class UploadCallbackConnectionClassFactory(object):
     self.progress_callback = progress_callback
     self.logger = logger
     self.debug = debug
+    # Incremented by StartUpload, so connections can tell when they start
+    # sending a different upload.
+    self.upload_count = 0
+
+  def StartUpload(self, bytes_uploaded_container, total_size=0,
+                  progress_callback=None):
+    """Makes connections of this factory's class report on a new upload."""
+    self.bytes_uploaded_container = bytes_uploaded_container
+    self.total_size = total_size
+    self.progress_callback = progress_callback
+    self.upload_count += 1
 
   def GetConnectionClass(self):
     """Returns a connection class that overrides send."""
-    outer_bytes_uploaded_container = self.bytes_uploaded_container
+    factory = self
     outer_buffer_size = self.buffer_size
-    outer_total_size = self.total_size
-    outer_progress_callback = self.progress_callback
     outer_logger = self.logger
     outer_debug = self.debug
 
     class UploadCallbackConnection(httplib2.HTTPSConnectionWithTimeout):
       """Connection class override for uploads."""
-      bytes_uploaded_container = outer_bytes_uploaded_container
       # After we instantiate this class, apitools will check with the server
       # to find out how many bytes remain for a resumable upload.  This allows
       # us to update our progress once based on that number.
       processed_initial_bytes = False
       GCS_JSON_BUFFER_SIZE = outer_buffer_size
       callback_processor = None
-      size = outer_total_size
       header_encoding = ''
       header_length = None
       header_range = None
       size_modifier = 1.0
+      upload_count = factory.upload_count
 
       def __init__(self, *args, **kwargs):
         kwargs['timeout'] = SSL_TIMEOUT_SEC
         httplib2.HTTPSConnectionWithTimeout.__init__(self, *args, **kwargs)
 
+      @property
+      def bytes_uploaded_container(self):
+        return factory.bytes_uploaded_container
+
+      @property
+      def size(self):
+        return factory.total_size
+
+      def _ResetIfNewUpload(self):
+        """Resets per-upload state when a reused connection starts an upload."""
+        if self.upload_count != factory.upload_count:
+          self.upload_count = factory.upload_count
+          self.processed_initial_bytes = False
+          self.callback_processor = None
+          self.header_encoding = ''
+          self.header_length = None
+          self.header_range = None
+          self.size_modifier = 1.0
+
       # Override httplib.HTTPConnection._send_output for debug logging.
       # Because the distinction between headers and message body occurs
       # only in this httplib function, we can only differentiate them here.
@@ -164,6 +197,7 @@ class UploadCallbackConnectionClassFactory(object):
           header: The header.
           *values: A set of values for the header.
         """
+        self._ResetIfNewUpload()
         if header == 'content-encoding':
           value = ''.join([str(v) for v in values])
           self.header_encoding = value
@@ -215,11 +249,12 @@ class UploadCallbackConnectionClassFactory(object):
           num_metadata_bytes: number of bytes that consist of metadata
               (headers, etc.) not representing the data being uploaded.
         """
+        self._ResetIfNewUpload()
         if not self.processed_initial_bytes:
           self.processed_initial_bytes = True
-          if outer_progress_callback:
+          if factory.progress_callback:
             self.callback_processor = ProgressCallbackWithTimeout(
-                outer_total_size, outer_progress_callback)
+                factory.total_size, factory.progress_callback)
             self.callback_processor.Progress(
                 self.bytes_uploaded_container.bytes_transferred)
         # httplib.HTTPConnection.send accepts either a string or a file-like
@@ -363,8 +398,10 @@ class DownloadCallbackConnectionClassFactory(object):
           if self.callback_processor:
             self.callback_processor.Progress(read_length)
           if self.outer_digesters:
-            for alg in self.outer_digesters:
-              self.outer_digesters[alg].update(data)
+            with perf_util.PhaseTimer(perf_util.PHASE_HASHING,
+                                      num_bytes=read_length):
+              for alg in self.outer_digesters:
+                self.outer_digesters[alg].update(data)
           return data
         orig_response.read = read
 
@@ -508,6 +545,32 @@ def WrapDownloadHttpRequest(download_http):
   return download_http
 
 
+def _GetBodySize(body):
+  """Returns the size of a request body, or 0 if it's a stream."""
+  return len(body) if isinstance(body, basestring) else 0
+
+
+class HttpWithPhaseTimes(httplib2.Http):
+  """httplib2.Http variant that records connection and request times.
+
+  The times are recorded for the report requested with GSUtil:perf_report;
+  requests are otherwise sent exactly as httplib2.Http sends them.
+  """
+
+  def _conn_request(self, conn, request_uri, method, body, headers):
+    if (perf_util.IsEnabled() and hasattr(conn, 'sock') and
+        conn.sock is None):
+      with perf_util.PhaseTimer(perf_util.PHASE_CONNECT):
+        try:
+          conn.connect()
+        except (socket.error, httplib.HTTPException, httplib2.ssl_SSLError):
+          # Leave reporting the failure to httplib2, which connects again.
+          conn.close()
+    with perf_util.PhaseTimer(perf_util.PHASE_REQUEST):
+      return super(HttpWithPhaseTimes, self)._conn_request(
+          conn, request_uri, method, body, headers)
+
+
 class HttpWithNoRetries(httplib2.Http):
   """httplib2.Http variant that does not retry.
 
@@ -526,8 +589,11 @@ class HttpWithNoRetries(httplib2.Http):
 
     try:
       if hasattr(conn, 'sock') and conn.sock is None:
-        conn.connect()
-      conn.request(method, request_uri, body, headers)
+        with perf_util.PhaseTimer(perf_util.PHASE_CONNECT):
+          conn.connect()
+      with perf_util.PhaseTimer(perf_util.PHASE_BODY_TRANSFER,
+                                num_bytes=_GetBodySize(body)):
+        conn.request(method, request_uri, body, headers)
     except socket.timeout:
       raise
     except socket.gaierror:
@@ -549,7 +615,8 @@ class HttpWithNoRetries(httplib2.Http):
       conn.close()
       raise
     try:
-      response = conn.getresponse()
+      with perf_util.PhaseTimer(perf_util.PHASE_REQUEST):
+        response = conn.getresponse()
     except (socket.error, httplib.HTTPException):
       conn.close()
       raise
@@ -596,8 +663,11 @@ class HttpWithDownloadStream(httplib2.Http):
   def _conn_request(self, conn, request_uri, method, body, headers):
     try:
       if hasattr(conn, 'sock') and conn.sock is None:
-        conn.connect()
-      conn.request(method, request_uri, body, headers)
+        with perf_util.PhaseTimer(perf_util.PHASE_CONNECT):
+          conn.connect()
+      with perf_util.PhaseTimer(perf_util.PHASE_BODY_TRANSFER,
+                                num_bytes=_GetBodySize(body)):
+        conn.request(method, request_uri, body, headers)
     except socket.timeout:
       raise
     except socket.gaierror:
@@ -621,7 +691,8 @@ class HttpWithDownloadStream(httplib2.Http):
       conn.close()
       raise
     try:
-      response = conn.getresponse()
+      with perf_util.PhaseTimer(perf_util.PHASE_REQUEST):
+        response = conn.getresponse()
     except (socket.error, httplib.HTTPException):
       conn.close()
       raise
@@ -637,16 +708,25 @@ class HttpWithDownloadStream(httplib2.Http):
           content_length = response.getheader('content-length')
         http_stream = response
         bytes_read = 0
-        while True:
-          new_data = http_stream.read(TRANSFER_BUFFER_SIZE)
-          if new_data:
-            if self.stream is None:
-              raise apitools_exceptions.InvalidUserInputError(
-                  'Cannot exercise HttpWithDownloadStream with no stream')
-            self.stream.write(new_data)
-            bytes_read += len(new_data)
-          else:
-            break
+        with perf_util.PhaseTimer(perf_util.PHASE_BODY_TRANSFER) as timer:
+          while True:
+            new_data = http_stream.read(TRANSFER_BUFFER_SIZE)
+            if new_data:
+              if self.stream is None:
+                raise apitools_exceptions.InvalidUserInputError(
+                    'Cannot exercise HttpWithDownloadStream with no stream')
+              try:
+                self.stream.write(new_data)
+              except:  # pylint: disable=bare-except
+                # The stream may stop a download early (for example, when a
+                # sliced download's range is taken over by another stream), so
+                # don't leave the rest of the response on the connection.
+                conn.close()
+                raise
+              bytes_read += len(new_data)
+            else:
+              break
+          timer.num_bytes = bytes_read
 
         if (content_length is not None and
             long(bytes_read) != long(content_length)):
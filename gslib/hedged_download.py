@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Hedged range requests for downloads.
+
+When hedging is enabled, a download that makes no progress for longer than a
+percentile of the stalls seen by recent downloads in this process gets a
+second request for the rest of its range, sent on a new connection. Whichever
+request finishes first wins and the other one is cancelled by shutting down
+its sockets. The hedge's bytes are buffered, and are only copied into the
+download stream (and through its digesters) if the hedge wins.
+"""
+
+from __future__ import absolute_import
+
+import collections
+import httplib
+import math
+import socket
+import tempfile
+import threading
+import time
+
+from gslib.progress_callback import ProgressCallbackWithTimeout
+from gslib.utils import parallelism_framework_util
+from gslib.utils.constants import TRANSFER_BUFFER_SIZE
+from gslib.utils.parallelism_framework_util import AtomicDict
+from gslib.utils.parallelism_framework_util import CheckMultiprocessingAvailableAndInit
+from gslib.utils.unit_util import ONE_MIB
+
+# Hedge delay used until enough stalls have been recorded to compute one.
+DEFAULT_HEDGE_DELAY = 2.0
+
+# Hedge delays are never shorter than this, so that a burst of fast downloads
+# can't make every request hedge.
+MIN_HEDGE_DELAY = 0.1
+
+# Number of stalls that must be recorded before the percentile is used.
+MIN_STALL_SAMPLES = 10
+
+# Number of recent stalls the percentile is computed over.
+MAX_STALL_SAMPLES = 100
+
+# Remaining ranges larger than this aren't hedged, as the duplicate request
+# would cost more than waiting for the stalled one.
+MAX_HEDGED_RANGE_SIZE = 32 * ONE_MIB
+
+# Hedged bytes are held in memory up to this size, then spill to a temp file.
+MAX_HEDGE_BUFFER_MEMORY = 8 * ONE_MIB
+
+# Counts of hedged requests issued and won, across all processes.
+global hedged_download_counters
+hedged_download_counters = AtomicDict(
+    manager=(
+        parallelism_framework_util.top_level_manager
+        if CheckMultiprocessingAvailableAndInit().is_available else None))
+
+HedgedDownloadCounts = collections.namedtuple('HedgedDownloadCounts',
+                                              'issued won')
+
+_stall_samples = collections.deque(maxlen=MAX_STALL_SAMPLES)
+_stall_samples_lock = threading.Lock()
+
+
+def GetHedgedDownloadCounts():
+  """Returns the HedgedDownloadCounts for this gsutil invocation."""
+  return HedgedDownloadCounts(hedged_download_counters.get('issued', 0),
+                              hedged_download_counters.get('won', 0))
+
+
+def RecordDownloadStall(seconds):
+  """Records the longest time a download request went without progress."""
+  with _stall_samples_lock:
+    _stall_samples.append(seconds)
+
+
+def GetHedgeDelay(percentile):
+  """Returns how long a download may go without progress before hedging.
+
+  Args:
+    percentile: Percentile (0-100] of recently recorded stalls to hedge at.
+
+  Returns:
+    Delay in seconds.
+  """
+  with _stall_samples_lock:
+    samples = sorted(_stall_samples)
+  if len(samples) < MIN_STALL_SAMPLES:
+    return DEFAULT_HEDGE_DELAY
+  index = int(math.ceil(min(percentile, 100) / 100.0 * len(samples))) - 1
+  return max(samples[max(index, 0)], MIN_HEDGE_DELAY)
+
+
+def ShutDownConnections(http):
+  """Aborts any requests in flight on http's connections.
+
+  This may be called from a thread other than the one making the requests;
+  blocked reads on the connections fail once their sockets are shut down.
+
+  Args:
+    http: httplib2.Http whose connections should be shut down.
+  """
+  for conn in http.connections.values():
+    # gsutil also keeps connection classes in this dict; skip those.
+    if isinstance(conn, httplib.HTTPConnection) and conn.sock:
+      try:
+        conn.sock.shutdown(socket.SHUT_RDWR)
+      except socket.error:
+        pass
+
+
+class HedgedDownloadCancelledException(Exception):
+  """Raised by the primary request's stream when a hedged request has won."""
+
+
+class _ProgressTrackingStream(object):
+  """Wraps a download stream to track the primary request's progress."""
+
+  def __init__(self, stream, start_byte):
+    self._stream = stream
+    self.position = start_byte
+    self.last_progress_time = time.time()
+    self.longest_stall = 0
+    self.cancelled = False
+
+  def write(self, data):  # pylint: disable=invalid-name
+    now = time.time()
+    self.longest_stall = max(self.longest_stall, now - self.last_progress_time)
+    self.last_progress_time = now
+    self._stream.write(data)
+    self.position += len(data)
+    # Digesters have already seen data by the time it's written, so it's
+    # written before giving up to keep the stream and digesters in step.
+    if self.cancelled:
+      raise HedgedDownloadCancelledException()
+
+  def __getattr__(self, name):
+    return getattr(self._stream, name)
+
+
+class HedgedDownload(object):
+  """Races a hedged request against a stalled download request.
+
+  Usage: wrap the primary request in Start() and Finish(), sending its bytes
+  to self.stream. If the primary request fails, call WaitForHedge() and, if
+  it returns True, CopyHedgedBytes() to complete the download from the hedge.
+  """
+
+  def __init__(self, download_stream, start_byte, end_byte, hedge_delay,
+               primary_http, new_http_func, hedge_func, logger):
+    """Initializes the hedged download.
+
+    Args:
+      download_stream: Stream the download is written to.
+      start_byte: First byte the primary request writes to download_stream.
+      end_byte: Last byte of the download.
+      hedge_delay: Seconds without progress after which to send the hedge.
+      primary_http: httplib2.Http the primary request is sent on.
+      new_http_func: Function returning a new httplib2.Http with a stream
+          property, to send the hedge on.
+      hedge_func: Function of (http, start_byte, end_byte) that downloads the
+          given range into http.stream.
+      logger: logging.Logger for debug messages.
+    """
+    self.stream = _ProgressTrackingStream(download_stream, start_byte)
+    self._download_stream = download_stream
+    self._end_byte = end_byte
+    self._hedge_delay = hedge_delay
+    self._primary_http = primary_http
+    self._new_http_func = new_http_func
+    self._hedge_func = hedge_func
+    self._logger = logger
+    self._cond = threading.Condition()
+    self._primary_done = False
+    self._primary_succeeded = False
+    self._hedge_http = None
+    self._hedge_buffer = None
+    self._hedge_start_byte = None
+    self._hedge_done = False
+    self._hedge_succeeded = False
+    self._thread = None
+
+  def Start(self):
+    self.stream.last_progress_time = time.time()
+    self._thread = threading.Thread(target=self._WatchPrimary)
+    self._thread.daemon = True
+    self._thread.start()
+
+  def Finish(self, primary_succeeded):
+    """Stops hedging once the primary request is over.
+
+    Args:
+      primary_succeeded: Whether the primary request completed the download.
+    """
+    with self._cond:
+      self._primary_done = True
+      self._primary_succeeded = primary_succeeded
+      self._cond.notify_all()
+      if not primary_succeeded:
+        return
+      RecordDownloadStall(self.stream.longest_stall)
+      if self._hedge_start_byte is None:
+        return
+      if self._hedge_done:
+        if self._hedge_succeeded:
+          self._hedge_buffer.close()
+      else:
+        ShutDownConnections(self._hedge_http)
+
+  def WaitForHedge(self):
+    """Waits for a hedge in flight; returns True if it fetched the range."""
+    with self._cond:
+      while self._hedge_start_byte is not None and not self._hedge_done:
+        self._cond.wait()
+      return self._hedge_succeeded
+
+  def CopyHedgedBytes(self, digesters=None, progress_callback=None,
+                      total_size=None):
+    """Completes the download with the bytes fetched by the hedge.
+
+    Only the bytes the primary request hadn't written yet are copied.
+
+    Args:
+      digesters: Digesters to update with the copied bytes.
+      progress_callback: Progress callback for the copied bytes.
+      total_size: Total size for progress_callback.
+    """
+    hedged_download_counters.Increment('won', 1)
+    callback_processor = None
+    if progress_callback:
+      callback_processor = ProgressCallbackWithTimeout(total_size,
+                                                       progress_callback)
+      callback_processor.Progress(self.stream.position)
+    try:
+      self._hedge_buffer.seek(self.stream.position - self._hedge_start_byte)
+      while True:
+        data = self._hedge_buffer.read(TRANSFER_BUFFER_SIZE)
+        if not data:
+          break
+        if digesters:
+          for alg in digesters:
+            digesters[alg].update(data)
+        self._download_stream.write(data)
+        if callback_processor:
+          callback_processor.Progress(len(data))
+    finally:
+      self._hedge_buffer.close()
+
+  def _WatchPrimary(self):
+    """Sends the hedge if the primary request stalls for too long."""
+    with self._cond:
+      while not self._primary_done:
+        wait_time = (self.stream.last_progress_time + self._hedge_delay -
+                     time.time())
+        if wait_time <= 0:
+          break
+        self._cond.wait(wait_time)
+      if self._primary_done:
+        return
+      start_byte = self.stream.position
+      if self._end_byte - start_byte + 1 > MAX_HEDGED_RANGE_SIZE:
+        return
+      self._hedge_start_byte = start_byte
+      self._hedge_http = self._new_http_func()
+      self._hedge_buffer = tempfile.SpooledTemporaryFile(
+          max_size=MAX_HEDGE_BUFFER_MEMORY)
+      self._hedge_http.stream = self._hedge_buffer
+
+    hedged_download_counters.Increment('issued', 1)
+    self._logger.debug(
+        'Download made no progress for %.2f seconds; sending a hedged request '
+        'for bytes %d-%d.', self._hedge_delay, start_byte, self._end_byte)
+    succeeded = False
+    try:
+      self._hedge_func(self._hedge_http, start_byte, self._end_byte)
+      # A server that ignores the range would return the wrong bytes.
+      succeeded = (self._hedge_buffer.tell() ==
+                   self._end_byte - start_byte + 1)
+    except Exception, e:  # pylint: disable=broad-except
+      self._logger.debug('Hedged request failed: %s', e)
+
+    with self._cond:
+      self._hedge_done = True
+      self._hedge_succeeded = succeeded
+      if not succeeded or self._primary_succeeded:
+        self._hedge_buffer.close()
+      elif not self._primary_done:
+        self.stream.cancelled = True
+        ShutDownConnections(self._primary_http)
+      self._cond.notify_all()
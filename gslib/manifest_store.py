@@ -0,0 +1,425 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Reading and writing cp -L manifest files.
+
+A manifest is always a CSV file with the columns in MANIFEST_HEADER. The
+GSUtil:manifest_store option selects how gsutil looks up which sources an
+earlier run already copied:
+
+  csv:    The successful sources are read into memory when the command
+          starts (the default).
+  sqlite: The successful sources are kept in a SQLite index in the tracker
+          directory and looked up one at a time. The index records how far
+          into the manifest it is up to date, so resuming a job only reads
+          the rows appended since the index was last updated.
+
+With both, each process appends rows through a single ManifestWriter thread.
+"""
+
+from __future__ import absolute_import
+
+import csv
+import cStringIO
+import hashlib
+import itertools
+import logging
+import os
+import threading
+
+from boto import config
+from gslib.utils.constants import UTF8
+
+try:
+  # pylint: disable=g-import-not-at-top
+  import sqlite3
+except ImportError:
+  sqlite3 = None
+
+
+class ManifestStoreType(object):
+  CSV = 'csv'
+  SQLITE = 'sqlite'
+
+
+MANIFEST_HEADER = ['Source', 'Destination', 'Start', 'End', 'Md5', 'UploadId',
+                   'Source Size', 'Bytes Transferred', 'Result', 'Description']
+
+# Rows with these results aren't copied again.
+SUCCESSFUL_RESULTS = ('OK', 'skip')
+
+# Number of index rows inserted per statement while indexing a manifest.
+_INDEX_BATCH_SIZE = 10000
+
+# Number of bytes at the start of the indexed part of a manifest, and at its
+# end, that identify the manifest (see _GetManifestFingerprint).
+_FINGERPRINT_SIZE = 4096
+
+# This process's manifest indexes and writers. ManifestIndex objects reopen
+# their connection after a fork, but writer threads have to be restarted.
+_manifest_indexes = {}
+_manifest_indexes_lock = threading.Lock()
+_manifest_writers = {}
+_manifest_writers_lock = threading.Lock()
+
+
+class MissingManifestHeadersError(Exception):
+  """Raised when a manifest file doesn't start with its column names."""
+
+
+def GetManifestStoreType():
+  """Returns the ManifestStoreType configured for this gsutil invocation."""
+  store_type = config.get('GSUtil', 'manifest_store', ManifestStoreType.CSV)
+  if store_type == ManifestStoreType.SQLITE and not sqlite3:
+    logging.getLogger().warn(
+        'The sqlite3 module is not available; reading manifest files into '
+        'memory instead.')
+    return ManifestStoreType.CSV
+  return store_type
+
+
+def GetManifestIndexPath(manifest_path):
+  """Returns the path of the SQLite index for manifest_path."""
+  # Imported here to avoid a circular import.
+  # pylint: disable=g-import-not-at-top
+  from gslib.tracker_file import CreateTrackerDirIfNeeded
+  real_path = os.path.realpath(manifest_path)
+  if isinstance(real_path, unicode):
+    real_path = real_path.encode(UTF8)
+  return os.path.join(CreateTrackerDirIfNeeded(), 'MANIFEST_INDEX_%s.db' %
+                      hashlib.sha1(real_path).hexdigest())
+
+
+def IterSuccessfulSources(manifest_path, offset=0):
+  """Yields the source of each successful row of a manifest file.
+
+  Rows are read as they're yielded, so the file is never held in memory.
+
+  Args:
+    manifest_path: Path of the manifest file.
+    offset: Byte offset of the first row to read. The column names are
+        always read from the start of the file.
+
+  Yields:
+    Source URL strings, in the order their rows appear in the file.
+
+  Raises:
+    IOError: if the file can't be read.
+    MissingManifestHeadersError: if the file doesn't start with column names.
+  """
+  with open(manifest_path, 'rb') as f:
+    reader = csv.reader(f)
+    header = next(reader, None)
+    if header is None:
+      return
+    try:
+      source_index = header.index('Source')
+      result_index = header.index('Result')
+    except ValueError:
+      raise MissingManifestHeadersError()
+    if offset:
+      f.seek(offset)
+      reader = csv.reader(f)
+    min_row_length = max(source_index, result_index) + 1
+    for row in reader:
+      # A row may be incomplete if gsutil was killed while writing it.
+      if len(row) >= min_row_length and row[result_index] in SUCCESSFUL_RESULTS:
+        yield row[source_index]
+
+
+def WriteManifestHeaderIfNeeded(manifest_path):
+  """Creates manifest_path with the column names if it's missing or empty."""
+  if (not os.path.exists(manifest_path) or
+      os.stat(manifest_path).st_size == 0):
+    with open(manifest_path, 'wb', 1) as f:
+      csv.writer(f).writerow(MANIFEST_HEADER)
+
+
+def _GetManifestFingerprint(manifest_path, offset):
+  """Returns a fingerprint of the first offset bytes of a manifest.
+
+  The fingerprint covers the first and last _FINGERPRINT_SIZE bytes before
+  offset, which identify the manifest without reading all of it: appending
+  rows doesn't change them, but replacing the manifest does.
+
+  Args:
+    manifest_path: Path of the manifest file.
+    offset: Number of bytes of the manifest to fingerprint.
+
+  Returns:
+    The fingerprint, as an integer that fits in a SQLite INTEGER.
+  """
+  digest = hashlib.sha1()
+  with open(manifest_path, 'rb') as f:
+    digest.update(f.read(min(offset, _FINGERPRINT_SIZE)))
+    tail_start = max(_FINGERPRINT_SIZE, offset - _FINGERPRINT_SIZE)
+    if tail_start < offset:
+      f.seek(tail_start)
+      digest.update(f.read(offset - tail_start))
+  return int(digest.hexdigest()[:15], 16)
+
+
+class ManifestIndex(object):
+  """A SQLite index of the successful sources in a manifest file.
+
+  Besides the sources, the index stores the manifest's inode, the offset up
+  to which it has indexed the manifest, and a fingerprint of the manifest's
+  contents up to that offset. Update reads the rows past that offset, or the
+  whole file if it has been replaced or truncated. Since a replacement may
+  reuse the inode and be at least as large, the fingerprint is what tells
+  it apart. Each process uses its own connection. Errors are reported as
+  IOError.
+  """
+
+  def __init__(self, manifest_path, db_path):
+    self._manifest_path = manifest_path
+    self._db_path = db_path
+    self._lock = threading.Lock()
+    self._pid = None
+    self._conn = None
+
+  def _GetConnection(self):
+    """Returns this process's connection, opening it if needed."""
+    if self._pid != os.getpid():
+      # Forked processes don't share the parent's connection.
+      self._pid = os.getpid()
+      self._conn = None
+    if self._conn is None:
+      conn = sqlite3.connect(self._db_path, timeout=60,
+                             check_same_thread=False)
+      conn.execute('PRAGMA journal_mode=WAL')
+      conn.execute('PRAGMA synchronous=NORMAL')
+      with conn:
+        conn.execute('CREATE TABLE IF NOT EXISTS sources ('
+                     'source TEXT PRIMARY KEY)')
+        conn.execute('CREATE TABLE IF NOT EXISTS state ('
+                     'name TEXT PRIMARY KEY, value INTEGER)')
+      self._conn = conn
+    return self._conn
+
+  def _Call(self, func, *args):
+    """Calls func with the lock held, reporting database errors as IOError."""
+    with self._lock:
+      try:
+        return func(*args)
+      except sqlite3.Error as e:
+        raise IOError(None, 'Manifest index %s: %s' % (self._db_path, e))
+
+  def _GetState(self, conn):
+    state = dict(conn.execute('SELECT name, value FROM state').fetchall())
+    return (state.get('inode'), state.get('offset', 0),
+            state.get('fingerprint'))
+
+  def _SetState(self, conn, inode, offset):
+    fingerprint = _GetManifestFingerprint(self._manifest_path, offset)
+    conn.executemany('INSERT OR REPLACE INTO state VALUES (?, ?)',
+                     (('inode', inode), ('offset', offset),
+                      ('fingerprint', fingerprint)))
+
+  def Update(self):
+    """Indexes the rows appended to the manifest since the last update.
+
+    Raises:
+      IOError: if the manifest or the index can't be read or written.
+      MissingManifestHeadersError: if the manifest has no column names.
+    """
+    self._Call(self._Update)
+
+  def _Update(self):
+    manifest_stat = os.stat(self._manifest_path)
+    with self._GetConnection() as conn:
+      inode, offset, fingerprint = self._GetState(conn)
+      if (inode != manifest_stat.st_ino or offset > manifest_stat.st_size or
+          fingerprint != _GetManifestFingerprint(self._manifest_path, offset)):
+        # This isn't the manifest that was indexed.
+        conn.execute('DELETE FROM sources')
+        offset = 0
+      if offset < manifest_stat.st_size:
+        sources = IterSuccessfulSources(self._manifest_path, offset)
+        while True:
+          batch = [(_DecodeSource(source),) for source in
+                   itertools.islice(sources, _INDEX_BATCH_SIZE)]
+          if not batch:
+            break
+          conn.executemany('INSERT OR IGNORE INTO sources VALUES (?)', batch)
+      self._SetState(conn, manifest_stat.st_ino, manifest_stat.st_size)
+
+  def Contains(self, source):
+    """Returns whether source has a successful row in the manifest."""
+    return self._Call(self._Contains, _DecodeSource(source))
+
+  def _Contains(self, source):
+    row = self._GetConnection().execute(
+        'SELECT 1 FROM sources WHERE source = ?', (source,)).fetchone()
+    return row is not None
+
+  def AddRows(self, sources, inode, start_offset, end_offset):
+    """Indexes rows that were just appended to the manifest.
+
+    Args:
+      sources: Sources of the successful rows that were appended.
+      inode: Inode of the manifest file.
+      start_offset: Size of the manifest before the rows were appended.
+      end_offset: Size of the manifest after the rows were appended.
+    """
+    self._Call(self._AddRows, [(_DecodeSource(source),) for source in sources],
+               inode, start_offset, end_offset)
+
+  def _AddRows(self, sources, inode, start_offset, end_offset):
+    with self._GetConnection() as conn:
+      conn.executemany('INSERT OR IGNORE INTO sources VALUES (?)', sources)
+      if self._GetState(conn)[:2] == (inode, start_offset):
+        # Otherwise something else appended to the manifest, and the next
+        # Update reads those rows.
+        self._SetState(conn, inode, end_offset)
+
+
+class ManifestWriter(object):
+  """Appends rows to a manifest file from a dedicated thread.
+
+  Write queues a row and waits until it has been written. The writer thread
+  writes all of the rows queued while it was writing the previous ones with a
+  single append, taking the lock shared by gsutil's processes once per batch.
+  """
+
+  def __init__(self, manifest_path, lock, index=None):
+    """Initializes the writer.
+
+    Args:
+      manifest_path: Path of the manifest file.
+      lock: Lock shared by the processes that write to the manifest.
+      index: ManifestIndex to add successful rows to, if any.
+    """
+    self._manifest_path = manifest_path
+    self._lock = lock
+    self._index = index
+    self._manifest_file = None
+    self._cond = threading.Condition()
+    self._pending = []
+    self._thread = threading.Thread(target=self._Run)
+    self._thread.daemon = True
+    self._thread.start()
+
+  def Write(self, row, successful):
+    """Appends row to the manifest, returning once it's written.
+
+    Args:
+      row: List of the row's column values, as strings.
+      successful: Whether the row's result is in SUCCESSFUL_RESULTS.
+
+    Raises:
+      IOError: if the row couldn't be written.
+    """
+    pending_row = _PendingRow(row, successful)
+    with self._cond:
+      self._pending.append(pending_row)
+      self._cond.notify_all()
+      while not pending_row.done:
+        self._cond.wait()
+    if pending_row.error:
+      raise pending_row.error
+
+  def _Run(self):
+    while True:
+      with self._cond:
+        while not self._pending:
+          self._cond.wait()
+        batch, self._pending = self._pending, []
+      error = None
+      try:
+        self._WriteBatch(batch)
+      except Exception as e:  # pylint: disable=broad-except
+        error = e if isinstance(e, IOError) else IOError(None, str(e))
+      with self._cond:
+        for pending_row in batch:
+          pending_row.error = error
+          pending_row.done = True
+        self._cond.notify_all()
+
+  def _WriteBatch(self, batch):
+    rows_buffer = cStringIO.StringIO()
+    csv.writer(rows_buffer).writerows(pending_row.row for pending_row in batch)
+    data = rows_buffer.getvalue()
+    # Prevent multiple processes writing to the same file at the same time.
+    # This would cause a garbled mess in the manifest file.
+    with self._lock:
+      if self._manifest_file is None:
+        self._manifest_file = open(self._manifest_path, 'a')
+      manifest_stat = os.fstat(self._manifest_file.fileno())
+      self._manifest_file.write(data)
+      self._manifest_file.flush()
+      if self._index:
+        self._index.AddRows(
+            [pending_row.row[0] for pending_row in batch
+             if pending_row.successful],
+            manifest_stat.st_ino, manifest_stat.st_size,
+            manifest_stat.st_size + len(data))
+
+
+class _PendingRow(object):
+  """A row waiting for ManifestWriter's thread to write it."""
+
+  def __init__(self, row, successful):
+    self.row = row
+    self.successful = successful
+    self.done = False
+    self.error = None
+
+
+def GetManifestIndex(manifest_path, db_path):
+  """Returns this process's ManifestIndex for manifest_path.
+
+  Manifests are pickled along with their command to reach worker processes, so
+  they refer to their index by path, and each process opens its own.
+
+  Args:
+    manifest_path: Path of the manifest file.
+    db_path: Path of the index database.
+
+  Returns:
+    The ManifestIndex.
+  """
+  with _manifest_indexes_lock:
+    key = (manifest_path, db_path)
+    if key not in _manifest_indexes:
+      _manifest_indexes[key] = ManifestIndex(manifest_path, db_path)
+    return _manifest_indexes[key]
+
+
+def GetManifestWriter(manifest_path, lock, index_path=None):
+  """Returns this process's ManifestWriter for manifest_path.
+
+  Args:
+    manifest_path: Path of the manifest file.
+    lock: Lock shared by the processes that write to the manifest.
+    index_path: Path of the manifest's index database, if it has one.
+
+  Returns:
+    The ManifestWriter, started if it wasn't already.
+  """
+  index = GetManifestIndex(manifest_path, index_path) if index_path else None
+  with _manifest_writers_lock:
+    key = (manifest_path, index_path)
+    writer, pid = _manifest_writers.get(key, (None, None))
+    if pid != os.getpid():
+      # Forked processes don't inherit the parent's writer thread.
+      writer = ManifestWriter(manifest_path, lock, index=index)
+      _manifest_writers[key] = (writer, os.getpid())
+    return writer
+
+
+def _DecodeSource(source):
+  if isinstance(source, unicode):
+    return source
+  return source.decode(UTF8)
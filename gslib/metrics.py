@@ -512,6 +512,8 @@ class MetricsCollector(object):
         - provider_types: A list of additional provider types used.
         - file_message: A FileMessage used to calculate thread throughput and
                         number of objects transferred in the non-parallel case.
+        - finished_files_message: A FinishedFilesMessage used like
+                                  file_message, for the files it counts.
     """
     if self.GetGAParam('Command Name') not in ('cp', 'rsync'):
       return
@@ -524,6 +526,9 @@ class MetricsCollector(object):
     if 'file_message' in params:
       self._ProcessFileMessage(file_message=params['file_message'])
       return
+    if 'finished_files_message' in params:
+      self._ProcessFinishedFilesMessage(params['finished_files_message'])
+      return
 
     for param_name, param in params.iteritems():
       # These parameters start in 0 or False state and can be updated to a
@@ -567,6 +572,9 @@ class MetricsCollector(object):
     thread_info = (self.perf_sum_params.thread_throughputs[(
         file_message.process_id, file_message.thread_id)])
     if file_message.finished:
+      if file_message.start_time is not None:
+        # The start of this file wasn't reported in a message of its own.
+        thread_info.LogTaskStart(file_message.start_time, file_message.size)
       # If this operation doesn't use parallelism, we manually update the
       # number of objects transferred rather than relying on
       # ProducerThreadMessages.
@@ -577,6 +585,22 @@ class MetricsCollector(object):
     else:
       thread_info.LogTaskStart(file_message.time, file_message.size)
 
+  def _ProcessFinishedFilesMessage(self, finished_files_message):
+    """Processes FinishedFilesMessages for thread throughput calculations.
+
+    Args:
+      finished_files_message: The FinishedFilesMessage to process.
+    """
+    for thread_id, (bytes_transferred, elapsed_time) in (
+        finished_files_message.thread_totals.iteritems()):
+      thread_info = (self.perf_sum_params.thread_throughputs[(
+          finished_files_message.process_id, thread_id)])
+      thread_info.total_bytes_transferred += bytes_transferred
+      thread_info.total_elapsed_time += elapsed_time
+    if not (self.perf_sum_params.uses_slice or self.perf_sum_params.uses_fan):
+      self.perf_sum_params.num_objects_transferred += (
+          finished_files_message.num_files)
+
   def _CollectCommandAndErrorMetrics(self):
     """Aggregates command and error info and adds them to the metrics list."""
     # Collect the command metric, including the number of retryable errors.
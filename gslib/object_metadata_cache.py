@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Per-process cache of object metadata returned by listings.
+
+Commands such as cp, rsync, stat, setmeta and rewrite often list objects (e.g.,
+to expand wildcards) and then fetch the metadata of each listed object again
+with GetObjectMetadata. CloudApiDelegator records the metadata returned by
+listings here, keyed by (provider, bucket, object, generation), and answers
+later GetObjectMetadata calls from it when the cached entry contains all of the
+requested fields.
+
+Entries expire after a configurable TTL, and the delegator invalidates an
+object's entries before and after it writes or deletes the object. The cache is shared
+by all threads in a process; it is not shared across processes.
+"""
+
+from __future__ import absolute_import
+
+import collections
+import re
+import threading
+import time
+
+from apitools.base.py import encoding
+from boto import config
+
+from gslib.cloud_api import CloudApi
+from gslib.utils.cloud_api_helper import ListToGetFields
+
+# Default number of seconds for which cached metadata is used. A value of 0
+# disables the cache.
+DEFAULT_METADATA_CACHE_TTL = 60
+
+# Default maximum number of cached entries; the least recently added entries
+# are evicted first.
+DEFAULT_METADATA_CACHE_MAX_ENTRIES = 100000
+
+# Only plain top-level fields can be merged; partial field specifications
+# such as "metadata/foo" or "owner(entity)" are not cached.
+_SIMPLE_FIELD_REGEX = re.compile(r'^\w+$')
+
+ObjectMetadataCacheStats = collections.namedtuple(
+    'ObjectMetadataCacheStats', 'hits misses')
+
+
+class _CacheEntry(object):
+  """Cached metadata for a single object generation."""
+
+  def __init__(self, metadata, fields, timestamp):
+    self.metadata = metadata
+    self.fields = fields
+    self.timestamp = timestamp
+
+
+def _GetCacheableFields(fields):
+  """Returns the set of fields to cache for a request, or None.
+
+  Args:
+    fields: GetObjectMetadata-format fields of the request.
+
+  Returns:
+    Set of field names, or None if the fields can't be cached (no explicit
+    fields, or partial field specifications).
+  """
+  if not fields:
+    return None
+  fields = set(fields)
+  if not all(_SIMPLE_FIELD_REGEX.match(field) for field in fields):
+    return None
+  return fields
+
+
+class ObjectMetadataCache(object):
+  """Thread-safe cache of object metadata keyed by object generation."""
+
+  def __init__(self, ttl=None, max_entries=None):
+    """Instantiates an ObjectMetadataCache.
+
+    Args:
+      ttl: Seconds for which entries are valid. Defaults to the
+          GSUtil:metadata_cache_ttl config value.
+      max_entries: Maximum number of cached object generations. Defaults to
+          the GSUtil:metadata_cache_max_entries config value.
+    """
+    self.ttl = (config.getint('GSUtil', 'metadata_cache_ttl',
+                              DEFAULT_METADATA_CACHE_TTL)
+                if ttl is None else ttl)
+    self.max_entries = (
+        config.getint('GSUtil', 'metadata_cache_max_entries',
+                      DEFAULT_METADATA_CACHE_MAX_ENTRIES)
+        if max_entries is None else max_entries)
+    self._lock = threading.Lock()
+    # Maps (provider, bucket, object, generation) to _CacheEntry.
+    self._entries = collections.OrderedDict()
+    # Maps (provider, bucket, object) to the set of its cached generations.
+    self._generations = collections.defaultdict(set)
+    # Maps (provider, bucket, object) to the live generation, as reported by
+    # the most recent non-versioned listing.
+    self._live_generations = {}
+    self.hits = 0
+    self.misses = 0
+
+  @property
+  def enabled(self):
+    return self.ttl > 0 and self.max_entries > 0
+
+  def _IsExpired(self, entry, now):
+    return now - entry.timestamp > self.ttl
+
+  def AddObject(self, provider, bucket_name, obj, fields, is_live=False):
+    """Records metadata for an object.
+
+    Args:
+      provider: Cloud provider of the object.
+      bucket_name: Bucket containing the object.
+      obj: apitools Object, as returned by the API.
+      fields: GetObjectMetadata-format fields that were requested for obj.
+      is_live: True if obj is known to be the live generation of the object.
+    """
+    fields = _GetCacheableFields(fields)
+    if (not self.enabled or fields is None or not obj.name or
+        not obj.generation or 'generation' not in fields):
+      return
+    # Listings don't return the hashes of objects encrypted with a
+    # customer-supplied key, so leave those to GetObjectMetadata.
+    if obj.customerEncryption:
+      return
+    object_key = (provider, bucket_name, obj.name)
+    key = object_key + (long(obj.generation),)
+    now = time.time()
+    with self._lock:
+      entry = self._entries.pop(key, None)
+      # Field subsets are only merged if they are known to describe the same
+      # metageneration; otherwise the new fields replace the entry.
+      if (entry and not self._IsExpired(entry, now) and
+          obj.metageneration is not None and
+          entry.metadata.metageneration == obj.metageneration):
+        for field in fields:
+          setattr(entry.metadata, field, getattr(obj, field))
+        entry.fields |= fields
+      else:
+        entry = _CacheEntry(encoding.CopyProtoMessage(obj), fields, now)
+      self._entries[key] = entry
+      self._generations[object_key].add(key[3])
+      if is_live:
+        self._live_generations[object_key] = key[3]
+      while len(self._entries) > self.max_entries:
+        self._RemoveEntry(self._entries.popitem(last=False)[0])
+
+  def _RemoveEntry(self, key):
+    """Removes key's index entries; the caller must hold the lock."""
+    self._entries.pop(key, None)
+    object_key, generation = key[:3], key[3]
+    generations = self._generations.get(object_key)
+    if generations is not None:
+      generations.discard(generation)
+      if not generations:
+        del self._generations[object_key]
+    if self._live_generations.get(object_key) == generation:
+      del self._live_generations[object_key]
+
+  def AddListing(self, provider, bucket_name, objects_iter, fields,
+                 all_versions=False):
+    """Records each object in a listing while yielding it.
+
+    Args:
+      provider: Cloud provider of the bucket.
+      bucket_name: Bucket being listed.
+      objects_iter: Iterator of CloudApi.CsObjectOrPrefix, as returned by
+          ListObjects.
+      fields: ListObjects-format fields of the listing.
+      all_versions: True if the listing included noncurrent generations.
+
+    Yields:
+      The items of objects_iter.
+    """
+    get_fields = _GetCacheableFields(ListToGetFields(list_fields=fields))
+    for object_or_prefix in objects_iter:
+      if (get_fields is not None and object_or_prefix.datatype ==
+          CloudApi.CsObjectOrPrefixType.OBJECT):
+        self.AddObject(provider, bucket_name, object_or_prefix.data,
+                       get_fields, is_live=not all_versions)
+      yield object_or_prefix
+
+  def GetObject(self, provider, bucket_name, object_name, generation=None,
+                fields=None):
+    """Returns a copy of the cached metadata for an object, or None.
+
+    Args:
+      provider: Cloud provider of the object.
+      bucket_name: Bucket containing the object.
+      object_name: Name of the object.
+      generation: Generation of the object, or None for the live generation.
+      fields: GetObjectMetadata-format fields being requested.
+
+    Returns:
+      apitools Object containing (at least) the requested fields, or None if
+      they aren't all cached.
+    """
+    fields = _GetCacheableFields(fields)
+    if not self.enabled:
+      return None
+    object_key = (provider, bucket_name, object_name)
+    with self._lock:
+      if generation:
+        key = object_key + (long(generation),)
+      elif object_key in self._live_generations:
+        key = object_key + (self._live_generations[object_key],)
+      else:
+        key = None
+      entry = self._entries.get(key) if key else None
+      if (fields is None or entry is None or
+          self._IsExpired(entry, time.time()) or
+          not fields.issubset(entry.fields)):
+        self.misses += 1
+        return None
+      self.hits += 1
+      return encoding.CopyProtoMessage(entry.metadata)
+
+  def InvalidateObject(self, provider, bucket_name, object_name):
+    """Removes all cached generations of an object."""
+    object_key = (provider, bucket_name, object_name)
+    with self._lock:
+      for generation in list(self._generations.get(object_key, ())):
+        self._RemoveEntry(object_key + (generation,))
+      self._live_generations.pop(object_key, None)
+
+  def InvalidateBucket(self, provider, bucket_name):
+    """Removes all cached objects in a bucket."""
+    with self._lock:
+      for key in [key for key in self._entries
+                  if key[:2] == (provider, bucket_name)]:
+        self._RemoveEntry(key)
+
+  def Clear(self):
+    with self._lock:
+      self._entries.clear()
+      self._generations.clear()
+      self._live_generations.clear()
+
+  def GetStats(self):
+    with self._lock:
+      return ObjectMetadataCacheStats(self.hits, self.misses)
+
+
+_object_metadata_cache = None
+_object_metadata_cache_lock = threading.Lock()
+
+
+def GetObjectMetadataCache():
+  """Returns the process-wide ObjectMetadataCache."""
+  global _object_metadata_cache
+  with _object_metadata_cache_lock:
+    if _object_metadata_cache is None:
+      _object_metadata_cache = ObjectMetadataCache()
+    return _object_metadata_cache
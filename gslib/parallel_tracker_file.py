@@ -22,6 +22,7 @@ import random
 import gslib
 from gslib.exception import CommandException
 from gslib.tracker_file import RaiseUnwritableTrackerFileException
+from gslib.tracker_store import GetTrackerStore
 
 
 ObjectFromTracker = namedtuple('ObjectFromTracker',
@@ -34,6 +35,9 @@ class _CompositeUploadTrackerEntry(object):
   COMPONENT_NAME = 'component_name'
   COMPONENT_GENERATION = 'component_generation'
   ENC_SHA256 = 'encryption_key_sha256'
+  INTERMEDIATES_LIST = 'intermediates'
+  INTERMEDIATE_NAME = 'intermediate_name'
+  INTERMEDIATE_GENERATION = 'intermediate_generation'
   PREFIX = 'prefix'
 
 
@@ -62,13 +66,11 @@ def ReadParallelUploadTrackerFile(tracker_file_name, logger):
   enc_key_sha256 = None
   prefix = None
   existing_components = []
-  tracker_file = None
 
   # If we already have a matching tracker file, get the serialization data
   # so that we can resume the upload.
   try:
-    tracker_file = open(tracker_file_name, 'r')
-    tracker_data = tracker_file.read()
+    tracker_data = GetTrackerStore().Read(tracker_file_name)
     tracker_json = json.loads(tracker_data)
     enc_key_sha256 = tracker_json[_CompositeUploadTrackerEntry.ENC_SHA256]
     prefix = tracker_json[_CompositeUploadTrackerEntry.PREFIX]
@@ -89,9 +91,6 @@ def ReadParallelUploadTrackerFile(tracker_file_name, logger):
     # Legacy format did not support user-supplied encryption.
     enc_key_sha256 = None
     (prefix, existing_components) = _ParseLegacyTrackerData(tracker_data)
-  finally:
-    if tracker_file:
-      tracker_file.close()
 
   return (enc_key_sha256, prefix, existing_components)
 
@@ -127,6 +126,37 @@ def _ParseLegacyTrackerData(tracker_data):
   return (prefix, existing_components)
 
 
+def ReadParallelUploadTrackerIntermediates(tracker_file_name):
+  """Reads the intermediate composite objects recorded in a tracker file.
+
+  Intermediate objects are only created by uploads with more components than
+  can be composed in a single request (see WriteParallelUploadTrackerFile).
+  Tracker files written by older versions of gsutil don't contain any.
+
+  This function is not thread-safe and must be protected by a lock if
+  called within Command.Apply.
+
+  Args:
+    tracker_file_name: The name of the tracker file to read.
+
+  Returns:
+    A list of ObjectFromTracker objects representing the intermediate objects
+    that have already been composed.
+  """
+  try:
+    tracker_json = json.loads(GetTrackerStore().Read(tracker_file_name))
+    return [
+        ObjectFromTracker(
+            intermediate[_CompositeUploadTrackerEntry.INTERMEDIATE_NAME],
+            intermediate[_CompositeUploadTrackerEntry.INTERMEDIATE_GENERATION])
+        for intermediate in tracker_json.get(
+            _CompositeUploadTrackerEntry.INTERMEDIATES_LIST, [])]
+  except (AttributeError, IOError, KeyError, TypeError, ValueError):
+    # Missing, legacy or corrupt tracker files have no usable intermediates;
+    # ReadParallelUploadTrackerFile reports any problems with the file.
+    return []
+
+
 def ValidateParallelCompositeTrackerData(
     tracker_file_name, existing_enc_sha256, existing_prefix,
     existing_components, current_enc_key_sha256, bucket_url, command_obj,
@@ -218,10 +248,15 @@ def WriteComponentToParallelUploadTrackerFile(
     component: ObjectFromTracker describing the object that was uploaded.
     logger: logging.Logger for outputting log messages.
     encryption_key_sha256: Encryption key SHA256 for use in this upload, if any.
+
+  Returns:
+    A list of ObjectFromTracker objects representing all of the components
+    recorded in the tracker file, including the new component.
   """
   with tracker_file_lock:
     (existing_enc_key_sha256, prefix, existing_components) = (
         ReadParallelUploadTrackerFile(tracker_file_name, logger))
+    intermediates = ReadParallelUploadTrackerIntermediates(tracker_file_name)
     if existing_enc_key_sha256 != encryption_key_sha256:
       raise CommandException(
           'gsutil client error: encryption key SHA256 (%s) in tracker file '
@@ -232,11 +267,43 @@ def WriteComponentToParallelUploadTrackerFile(
     completed_components = existing_components + newly_completed_components
     WriteParallelUploadTrackerFile(
         tracker_file_name, prefix, completed_components,
-        encryption_key_sha256=encryption_key_sha256)
+        encryption_key_sha256=encryption_key_sha256,
+        intermediates=intermediates)
+    return completed_components
+
+
+def WriteIntermediateToParallelUploadTrackerFile(
+    tracker_file_name, tracker_file_lock, intermediate, logger,
+    encryption_key_sha256=None, composed_component_names=None):
+  """Rewrites an existing tracker file with info about a composed object.
+
+  Args:
+    tracker_file_name: Tracker file to append to.
+    tracker_file_lock: Thread and process-safe Lock protecting the tracker file.
+    intermediate: ObjectFromTracker describing the intermediate object that
+        was composed.
+    logger: logging.Logger for outputting log messages.
+    encryption_key_sha256: Encryption key SHA256 for use in this upload, if any.
+    composed_component_names: Names of components to remove from the tracker
+        file because they are about to be deleted, if any.
+  """
+  composed_component_names = set(composed_component_names or [])
+  with tracker_file_lock:
+    (_, prefix, existing_components) = (
+        ReadParallelUploadTrackerFile(tracker_file_name, logger))
+    existing_components = [
+        component for component in existing_components
+        if component.object_name not in composed_component_names]
+    intermediates = ReadParallelUploadTrackerIntermediates(tracker_file_name)
+    WriteParallelUploadTrackerFile(
+        tracker_file_name, prefix, existing_components,
+        encryption_key_sha256=encryption_key_sha256,
+        intermediates=intermediates + [intermediate])
 
 
 def WriteParallelUploadTrackerFile(tracker_file_name, prefix, components,
-                                   encryption_key_sha256=None):
+                                   encryption_key_sha256=None,
+                                   intermediates=None):
   """Writes information about components that were successfully uploaded.
 
   The tracker file is serialized JSON of the form:
@@ -248,9 +315,17 @@ def WriteParallelUploadTrackerFile(tracker_file_name, prefix, components,
        "component_name": Component object name,
        "component_generation": Component object generation (or null),
       }, ...
+    ],
+    "intermediates": [
+      {
+       "intermediate_name": Intermediate composite object name,
+       "intermediate_generation": Intermediate object generation (or null),
+      }, ...
     ]
   }
   where N is the number of components that have been successfully uploaded.
+  The "intermediates" list is only present for uploads with more components
+  than a single compose request accepts, which are composed in two levels.
 
   This function is not thread-safe and must be protected by a lock if
   called within Command.Apply.
@@ -261,6 +336,8 @@ def WriteParallelUploadTrackerFile(tracker_file_name, prefix, components,
         components.
     components: A list of ObjectFromTracker objects that were uploaded.
     encryption_key_sha256: Encryption key SHA256 for use in this upload, if any.
+    intermediates: A list of ObjectFromTracker objects for the intermediate
+        composite objects that were composed, if any.
   """
   tracker_components = []
   for component in components:
@@ -273,9 +350,14 @@ def WriteParallelUploadTrackerFile(tracker_file_name, prefix, components,
       _CompositeUploadTrackerEntry.ENC_SHA256: encryption_key_sha256,
       _CompositeUploadTrackerEntry.PREFIX: prefix
   }
+  if intermediates:
+    tracker_file_data[_CompositeUploadTrackerEntry.INTERMEDIATES_LIST] = [{
+        _CompositeUploadTrackerEntry.INTERMEDIATE_NAME:
+            intermediate.object_name,
+        _CompositeUploadTrackerEntry.INTERMEDIATE_GENERATION:
+            intermediate.generation
+    } for intermediate in intermediates]
   try:
-    open(tracker_file_name, 'w').close()  # Clear the file.
-    with open(tracker_file_name, 'w') as fp:
-      fp.write(json.dumps(tracker_file_data))
-  except IOError as e:
+    GetTrackerStore().Write(tracker_file_name, json.dumps(tracker_file_data))
+  except (IOError, OSError) as e:
     RaiseUnwritableTrackerFileException(tracker_file_name, e.strerror)
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Pipelining for resumable uploads sent in chunks.
+
+The JSON API accepts the chunks of a resumable upload one at a time, and each
+chunk's response must arrive before the next chunk is sent. Without
+pipelining, the next chunk is read from disk (and hashed, by
+HashingFileUploadWrapper) only once the previous chunk's response arrives.
+
+PipelinedUploadStream reads ahead of the upload on another thread, into a
+double buffer taken from the transfer buffer pool, so that reading and
+hashing overlap with sending. ChunkSizeTuner grows the chunk size, up to
+json_resumable_max_chunk_size, until the round trip at the end of each chunk
+is a small part of the chunk's transfer time.
+"""
+
+from __future__ import absolute_import
+
+import os
+import threading
+import time
+
+from gslib.buffer_pool import GetTransferBufferPool
+from gslib.buffer_pool import TRANSFER_BUFFER_CHUNK_SIZE
+from gslib.utils.boto_util import GetTransferBufferMemory
+from gslib.utils.unit_util import ONE_MIB
+
+# Largest read-ahead buffer used by a single upload. Each half of the double
+# buffer is at most one chunk.
+MAX_READ_AHEAD_BUFFER_SIZE = 16 * ONE_MIB
+
+# Number of bytes read from the wrapped stream at a time.
+READ_AHEAD_SIZE = TRANSFER_BUFFER_CHUNK_SIZE
+
+# Chunks are sized to take at least this many round trips to send, so that
+# waiting for each chunk's response costs at most about 1/TARGET_CHUNK_RTTS
+# of the upload's throughput.
+TARGET_CHUNK_RTTS = 16
+
+# Weight of the latest chunk in the smoothed throughput estimate.
+THROUGHPUT_SMOOTHING = 0.5
+
+# The JSON API requires chunk sizes to be multiples of this.
+CHUNK_SIZE_GRANULARITY = 256 * 1024
+
+
+def CanPipelineUpload(upload_stream, size):
+  """Returns True if upload_stream may be wrapped in a PipelinedUploadStream.
+
+  Streams of unknown size, and daisy chain downloads, can only seek back a
+  limited distance, which reading ahead of the upload would use up.
+
+  Args:
+    upload_stream: Stream the upload reads from.
+    size: Size of the upload, or None if unknown.
+
+  Returns:
+    True if the upload can be pipelined.
+  """
+  # Imported here to avoid a circular import.
+  # pylint: disable=g-import-not-at-top
+  from gslib.daisy_chain_wrapper import DaisyChainWrapper
+  return size is not None and not isinstance(upload_stream, DaisyChainWrapper)
+
+
+def GetReadAheadBufferSize(chunk_size):
+  """Returns the size of the double buffer for uploads of chunk_size chunks."""
+  return min(2 * chunk_size, MAX_READ_AHEAD_BUFFER_SIZE,
+             GetTransferBufferMemory())
+
+
+class PipelinedUploadStream(object):
+  """Wraps a seekable upload stream, reading ahead of it on another thread.
+
+  Reading ahead starts with the first read and stops whenever the buffer
+  holds buffer_size bytes that haven't been read yet. Seeks to positions
+  outside the buffered bytes stop reading ahead and seek the wrapped stream.
+
+  If the buffer doesn't fit in the transfer buffer memory budget, reads go
+  straight to the wrapped stream instead.
+  """
+
+  def __init__(self, stream, size, buffer_size):
+    """Initializes the stream.
+
+    Args:
+      stream: Seekable stream to read ahead of.
+      size: Size of the stream.
+      buffer_size: Size of the read-ahead buffer.
+    """
+    self._stream = stream
+    self._size = size
+    self._buffer_size = buffer_size
+    self._buffer = None
+    self._cond = threading.Condition()
+    self._position = stream.tell()
+    # The buffer holds the bytes from _buffer_start to _buffer_end.
+    self._buffer_start = self._position
+    self._buffer_end = self._position
+    # Incremented to tell the read-ahead thread to stop.
+    self._generation = 0
+    self._thread = None
+    self._exception = None
+
+  def read(self, size=-1):  # pylint: disable=invalid-name
+    """Reads from the buffer, waiting for the read-ahead thread if needed."""
+    if size is None or size < 0:
+      size = self._size - self._position
+    if size == 0 or self._position >= self._size:
+      return b''
+    if self._buffer is None:
+      self._buffer = GetTransferBufferPool().Acquire(self._buffer_size,
+                                                     blocking=False)
+      if self._buffer is None:
+        self._buffer_size = 0
+    if not self._buffer_size:
+      if self._stream.tell() != self._position:
+        self._stream.seek(self._position)
+      data = self._stream.read(size)
+      self._position += len(data)
+      return data
+    if not self._buffer_start <= self._position <= self._buffer_end:
+      self._StopReadingAhead()
+      if self._stream.tell() != self._position:
+        self._stream.seek(self._position)
+      self._buffer_start = self._buffer_end = self._position
+    if self._thread is None and self._buffer_end < self._size:
+      self._StartReadingAhead()
+    # Like files, return fewer bytes than requested only at the end of the
+    # stream; apitools treats short reads as the end.
+    pieces = []
+    with self._cond:
+      while size:
+        while (self._buffer_end == self._position and
+               self._exception is None and self._thread is not None):
+          self._cond.wait()
+        if self._buffer_end == self._position:
+          if self._exception is not None:
+            raise self._exception  # pylint: disable=raising-bad-type
+          break
+        length = min(size, self._buffer_end - self._position)
+        pieces.append(self._buffer.Read(self._position, length))
+        self._position += length
+        size -= length
+        # Bytes that have been read are no longer needed.
+        self._buffer_start = self._position
+        self._cond.notify_all()
+    return b''.join(pieces)
+
+  def tell(self):  # pylint: disable=invalid-name
+    return self._position
+
+  def seek(self, offset, whence=os.SEEK_SET):  # pylint: disable=invalid-name
+    """Sets the position. The wrapped stream is only moved on the next read."""
+    if whence == os.SEEK_CUR:
+      offset += self._position
+    elif whence == os.SEEK_END:
+      offset += self._size
+    self._position = offset
+
+  def close(self):  # pylint: disable=invalid-name
+    """Stops reading ahead and releases the buffer.
+
+    The wrapped stream is left open, at an unspecified position.
+    """
+    self._StopReadingAhead()
+    if self._buffer is not None:
+      self._buffer.Release()
+      self._buffer = None
+
+  def _StartReadingAhead(self):
+    with self._cond:
+      self._exception = None
+      self._thread = threading.Thread(target=self._ReadAhead,
+                                      args=(self._generation,))
+      self._thread.daemon = True
+      self._thread.start()
+
+  def _StopReadingAhead(self):
+    with self._cond:
+      self._generation += 1
+      thread = self._thread
+      self._thread = None
+      self._cond.notify_all()
+    if thread:
+      thread.join()
+
+  def _ReadAhead(self, generation):
+    """Fills the buffer from the wrapped stream until stopped or at the end."""
+    while True:
+      with self._cond:
+        while (generation == self._generation and
+               self._buffer_end - self._buffer_start + READ_AHEAD_SIZE >
+               self._buffer.size):
+          self._cond.wait()
+        if generation != self._generation:
+          return
+        read_position = self._buffer_end
+      try:
+        data = self._stream.read(
+            min(READ_AHEAD_SIZE, self._size - read_position))
+      except Exception as e:  # pylint: disable=broad-except
+        with self._cond:
+          self._exception = e
+          self._cond.notify_all()
+        return
+      with self._cond:
+        if generation != self._generation:
+          return
+        self._buffer.Write(read_position, data)
+        self._buffer_end += len(data)
+        self._cond.notify_all()
+        if not data or self._buffer_end >= self._size:
+          # Readers stop waiting once the thread is gone.
+          if self._thread is threading.current_thread():
+            self._thread = None
+          return
+
+
+class ChunkSizeTuner(object):
+  """Grows an apitools upload's chunk size to suit the measured link.
+
+  Sending a chunk takes about its size divided by the throughput, plus one
+  round trip for its response. An instance is passed to apitools as the
+  progress callback, which is called after each chunk's response.
+  """
+
+  def __init__(self, apitools_upload, max_chunk_size, rtt):
+    """Initializes the tuner.
+
+    Args:
+      apitools_upload: apitools Upload whose chunksize is tuned.
+      max_chunk_size: Largest chunk size to use.
+      rtt: Round trip time to the service, in seconds.
+    """
+    self._upload = apitools_upload
+    self._max_chunk_size = max_chunk_size
+    self._rtt = rtt
+    self._throughput = None
+    self._chunk_start_time = None
+    self._chunk_start_byte = None
+
+  def StartChunk(self):
+    """Records the start of the next chunk."""
+    self._chunk_start_time = time.time()
+    self._chunk_start_byte = self._upload.stream.tell()
+
+  def __call__(self, unused_response, unused_upload):
+    now = time.time()
+    bytes_sent = self._upload.stream.tell() - self._chunk_start_byte
+    send_time = now - self._chunk_start_time - self._rtt
+    if bytes_sent > 0 and send_time > 0:
+      throughput = bytes_sent / send_time
+      if self._throughput is None:
+        self._throughput = throughput
+      else:
+        self._throughput = (THROUGHPUT_SMOOTHING * throughput +
+                            (1 - THROUGHPUT_SMOOTHING) * self._throughput)
+      target_size = int(self._throughput * self._rtt * TARGET_CHUNK_RTTS)
+      target_size += -target_size % CHUNK_SIZE_GRANULARITY
+      # Chunks only grow, so a slow chunk never shrinks them below the
+      # configured size.
+      self._upload.chunksize = min(max(self._upload.chunksize, target_size),
+                                   self._max_chunk_size)
+    self.StartChunk()
@@ -24,6 +24,9 @@ from gslib.utils import parallelism_framework_util
 _START_BYTES_PER_CALLBACK = 1024*256
 _MAX_BYTES_PER_CALLBACK = 1024*1024*100
 _TIMEOUT_SECONDS = 1
+# Minimum time between the progress messages a FileProgressCallbackHandler
+# sends for its file or component. The UI refreshes once a second.
+_MIN_SECONDS_BETWEEN_PROGRESS_MESSAGES = 0.5
 
 # Max width of URL to display in progress indicator. Wide enough to allow
 # 15 chars for x/y display on an 80 char wide terminal.
@@ -67,7 +70,7 @@ class ProgressCallbackWithTimeout(object):
     if (self._bytes_processed_since_callback > self._bytes_per_callback or
         (self._total_bytes_processed + self._bytes_processed_since_callback >=
          self._total_size and self._total_size is not None) or
-	       (self._last_time - cur_time) > self._timeout):
+        (cur_time - self._last_time) > self._timeout):
       self._total_bytes_processed += self._bytes_processed_since_callback
       # TODO: We check if >= total_size and truncate because JSON uploads count
       # multipart metadata during their send progress. If the size is unknown,
@@ -143,7 +146,10 @@ class FileProgressCallbackHandler(object):
   """Tracks progress info for large operations like file copy or hash.
 
       Information is sent to the status_queue, which will print it in the
-      UI Thread.
+      UI Thread. Messages are sent at most every
+      _MIN_SECONDS_BETWEEN_PROGRESS_MESSAGES, except for the one that reports
+      the operation's end; the UI accounts for the bytes of skipped updates
+      when the file or component finishes.
   """
 
   def __init__(self, status_queue, start_byte=0,
@@ -170,6 +176,7 @@ class FileProgressCallbackHandler(object):
     self._operation_name = operation_name
     # Ensures final newline is written once even if we get multiple callbacks.
     self._last_byte_written = False
+    self._last_message_time = 0
 
   # Function signature is in boto callback format, which cannot be changed.
   def call(self,  # pylint: disable=invalid-name
@@ -191,10 +198,18 @@ class FileProgressCallbackHandler(object):
     if self._override_total_size:
       total_size = self._override_total_size
 
+    cur_time = time.time()
+    finished = (total_size is not None and
+                last_byte_processed - self._start_byte >= total_size)
+    if (not finished and cur_time - self._last_message_time <
+        _MIN_SECONDS_BETWEEN_PROGRESS_MESSAGES):
+      return
+    self._last_message_time = cur_time
+
     parallelism_framework_util.PutToQueueWithTimeout(
         self._status_queue,
         ProgressMessage(total_size, last_byte_processed - self._start_byte,
-                        self._src_url, time.time(),
+                        self._src_url, cur_time,
                         component_num=self._component_num,
                         operation_name=self._operation_name,
                         dst_url=self._dst_url))
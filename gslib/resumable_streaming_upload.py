@@ -13,9 +13,9 @@
 # limitations under the License.
 """Helper class for streaming resumable uploads."""
 
-import collections
 import os
 
+from gslib.buffer_pool import GetTransferBufferPool
 from gslib.exception import CommandException
 from gslib.utils.boto_util import GetJsonResumableChunkSize
 
@@ -27,7 +27,8 @@ class ResumableStreamingJsonUploadWrapper(object):
   as a stream with limited seek capabilities such that it can be used in a
   resumable JSON API upload.
 
-  max_buffer_size bytes of buffering is supported.
+  max_buffer_size bytes of buffering is supported. The buffer is taken from
+  the process's TransferBufferPool the first time data is buffered.
   """
 
   def __init__(self, stream, max_buffer_size, test_small_buffer=False):
@@ -51,7 +52,9 @@ class ResumableStreamingJsonUploadWrapper(object):
                                            GetJsonResumableChunkSize()))
 
     self._max_buffer_size = max_buffer_size
-    self._buffer = collections.deque()
+    # TransferBuffer holding the bytes from _buffer_start to _buffer_end,
+    # addressed by their offsets in the stream.
+    self._buffer = None
     self._buffer_start = 0
     self._buffer_end = 0
     self._position = 0
@@ -75,35 +78,10 @@ class ResumableStreamingJsonUploadWrapper(object):
     buffered_data = []
     if self._position < self._buffer_end:
       # There was a backwards seek, so read from the buffer first.
-
-      # TODO: Performance test to validate if it is worth re-aligning
-      # the buffers in this case.  Also, seeking through the buffer for
-      # each read on a long catch-up is probably not performant, but we'd
-      # need a more complex data structure than a deque to get around this.
-      pos_in_buffer = self._buffer_start
-      buffer_index = 0
-      # First, find the start position in the buffer.
-      while pos_in_buffer + len(self._buffer[buffer_index]) < self._position:
-        # When this loop exits, buffer_index will refer to a buffer that
-        # has at least some overlap with self._position, and
-        # pos_in_buffer will be >= self._position
-        pos_in_buffer += len(self._buffer[buffer_index])
-        buffer_index += 1
-
-      # Read until we've read enough or we're out of buffer.
-      while pos_in_buffer < self._buffer_end and bytes_remaining > 0:
-        buffer_len = len(self._buffer[buffer_index])
-        # This describes how far into the current buffer self._position is.
-        offset_from_position = self._position - pos_in_buffer
-        bytes_available_this_buffer = buffer_len - offset_from_position
-        read_size = min(bytes_available_this_buffer, bytes_remaining)
-        buffered_data.append(
-            self._buffer[buffer_index]
-            [offset_from_position:offset_from_position + read_size])
-        bytes_remaining -= read_size
-        pos_in_buffer += buffer_len
-        buffer_index += 1
-        self._position += read_size
+      read_size = min(self._buffer_end - self._position, bytes_remaining)
+      buffered_data.append(self._buffer.Read(self._position, read_size))
+      bytes_remaining -= read_size
+      self._position += read_size
 
     # At this point we're guaranteed that if there are any bytes left to read,
     # then self._position == self._buffer_end, and we can read from the
@@ -134,23 +112,23 @@ class ResumableStreamingJsonUploadWrapper(object):
       data_len = len(new_data)
       if data_len:
         self._position += data_len
-        self._buffer.append(new_data)
-        self._buffer_end += data_len
-        oldest_data = None
-        while self._buffer_end - self._buffer_start > self._max_buffer_size:
-          oldest_data = self._buffer.popleft()
-          self._buffer_start += len(oldest_data)
-        if oldest_data:
-          refill_amount = self._max_buffer_size - (self._buffer_end -
-                                                   self._buffer_start)
-          if refill_amount:
-            self._buffer.appendleft(oldest_data[-refill_amount:])
-            self._buffer_start -= refill_amount
+        self._BufferData(new_data)
     else:
       data = b''.join(buffered_data) if buffered_data else b''
 
     return data
 
+  def _BufferData(self, new_data):
+    """Appends new_data to the buffer, dropping the oldest buffered bytes."""
+    if self._buffer is None:
+      self._buffer = GetTransferBufferPool().Acquire(self._max_buffer_size)
+    kept_len = min(len(new_data), self._max_buffer_size)
+    self._buffer_end += len(new_data)
+    self._buffer.Write(self._buffer_end - kept_len,
+                       new_data[len(new_data) - kept_len:])
+    self._buffer_start = max(self._buffer_start,
+                             self._buffer_end - self._max_buffer_size)
+
   def tell(self):  # pylint: disable=invalid-name
     """Returns the current stream position."""
     return self._position
@@ -193,4 +171,7 @@ class ResumableStreamingJsonUploadWrapper(object):
                              '(mode %s, offset %s)' % (whence, offset))
 
   def close(self):  # pylint: disable=invalid-name
+    if self._buffer is not None:
+      self._buffer.Release()
+      self._buffer = None
     return self._orig_fp.close()
@@ -0,0 +1,366 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Shared work queue for the byte ranges of sliced object downloads.
+
+A sliced download divides an object into many more slices than it has
+parallel streams, and each stream repeatedly claims the next unclaimed range
+from the download's SlicedDownloadScheduler. Once every range has been
+claimed, a stream that runs out of work steals the second half of the largest
+unfinished range instead, so that a single slow connection can't hold up the
+whole download.
+
+Streams report how far they have got through their range as they download
+it; this is what lets the scheduler pick ranges to steal, and lets a stream
+find out that the end of its range was stolen. The scheduler records the
+bytes that have been written to the download file as a set of completed byte
+ranges in the sliced download tracker file, so that a later attempt only
+downloads the bytes that are missing.
+
+The state of each download lives in a process-safe dictionary, so schedulers
+can be pickled and passed to the worker processes used by Command.Apply. Each
+range is stored under its own key and streams claim ranges by incrementing a
+shared cursor, so a stream's progress reports only exchange the state of its
+own range. Completed bytes are added to the tracker file's ranges as each
+stream checkpoints them, rather than recomputed from every range.
+"""
+
+from __future__ import absolute_import
+
+import collections
+
+from gslib.tracker_file import WriteSlicedDownloadTrackerFile
+from gslib.utils import parallelism_framework_util
+from gslib.utils.parallelism_framework_util import AtomicDict
+from gslib.utils.parallelism_framework_util import CheckMultiprocessingAvailableAndInit
+from gslib.utils.unit_util import DivideAndCeil
+from gslib.utils.unit_util import ONE_MIB
+
+# A stream reports its progress at least every this many bytes, and never
+# writes more than this many bytes past the position it last reported. Ranges
+# are only ever split this far past a stream's reported position, so a stream
+# never writes bytes that have been stolen.
+SLICE_PROGRESS_SYNC_THRESHOLD = ONE_MIB
+
+# Ranges smaller than this aren't worth a new request, so they aren't stolen.
+MIN_STOLEN_RANGE_SIZE = 2 * ONE_MIB
+
+# range_id: Index of the range in the download's list of ranges.
+# start_byte: The first byte of the range.
+# download_start_byte: The first byte of the range that still needs to be
+#     downloaded. Bytes before it are already in the download file.
+# end_byte: The last byte of the range.
+# stolen: True if the range was split off the end of another stream's range.
+SlicedDownloadRange = collections.namedtuple(
+    'SlicedDownloadRange',
+    'range_id start_byte download_start_byte end_byte stolen')
+
+# Indexes into the list that holds the state of each range.
+_START = 0
+_WRITTEN = 1
+_RECEIVED = 2
+_END = 3
+# Bytes of the range before this one have been added to the completed ranges.
+_CHECKPOINTED = 4
+
+# Keys under which each download's state is stored, as the second element of
+# a (download_file_name, ...) tuple.
+# (num_initial_ranges, tracker), where tracker is (tracker_file_name, etag,
+# generation, num_components), or None if the download isn't resumable.
+_INFO = 'info'
+# Number of initial ranges that have been claimed. Can exceed the number of
+# initial ranges, once streams start looking for ranges to steal.
+_CURSOR = 'cursor'
+# Number of ranges, including stolen ones.
+_NUM_RANGES = 'num_ranges'
+# Ids of the claimed ranges that still have bytes to download.
+_IN_PROGRESS = 'in_progress'
+# Merged [start_byte, end_byte] ranges that have been checkpointed.
+_COMPLETED = 'completed'
+# The state of a range, stored under (download_file_name, _RANGE, range_id).
+_RANGE = 'range'
+
+# Maps (download file name, key) tuples to the state of the sliced download to
+# that file.
+global sliced_download_states, sliced_download_states_lock
+sliced_download_states = AtomicDict(
+    manager=(
+        parallelism_framework_util.top_level_manager
+        if CheckMultiprocessingAvailableAndInit().is_available else None))
+sliced_download_states_lock = parallelism_framework_util.CreateLock()
+
+
+class SlicedDownloadRangeStolenException(Exception):
+  """Raised by a download stream when the end of its range has been stolen."""
+
+  def __init__(self, end_byte):
+    super(SlicedDownloadRangeStolenException, self).__init__(
+        'The rest of the range after byte %d was stolen.' % end_byte)
+    self.end_byte = end_byte
+
+
+def MergeByteRanges(byte_ranges):
+  """Merges overlapping and adjacent byte ranges.
+
+  Args:
+    byte_ranges: Iterable of [start_byte, end_byte] ranges (inclusive).
+
+  Returns:
+    Sorted list of non-overlapping, non-adjacent [start_byte, end_byte] ranges
+    covering the same bytes.
+  """
+  merged = []
+  for start_byte, end_byte in sorted(byte_ranges):
+    if merged and start_byte <= merged[-1][1] + 1:
+      merged[-1][1] = max(merged[-1][1], end_byte)
+    else:
+      merged.append([start_byte, end_byte])
+  return merged
+
+
+def GetSliceRanges(object_size, slice_size, completed_ranges=None):
+  """Divides an object into the ranges to start a sliced download with.
+
+  Each slice is split further around the bytes that have already been
+  downloaded, so that every range starts with some (possibly no) downloaded
+  bytes, followed by some (possibly no) bytes that still need downloading.
+
+  Args:
+    object_size: Size of the object in bytes.
+    slice_size: Size of each slice, except the last.
+    completed_ranges: [start_byte, end_byte] ranges of the object that have
+        already been written to the download file.
+
+  Returns:
+    List of (start_byte, download_start_byte, end_byte) tuples, in order.
+  """
+  completed_ranges = MergeByteRanges(completed_ranges or [])
+  byte_ranges = []
+  completed_index = 0
+  for slice_start in xrange(0, object_size, slice_size):
+    slice_end = min(slice_start + slice_size, object_size) - 1
+    start_byte = slice_start
+    while start_byte <= slice_end:
+      while (completed_index < len(completed_ranges) and
+             completed_ranges[completed_index][1] < start_byte):
+        completed_index += 1
+      download_start_byte = start_byte
+      end_byte = slice_end
+      if completed_index < len(completed_ranges):
+        completed_start, completed_end = completed_ranges[completed_index]
+        if completed_start <= start_byte:
+          download_start_byte = min(completed_end, slice_end) + 1
+          if completed_index + 1 < len(completed_ranges):
+            end_byte = min(
+                slice_end, completed_ranges[completed_index + 1][0] - 1)
+        else:
+          end_byte = min(slice_end, completed_start - 1)
+      byte_ranges.append((start_byte, download_start_byte, end_byte))
+      start_byte = end_byte + 1
+  return byte_ranges
+
+
+class SlicedDownloadScheduler(object):
+  """Hands out the byte ranges of one sliced download to its streams.
+
+  Instances only hold the name of the download file; all state is shared
+  through sliced_download_states, so every stream sees the same ranges no
+  matter which process it runs in.
+  """
+
+  def __init__(self, download_file_name):
+    """Instantiates a scheduler for the download to download_file_name."""
+    self.download_file_name = download_file_name
+
+  def _Key(self, *parts):
+    return (self.download_file_name,) + parts
+
+  def Start(self, byte_ranges, tracker_file_name=None, src_obj_metadata=None,
+            num_components=None):
+    """Sets up the shared state for a new download.
+
+    Args:
+      byte_ranges: List of (start_byte, download_start_byte, end_byte) tuples,
+          as returned by GetSliceRanges.
+      tracker_file_name: Sliced download tracker file to record completed
+          ranges in, or None if the download isn't resumable.
+      src_obj_metadata: Metadata for the source object, which is written to
+          the tracker file. Must include etag and generation.
+      num_components: The number of streams, which is written to the tracker
+          file.
+
+    Returns:
+      List of SlicedDownloadRange for the initial ranges.
+    """
+    tracker = None
+    if tracker_file_name:
+      tracker = (tracker_file_name, src_obj_metadata.etag,
+                 src_obj_metadata.generation, num_components)
+    for range_id, (start_byte, download_start_byte, end_byte) in enumerate(
+        byte_ranges):
+      sliced_download_states[self._Key(_RANGE, range_id)] = [
+          start_byte, download_start_byte, download_start_byte, end_byte,
+          download_start_byte]
+    sliced_download_states[self._Key(_CURSOR)] = 0
+    sliced_download_states[self._Key(_NUM_RANGES)] = len(byte_ranges)
+    sliced_download_states[self._Key(_IN_PROGRESS)] = []
+    sliced_download_states[self._Key(_COMPLETED)] = MergeByteRanges(
+        [start_byte, download_start_byte - 1]
+        for start_byte, download_start_byte, _ in byte_ranges
+        if download_start_byte > start_byte)
+    # Written last, as the other methods treat the download as started once
+    # this key exists.
+    sliced_download_states[self._Key(_INFO)] = (len(byte_ranges), tracker)
+    return [SlicedDownloadRange(range_id, start_byte, download_start_byte,
+                                end_byte, False)
+            for range_id, (start_byte, download_start_byte, end_byte)
+            in enumerate(byte_ranges)]
+
+  def Finish(self):
+    """Discards the shared state once the download is over."""
+    with sliced_download_states_lock:
+      if sliced_download_states.get(self._Key(_INFO)) is None:
+        return
+      sliced_download_states.delete(self._Key(_INFO))
+      for range_id in xrange(sliced_download_states[self._Key(_NUM_RANGES)]):
+        sliced_download_states.delete(self._Key(_RANGE, range_id))
+      for key in (_CURSOR, _NUM_RANGES, _IN_PROGRESS, _COMPLETED):
+        sliced_download_states.delete(self._Key(key))
+
+  def ClaimRange(self):
+    """Claims a range for the calling stream to download.
+
+    Returns:
+      SlicedDownloadRange for the claimed range, or None if there's no more
+      work worth doing.
+    """
+    info = sliced_download_states.get(self._Key(_INFO))
+    if info is None:
+      return None
+    num_initial_ranges, _ = info
+    range_id = sliced_download_states.Increment(self._Key(_CURSOR), 1) - 1
+    if range_id < num_initial_ranges:
+      byte_range = sliced_download_states[self._Key(_RANGE, range_id)]
+      if byte_range[_WRITTEN] <= byte_range[_END]:
+        sliced_download_states.Modify(self._Key(_IN_PROGRESS),
+                                      lambda range_ids: range_ids + [range_id])
+      return SlicedDownloadRange(range_id, byte_range[_START],
+                                 byte_range[_WRITTEN], byte_range[_END], False)
+    return self._StealRange()
+
+  def _StealRange(self):
+    """Splits off the second half of the range with the most bytes left.
+
+    Only ranges that are in progress are considered, so the cost of a steal
+    depends on the number of streams rather than the number of ranges.
+
+    Returns:
+      SlicedDownloadRange for the stolen range, or None if no range has
+      enough bytes left to be worth stealing from.
+    """
+    # Steals are serialized, so two streams never pick the same victim. The
+    # victim's own progress reports don't take this lock; they are kept
+    # consistent with the split by sliced_download_states.Modify.
+    with sliced_download_states_lock:
+      range_ids = sliced_download_states.get(self._Key(_IN_PROGRESS))
+      if not range_ids:
+        return None
+      victim_id = max(
+          range_ids,
+          key=lambda range_id: self._GetBytesLeft(
+              sliced_download_states[self._Key(_RANGE, range_id)]))
+      stolen = []
+
+      def _Split(byte_range):
+        bytes_left = self._GetBytesLeft(byte_range)
+        split_byte = byte_range[_RECEIVED] + max(DivideAndCeil(bytes_left, 2),
+                                                 SLICE_PROGRESS_SYNC_THRESHOLD)
+        if byte_range[_END] - split_byte + 1 >= MIN_STOLEN_RANGE_SIZE:
+          stolen.extend([split_byte, byte_range[_END]])
+          byte_range[_END] = split_byte - 1
+        return byte_range
+
+      sliced_download_states.Modify(self._Key(_RANGE, victim_id), _Split)
+      if not stolen:
+        return None
+      split_byte, end_byte = stolen
+      range_id = sliced_download_states.Increment(self._Key(_NUM_RANGES),
+                                                   1) - 1
+      sliced_download_states[self._Key(_RANGE, range_id)] = [
+          split_byte, split_byte, split_byte, end_byte, split_byte]
+      sliced_download_states.Modify(self._Key(_IN_PROGRESS),
+                                    lambda range_ids: range_ids + [range_id])
+      return SlicedDownloadRange(range_id, split_byte, split_byte, end_byte,
+                                 True)
+
+  @staticmethod
+  def _GetBytesLeft(byte_range):
+    return byte_range[_END] - byte_range[_RECEIVED] + 1
+
+  def UpdateProgress(self, range_id, received_byte, written_byte,
+                     update_tracker_file=False):
+    """Records a stream's progress on its range.
+
+    Args:
+      range_id: The range_id of the stream's SlicedDownloadRange.
+      received_byte: The next byte the stream will receive.
+      written_byte: All bytes of the range before this one have been written
+          to the download file.
+      update_tracker_file: Whether to add the bytes written since the range's
+          last checkpoint to the completed ranges, and checkpoint them to the
+          tracker file.
+
+    Returns:
+      The last byte of the range, which is lower than it was if the end of
+      the range was stolen, or None if the download is over.
+    """
+    checkpoint = []
+
+    def _Update(byte_range):
+      byte_range[_RECEIVED] = max(byte_range[_RECEIVED], received_byte)
+      byte_range[_WRITTEN] = max(byte_range[_WRITTEN], written_byte)
+      if (update_tracker_file and
+          byte_range[_WRITTEN] > byte_range[_CHECKPOINTED]):
+        checkpoint.append([byte_range[_CHECKPOINTED],
+                           byte_range[_WRITTEN] - 1])
+        byte_range[_CHECKPOINTED] = byte_range[_WRITTEN]
+      return byte_range
+
+    byte_range = sliced_download_states.Modify(self._Key(_RANGE, range_id),
+                                               _Update)
+    if byte_range is None:
+      return None
+    if byte_range[_WRITTEN] > byte_range[_END]:
+      sliced_download_states.Modify(
+          self._Key(_IN_PROGRESS),
+          lambda range_ids: [i for i in range_ids if i != range_id])
+    if checkpoint:
+      completed_ranges = sliced_download_states.Modify(
+          self._Key(_COMPLETED),
+          lambda completed_ranges: MergeByteRanges(completed_ranges +
+                                                   checkpoint))
+      info = sliced_download_states.get(self._Key(_INFO))
+      if completed_ranges is not None and info is not None and info[1]:
+        # Checkpoints from different streams may be written out of order.
+        # That only loses some of the completed ranges from the tracker file,
+        # and a later attempt downloads those bytes again.
+        tracker_file_name, etag, generation, num_components = info[1]
+        WriteSlicedDownloadTrackerFile(tracker_file_name, etag, generation,
+                                       num_components, completed_ranges,
+                                       checkpoint=True)
+    return byte_range[_END]
+
+  def GetCompletedRanges(self):
+    """Returns the merged ranges of bytes checkpointed by the streams."""
+    return sliced_download_states[self._Key(_COMPLETED)]
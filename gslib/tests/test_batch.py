@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the batch command."""
+
+from __future__ import absolute_import
+
+import json
+import os
+
+from gslib.commands import batch
+from gslib.exception import CommandException
+import gslib.tests.testcase as testcase
+from gslib.tests.util import ObjectToURI as suri
+
+
+class TestBatchUnitTests(testcase.GsUtilUnitTestCase):
+  """Unit tests for the batch command."""
+
+  def test_parse_batch(self):
+    groups = batch._ParseBatch([
+        '# A comment.\n',
+        'gsutil mb gs://bucket\n',
+        '\n',
+        'wait\n',
+        'wait\n',
+        'cp "a file" gs://bucket  # Trailing comment.\n',
+        'stat gs://bucket/obj\n',
+    ])
+    self.assertEqual([
+        [batch.BatchEntry(2, ['mb', 'gs://bucket'])],
+        [batch.BatchEntry(6, ['cp', 'a file', 'gs://bucket']),
+         batch.BatchEntry(7, ['stat', 'gs://bucket/obj'])],
+    ], groups)
+
+  def test_parse_batch_rejects_top_level_options(self):
+    with self.assertRaisesRegexp(CommandException, 'Top-level gsutil options'):
+      batch._ParseBatch(['gsutil -m cp a b\n'])
+
+  def test_batch_of_local_copies(self):
+    tmpdir = self.CreateTempDir()
+    src_path = self.CreateTempFile(tmpdir=tmpdir, file_name='src',
+                                   contents='foo')
+    dst_path = os.path.join(tmpdir, 'dst')
+    commands_path = self.CreateTempFile(tmpdir=tmpdir, contents='\n'.join([
+        'cp %s %s' % (src_path, dst_path),
+        'wait',
+        'cp %s %s' % (os.path.join(tmpdir, 'nonexistent'), dst_path),
+        'cp %s %s' % (src_path, dst_path + '2'),
+    ]))
+    results_path = os.path.join(tmpdir, 'results')
+    self.RunCommand('batch', ['-c', '-r', results_path, commands_path])
+
+    with open(dst_path, 'r') as f:
+      self.assertEqual('foo', f.read())
+    self.assertTrue(os.path.exists(dst_path + '2'))
+    with open(results_path, 'r') as f:
+      results = [json.loads(line) for line in f]
+    self.assertEqual([1, 3, 4], [result['line'] for result in results])
+    self.assertEqual([0, 1, 0], [result['status'] for result in results])
+    self.assertIsNotNone(results[1]['error'])
+
+  def test_batch_stops_after_failure(self):
+    tmpdir = self.CreateTempDir()
+    dst_path = os.path.join(tmpdir, 'dst')
+    src_path = self.CreateTempFile(tmpdir=tmpdir, contents='foo')
+    commands_path = self.CreateTempFile(tmpdir=tmpdir, contents='\n'.join([
+        'cp %s %s' % (os.path.join(tmpdir, 'nonexistent'), dst_path),
+        'cp %s %s' % (src_path, dst_path),
+    ]))
+    self.RunCommand('batch', [commands_path])
+    self.assertFalse(os.path.exists(dst_path))
+
+
+class TestBatch(testcase.GsUtilIntegrationTestCase):
+  """Integration tests for the batch command."""
+
+  def test_parallel_batch(self):
+    bucket_uri = self.CreateBucket()
+    fpath = self.CreateTempFile(contents='foo')
+    commands = ['cp %s %s' % (fpath, suri(bucket_uri, 'obj%d' % i))
+                for i in range(3)]
+    commands = ['# Parallel copies.'] + commands + [
+        'wait', 'stat %s' % suri(bucket_uri, 'nonexistent')]
+    commands_path = self.CreateTempFile(contents='\n'.join(commands))
+    stdout = self.RunGsUtil(['-m', 'batch', '-r', '-', commands_path],
+                            return_stdout=True, expected_status=1)
+    results = [json.loads(line) for line in stdout.splitlines()]
+    self.assertEqual([2, 3, 4, 6], [result['line'] for result in results])
+    self.assertEqual([0, 0, 0, 1], [result['status'] for result in results])
+    stdout = self.RunGsUtil(['ls', suri(bucket_uri)], return_stdout=True)
+    self.assertEqual(3, len(stdout.splitlines()))
+
+  def test_parallel_batch_commands_keep_their_options(self):
+    tmpdir = self.CreateTempDir()
+    src_path = self.CreateTempFile(tmpdir=tmpdir, file_name='src',
+                                   contents='new')
+    commands = []
+    for i in range(4):
+      # No-clobber copies, run alongside copies without -n, mustn't overwrite
+      # their destinations, and their statuses mustn't reflect the failing
+      # copy's.
+      self.CreateTempFile(tmpdir=tmpdir, file_name='existing%d' % i,
+                          contents='old')
+      commands.append('cp -n %s %s' % (
+          src_path, os.path.join(tmpdir, 'existing%d' % i)))
+      commands.append('cp %s %s' % (src_path,
+                                    os.path.join(tmpdir, 'dst%d' % i)))
+    commands.append('cp %s %s' % (os.path.join(tmpdir, 'nonexistent'),
+                                  os.path.join(tmpdir, 'dst')))
+    commands_path = self.CreateTempFile(contents='\n'.join(commands))
+    stdout = self.RunGsUtil(['-m', 'batch', '-r', '-', commands_path],
+                            return_stdout=True, expected_status=1)
+    results = [json.loads(line) for line in stdout.splitlines()]
+    self.assertEqual([0] * 8 + [1], [result['status'] for result in results])
+    for i in range(4):
+      with open(os.path.join(tmpdir, 'existing%d' % i)) as f:
+        self.assertEqual('old', f.read())
+      with open(os.path.join(tmpdir, 'dst%d' % i)) as f:
+        self.assertEqual('new', f.read())
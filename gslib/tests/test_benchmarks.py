@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unit tests for the offline benchmark suite."""
+
+from __future__ import absolute_import
+
+from gslib.benchmarks import framework
+from gslib.benchmarks import runner
+from gslib.benchmarks.framework import BenchmarkEnvironment
+from gslib.benchmarks.framework import BenchmarkSpec
+from gslib.benchmarks.framework import BYTES_METRIC
+from gslib.benchmarks.framework import Measurement
+from gslib.benchmarks.framework import OBJECTS_METRIC
+import gslib.tests.testcase as testcase
+
+# Benchmarks that run quickly in the test process at a small scale.
+_LOCAL_BENCHMARKS = ('rsync_diff', 'batch_sort', 'file_wildcard_walk',
+                     'hash_upload_md5', 'hash_download_crc32c_md5')
+
+
+class TestBenchmarks(testcase.GsUtilUnitTestCase):
+  """Unit tests for the benchmark runner and local benchmarks."""
+
+  def setUp(self):
+    super(TestBenchmarks, self).setUp()
+    self.env = BenchmarkEnvironment(scale=0.001)
+    self.addCleanup(self.env.Close)
+
+  def test_local_benchmarks(self):
+    specs = [spec for spec in framework.BENCHMARKS
+             if spec.name in _LOCAL_BENCHMARKS]
+    self.assertEqual(len(_LOCAL_BENCHMARKS), len(specs))
+    results = runner.RunBenchmarks(specs, self.env)
+    # 1000 source files, 950 destination objects and 20 extra ones.
+    self.assertEqual(1970, results['rsync_diff']['objects'])
+    self.assertEqual(1000, results['batch_sort']['objects'])
+    self.assertEqual(100, results['file_wildcard_walk']['objects'])
+    for result in results.itervalues():
+      self.assertGreater(result[result['metric']], 0)
+
+  def test_median_of_repeated_runs(self):
+    times = iter([3, 1, 2])
+    spec = BenchmarkSpec(
+        'fake', lambda env: Measurement(next(times), 10, 100), BYTES_METRIC,
+        'Fake benchmark.')
+    result = runner.RunBenchmarks([spec], self.env, repeat=3)['fake']
+    self.assertEqual([3, 1, 2], result['runs'])
+    self.assertEqual(2, result['seconds'])
+    self.assertEqual(50, result[BYTES_METRIC])
+    self.assertEqual(5, result[OBJECTS_METRIC])
+
+  def test_compare_with_baseline(self):
+    results = {
+        'faster': {'metric': OBJECTS_METRIC, OBJECTS_METRIC: 120},
+        'slower': {'metric': BYTES_METRIC, BYTES_METRIC: 80},
+        'new': {'metric': OBJECTS_METRIC, OBJECTS_METRIC: 1},
+    }
+    baseline_results = {
+        'faster': {OBJECTS_METRIC: 100},
+        'slower': {BYTES_METRIC: 100},
+        'removed': {OBJECTS_METRIC: 100},
+    }
+    comparison = runner.CompareWithBaseline(results, baseline_results, 0.1)
+    self.assertEqual(['faster', 'slower'], sorted(comparison))
+    self.assertFalse(comparison['faster'][2])
+    self.assertAlmostEqual(0.2, comparison['faster'][1])
+    self.assertTrue(comparison['slower'][2])
+    self.assertAlmostEqual(-0.2, comparison['slower'][1])
+    self.assertFalse(
+        runner.CompareWithBaseline(results, baseline_results, 0.25)
+        ['slower'][2])
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unit tests for the transfer buffer pool."""
+
+from __future__ import absolute_import
+
+import threading
+
+from gslib import buffer_pool
+from gslib.buffer_pool import TRANSFER_BUFFER_CHUNK_SIZE
+from gslib.buffer_pool import TransferBufferPool
+from gslib.exception import CommandException
+import gslib.tests.testcase as testcase
+from gslib.tests.util import SetBotoConfigForTest
+from gslib.utils.parallelism_framework_util import AtomicDict
+
+import mock
+
+
+class TestBufferPool(testcase.GsUtilUnitTestCase):
+  """Unit tests for TransferBufferPool and TransferBuffer."""
+
+  def setUp(self):
+    super(TestBufferPool, self).setUp()
+    # Give each test a budget of its own.
+    for name, value in (('transfer_buffer_usage', AtomicDict()),
+                        ('transfer_buffer_cond', threading.Condition())):
+      patcher = mock.patch.object(buffer_pool, name, value)
+      patcher.start()
+      self.addCleanup(patcher.stop)
+    self.pool = TransferBufferPool()
+
+  def test_ring_buffer_wraps(self):
+    transfer_buffer = self.pool.Acquire(TRANSFER_BUFFER_CHUNK_SIZE + 1)
+    self.assertEqual(2 * TRANSFER_BUFFER_CHUNK_SIZE, transfer_buffer.size)
+    # Write across the end of the buffer and the boundary between chunks.
+    position = 4 * TRANSFER_BUFFER_CHUNK_SIZE - 2
+    transfer_buffer.Write(position, 'abcd')
+    self.assertEqual('abcd', transfer_buffer.Read(position, 4))
+    self.assertEqual('cd', transfer_buffer.Read(0, 2))
+    transfer_buffer.Write(TRANSFER_BUFFER_CHUNK_SIZE - 1, bytearray('xy'))
+    self.assertEqual('xy', transfer_buffer.Read(TRANSFER_BUFFER_CHUNK_SIZE - 1,
+                                                2))
+    transfer_buffer.Release()
+
+  def test_acquire_waits_for_budget(self):
+    with SetBotoConfigForTest(
+        [('GSUtil', 'transfer_buffer_memory',
+          str(2 * TRANSFER_BUFFER_CHUNK_SIZE))]):
+      first_buffer = self.pool.Acquire(2 * TRANSFER_BUFFER_CHUNK_SIZE)
+      first_chunks = list(first_buffer.chunks)
+      acquired = []
+      acquire_thread = threading.Thread(
+          target=lambda: acquired.append(self.pool.Acquire(1)))
+      acquire_thread.start()
+      acquire_thread.join(0.1)
+      self.assertFalse(acquired)
+      self.assertIsNone(self.pool.Acquire(1, blocking=False))
+      first_buffer.Release()
+      acquire_thread.join()
+      # The released chunks are reused.
+      self.assertIn(acquired[0].chunks[0], first_chunks)
+      acquired[0].Release()
+      self.assertEqual(0, buffer_pool.transfer_buffer_usage.get('chunks'))
+
+  def test_acquire_more_than_budget(self):
+    with SetBotoConfigForTest(
+        [('GSUtil', 'transfer_buffer_memory',
+          str(TRANSFER_BUFFER_CHUNK_SIZE))]):
+      with self.assertRaises(CommandException):
+        self.pool.Acquire(TRANSFER_BUFFER_CHUNK_SIZE + 1)
@@ -24,6 +24,7 @@ import boto
 import mock
 
 import gslib
+from gslib import command_registry
 from gslib import command_runner
 from gslib.command import Command
 from gslib.command_argument import CommandArgument
@@ -441,6 +442,31 @@ class TestCommandRunnerUnitTests(testcase.unit_testcase.GsUtilUnitTestCase):
     with self.assertRaisesRegexp(CommandException, r'Invalid non-ASCII'):
       HandleHeaderCoding(headers)
 
+  def test_command_registry_matches_command_modules(self):
+    """Tests that the precomputed command registry is up to date."""
+    self.assertEqual(
+        command_registry.BuildCommandModuleMap(),
+        command_registry.COMMAND_MODULE_MAP,
+        'The command registry is out of date; regenerate it by running '
+        '"python gslib/command_registry.py".')
+
+  def test_lazy_command_map_imports_only_requested_command(self):
+    command_map = command_registry.LazyCommandMap(
+        {'fake2': 'gslib.tests.test_command_runner',
+         'fake_missing_cmd': 'gslib.commands.no_such_command'})
+    self.assertIn('fake2', command_map)
+    self.assertNotIn('fake_missing_cmd', command_map)
+    self.assertNotIn('ls', command_map)
+    self.assertEqual(['fake2'], command_map.keys())
+    self.assertIs(FakeCommandWithCompleters, command_map['fake2'])
+    with self.assertRaises(KeyError):
+      _ = command_map['fake_missing_cmd']
+
+  def test_lazy_command_map_finds_aliases(self):
+    command_map = command_registry.LazyCommandMap()
+    self.assertIs(command_map['cp'], command_map['copy'])
+    self.assertEqual('cp', command_map['copy'].command_spec.command_name)
+
 
 class TestCommandRunnerIntegrationTests(
     testcase.GsUtilIntegrationTestCase):
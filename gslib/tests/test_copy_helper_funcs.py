@@ -15,12 +15,14 @@
 """Unit tests for parallel upload functions in copy_helper."""
 
 import datetime
+import json
 import logging
 import os
 
 from apitools.base.py import exceptions as apitools_exceptions
 import mock
 
+from gslib.cloud_api import CloudApi
 from gslib.cloud_api import ResumableUploadAbortException
 from gslib.cloud_api import ResumableUploadException
 from gslib.cloud_api import ResumableUploadStartOverException
@@ -29,6 +31,8 @@ from gslib.command import CreateGsutilLogger
 from gslib.discard_messages_queue import DiscardMessagesQueue
 from gslib.gcs_json_api import GcsJsonApi
 from gslib.parallel_tracker_file import ObjectFromTracker
+from gslib.sliced_download_scheduler import SlicedDownloadRangeStolenException
+from gslib.sliced_download_scheduler import SlicedDownloadScheduler
 from gslib.storage_url import StorageUrlFromString
 from gslib.tests.mock_cloud_api import MockCloudApi
 from gslib.tests.testcase.unit_testcase import GsUtilUnitTestCase
@@ -41,12 +45,16 @@ from gslib.utils import posix_util
 from gslib.utils import system_util
 from gslib.utils import hashing_helper
 from gslib.utils.copy_helper import _DelegateUploadFileToObject
+from gslib.utils.copy_helper import _FilterExistingIntermediates
+from gslib.utils.copy_helper import _GetIntermediateCompositeObjects
 from gslib.utils.copy_helper import _GetPartitionInfo
 from gslib.utils.copy_helper import _SelectUploadCompressionStrategy
 from gslib.utils.copy_helper import _SetContentTypeFromFile
+from gslib.utils.copy_helper import DestinationNameSet
 from gslib.utils.copy_helper import FilterExistingComponents
 from gslib.utils.copy_helper import GZIP_ALL_FILES
 from gslib.utils.copy_helper import PerformParallelUploadFileToObjectArgs
+from gslib.utils.copy_helper import SlicedDownloadPwriteSink
 from gslib.utils.copy_helper import WarnIfMvEarlyDeletionChargeApplies
 
 _CalculateB64EncodedMd5FromContents = (
@@ -97,6 +105,77 @@ class TestCpFuncs(GsUtilUnitTestCase):
     self.assertEquals(2, num_components)
     self.assertEqual(50, component_size)
 
+  def testGetIntermediateCompositeObjects(self):
+    """Tests grouping components into intermediate composite objects."""
+    # Uploads that fit in a single compose request have no intermediates.
+    self.assertEqual([], _GetIntermediateCompositeObjects('p', 32))
+
+    intermediates = _GetIntermediateCompositeObjects('p', 33)
+    self.assertEqual(33, len(intermediates))
+    self.assertEqual('p_intermediate_0', intermediates[0].object_name)
+    self.assertEqual(tuple('p_%d' % i for i in range(17)),
+                     intermediates[16].component_names)
+    self.assertEqual('p_intermediate_1', intermediates[17].object_name)
+    self.assertEqual(tuple('p_%d' % i for i in range(17, 33)),
+                     intermediates[32].component_names)
+
+    # The largest composite object needs exactly 32 full groups.
+    intermediates = _GetIntermediateCompositeObjects('p', 1024)
+    groups = sorted(set(intermediates))
+    self.assertEqual(32, len(groups))
+    self.assertTrue(all(len(group.component_names) == 32
+                        for group in groups))
+
+  def testGetIntermediateCompositeObjectsPipelined(self):
+    """Tests grouping components for pipelined composition."""
+    self.assertEqual([], _GetIntermediateCompositeObjects('p', 2,
+                                                          pipelined=True))
+    intermediates = _GetIntermediateCompositeObjects('p', 32, pipelined=True)
+    groups = sorted(set(intermediates))
+    self.assertEqual([6, 6, 5, 5, 5, 5],
+                     [len(group.component_names) for group in groups])
+    self.assertTrue(all(group.delete_components for group in groups))
+    # Groups never exceed the compose limit.
+    groups = set(_GetIntermediateCompositeObjects('p', 1024, pipelined=True))
+    self.assertEqual(32, len(groups))
+
+  @mock.patch('gslib.utils.copy_helper.UsingCrcmodExtension',
+              return_value=True)
+  def testFilterExistingIntermediates(self, _):
+    """Tests reuse of intermediate objects from a previous upload."""
+    bucket_url = StorageUrlFromString('gs://bucket')
+    fpath = self.CreateTempFile(contents='abcd')
+    intermediates = _GetIntermediateCompositeObjects('p', 4, pipelined=True)
+    dst_args = {}
+    for i in range(4):
+      dst_args['p_%d' % i] = PerformParallelUploadFileToObjectArgs(
+          fpath, i, 1, StorageUrlFromString(fpath),
+          StorageUrlFromString('gs://bucket/p_%d' % i), None, None, None,
+          None, None, False, intermediates[i])
+    with open(self.CreateTempFile(contents='ab'), 'rb') as fp:
+      matching_crc32c = hashing_helper.CalculateB64EncodedCrc32cFromContents(
+          fp)
+    crc32cs = {'p_intermediate_0': matching_crc32c,
+               'p_intermediate_1': matching_crc32c}
+    mock_api = mock.Mock()
+    mock_api.GetObjectMetadata.side_effect = (
+        lambda bucket, name, **_: apitools_messages.Object(
+            crc32c=crc32cs[name]))
+    existing_intermediates = [
+        ObjectFromTracker('p_intermediate_0', '1'),
+        ObjectFromTracker('p_intermediate_1', '2'),
+        ObjectFromTracker('p_intermediate_5', '3')]
+
+    (reused, to_delete) = _FilterExistingIntermediates(
+        sorted(set(intermediates)), existing_intermediates, dst_args,
+        bucket_url, mock_api)
+    self.assertEqual([existing_intermediates[0]], reused)
+    # Intermediates whose part of the file changed, or that are no longer part
+    # of the upload, are deleted.
+    self.assertEqual(
+        ['gs://bucket/p_intermediate_1#2', 'gs://bucket/p_intermediate_5#3'],
+        [url.url_string for url in to_delete])
+
   def testFilterExistingComponentsNonVersioned(self):
     """Tests upload with a variety of component states."""
     mock_api = MockCloudApi()
@@ -126,7 +205,7 @@ class TestCpFuncs(GsUtilUnitTestCase):
     args_uploaded_correctly = PerformParallelUploadFileToObjectArgs(
         fpath_uploaded_correctly, 0, 1, fpath_uploaded_correctly_url,
         object_uploaded_correctly_url, '', empty_object, tracker_file,
-        tracker_file_lock, None, False)
+        tracker_file_lock, None, False, None)
 
     # Not yet uploaded, but needed.
     fpath_not_uploaded = self.CreateTempFile(file_name='foo2', contents='2')
@@ -136,7 +215,7 @@ class TestCpFuncs(GsUtilUnitTestCase):
     args_not_uploaded = PerformParallelUploadFileToObjectArgs(
         fpath_not_uploaded, 0, 1, fpath_not_uploaded_url,
         object_not_uploaded_url, '', empty_object, tracker_file,
-        tracker_file_lock, None, False)
+        tracker_file_lock, None, False, None)
 
     # Already uploaded, but contents no longer match. Even though the contents
     # differ, we don't delete this since the bucket is not versioned and it
@@ -156,7 +235,7 @@ class TestCpFuncs(GsUtilUnitTestCase):
     args_wrong_contents = PerformParallelUploadFileToObjectArgs(
         fpath_wrong_contents, 0, 1, fpath_wrong_contents_url,
         object_wrong_contents_url, '', empty_object, tracker_file,
-        tracker_file_lock, None, False)
+        tracker_file_lock, None, False, None)
 
     # Exists in tracker file, but component object no longer exists.
     fpath_remote_deleted = self.CreateTempFile(file_name='foo5', contents='5')
@@ -164,7 +243,7 @@ class TestCpFuncs(GsUtilUnitTestCase):
         str(fpath_remote_deleted))
     args_remote_deleted = PerformParallelUploadFileToObjectArgs(
         fpath_remote_deleted, 0, 1, fpath_remote_deleted_url, '', '',
-        empty_object, tracker_file, tracker_file_lock, None, False)
+        empty_object, tracker_file, tracker_file_lock, None, False, None)
 
     # Exists in tracker file and already uploaded, but no longer needed.
     fpath_no_longer_used = self.CreateTempFile(file_name='foo6', contents='6')
@@ -233,7 +312,7 @@ class TestCpFuncs(GsUtilUnitTestCase):
     args_uploaded_correctly = PerformParallelUploadFileToObjectArgs(
         fpath_uploaded_correctly, 0, 1, fpath_uploaded_correctly_url,
         object_uploaded_correctly_url, object_uploaded_correctly.generation,
-        empty_object, tracker_file, tracker_file_lock, None, False)
+        empty_object, tracker_file, tracker_file_lock, None, False, None)
 
     # Duplicate object name in tracker file, but uploaded correctly.
     fpath_duplicate = fpath_uploaded_correctly
@@ -250,7 +329,7 @@ class TestCpFuncs(GsUtilUnitTestCase):
         fpath_duplicate, 0, 1, fpath_duplicate_url,
         duplicate_uploaded_correctly_url,
         duplicate_uploaded_correctly.generation, empty_object, tracker_file,
-        tracker_file_lock, None, False)
+        tracker_file_lock, None, False, None)
 
     # Already uploaded, but contents no longer match.
     fpath_wrong_contents = self.CreateTempFile(file_name='foo4', contents='4')
@@ -268,7 +347,7 @@ class TestCpFuncs(GsUtilUnitTestCase):
     args_wrong_contents = PerformParallelUploadFileToObjectArgs(
         fpath_wrong_contents, 0, 1, fpath_wrong_contents_url,
         wrong_contents_url, '', empty_object, tracker_file,
-        tracker_file_lock, None, False)
+        tracker_file_lock, None, False, None)
 
     dst_args = {fpath_uploaded_correctly: args_uploaded_correctly,
                 fpath_wrong_contents: args_wrong_contents}
@@ -537,3 +616,80 @@ class TestCpFuncs(GsUtilUnitTestCase):
     self.assertTrue(mock_stream.close.called)
     # Ensure the lock was released.
     self.assertFalse(mock_lock.__exit__.called)
+
+  def testDestinationNameSet(self):
+    """Tests answering existence checks from a destination listing."""
+    mock_api = mock.Mock()
+    mock_api.ListObjects.return_value = [
+        CloudApi.CsObjectOrPrefix(apitools_messages.Object(name=name),
+                                  CloudApi.CsObjectOrPrefixType.OBJECT)
+        for name in (u'dir/a', u'dir/b', u'dir/c\u00e9')]
+    logger = CreateGsutilLogger('copy_test')
+    dst_name_set = DestinationNameSet(StorageUrlFromString('gs://bucket/dir/'),
+                                      mock_api, 10, logger)
+    mock_api.ListObjects.assert_called_once_with(
+        'bucket', prefix='dir/', provider='gs', fields=['items/name'])
+    self.assertTrue(dst_name_set.ObjectExists(
+        StorageUrlFromString('gs://bucket/dir/a')))
+    self.assertTrue(dst_name_set.ObjectExists(
+        StorageUrlFromString(u'gs://bucket/dir/c\u00e9')))
+    self.assertFalse(dst_name_set.ObjectExists(
+        StorageUrlFromString('gs://bucket/dir/z')))
+    # URLs outside of the listing can't be answered.
+    self.assertIsNone(dst_name_set.ObjectExists(
+        StorageUrlFromString('gs://bucket/other/a')))
+    self.assertIsNone(dst_name_set.ObjectExists(
+        StorageUrlFromString('gs://bucket2/dir/a')))
+
+    # A listing cut short only answers for names up to the last one listed.
+    dst_name_set = DestinationNameSet(StorageUrlFromString('gs://bucket/dir/'),
+                                      mock_api, 2, logger)
+    self.assertTrue(dst_name_set.ObjectExists(
+        StorageUrlFromString('gs://bucket/dir/b')))
+    self.assertFalse(dst_name_set.ObjectExists(
+        StorageUrlFromString('gs://bucket/dir/aa')))
+    self.assertIsNone(dst_name_set.ObjectExists(
+        StorageUrlFromString(u'gs://bucket/dir/c\u00e9')))
+
+  @unittest.skipUnless(system_util.PositionalWriteAvailable(),
+                       'Positional writes are not available')
+  def testSlicedDownloadPwriteSink(self):
+    """Tests writing a download range at its offset in the file."""
+    src_obj_metadata = apitools_messages.Object(etag='abc', generation=1)
+    for direct_io in (False, True):
+      download_file_name = self.CreateTempFile(contents='x' * 20)
+      tracker_file_name = self.CreateTempFile(contents='')
+      scheduler = SlicedDownloadScheduler(download_file_name)
+      scheduler.Start([(0, 5, 14)], tracker_file_name=tracker_file_name,
+                      src_obj_metadata=src_obj_metadata, num_components=2)
+      self.addCleanup(scheduler.Finish)
+      byte_range = scheduler.ClaimRange()
+      sink = SlicedDownloadPwriteSink(download_file_name, scheduler,
+                                      byte_range.range_id, 0, 14,
+                                      direct_io=direct_io)
+      sink.seek(5)
+      sink.write('abc')
+      sink.write('defghij')
+      self.assertEqual(15, sink.tell())
+      sink.close()
+      with open(download_file_name, 'rb') as fp:
+        self.assertEqual('xxxxxabcdefghijxxxxx', fp.read())
+      with open(tracker_file_name, 'r') as fp:
+        self.assertEqual([[0, 14]], json.load(fp)['completed_ranges'])
+
+  @unittest.skipUnless(system_util.PositionalWriteAvailable(),
+                       'Positional writes are not available')
+  def testSlicedDownloadPwriteSinkStolenRange(self):
+    """Tests that a sink stops at the new end of a stolen range."""
+    download_file_name = self.CreateTempFile(contents='x' * 20)
+    scheduler = mock.Mock()
+    # The end of the range is moved from byte 19 to byte 9.
+    scheduler.UpdateProgress.return_value = 9
+    sink = SlicedDownloadPwriteSink(download_file_name, scheduler, 0, 0, 19)
+    sink.write('abcdef')
+    with self.assertRaises(SlicedDownloadRangeStolenException) as context:
+      sink.write('ghijkl')
+    self.assertEqual(9, context.exception.end_byte)
+    sink.close()
+    with open(download_file_name, 'rb') as fp:
+      self.assertEqual('abcdefghijxxxxxxxxxx', fp.read())
@@ -464,6 +464,25 @@ class TestCp(testcase.GsUtilIntegrationTestCase):
       self.assertIn('Skipping existing item: %s' % suri(f), stderr)
       self.assertEqual(f.read(), 'bar')
 
+  @SequentialAndParallelTransfer
+  def test_noclobber_multiple_files(self):
+    bucket_uri = self.CreateBucket()
+    existing_uri = self.CreateObject(bucket_uri=bucket_uri, object_name='dir/a',
+                                     contents='foo')
+    tmpdir = self.CreateTempDir(test_files=['a', 'b', 'c'])
+    # The destination is listed once, so with the prefetch limit at 1, 'a' is
+    # answered from the listing and 'b' and 'c' are checked individually.
+    for prefetch_max_objects in ('1000', '1'):
+      with SetBotoConfigForTest([('GSUtil', 'no_clobber_prefetch_max_objects',
+                                  prefetch_max_objects)]):
+        stderr = self.RunGsUtil(['cp', '-n', os.path.join(tmpdir, '*'),
+                                 suri(bucket_uri, 'dir')], return_stderr=True)
+      self.assertIn('Skipping existing item: %s' % suri(existing_uri), stderr)
+      self.assertEqual(existing_uri.get_contents_as_string(), 'foo')
+    stdout = self.RunGsUtil(['ls', suri(bucket_uri, 'dir', '**')],
+                            return_stdout=True)
+    self.assertEqual(3, len(stdout.splitlines()))
+
   def test_dest_bucket_not_exist(self):
     fpath = self.CreateTempFile(contents='foo')
     invalid_bucket_uri = (
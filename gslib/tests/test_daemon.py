@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the gsutil daemon and daemon command."""
+
+from __future__ import absolute_import
+
+import os
+import socket
+
+from gslib import daemon
+import gslib.tests.testcase as testcase
+from gslib.tests.util import ObjectToURI as suri
+from gslib.tests.util import unittest
+from gslib.utils.system_util import IS_WINDOWS
+
+
+class TestDaemonUnitTests(testcase.GsUtilUnitTestCase):
+  """Unit tests for the gsutil daemon protocol helpers."""
+
+  def test_should_run_via_daemon(self):
+    self.assertTrue(daemon.ShouldRunViaDaemon(['stat', 'gs://b/o']))
+    self.assertTrue(daemon.ShouldRunViaDaemon(
+        ['-m', '-o', 'GSUtil:parallel_thread_count=4', 'cp', 'a', 'gs://b']))
+    self.assertFalse(daemon.ShouldRunViaDaemon([]))
+    self.assertFalse(daemon.ShouldRunViaDaemon(['-q']))
+    self.assertFalse(daemon.ShouldRunViaDaemon(['config', '-n']))
+    self.assertFalse(daemon.ShouldRunViaDaemon(['daemon', 'stop']))
+    self.assertFalse(daemon.ShouldRunViaDaemon(['--bogus-option', 'ls']))
+
+  @unittest.skipIf(IS_WINDOWS, 'Unix domain sockets not available on Windows.')
+  def test_frame_round_trip(self):
+    sock1, sock2 = socket.socketpair()
+    try:
+      daemon.SendFrame(sock1, daemon.FRAME_STDOUT, 'x' * 100000)
+      daemon.SendFrame(sock1, daemon.FRAME_STDIN_EOF)
+      sock1.close()
+      self.assertEqual((daemon.FRAME_STDOUT, 'x' * 100000),
+                       daemon.RecvFrame(sock2))
+      self.assertEqual((daemon.FRAME_STDIN_EOF, ''), daemon.RecvFrame(sock2))
+      self.assertEqual((None, None), daemon.RecvFrame(sock2))
+    finally:
+      sock2.close()
+
+  @unittest.skipIf(IS_WINDOWS, 'Unix domain sockets not available on Windows.')
+  def test_no_daemon_listening_runs_in_process(self):
+    socket_path = os.path.join(self.CreateTempDir(), 'daemon.sock')
+    self.assertIsNone(daemon.RunCommandViaDaemon(socket_path, ['ls']))
+
+
+@unittest.skipIf(IS_WINDOWS, 'The daemon command is not supported on Windows.')
+class TestDaemon(testcase.GsUtilIntegrationTestCase):
+  """Integration tests for the daemon command."""
+
+  def test_commands_run_via_daemon(self):
+    socket_path = os.path.join(self.CreateTempDir(), 'daemon.sock')
+    self.RunGsUtil(['daemon', 'start', '-s', socket_path])
+    try:
+      stdout = self.RunGsUtil(['daemon', 'status', '-s', socket_path],
+                              return_stdout=True)
+      self.assertIn('gsutil daemon listening on %s' % socket_path, stdout)
+
+      object_uri = self.CreateObject(contents='foo')
+      env_vars = {daemon.DAEMON_SOCKET_ENV_VAR: socket_path}
+      stdout = self.RunGsUtil(['cat', suri(object_uri)], return_stdout=True,
+                              env_vars=env_vars)
+      self.assertEqual('foo', stdout)
+      self.RunGsUtil(['cp', '-', suri(object_uri)], stdin='bar',
+                     env_vars=env_vars)
+      stdout = self.RunGsUtil(['cat', suri(object_uri)], return_stdout=True,
+                              env_vars=env_vars)
+      self.assertEqual('bar', stdout)
+      # Failures are reported with the command's exit status.
+      self.RunGsUtil(['cat', suri(object_uri) + '-nonexistent'],
+                     expected_status=1, env_vars=env_vars)
+    finally:
+      self.RunGsUtil(['daemon', 'stop', '-s', socket_path])
+
+  def test_status_without_daemon(self):
+    socket_path = os.path.join(self.CreateTempDir(), 'daemon.sock')
+    stdout = self.RunGsUtil(['daemon', 'status', '-s', socket_path],
+                            return_stdout=True, expected_status=1)
+    self.assertIn('No gsutil daemon listening', stdout)
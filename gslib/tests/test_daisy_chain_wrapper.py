@@ -196,15 +196,39 @@ class TestDaisyChainWrapper(testcase.GsUtilUnitTestCase):
       for write_value in write_values:
         expected_contents += write_value
       mock_api = self.MockDownloadCloudApi(write_values)
+      # The mock doesn't split write values at range boundaries, so download
+      # each case with a single request.
       daisy_chain_wrapper = DaisyChainWrapper(
           self._dummy_url, len(expected_contents), mock_api,
-          download_chunk_size=self.test_data_file_len)
+          download_chunk_size=len(expected_contents))
       self._WriteFromWrapperToFile(daisy_chain_wrapper, upload_file)
       with open(upload_file, 'rb') as upload_stream:
         self.assertEqual(upload_stream.read(), expected_contents,
                          'Uploaded file contents for case %s did not match'
                          % case_name)
 
+  def testDownloadMultipleStreams(self):
+    """Tests concurrent range downloads into a small ring buffer."""
+    write_values = []
+    with open(self.test_data_file, 'rb') as stream:
+      while True:
+        data = stream.read(TRANSFER_BUFFER_SIZE)
+        if not data:
+          break
+        write_values.append(data)
+    upload_file = self.CreateTempFile()
+    mock_api = self.MockDownloadCloudApi(write_values)
+    # Each stream downloads one TRANSFER_BUFFER_SIZE range at a time, and only
+    # three ranges fit in the buffer at once.
+    daisy_chain_wrapper = DaisyChainWrapper(
+        self._dummy_url, self.test_data_file_len, mock_api,
+        download_chunk_size=self.test_data_file_len, num_download_streams=3,
+        max_buffer_size=3 * TRANSFER_BUFFER_SIZE)
+    self._WriteFromWrapperToFile(daisy_chain_wrapper, upload_file)
+    with open(upload_file, 'rb') as upload_stream:
+      with open(self.test_data_file, 'rb') as download_stream:
+        self.assertEqual(upload_stream.read(), download_stream.read())
+
   def testSeekAndReturn(self):
     """Tests seeking to the end of the wrapper (simulates getting size)."""
     write_values = []
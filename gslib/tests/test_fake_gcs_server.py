@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unit tests for the fake GCS JSON API server, through GcsJsonApi."""
+
+from __future__ import absolute_import
+
+import cStringIO
+import os
+
+from boto import storage_uri
+
+from gslib.cloud_api import CloudApi
+from gslib.cloud_api import NotFoundException
+from gslib.cloud_api import Preconditions
+from gslib.cloud_api import PreconditionException
+from gslib.command import CreateGsutilLogger
+from gslib.discard_messages_queue import DiscardMessagesQueue
+from gslib.fake_gcs_server import FakeGcsServer
+from gslib.gcs_json_api import GcsJsonApi
+from gslib.no_op_credentials import NoOpCredentials
+import gslib.tests.testcase as testcase
+from gslib.tests.util import SetBotoConfigForTest
+from gslib.third_party.storage_apitools import storage_v1_messages as apitools_messages
+from gslib.utils.cloud_api_helper import GetDownloadSerializationData
+from gslib.utils.hashing_helper import CalculateB64EncodedMd5FromContents
+
+_DATA = os.urandom(300 * 1024 + 123)
+
+
+class TestFakeGcsServer(testcase.GsUtilUnitTestCase):
+  """Runs GcsJsonApi calls against a FakeGcsServer."""
+
+  def setUp(self):
+    super(TestFakeGcsServer, self).setUp()
+    self.server = FakeGcsServer(seed=0)
+    self.server.Start()
+    self.addCleanup(self.server.Stop)
+    self.server.CreateBucket('bucket')
+    boto_config = SetBotoConfigForTest(self.server.GetBotoConfig())
+    boto_config.__enter__()
+    self.addCleanup(boto_config.__exit__, None, None, None)
+    self.gsutil_api = self._CreateApi()
+
+  def _CreateApi(self):
+    return GcsJsonApi(storage_uri, CreateGsutilLogger('fake_gcs'),
+                      DiscardMessagesQueue(), credentials=NoOpCredentials())
+
+  def _Upload(self, object_name, data, resumable=False, preconditions=None):
+    object_metadata = apitools_messages.Object(
+        name=object_name, bucket='bucket', contentType='text/plain')
+    upload = (self.gsutil_api.UploadObjectResumable if resumable
+              else self.gsutil_api.UploadObject)
+    return upload(cStringIO.StringIO(data), object_metadata, size=len(data),
+                  preconditions=preconditions)
+
+  def _Download(self, object_name, **kwargs):
+    stream = cStringIO.StringIO()
+    self.gsutil_api.GetObjectMedia('bucket', object_name, stream, **kwargs)
+    return stream.getvalue()
+
+  def test_upload_and_download(self):
+    uploaded = self._Upload('dir/simple', _DATA)
+    self.assertEqual(len(_DATA), uploaded.size)
+    self.assertEqual('text/plain', uploaded.contentType)
+    self.assertEqual(
+        CalculateB64EncodedMd5FromContents(cStringIO.StringIO(_DATA)),
+        uploaded.md5Hash)
+    self.assertEqual(_DATA, self.server.GetObject('bucket', 'dir/simple')[1])
+    self.assertEqual(_DATA, self._Download('dir/simple'))
+    self.assertEqual(_DATA[100:1000],
+                     self._Download('dir/simple', start_byte=100, end_byte=999))
+    self.assertEqual(_DATA[-10:], self._Download('dir/simple', start_byte=-10))
+
+  def test_resumable_download_from_media_link(self):
+    uploaded = self._Upload(u'dir/résumé', _DATA)
+    # Like sliced downloads, download a range from the object's media link.
+    self.assertEqual(_DATA[1000:2000], self._Download(
+        u'dir/résumé', start_byte=1000, end_byte=1999,
+        download_strategy=CloudApi.DownloadStrategy.RESUMABLE,
+        serialization_data=GetDownloadSerializationData(uploaded)))
+
+  def test_resumable_upload(self):
+    with SetBotoConfigForTest([('GSUtil', 'json_resumable_chunk_size',
+                                str(256 * 1024))]):
+      uploaded = self._Upload(u'resumable é', _DATA, resumable=True)
+    self.assertEqual(u'resumable é', uploaded.name)
+    self.assertEqual(_DATA, self.server.GetObject('bucket', u'resumable é')[1])
+
+  def test_reused_upload_connections(self):
+    # Uploads share one connection class, which tracks each upload's bytes.
+    for i in xrange(3):
+      self._Upload('obj%d' % i, _DATA[:1000 * (i + 1)])
+    for i in xrange(3):
+      self.assertEqual(_DATA[:1000 * (i + 1)],
+                       self.server.GetObject('bucket', 'obj%d' % i)[1])
+
+  def test_preconditions(self):
+    uploaded = self._Upload('obj', 'data1')
+    with self.assertRaises(PreconditionException):
+      self._Upload('obj', 'data2', preconditions=Preconditions(gen_match=1))
+    self._Upload('obj', 'data2',
+                 preconditions=Preconditions(gen_match=uploaded.generation))
+    self.assertEqual('data2', self.server.GetObject('bucket', 'obj')[1])
+
+  def test_list_objects(self):
+    for name in ('a', 'dir1/b', 'dir1/c', 'dir2/d', 'e'):
+      self.server.CreateObject('bucket', name, name)
+    # Pages end after the last object or prefix that fits.
+    listing = self.server.ListObjects('bucket', {'delimiter': '/',
+                                                 'maxResults': '2'})
+    self.assertEqual(['a'], [item['name'] for item in listing['items']])
+    self.assertEqual(['dir1/'], listing['prefixes'])
+    listing = self.server.ListObjects(
+        'bucket', {'delimiter': '/', 'pageToken': listing['nextPageToken']})
+    self.assertEqual(['e'], [item['name'] for item in listing['items']])
+    self.assertEqual(['dir2/'], listing['prefixes'])
+    results = list(self.gsutil_api.ListObjects('bucket', delimiter='/'))
+    self.assertEqual(['dir1/', 'dir2/'],
+                     [r.data for r in results if r.datatype == 'prefix'])
+    self.assertEqual(['a', 'e'],
+                     [r.data.name for r in results if r.datatype == 'object'])
+    results = list(self.gsutil_api.ListObjects('bucket', prefix='dir1/'))
+    self.assertEqual(['dir1/b', 'dir1/c'], [r.data.name for r in results])
+
+  def test_compose_rewrite_and_delete(self):
+    self.server.CreateObject('bucket', 'part1', 'abc')
+    self.server.CreateObject('bucket', 'part2', 'def')
+    composed = self.gsutil_api.ComposeObject(
+        [apitools_messages.ComposeRequest.SourceObjectsValueListEntry(
+            name='part1'),
+         apitools_messages.ComposeRequest.SourceObjectsValueListEntry(
+             name='part2')],
+        apitools_messages.Object(name='composed', bucket='bucket'))
+    self.assertEqual(2, composed.componentCount)
+    self.assertIsNone(composed.md5Hash)
+    self.assertEqual('abcdef', self._Download('composed'))
+    copied = self.gsutil_api.CopyObject(
+        composed, apitools_messages.Object(name='copy', bucket='bucket'))
+    self.assertEqual(6, copied.size)
+    self.assertEqual('abcdef', self.server.GetObject('bucket', 'copy')[1])
+    self.gsutil_api.DeleteObject('bucket', 'copy')
+    with self.assertRaises(NotFoundException):
+      self.gsutil_api.GetObjectMetadata('bucket', 'copy')
+
+  def test_injected_errors_are_retried(self):
+    self.server.error_rate = 0.5
+    with SetBotoConfigForTest([('Boto', 'num_retries', '20'),
+                               ('Boto', 'max_retry_delay', '1')]):
+      # Retry settings are read when the API is created.
+      self.gsutil_api = self._CreateApi()
+      for i in xrange(3):
+        self._Upload('obj%d' % i, 'data%d' % i)
+        self.assertEqual(
+            5, self.gsutil_api.GetObjectMetadata('bucket', 'obj%d' % i).size)
+    self.assertGreater(self.server.injected_error_count, 0)
+    self.server.error_rate = 0
+    for i in xrange(3):
+      self.assertEqual('data%d' % i, self._Download('obj%d' % i))
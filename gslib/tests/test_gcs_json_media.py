@@ -104,3 +104,29 @@ class TestUploadCallbackConnection(testcase.GsUtilUnitTestCase):
     self.assertTrue(mock_callback.Progress.called)
     [sent_bytes], _ = mock_callback.Progress.call_args_list[0]
     self.assertEqual(sent_bytes, 20)
+
+  @mock.patch('gslib.gcs_json_media.ProgressCallbackWithTimeout')
+  @mock.patch('httplib2.HTTPSConnectionWithTimeout')
+  @mock.patch('httplib.HTTPSConnection')
+  def testReusedConnectionReportsNewUpload(self, unused_mock_httplib_conn,
+                                           mock_conn, mock_callback):
+    """Tests that a connection reused by a later upload reports on it."""
+    mock_conn.send.return_value = None
+    self.instance.putheader('content-encoding', 'gzip')
+    self.instance.putheader('content-length', '10')
+    self.instance.putheader('content-range', 'bytes 0-99/*')
+    self.instance.send(b'0123456789')
+    self.assertAlmostEqual(self.instance.size_modifier, 10.0)
+    mock_callback.assert_called_once_with(100, 'Sample')
+
+    new_container = BytesTransferredContainer()
+    new_container.bytes_transferred = 5
+    self.class_factory.StartUpload(new_container, total_size=200,
+                                   progress_callback='Other')
+    self.assertEqual(200, self.instance.size)
+    self.instance.send(b'0123456789')
+    # The size modifier from the previous upload's headers no longer applies.
+    self.assertAlmostEqual(self.instance.size_modifier, 1.0)
+    mock_callback.assert_called_with(200, 'Other')
+    mock_callback.return_value.Progress.assert_any_call(5)
+    mock_callback.return_value.Progress.assert_called_with(10)
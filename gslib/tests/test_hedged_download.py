@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unit tests for hedged download requests."""
+
+from __future__ import absolute_import
+
+import collections
+import hashlib
+import logging
+import time
+
+from gslib import hedged_download
+from gslib.hedged_download import GetHedgedDownloadCounts
+from gslib.hedged_download import GetHedgeDelay
+from gslib.hedged_download import HedgedDownload
+from gslib.hedged_download import HedgedDownloadCancelledException
+from gslib.hedged_download import RecordDownloadStall
+import gslib.tests.testcase as testcase
+
+import mock
+
+_DATA = 'abcdefghijklmnopqrstuvwxyz'
+
+
+class _FakeHttp(object):
+
+  def __init__(self):
+    self.connections = {}
+    self.stream = None
+
+
+def _HedgeFunc(http, start_byte, end_byte):
+  http.stream.write(_DATA[start_byte:end_byte + 1])
+
+
+class TestHedgedDownload(testcase.GsUtilUnitTestCase):
+  """Unit tests for HedgedDownload and the hedge delay."""
+
+  def setUp(self):
+    super(TestHedgedDownload, self).setUp()
+    self.download_file_name = self.CreateTempFile()
+    self.download_stream = open(self.download_file_name, 'wb')
+    self.addCleanup(self.download_stream.close)
+
+  def _MakeHedgedDownload(self, hedge_delay):
+    return HedgedDownload(self.download_stream, 0, len(_DATA) - 1, hedge_delay,
+                          _FakeHttp(), _FakeHttp, _HedgeFunc,
+                          logging.getLogger())
+
+  def test_hedge_delay_percentile(self):
+    with mock.patch.object(hedged_download, '_stall_samples',
+                           collections.deque(maxlen=100)):
+      RecordDownloadStall(5)
+      self.assertEqual(hedged_download.DEFAULT_HEDGE_DELAY, GetHedgeDelay(95))
+      for i in range(1, 20):
+        RecordDownloadStall(i / 10.0)
+      self.assertEqual(1.8, GetHedgeDelay(90))
+      self.assertEqual(5, GetHedgeDelay(100))
+      self.assertEqual(hedged_download.MIN_HEDGE_DELAY, GetHedgeDelay(1))
+
+  def test_hedge_wins_over_stalled_request(self):
+    counts = GetHedgedDownloadCounts()
+    digesters = {'md5': hashlib.md5()}
+    download = self._MakeHedgedDownload(0.01)
+    download.Start()
+    digesters['md5'].update(_DATA[:3])
+    download.stream.write(_DATA[:3])
+    # The stalled request only notices that it lost when it receives more.
+    while not download.stream.cancelled:
+      time.sleep(0.01)
+    digesters['md5'].update(_DATA[3:5])
+    with self.assertRaises(HedgedDownloadCancelledException):
+      download.stream.write(_DATA[3:5])
+    download.Finish(False)
+    self.assertTrue(download.WaitForHedge())
+    download.CopyHedgedBytes(digesters=digesters)
+    self.download_stream.close()
+
+    with open(self.download_file_name, 'rb') as download_file:
+      self.assertEqual(_DATA, download_file.read())
+    self.assertEqual(hashlib.md5(_DATA).hexdigest(),
+                     digesters['md5'].hexdigest())
+    self.assertEqual((counts.issued + 1, counts.won + 1),
+                     tuple(GetHedgedDownloadCounts()))
+
+  def test_no_hedge_without_stall(self):
+    counts = GetHedgedDownloadCounts()
+    download = self._MakeHedgedDownload(60)
+    download.Start()
+    download.stream.write(_DATA)
+    download.Finish(True)
+    self.assertEqual(counts, GetHedgedDownloadCounts())
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unit tests for the live metrics file."""
+
+from __future__ import absolute_import
+
+import os
+
+import six
+from six.moves import queue as Queue
+
+import gslib.tests.testcase as testcase
+from gslib.storage_url import StorageUrlFromString
+from gslib.thread_message import FileMessage
+from gslib.thread_message import MetadataMessage
+from gslib.thread_message import RetryableErrorMessage
+from gslib.ui_controller import UIController
+from gslib.utils import live_metrics
+from gslib.utils import perf_util
+
+# pylint: disable=protected-access
+
+
+def _ParseMetrics(text):
+  """Returns a dict of sample (name and labels) to value."""
+  samples = {}
+  for line in text.splitlines():
+    if line and not line.startswith('#'):
+      sample, value = line.rsplit(' ', 1)
+      samples[sample] = float(value)
+  return samples
+
+
+class TestLiveMetrics(testcase.GsUtilObserverUnitTestCase):
+  """Unit tests for live_metrics."""
+
+  def setUp(self):
+    super(TestLiveMetrics, self).setUp()
+    self.stream = six.StringIO()
+
+  def _Start(self):
+    return self.StartObserver(
+        'metrics_textfile',
+        os.path.join(self.CreateTempDir(), 'gsutil.prom'))
+
+  def test_nothing_recorded_without_textfile(self):
+    self.StartObserver('metrics_textfile', None)
+    self.assertFalse(live_metrics.IsEnabled())
+    UIController().Call(RetryableErrorMessage(ValueError(), 1), self.stream)
+    self.assertEqual({}, live_metrics._observer.retries)
+
+  def test_data_metrics(self):
+    textfile_path = self._Start()
+    task_queue = Queue.Queue()
+    task_queue.put(1)
+    live_metrics.SetWorkers(4, task_queue=task_queue)
+    perf_util.Record(perf_util.PHASE_TASK, 0.5)
+    src_url = StorageUrlFromString('gs://bucket/obj')
+    dst_url = StorageUrlFromString('file://obj')
+    ui_controller = UIController()
+    ui_controller.Call(FileMessage(
+        src_url, dst_url, 1, size=10, message_type=FileMessage.FILE_DOWNLOAD),
+                       self.stream)
+    # Messages from other processes carry copies of the URLs.
+    ui_controller.Call(FileMessage(
+        StorageUrlFromString('gs://bucket/obj'),
+        StorageUrlFromString('file://obj'), 2, size=10, component_num=0,
+        message_type=FileMessage.COMPONENT_TO_DOWNLOAD,
+        bytes_already_downloaded=0), self.stream)
+    for message_type, component_num in (
+        (FileMessage.COMPONENT_TO_DOWNLOAD, 0), (FileMessage.FILE_DOWNLOAD,
+                                                 None)):
+      ui_controller.Call(FileMessage(
+          src_url, dst_url, 3, size=10, finished=True,
+          component_num=component_num, message_type=message_type),
+                         self.stream)
+    ui_controller.Call(FileMessage(
+        dst_url, src_url, 4, size=20, message_type=FileMessage.FILE_UPLOAD),
+                       self.stream)
+    for _ in range(2):
+      ui_controller.Call(RetryableErrorMessage(ValueError(), 3), self.stream)
+    live_metrics._observer.WriteOutput(finished=False)
+    with open(textfile_path) as textfile:
+      samples = _ParseMetrics(textfile.read())
+    self.assertEqual(1, samples['gsutil_running'])
+    self.assertEqual(1, samples['gsutil_objects_done_total'])
+    self.assertEqual(2, samples['gsutil_objects'])
+    self.assertEqual(30, samples['gsutil_bytes'])
+    self.assertIn('gsutil_bytes_done_total', samples)
+    self.assertIn('gsutil_throughput_bytes_per_second', samples)
+    self.assertEqual(2, samples['gsutil_retries_total{error_type="ValueError"}'])
+    self.assertEqual(1, samples['gsutil_transfers_in_flight'])
+    self.assertEqual(1, samples['gsutil_task_queue_depth'])
+    self.assertNotIn('gsutil_status_queue_depth', samples)
+    self.assertEqual(4, samples['gsutil_worker_threads'])
+    self.assertEqual(0.5, samples['gsutil_worker_busy_seconds_total'])
+    self.assertTrue(0 <= samples['gsutil_worker_idle_ratio'] <= 1)
+    # Only the finished file remains.
+    self.assertEqual([textfile_path],
+                     [os.path.join(os.path.dirname(textfile_path), name)
+                      for name in os.listdir(os.path.dirname(textfile_path))])
+
+  def test_metadata_metrics_when_finished(self):
+    textfile_path = self._Start()
+    ui_controller = UIController()
+    ui_controller.Call(MetadataMessage(1), self.stream)
+    live_metrics._observer.WriteOutput()
+    with open(textfile_path) as textfile:
+      samples = _ParseMetrics(textfile.read())
+    self.assertEqual(0, samples['gsutil_running'])
+    self.assertEqual(1, samples['gsutil_objects_done_total'])
+    self.assertIn('gsutil_throughput_objects_per_second', samples)
+    self.assertNotIn('gsutil_bytes_done_total', samples)
+    self.assertNotIn('gsutil_worker_idle_ratio', samples)
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unit tests for reading and writing cp -L manifest files."""
+
+from __future__ import absolute_import
+
+import csv
+import os
+import threading
+
+from gslib import manifest_store
+from gslib.exception import CommandException
+from gslib.manifest_store import IterSuccessfulSources
+from gslib.manifest_store import MANIFEST_HEADER
+from gslib.manifest_store import ManifestIndex
+from gslib.manifest_store import ManifestWriter
+from gslib.manifest_store import WriteManifestHeaderIfNeeded
+import gslib.tests.testcase as testcase
+from gslib.tests.util import SetBotoConfigForTest
+from gslib.tests.util import unittest
+from gslib.utils.copy_helper import Manifest
+
+
+def _Row(source, result):
+  return [source, 'gs://bucket/' + source, '', '', '', '', '', '', result, '']
+
+
+def _AppendRows(manifest_path, rows):
+  with open(manifest_path, 'ab') as f:
+    csv.writer(f).writerows(rows)
+
+
+def _ReadRows(manifest_path):
+  with open(manifest_path, 'rb') as f:
+    return list(csv.reader(f))
+
+
+class TestManifestStore(testcase.GsUtilUnitTestCase):
+  """Unit tests for manifest reading and writing."""
+
+  def setUp(self):
+    super(TestManifestStore, self).setUp()
+    self.manifest_path = os.path.join(self.CreateTempDir(), 'manifest.csv')
+    WriteManifestHeaderIfNeeded(self.manifest_path)
+
+  def test_iter_successful_sources(self):
+    _AppendRows(self.manifest_path,
+                [_Row('a', 'OK'), _Row('b', 'error'), _Row('c', 'skip')])
+    size = os.path.getsize(self.manifest_path)
+    # A row cut short by a crash is ignored.
+    _AppendRows(self.manifest_path, [_Row('d', 'OK'), ['e']])
+    self.assertEqual(['a', 'c', 'd'],
+                     list(IterSuccessfulSources(self.manifest_path)))
+    self.assertEqual(['d'],
+                     list(IterSuccessfulSources(self.manifest_path, size)))
+
+  def test_writer_writes_rows_from_many_threads(self):
+    writer = ManifestWriter(self.manifest_path, threading.Lock())
+    threads = [threading.Thread(target=writer.Write,
+                                args=(_Row(str(i), 'OK'), True))
+               for i in range(50)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    rows = _ReadRows(self.manifest_path)
+    self.assertEqual(MANIFEST_HEADER, rows[0])
+    self.assertEqual(set(str(i) for i in range(50)),
+                     set(row[0] for row in rows[1:]))
+
+  def test_writer_reports_errors(self):
+    writer = ManifestWriter(os.path.join(self.manifest_path, 'missing'),
+                            threading.Lock())
+    with self.assertRaises(IOError):
+      writer.Write(_Row('a', 'OK'), True)
+
+  def test_manifest_rejects_missing_headers(self):
+    with open(self.manifest_path, 'wb') as f:
+      f.write('a,b\n')
+    with self.assertRaises(CommandException):
+      Manifest(self.manifest_path)
+
+
+@unittest.skipUnless(manifest_store.sqlite3, 'sqlite3 is not available')
+class TestManifestIndex(testcase.GsUtilUnitTestCase):
+  """Unit tests for the SQLite manifest index."""
+
+  def setUp(self):
+    super(TestManifestIndex, self).setUp()
+    self.manifest_path = os.path.join(self.CreateTempDir(), 'manifest.csv')
+    WriteManifestHeaderIfNeeded(self.manifest_path)
+    self.db_path = os.path.join(self.CreateTempDir(), 'index.db')
+
+  def _NewIndex(self):
+    index = ManifestIndex(self.manifest_path, self.db_path)
+    index.Update()
+    return index
+
+  def test_update_reads_appended_rows(self):
+    _AppendRows(self.manifest_path, [_Row('a', 'OK'), _Row('b', 'error')])
+    index = self._NewIndex()
+    self.assertTrue(index.Contains('a'))
+    self.assertFalse(index.Contains('b'))
+    _AppendRows(self.manifest_path, [_Row('b', 'OK')])
+    self.assertFalse(index.Contains('b'))
+    index.Update()
+    self.assertTrue(index.Contains('b'))
+    # Later failures don't undo earlier successes.
+    _AppendRows(self.manifest_path, [_Row('a', 'error')])
+    self.assertTrue(self._NewIndex().Contains('a'))
+
+  def test_update_reindexes_replaced_manifest(self):
+    _AppendRows(self.manifest_path, [_Row('a', 'OK')])
+    self._NewIndex()
+    os.unlink(self.manifest_path)
+    WriteManifestHeaderIfNeeded(self.manifest_path)
+    _AppendRows(self.manifest_path, [_Row('b', 'OK')])
+    index = self._NewIndex()
+    self.assertFalse(index.Contains('a'))
+    self.assertTrue(index.Contains('b'))
+
+  def test_writer_adds_rows_to_index(self):
+    index = self._NewIndex()
+    writer = ManifestWriter(self.manifest_path, threading.Lock(), index=index)
+    writer.Write(_Row(u'föö'.encode('utf-8'), 'OK'), True)
+    writer.Write(_Row('b', 'error'), False)
+    self.assertTrue(index.Contains(u'föö'))
+    self.assertFalse(index.Contains('b'))
+    # Rows appended by others are still read by the next update.
+    _AppendRows(self.manifest_path, [_Row('c', 'OK')])
+    index.Update()
+    self.assertTrue(index.Contains('c'))
+
+  def test_manifest_uses_index(self):
+    _AppendRows(self.manifest_path, [_Row('a', 'OK')])
+    with SetBotoConfigForTest([
+        ('GSUtil', 'manifest_store', 'sqlite'),
+        ('GSUtil', 'state_dir', self.CreateTempDir())]):
+      manifest = Manifest(self.manifest_path)
+      self.assertIsNotNone(manifest.index_path)
+      self.assertTrue(manifest.WasSuccessful('a'))
+      manifest.Initialize('b', 'gs://bucket/b')
+      manifest.SetResult('b', 1, 'OK')
+      self.assertTrue(manifest.WasSuccessful('b'))
+      self.assertTrue(Manifest(self.manifest_path).WasSuccessful('b'))
+    self.assertEqual(['a', 'b'],
+                     [row[0] for row in _ReadRows(self.manifest_path)[1:]])
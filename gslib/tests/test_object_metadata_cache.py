@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unit tests for the object metadata cache."""
+
+from __future__ import absolute_import
+
+from gslib.cloud_api import CloudApi
+from gslib.cloud_api_delegator import CloudApiDelegator
+from gslib.cs_api_map import ApiMapConstants
+from gslib.object_metadata_cache import ObjectMetadataCache
+import gslib.tests.testcase as testcase
+from gslib.third_party.storage_apitools import storage_v1_messages as apitools_messages
+
+import mock
+
+
+def _MakeObject(name, generation, size=None, md5_hash=None, metageneration=1):
+  return apitools_messages.Object(
+      bucket='bucket', name=name, generation=generation, size=size,
+      md5Hash=md5_hash, metageneration=metageneration)
+
+
+class TestObjectMetadataCache(testcase.GsUtilUnitTestCase):
+  """Unit tests for ObjectMetadataCache."""
+
+  def setUp(self):
+    super(TestObjectMetadataCache, self).setUp()
+    self.cache = ObjectMetadataCache(ttl=60, max_entries=10)
+
+  def test_listing_fills_cache(self):
+    listing = [
+        CloudApi.CsObjectOrPrefix(_MakeObject('obj', 1, size=3),
+                                  CloudApi.CsObjectOrPrefixType.OBJECT),
+        CloudApi.CsObjectOrPrefix('dir/', CloudApi.CsObjectOrPrefixType.PREFIX),
+    ]
+    self.assertEqual(listing, list(self.cache.AddListing(
+        'gs', 'bucket', iter(listing),
+        ['items/name', 'items/generation', 'items/size', 'prefixes'])))
+
+    obj = self.cache.GetObject('gs', 'bucket', 'obj', fields=['name', 'size'])
+    self.assertEqual(3, obj.size)
+    self.assertEqual(1, self.cache.GetObject(
+        'gs', 'bucket', 'obj', generation='1', fields=['size']).generation)
+    # Fields that weren't listed, and requests for all fields, are misses.
+    self.assertIsNone(self.cache.GetObject('gs', 'bucket', 'obj',
+                                           fields=['md5Hash']))
+    self.assertIsNone(self.cache.GetObject('gs', 'bucket', 'obj'))
+    self.assertEqual((2, 2), tuple(self.cache.GetStats()))
+
+  def test_field_subsets_are_merged(self):
+    self.cache.AddObject('gs', 'bucket', _MakeObject('obj', 1, size=3),
+                         ['name', 'generation', 'size'], is_live=True)
+    self.cache.AddObject('gs', 'bucket', _MakeObject('obj', 1, md5_hash='abc'),
+                         ['name', 'generation', 'md5Hash'])
+    obj = self.cache.GetObject('gs', 'bucket', 'obj',
+                               fields=['size', 'md5Hash'])
+    self.assertEqual((3, 'abc'), (obj.size, obj.md5Hash))
+
+  def test_new_metageneration_replaces_entry(self):
+    fields = ['name', 'generation', 'metageneration', 'size', 'md5Hash']
+    self.cache.AddObject('gs', 'bucket', _MakeObject('obj', 1, size=3),
+                         fields, is_live=True)
+    self.cache.AddObject('gs', 'bucket',
+                         _MakeObject('obj', 1, metageneration=2),
+                         ['name', 'generation', 'metageneration'])
+    self.assertIsNone(self.cache.GetObject('gs', 'bucket', 'obj',
+                                           fields=['size']))
+
+  def test_unknown_metageneration_replaces_entry(self):
+    self.cache.AddObject('gs', 'bucket',
+                         _MakeObject('obj', 1, size=3, metageneration=None),
+                         ['name', 'generation', 'size'], is_live=True)
+    self.cache.AddObject('gs', 'bucket',
+                         _MakeObject('obj', 1, md5_hash='abc',
+                                     metageneration=None),
+                         ['name', 'generation', 'md5Hash'])
+    self.assertIsNone(self.cache.GetObject('gs', 'bucket', 'obj',
+                                           fields=['size']))
+    self.assertEqual('abc', self.cache.GetObject(
+        'gs', 'bucket', 'obj', fields=['md5Hash']).md5Hash)
+
+  def test_returned_metadata_is_a_copy(self):
+    self.cache.AddObject('gs', 'bucket', _MakeObject('obj', 1, size=3),
+                         ['name', 'generation', 'size'], is_live=True)
+    self.cache.GetObject('gs', 'bucket', 'obj', fields=['size']).size = 4
+    self.assertEqual(3, self.cache.GetObject('gs', 'bucket', 'obj',
+                                             fields=['size']).size)
+
+  def test_invalidation(self):
+    fields = ['name', 'generation', 'size']
+    self.cache.AddObject('gs', 'bucket', _MakeObject('obj', 1), fields,
+                         is_live=True)
+    self.cache.AddObject('gs', 'bucket', _MakeObject('obj2', 1), fields,
+                         is_live=True)
+    self.cache.InvalidateObject('gs', 'bucket', 'obj')
+    self.assertIsNone(self.cache.GetObject('gs', 'bucket', 'obj',
+                                           fields=['size']))
+    self.assertIsNotNone(self.cache.GetObject('gs', 'bucket', 'obj2',
+                                              fields=['size']))
+    self.cache.InvalidateBucket('gs', 'bucket')
+    self.assertIsNone(self.cache.GetObject('gs', 'bucket', 'obj2',
+                                           fields=['size']))
+
+  def test_expiry_and_eviction(self):
+    fields = ['name', 'generation', 'size']
+    with mock.patch('time.time', return_value=1000):
+      self.cache.AddObject('gs', 'bucket', _MakeObject('obj', 1), fields,
+                           is_live=True)
+    with mock.patch('time.time', return_value=1061):
+      self.assertIsNone(self.cache.GetObject('gs', 'bucket', 'obj',
+                                             fields=['size']))
+
+    for i in range(11):
+      self.cache.AddObject('gs', 'bucket', _MakeObject('obj%d' % i, 1), fields,
+                           is_live=True)
+    self.assertIsNone(self.cache.GetObject('gs', 'bucket', 'obj0',
+                                           fields=['size']))
+    self.assertIsNotNone(self.cache.GetObject('gs', 'bucket', 'obj10',
+                                              fields=['size']))
+
+  def test_uncacheable_fields(self):
+    self.cache.AddObject('gs', 'bucket', _MakeObject('obj', 1),
+                         ['name', 'generation', 'metadata/foo'], is_live=True)
+    self.assertIsNone(self.cache.GetObject('gs', 'bucket', 'obj',
+                                           fields=['name']))
+    encrypted_obj = _MakeObject('obj', 1)
+    encrypted_obj.customerEncryption = (
+        apitools_messages.Object.CustomerEncryptionValue(keySha256='abc'))
+    self.cache.AddObject('gs', 'bucket', encrypted_obj, ['name', 'generation'],
+                         is_live=True)
+    self.assertIsNone(self.cache.GetObject('gs', 'bucket', 'obj',
+                                           fields=['name']))
+
+  def test_delegator_invalidates_after_writes(self):
+    delegator = CloudApiDelegator(
+        None, {ApiMapConstants.API_MAP: {'gs': {}}}, mock.Mock(), None,
+        provider='gs')
+    delegator.metadata_caches['gs'] = self.cache
+    fields = ['name', 'generation', 'size']
+
+    def _ListDuringDelete(*unused_args, **unused_kwargs):
+      # A listing in another thread caches the object while it's deleted.
+      self.cache.AddObject('gs', 'bucket', _MakeObject('obj', 1, size=3),
+                           fields, is_live=True)
+      raise ValueError('Delete failed')
+
+    api = mock.Mock()
+    api.DeleteObject.side_effect = _ListDuringDelete
+    with mock.patch.object(delegator, '_GetApi', return_value=api):
+      with self.assertRaises(ValueError):
+        delegator.DeleteObject('bucket', 'obj')
+    self.assertIsNone(self.cache.GetObject('gs', 'bucket', 'obj',
+                                           fields=['size']))
+
+  def test_disabled_cache(self):
+    cache = ObjectMetadataCache(ttl=0, max_entries=10)
+    cache.AddObject('gs', 'bucket', _MakeObject('obj', 1),
+                    ['name', 'generation'], is_live=True)
+    self.assertIsNone(cache.GetObject('gs', 'bucket', 'obj', fields=['name']))
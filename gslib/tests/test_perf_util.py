@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unit tests for the per-phase performance report."""
+
+from __future__ import absolute_import
+
+import os
+
+from six.moves import queue as Queue
+
+import gslib.tests.testcase as testcase
+from gslib.thread_message import ObserverDataMessage
+from gslib.ui_controller import UIController
+from gslib.utils import observer_util
+from gslib.utils import perf_util
+
+import mock
+
+
+class TestPerfUtil(testcase.GsUtilObserverUnitTestCase):
+  """Unit tests for perf_util."""
+
+  def _StartReport(self):
+    return self.StartObserver('perf_report', self.CreateTempFile(contents=''))
+
+  def test_nothing_recorded_without_report(self):
+    self.StartObserver('perf_report', None)
+    self.assertFalse(perf_util.IsEnabled())
+    with perf_util.PhaseTimer(perf_util.PHASE_TASK) as timer:
+      timer.num_bytes += 10
+    perf_util.Record(perf_util.PHASE_REQUEST, 1.0)
+    # pylint: disable=protected-access
+    self.assertEqual({}, perf_util._observer.counters)
+
+  def test_phases_recorded(self):
+    self._StartReport()
+    self.assertTrue(perf_util.IsEnabled())
+    for _ in range(3):
+      with perf_util.PhaseTimer(perf_util.PHASE_HASHING, num_bytes=5):
+        pass
+    with perf_util.PhaseTimer(perf_util.PHASE_BODY_TRANSFER) as timer:
+      timer.num_bytes += 7
+    perf_util.Record(perf_util.PHASE_REQUEST, 0.5)
+    perf_util.Record(perf_util.PHASE_REQUEST, 0.25)
+    # pylint: disable=protected-access
+    counters = perf_util._observer.counters
+    # pylint: enable=protected-access
+    self.assertEqual(3, counters[perf_util.PHASE_HASHING][0])
+    self.assertEqual(15, counters[perf_util.PHASE_HASHING][2])
+    self.assertEqual(7, counters[perf_util.PHASE_BODY_TRANSFER][2])
+    self.assertEqual([2, 0.75, 0], counters[perf_util.PHASE_REQUEST])
+
+  def test_worker_counters_merged_into_report(self):
+    report_path = self._StartReport()
+    perf_util.Record(perf_util.PHASE_TASK, 1.0)
+    # Counters sent by two worker processes arrive on the status queue and
+    # are merged by the UI controller.
+    ui_controller = UIController()
+    ui_controller.Call(ObserverDataMessage(
+        {'perf': {perf_util.PHASE_TASK: [2, 3.0, 0],
+                  perf_util.PHASE_BODY_TRANSFER: [2, 1.0, 2048]}},
+        0, process_id=1), None)
+    ui_controller.Call(ObserverDataMessage(
+        {'perf': {perf_util.PHASE_TASK: [1, 2.0, 0]}}, 0, process_id=2), None)
+    self.assertEqual((4, 6.0, 0),
+                     perf_util.GetPhaseTotals(perf_util.PHASE_TASK))
+    perf_util._observer.WriteOutput()  # pylint: disable=protected-access
+    with open(report_path) as report_file:
+      report = report_file.read()
+    self.assertIn('processes: 3', report)
+    task_line = [line for line in report.splitlines()
+                 if line.startswith(perf_util.PHASE_TASK)][0]
+    self.assertEqual(['task', '4', '6.000', '1500.000', '-'],
+                     task_line.split()[:5])
+    self.assertIn('2 KiB', report)
+    # Phases that never ran aren't reported. The report also holds the
+    # command line, so only the phase lines are checked.
+    self.assertFalse([line for line in report.splitlines()
+                      if line.startswith(perf_util.PHASE_COMPOSE)])
+
+  def test_worker_process_sends_counters(self):
+    self._StartReport()
+    status_queue = Queue.Queue()
+    perf_util.Record(perf_util.PHASE_TASK, 1.0)
+    # The main process's counters stay where they are.
+    observer_util.SendToMainProcess(status_queue)
+    self.assertTrue(status_queue.empty())
+    # pylint: disable=protected-access
+    with mock.patch.object(perf_util._observer, 'main_pid', os.getpid() + 1):
+      # pylint: enable=protected-access
+      observer_util.ResetForWorkerProcess()
+      perf_util.Record(perf_util.PHASE_REQUEST, 1.0)
+      observer_util.SendToMainProcess(status_queue)
+      # Nothing new was recorded since the last message.
+      observer_util.SendToMainProcess(status_queue)
+    message = status_queue.get_nowait()
+    self.assertIsInstance(message, ObserverDataMessage)
+    self.assertEqual({'perf': {perf_util.PHASE_REQUEST: [1, 1.0, 0]}},
+                     message.data)
+    self.assertEqual(os.getpid(), message.process_id)
+    self.assertTrue(status_queue.empty())
@@ -16,6 +16,7 @@
 
 from __future__ import absolute_import
 
+import json
 import os
 import socket
 import StringIO
@@ -23,11 +24,16 @@ import sys
 
 import boto
 from gslib.commands.perfdiag import _GenerateFileData
+from gslib.commands.perfdiag import _GetSweepPoints
+from gslib.commands.perfdiag import _RecommendSweepSettings
+from gslib.commands.perfdiag import GetLatencyPercentiles
+from gslib.commands.perfdiag import SweepPoint
 import gslib.tests.testcase as testcase
 from gslib.tests.testcase.integration_testcase import SkipForXML
 from gslib.tests.util import ObjectToURI as suri
 from gslib.tests.util import RUN_S3_TESTS
 from gslib.tests.util import unittest
+from gslib.utils.system_util import IS_LINUX
 from gslib.utils.system_util import IS_WINDOWS
 import mock
 
@@ -169,6 +175,54 @@ class TestPerfDiag(testcase.GsUtilIntegrationTestCase):
         expected_status=1, return_stderr=True)
     self.assertIn('in-memory tests maximum file size', stderr)
 
+  def test_sweep(self):
+    outpath = self.CreateTempFile()
+    bucket_uri = self.CreateBucket()
+    stdout = self.RunGsUtil(
+        ['perfdiag', '-n', '2', '-k', '1,2', '-s', '1K', '-t', 'wthru', '-o',
+         outpath, suri(bucket_uri)], return_stdout=True)
+    self.assertIn('Recommended settings for 1 KiB objects', stdout)
+    self.assertIn('parallel_thread_count = ', stdout)
+    with open(outpath, 'r') as f:
+      sweep = json.load(f)['sweep']
+    self.assertEqual(2, len(sweep['points']))
+    for point in sweep['points']:
+      self.assertIn('p99', point['results']['wthru']['latency_percentiles'])
+    self.assertEqual(1, len(sweep['recommendations']))
+    self.AssertNObjectsInBucket(bucket_uri, 0, versioned=True)
+
+  def test_sweep_invalid_test(self):
+    stderr = self.RunGsUtil(
+        ['perfdiag', '-n', '1', '-k', '1,2', '-t', 'lat', 'gs://foobar'],
+        expected_status=1, return_stderr=True)
+    self.assertIn('can be run when sweeping', stderr)
+
+  def test_offline(self):
+    outpath = self.CreateTempFile()
+    stdout = self.RunGsUtil(
+        ['perfdiag', '-l', '-n', '2', '-s', '1K', '-t', 'rthru,wthru,list',
+         '-o', outpath], return_stdout=True)
+    self.assertIn('local fake of the Cloud Storage JSON API', stdout)
+    self.assertIn('CPU ms per HTTP request', stdout)
+    with open(outpath, 'r') as f:
+      results = json.load(f)
+    self.assertTrue(results['offline'])
+    for test_results in (results['read_throughput'],
+                         results['write_throughput'], results['listing']):
+      usage = test_results['client_usage']
+      self.assertGreater(usage['requests'], 0)
+      self.assertGreaterEqual(usage['cpu_seconds'], 0)
+      if IS_LINUX:
+        self.assertGreater(usage['syscalls_per_object'], 0)
+    self.assertIsNotNone(
+        results['write_throughput']['client_usage']['cpu_seconds_per_gib'])
+
+  def test_offline_with_url(self):
+    stderr = self.RunGsUtil(
+        ['perfdiag', '-l', '-n', '1', 'gs://foobar'],
+        expected_status=1, return_stderr=True)
+    self.assertIn('no URL may be given', stderr)
+
   def test_listing(self):
     bucket_uri = self.CreateBucket()
     stdout = self.RunGsUtil(
@@ -255,3 +309,60 @@ class TestPerfDiagUnitTests(testcase.GsUtilUnitTestCase):
     _GenerateFileData(fp, 8, 50, 4)
     self.assertEqual('aaxxaaxx', fp.getvalue())
     self.assertEqual(8, fp.tell())
+
+  def test_latency_percentiles(self):
+    self.assertEqual({'p50': 2.5, 'p90': 4.5, 'p99': 4.95},
+                     {key: round(value, 2) for key, value in
+                      GetLatencyPercentiles([5, 1, 4, 2, 3, 0]).iteritems()})
+    self.assertEqual({'p50': None, 'p90': None, 'p99': None},
+                     GetLatencyPercentiles([]))
+
+  def test_sweep_points(self):
+    self.assertEqual(
+        [SweepPoint(1, 1, None, None, 1024),
+         SweepPoint(1, 2, 'fan', None, 1024),
+         SweepPoint(1, 2, 'slice', 2, 1024),
+         SweepPoint(1, 2, 'slice', 4, 1024),
+         SweepPoint(1, 1, None, None, 2048),
+         SweepPoint(1, 2, 'fan', None, 2048),
+         SweepPoint(1, 2, 'slice', 2, 2048),
+         SweepPoint(1, 2, 'slice', 4, 2048)],
+        _GetSweepPoints([1], [1, 2], ['fan', 'slice'], [2, 4], [1024, 2048]))
+    # Without -p, parallel points use the fan strategy.
+    self.assertEqual(
+        [SweepPoint(1, 1, None, None, 1024),
+         SweepPoint(2, 1, 'fan', None, 1024)],
+        _GetSweepPoints([1, 2], [1], [None], [4], [1024]))
+
+  def test_recommend_sweep_settings(self):
+    def _Point(processes, threads, parallelism, slices, rthru, wthru):
+      point = SweepPoint(processes, threads, parallelism, slices,
+                         1048576)._asdict()
+      point['results'] = {'rthru': {'bytes_per_second': rthru},
+                          'wthru': {'bytes_per_second': wthru}}
+      return point
+    failed_point = SweepPoint(8, 8, 'fan', None, 1048576)._asdict()
+    failed_point['error'] = 'perfdiag exited with status 1.'
+    points = [_Point(1, 1, None, None, 10.0, 10.0),
+              _Point(2, 4, 'fan', None, 40.0, 20.0),
+              # Matches the best point above, but uses more threads.
+              _Point(4, 4, 'fan', None, 40.0, 20.0),
+              _Point(2, 4, 'slice', 4, 30.0, 15.0),
+              failed_point]
+    self.assertEqual(
+        [{'file_size': 1048576, 'processes': 2, 'threads': 4,
+          'parallelism': 'fan', 'slices': None,
+          'settings': {'parallel_process_count': 2,
+                       'parallel_thread_count': 4}}],
+        _RecommendSweepSettings(points))
+    # Sliced points also recommend sliced download and parallel composite
+    # upload settings.
+    points.append(_Point(1, 4, 'slice', 4, 50.0, 30.0))
+    self.assertEqual(
+        {'parallel_process_count': 1,
+         'parallel_thread_count': 4,
+         'sliced_object_download_threshold': 1048576,
+         'sliced_object_download_max_components': 4,
+         'parallel_composite_upload_threshold': 1048576,
+         'parallel_composite_upload_component_size': 262144},
+        _RecommendSweepSettings(points)[0]['settings'])
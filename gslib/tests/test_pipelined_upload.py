@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unit tests for pipelined resumable uploads."""
+
+from __future__ import absolute_import
+
+import os
+import time
+
+from gslib import pipelined_upload
+from gslib.buffer_pool import TRANSFER_BUFFER_CHUNK_SIZE
+from gslib.pipelined_upload import ChunkSizeTuner
+from gslib.pipelined_upload import PipelinedUploadStream
+import gslib.tests.testcase as testcase
+from gslib.utils.unit_util import ONE_MIB
+
+import mock
+
+_DATA = os.urandom(3 * TRANSFER_BUFFER_CHUNK_SIZE + 12345)
+
+
+class _FakeUpload(object):
+
+  def __init__(self, stream, chunksize):
+    self.stream = stream
+    self.chunksize = chunksize
+
+
+class TestPipelinedUpload(testcase.GsUtilUnitTestCase):
+  """Unit tests for PipelinedUploadStream and ChunkSizeTuner."""
+
+  def setUp(self):
+    super(TestPipelinedUpload, self).setUp()
+    self.upload_file = open(self.CreateTempFile(contents=_DATA), 'rb')
+    self.addCleanup(self.upload_file.close)
+
+  def _ReadAll(self, stream, read_size):
+    data = []
+    while True:
+      piece = stream.read(read_size)
+      if not piece:
+        return b''.join(data)
+      data.append(piece)
+
+  def test_reads_ahead_and_seeks(self):
+    stream = PipelinedUploadStream(self.upload_file, len(_DATA),
+                                   2 * TRANSFER_BUFFER_CHUNK_SIZE)
+    try:
+      # Reads return exactly the requested number of bytes, even across the
+      # end of the buffer.
+      self.assertEqual(_DATA[:3 * TRANSFER_BUFFER_CHUNK_SIZE],
+                       stream.read(3 * TRANSFER_BUFFER_CHUNK_SIZE))
+      # Seeking back outside the buffer reads from the wrapped stream again.
+      stream.seek(100)
+      self.assertEqual(100, stream.tell())
+      self.assertEqual(_DATA[100:], self._ReadAll(stream, 8192))
+      stream.seek(0, os.SEEK_END)
+      self.assertEqual(len(_DATA), stream.tell())
+      self.assertEqual(b'', stream.read(1))
+    finally:
+      stream.close()
+    self.assertFalse(self.upload_file.closed)
+
+  def test_reads_directly_without_budget(self):
+    stream = PipelinedUploadStream(self.upload_file, len(_DATA),
+                                   2 * TRANSFER_BUFFER_CHUNK_SIZE)
+    with mock.patch.object(pipelined_upload, 'GetTransferBufferPool') as (
+        mock_get_pool):
+      mock_get_pool.return_value.Acquire.return_value = None
+      self.assertEqual(_DATA, self._ReadAll(stream, ONE_MIB))
+    stream.close()
+
+  def _TuneChunkSize(self, max_chunk_size, rtt, chunk_time):
+    """Returns the chunk size tuned after sending a 256KiB chunk."""
+    upload = _FakeUpload(self.upload_file, 256 * 1024)
+    tuner = ChunkSizeTuner(upload, max_chunk_size, rtt)
+    self.upload_file.seek(0)
+    with mock.patch.object(time, 'time', return_value=100):
+      tuner.StartChunk()
+    self.upload_file.seek(256 * 1024)
+    with mock.patch.object(time, 'time', return_value=100 + chunk_time):
+      tuner(None, upload)
+    return upload.chunksize
+
+  def test_tuner_grows_chunks(self):
+    # 256KiB sent in 0.1 seconds, plus the response's round trip, is 2.5MiB/s.
+    # TARGET_CHUNK_RTTS round trips at that rate is 4MiB.
+    self.assertEqual(4 * ONE_MIB, self._TuneChunkSize(64 * ONE_MIB, 0.1, 0.2))
+    self.assertEqual(2 * ONE_MIB, self._TuneChunkSize(2 * ONE_MIB, 0.1, 0.2))
+    # Chunks are never made smaller than the configured size.
+    self.assertEqual(256 * 1024, self._TuneChunkSize(64 * ONE_MIB, 0.01, 0.26))
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unit tests for the sampling profiler."""
+
+from __future__ import absolute_import
+
+import os
+import threading
+
+from six.moves import queue as Queue
+
+import gslib.tests.testcase as testcase
+from gslib.thread_message import ObserverDataMessage
+from gslib.ui_controller import UIController
+from gslib.utils import observer_util
+from gslib.utils import profile_util
+
+import mock
+
+# pylint: disable=protected-access
+
+
+def _WaitForEvent(started, stop):
+  started.set()
+  stop.wait()
+
+
+class TestProfileUtil(testcase.GsUtilObserverUnitTestCase):
+  """Unit tests for profile_util."""
+
+  def _StartProfile(self):
+    return self.StartObserver('profile', self.CreateTempFile(contents=''))
+
+  def _SampleWaitingThread(self):
+    """Samples the stacks of this process with a thread in _WaitForEvent."""
+    started = threading.Event()
+    stop = threading.Event()
+    thread = threading.Thread(target=_WaitForEvent, args=(started, stop))
+    thread.start()
+    started.wait()
+    try:
+      profile_util.TakeSample()
+    finally:
+      stop.set()
+      thread.join()
+
+  def test_not_enabled_without_option(self):
+    self.StartObserver('profile', None)
+    self.assertFalse(profile_util.IsEnabled())
+    status_queue = Queue.Queue()
+    observer_util.SendToMainProcess(status_queue)
+    self.assertTrue(status_queue.empty())
+
+  def test_profile_written_with_worker_samples(self):
+    profile_path = self._StartProfile()
+    self._SampleWaitingThread()
+    UIController().Call(ObserverDataMessage(
+        {'profile': {'gsutil worker process;f (a.py:1);g (a.py:5)': 2}}, 0,
+        process_id=1), None)
+    UIController().Call(ObserverDataMessage(
+        {'profile': {'gsutil worker process;f (a.py:1);g (a.py:5)': 3}}, 0,
+        process_id=2), None)
+    profile_util._observer.WriteOutput()
+    with open(profile_path) as profile_file:
+      lines = profile_file.read().splitlines()
+    self.assertIn('gsutil worker process;f (a.py:1);g (a.py:5) 5', lines)
+    waiting_lines = [line for line in lines if ';_WaitForEvent (' in line]
+    self.assertEqual(1, len(waiting_lines))
+    stack, count = waiting_lines[0].rsplit(' ', 1)
+    self.assertEqual('1', count)
+    self.assertTrue(stack.startswith('gsutil main process;'))
+    # The waiting thread's frames continue into threading.py's wait.
+    self.assertNotIn('_WaitForEvent', stack.split(';')[-1])
+
+  def test_worker_process_sends_samples(self):
+    self._StartProfile()
+    status_queue = Queue.Queue()
+    self._SampleWaitingThread()
+    # The main process's samples stay where they are.
+    observer_util.SendToMainProcess(status_queue)
+    self.assertTrue(status_queue.empty())
+    with mock.patch.object(profile_util._observer, 'main_pid',
+                           os.getpid() + 1):
+      observer_util.ResetForWorkerProcess()
+      self.assertEqual({}, profile_util._observer.samples)
+      self._SampleWaitingThread()
+      observer_util.SendToMainProcess(status_queue)
+      # Nothing new was sampled since the last message.
+      observer_util.SendToMainProcess(status_queue)
+    message = status_queue.get_nowait()
+    self.assertIsInstance(message, ObserverDataMessage)
+    self.assertEqual(['profile'], message.data.keys())
+    self.assertTrue(all(stack.startswith('gsutil worker process;')
+                        for stack in message.data['profile']))
+    self.assertTrue(status_queue.empty())
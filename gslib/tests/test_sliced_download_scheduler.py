@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unit tests for the sliced download scheduler."""
+
+from __future__ import absolute_import
+
+import json
+
+from gslib.sliced_download_scheduler import GetSliceRanges
+from gslib.sliced_download_scheduler import MergeByteRanges
+from gslib.sliced_download_scheduler import MIN_STOLEN_RANGE_SIZE
+from gslib.sliced_download_scheduler import SlicedDownloadScheduler
+import gslib.tests.testcase as testcase
+from gslib.third_party.storage_apitools import storage_v1_messages as apitools_messages
+from gslib.utils.unit_util import ONE_MIB
+
+
+class TestSlicedDownloadScheduler(testcase.GsUtilUnitTestCase):
+  """Unit tests for SlicedDownloadScheduler and its helpers."""
+
+  def setUp(self):
+    super(TestSlicedDownloadScheduler, self).setUp()
+    self.scheduler = SlicedDownloadScheduler(self.CreateTempFile())
+    self.addCleanup(self.scheduler.Finish)
+
+  def test_merge_byte_ranges(self):
+    self.assertEqual([[0, 9], [20, 29]],
+                     MergeByteRanges([[20, 24], [0, 4], [5, 9], [22, 29]]))
+    self.assertEqual([], MergeByteRanges([]))
+
+  def test_get_slice_ranges(self):
+    self.assertEqual([(0, 0, 9), (10, 10, 19), (20, 20, 24)],
+                     GetSliceRanges(25, 10))
+    # Ranges are split around completed bytes, each starting with completed
+    # bytes followed by bytes to download.
+    self.assertEqual(
+        [(0, 4, 9), (10, 10, 11), (12, 16, 17), (18, 20, 19), (20, 20, 24)],
+        GetSliceRanges(25, 10, [[0, 3], [12, 15], [18, 19]]))
+
+  def test_claim_ranges_in_order(self):
+    self.scheduler.Start(GetSliceRanges(25, 10))
+    self.assertEqual([0, 1, 2],
+                     [self.scheduler.ClaimRange().range_id for _ in range(3)])
+    # The remaining ranges are too small to steal.
+    self.assertIsNone(self.scheduler.ClaimRange())
+
+  def test_steal_largest_range(self):
+    size = 4 * MIN_STOLEN_RANGE_SIZE
+    self.scheduler.Start([(0, 0, size - 1), (size, size, size + ONE_MIB - 1)])
+    self.scheduler.ClaimRange()
+    self.scheduler.ClaimRange()
+    self.assertEqual(size - 1, self.scheduler.UpdateProgress(0, ONE_MIB,
+                                                             ONE_MIB))
+    stolen = self.scheduler.ClaimRange()
+    self.assertTrue(stolen.stolen)
+    split_byte = ONE_MIB + (size - ONE_MIB) // 2
+    self.assertEqual((split_byte, split_byte, size - 1),
+                     (stolen.start_byte, stolen.download_start_byte,
+                      stolen.end_byte))
+    # The victim learns about the new end of its range with its next update.
+    self.assertEqual(split_byte - 1,
+                     self.scheduler.UpdateProgress(0, 2 * ONE_MIB, 2 * ONE_MIB))
+
+  def test_tracker_file_records_completed_ranges(self):
+    tracker_file_name = self.CreateTempFile()
+    src_obj_metadata = apitools_messages.Object(etag='abc', generation=1)
+    self.scheduler.Start(GetSliceRanges(30, 10, [[0, 9]]),
+                         tracker_file_name=tracker_file_name,
+                         src_obj_metadata=src_obj_metadata, num_components=2)
+    self.scheduler.ClaimRange()
+    self.scheduler.ClaimRange()
+    self.scheduler.UpdateProgress(1, 15, 15, update_tracker_file=True)
+    with open(tracker_file_name, 'r') as tracker_file:
+      tracker_data = json.load(tracker_file)
+    self.assertEqual([[0, 14]], tracker_data['completed_ranges'])
+    self.assertEqual(('abc', 1, 2), (tracker_data['etag'],
+                                     tracker_data['generation'],
+                                     tracker_data['num_components']))
+
+  def test_checkpoints_add_to_completed_ranges(self):
+    self.scheduler.Start(GetSliceRanges(30, 10, [[0, 4]]))
+    for _ in range(3):
+      self.scheduler.ClaimRange()
+    # Progress that isn't checkpointed isn't recorded as completed.
+    self.scheduler.UpdateProgress(0, 8, 8)
+    self.assertEqual([[0, 4]], self.scheduler.GetCompletedRanges())
+    self.scheduler.UpdateProgress(2, 25, 25, update_tracker_file=True)
+    self.scheduler.UpdateProgress(0, 10, 10, update_tracker_file=True)
+    self.assertEqual([[0, 9], [20, 24]], self.scheduler.GetCompletedRanges())
+    # Only the bytes written since the range's last checkpoint are added.
+    self.scheduler.UpdateProgress(1, 20, 20, update_tracker_file=True)
+    self.assertEqual([[0, 24]], self.scheduler.GetCompletedRanges())
+
+  def test_stolen_ranges_are_not_claimed_again(self):
+    size = 8 * MIN_STOLEN_RANGE_SIZE
+    self.scheduler.Start([(0, 0, size - 1)])
+    self.scheduler.ClaimRange()
+    stolen = self.scheduler.ClaimRange()
+    self.assertEqual((1, size // 2, size - 1),
+                     (stolen.range_id, stolen.start_byte, stolen.end_byte))
+    # The stolen range isn't handed out again; the next claim steals from
+    # the stolen range, which has the most bytes left to receive.
+    self.scheduler.UpdateProgress(0, ONE_MIB, ONE_MIB)
+    stolen = self.scheduler.ClaimRange()
+    self.assertEqual((2, 3 * size // 4, size - 1),
+                     (stolen.range_id, stolen.start_byte, stolen.end_byte))
+    # Finished ranges aren't stolen from.
+    self.scheduler.UpdateProgress(1, 3 * size // 4, 3 * size // 4)
+    self.scheduler.UpdateProgress(2, size, size)
+    stolen = self.scheduler.ClaimRange()
+    self.assertEqual((3, ONE_MIB + (size // 2 - ONE_MIB) // 2, size // 2 - 1),
+                     (stolen.range_id, stolen.start_byte, stolen.end_byte))
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unit tests for trace files of transfers."""
+
+from __future__ import absolute_import
+
+import json
+
+import six
+
+import gslib.tests.testcase as testcase
+from gslib.storage_url import StorageUrlFromString
+from gslib.thread_message import FileMessage
+from gslib.thread_message import ObserverDataMessage
+from gslib.thread_message import RetryableErrorMessage
+from gslib.ui_controller import UIController
+from gslib.utils import observer_util
+from gslib.utils import perf_util
+from gslib.utils import trace_util
+
+# pylint: disable=protected-access
+
+
+class TestTraceUtil(testcase.GsUtilObserverUnitTestCase):
+  """Unit tests for trace_util."""
+
+  def setUp(self):
+    super(TestTraceUtil, self).setUp()
+    self.src_url = StorageUrlFromString('gs://bucket/obj')
+    self.dst_url = StorageUrlFromString('file://obj')
+    self.stream = six.StringIO()
+
+  def _StartTrace(self):
+    return self.StartObserver('trace_file', self.CreateTempFile(contents=''))
+
+  def _ReadTrace(self, trace_path):
+    trace_util._observer.WriteOutput()
+    with open(trace_path) as trace_file:
+      return json.load(trace_file)['traceEvents']
+
+  def test_nothing_recorded_without_trace(self):
+    self.StartObserver('trace_file', None)
+    self.assertFalse(trace_util.IsEnabled())
+    observer_util.HandleMessage(FileMessage(
+        self.src_url, self.dst_url, 1, message_type=FileMessage.FILE_DOWNLOAD),
+                                None)
+    self.assertEqual({}, trace_util._observer.open_transfers)
+
+  def test_transfer_spans(self):
+    trace_path = self._StartTrace()
+    start_time = trace_util._observer.start_time
+    # A sliced download, with one slice that never finishes.
+    for component_num, finished, message_time in (
+        (None, False, 1), (0, False, 1), (1, False, 1), (0, True, 2)):
+      trace_util._observer.HandleMessage(FileMessage(
+          self.src_url, self.dst_url, start_time + message_time, size=10,
+          finished=finished, component_num=component_num,
+          message_type=(FileMessage.FILE_DOWNLOAD if component_num is None
+                        else FileMessage.COMPONENT_TO_DOWNLOAD),
+          process_id=1, thread_id=(component_num or 0) + 1), None)
+    trace_util._observer.HandleMessage(FileMessage(
+        self.src_url, self.dst_url, start_time + 4, size=20, finished=True,
+        message_type=FileMessage.FILE_DOWNLOAD, process_id=1, thread_id=5),
+                                       None)
+    # A small upload, reported when it finishes.
+    trace_util._observer.HandleMessage(FileMessage(
+        self.dst_url, self.src_url, start_time + 3, size=1, finished=True,
+        message_type=FileMessage.FILE_UPLOAD, process_id=2, thread_id=1,
+        start_time=start_time + 2.5), None)
+    events = self._ReadTrace(trace_path)
+    spans = dict(((event['name'], event['args'].get('component')), event)
+                 for event in events if event.get('cat') == 'transfer')
+    self.assertEqual(4, len(spans))
+    download = spans[('download', None)]
+    self.assertEqual((1000000, 3000000, 1, 1),
+                     (download['ts'], download['dur'], download['pid'],
+                      download['tid']))
+    self.assertEqual(20, download['args']['size'])
+    self.assertEqual('gs://bucket/obj', download['args']['src'])
+    self.assertEqual(1000000, spans[('download slice', 0)]['dur'])
+    self.assertNotIn('finished', spans[('download slice', 0)]['args'])
+    self.assertFalse(spans[('download slice', 1)]['args']['finished'])
+    upload = spans[('upload', None)]
+    self.assertEqual((2500000, 500000, 2), (upload['ts'], upload['dur'],
+                                            upload['pid']))
+    process_names = [event for event in events if event['ph'] == 'M']
+    self.assertEqual([1, 2], sorted(event['pid'] for event in process_names))
+
+  def test_phase_and_retry_events(self):
+    trace_path = self._StartTrace()
+    start_time = trace_util._observer.start_time
+    self.assertTrue(perf_util.IsEnabled())
+    # Phases in SPAN_PHASES are kept as spans; others are only counted.
+    with perf_util.PhaseTimer(perf_util.PHASE_REQUEST):
+      pass
+    with perf_util.PhaseTimer(perf_util.PHASE_HASHING):
+      pass
+    ui_controller = UIController()
+    ui_controller.Call(ObserverDataMessage(
+        {'perf': {perf_util.PHASE_TASK: [1, 2.0, 0]},
+         'trace': [(perf_util.PHASE_TASK, start_time + 1, 2.0, 0, 7),
+                   (perf_util.PHASE_BODY_TRANSFER, start_time + 2, 0.5, 100,
+                    7)]},
+        start_time + 3, process_id=3), self.stream)
+    ui_controller.Call(RetryableErrorMessage(
+        ValueError(), start_time + 2.5, num_retries=2, total_wait_sec=3,
+        process_id=3, thread_id=7), self.stream)
+    events = self._ReadTrace(trace_path)
+    names = sorted(event['name'] for event in events if event['ph'] != 'M')
+    self.assertEqual([perf_util.PHASE_BODY_TRANSFER, perf_util.PHASE_REQUEST,
+                      'retry', perf_util.PHASE_TASK], names)
+    by_name = dict((event['name'], event) for event in events)
+    self.assertEqual((3, 7, 1000000, 2000000),
+                     tuple(by_name[perf_util.PHASE_TASK][key]
+                           for key in ('pid', 'tid', 'ts', 'dur')))
+    self.assertEqual({'bytes': 100},
+                     by_name[perf_util.PHASE_BODY_TRANSFER]['args'])
+    retry = by_name['retry']
+    self.assertEqual(('i', 2500000, 2, 'ValueError'),
+                     (retry['ph'], retry['ts'], retry['args']['num_retries'],
+                      retry['args']['error_type']))
+    # The main process's own spans are tagged with its process ID.
+    self.assertEqual(trace_util._observer.main_pid,
+                     by_name[perf_util.PHASE_REQUEST]['pid'])
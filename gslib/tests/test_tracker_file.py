@@ -17,8 +17,10 @@
 from gslib.exception import CommandException
 from gslib.parallel_tracker_file import ObjectFromTracker
 from gslib.parallel_tracker_file import ReadParallelUploadTrackerFile
+from gslib.parallel_tracker_file import ReadParallelUploadTrackerIntermediates
 from gslib.parallel_tracker_file import ValidateParallelCompositeTrackerData
 from gslib.parallel_tracker_file import WriteComponentToParallelUploadTrackerFile
+from gslib.parallel_tracker_file import WriteIntermediateToParallelUploadTrackerFile
 from gslib.parallel_tracker_file import WriteParallelUploadTrackerFile
 from gslib.storage_url import StorageUrlFromString
 from gslib.tests.testcase.unit_testcase import GsUtilUnitTestCase
@@ -148,6 +150,34 @@ class TestTrackerFile(GsUtilUnitTestCase):
     self.assertEqual(random_prefix, actual_prefix)
     self.assertEqual(objects + [new_object], actual_objects)
 
+  def testParallelUploadTrackerFileIntermediates(self):
+    tracker_file_lock = parallelism_framework_util.CreateLock()
+    fpath = self.CreateTempFile(file_name='foo')
+    objects = [ObjectFromTracker('obj_0', '42')]
+    WriteParallelUploadTrackerFile(fpath, '123', objects)
+    self.assertEqual([], ReadParallelUploadTrackerIntermediates(fpath))
+
+    intermediate = ObjectFromTracker('obj_intermediate_0', '44')
+    WriteIntermediateToParallelUploadTrackerFile(
+        fpath, tracker_file_lock, intermediate, self.logger)
+    # Recording components must preserve the intermediate objects.
+    new_object = ObjectFromTracker('obj_1', '43')
+    self.assertEqual(objects + [new_object],
+                     WriteComponentToParallelUploadTrackerFile(
+                         fpath, tracker_file_lock, new_object, self.logger))
+
+    (_, actual_prefix, actual_objects) = ReadParallelUploadTrackerFile(
+        fpath, self.logger)
+    self.assertEqual('123', actual_prefix)
+    self.assertEqual(objects + [new_object], actual_objects)
+    self.assertEqual([intermediate],
+                     ReadParallelUploadTrackerIntermediates(fpath))
+
+  def testReadParallelUploadTrackerIntermediatesLegacy(self):
+    fpath = self.CreateTempFile(file_name='foo',
+                                contents='123\nobj_0\n42\n')
+    self.assertEqual([], ReadParallelUploadTrackerIntermediates(fpath))
+
   def testValidateParallelCompositeTrackerData(self):
     fpath = self.CreateTempFile(file_name='foo')
     random_prefix = '123'
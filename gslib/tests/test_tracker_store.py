@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unit tests for the SQLite tracker store."""
+
+from __future__ import absolute_import
+
+import errno
+import os
+import time
+
+from gslib import tracker_store
+import gslib.tests.testcase as testcase
+from gslib.tests.util import unittest
+from gslib.tracker_store import SqliteTrackerStore
+
+import mock
+
+
+@unittest.skipUnless(tracker_store.sqlite3, 'sqlite3 is not available')
+class TestSqliteTrackerStore(testcase.GsUtilUnitTestCase):
+  """Unit tests for SqliteTrackerStore."""
+
+  def setUp(self):
+    super(TestSqliteTrackerStore, self).setUp()
+    self.tracker_dir = self.CreateTempDir()
+    self.db_path = os.path.join(self.tracker_dir, 'trackers.db')
+    self.store = SqliteTrackerStore(self.db_path)
+    self.key = os.path.join(self.tracker_dir, 'upload_TRACKER_abc')
+
+  def _ReadFromNewStore(self, key):
+    """Reads key as another gsutil process would."""
+    return SqliteTrackerStore(self.db_path).Read(key)
+
+  def _AssertMissing(self, store, key):
+    with self.assertRaises(IOError) as cm:
+      store.Read(key)
+    self.assertEqual(errno.ENOENT, cm.exception.errno)
+
+  def test_write_read_delete(self):
+    self._AssertMissing(self.store, self.key)
+    self.store.Write(self.key, 'data1')
+    self.assertEqual('data1', self.store.Read(self.key))
+    # Writes are committed straight away, so that they survive the process
+    # being killed.
+    self.assertEqual('data1', self._ReadFromNewStore(self.key))
+    self.store.Checkpoint(self.key, 'data2')
+    self.assertEqual('data2', self.store.Read(self.key))
+    # Checkpoints are batched until flushed.
+    self.assertEqual('data1', self._ReadFromNewStore(self.key))
+    self.store.Delete(self.key)
+    self._AssertMissing(self.store, self.key)
+    self._AssertMissing(SqliteTrackerStore(self.db_path), self.key)
+    self.assertFalse(os.path.exists(self.key))
+
+  def test_checkpoint_after_delete_is_dropped(self):
+    self.store.Write(self.key, 'data1')
+    self.store.Checkpoint(self.key, 'data2')
+    self.store.Flush()
+    self.assertEqual('data2', self._ReadFromNewStore(self.key))
+    # Another process checkpoints the tracker, but it's deleted before the
+    # checkpoint is committed.
+    other_store = SqliteTrackerStore(self.db_path)
+    other_store.Checkpoint(self.key, 'data3')
+    self.store.Delete(self.key)
+    self.store.Flush()
+    other_store.Flush()
+    self._AssertMissing(SqliteTrackerStore(self.db_path), self.key)
+    # Checkpoints of trackers that were never written aren't stored either.
+    self.store.Checkpoint(self.key, 'data4')
+    self.store.Flush()
+    self._AssertMissing(SqliteTrackerStore(self.db_path), self.key)
+
+  def test_commits_old_pending_checkpoints(self):
+    self.store.Write(self.key, 'data1')
+    self.store.Write(self.key + '2', 'data2')
+    self.store.Checkpoint(self.key, 'data3')
+    with mock.patch.object(tracker_store, 'MAX_PENDING_WRITE_AGE', 0):
+      self.store.Checkpoint(self.key + '2', 'data4')
+    self.assertEqual('data3', self._ReadFromNewStore(self.key))
+    self.assertEqual('data4', self._ReadFromNewStore(self.key + '2'))
+
+  def test_timer_commits_pending_checkpoints(self):
+    self.store.Write(self.key, 'data1')
+    with mock.patch.object(tracker_store, 'MAX_PENDING_WRITE_AGE', 0.01):
+      self.store.Checkpoint(self.key, 'data2')
+    # Without further writes, the checkpoint is committed by a timer.
+    deadline = time.time() + 5
+    while (self._ReadFromNewStore(self.key) != 'data2' and
+           time.time() < deadline):
+      time.sleep(0.01)
+    self.assertEqual('data2', self._ReadFromNewStore(self.key))
+
+  def test_moves_tracker_files_into_database(self):
+    with open(self.key, 'w') as tracker_file:
+      tracker_file.write('legacy data')
+    self.assertEqual('legacy data', self.store.Read(self.key))
+    self.assertFalse(os.path.exists(self.key))
+    self.assertEqual('legacy data', self._ReadFromNewStore(self.key))
+
+  def test_removes_expired_entries(self):
+    self.store.Write(self.key, 'data1')
+    self.store.Flush()
+    with mock.patch.object(time, 'time',
+                           return_value=(time.time() +
+                                         tracker_store.MAX_ENTRY_AGE + 1)):
+      self._AssertMissing(SqliteTrackerStore(self.db_path), self.key)
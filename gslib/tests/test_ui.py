@@ -34,6 +34,7 @@ from six.moves import queue as Queue
 
 from gslib.cs_api_map import ApiSelector
 from gslib.parallel_tracker_file import ObjectFromTracker
+from gslib.progress_callback import FileProgressCallbackHandler
 from gslib.parallel_tracker_file import WriteParallelUploadTrackerFile
 from gslib.storage_url import StorageUrlFromString
 import gslib.tests.testcase as testcase
@@ -48,10 +49,12 @@ from gslib.tests.util import TEST_ENCRYPTION_KEY2
 from gslib.tests.util import unittest
 from gslib.thread_message import FileMessage
 from gslib.thread_message import FinalMessage
+from gslib.thread_message import FinishedFilesMessage
 from gslib.thread_message import MetadataMessage
 from gslib.thread_message import ProducerThreadMessage
 from gslib.thread_message import ProgressMessage
 from gslib.thread_message import SeekAheadMessage
+from gslib.thread_message import StatusMessageBatch
 from gslib.tracker_file import DeleteTrackerFile
 from gslib.tracker_file import GetSlicedDownloadTrackerFilePaths
 from gslib.tracker_file import GetTrackerFilePath
@@ -67,6 +70,8 @@ from gslib.utils.constants import START_CALLBACK_PER_BYTES
 from gslib.utils.constants import UTF8
 from gslib.utils.copy_helper import PARALLEL_UPLOAD_STATIC_SALT
 from gslib.utils.copy_helper import PARALLEL_UPLOAD_TEMP_NAMESPACE
+from gslib.utils.parallelism_framework_util import BatchingStatusQueue
+from gslib.utils.parallelism_framework_util import ProcessAndThreadSafeInt
 from gslib.utils.parallelism_framework_util import PutToQueueWithTimeout
 from gslib.utils.parallelism_framework_util import ZERO_TASKS_TO_DO_ARGUMENT
 from gslib.utils.retry_util import Retry
@@ -992,6 +997,158 @@ class TestUiUnitTests(testcase.GsUtilUnitTestCase):
     JoinThreadAndRaiseOnTimeout(ui_thread)
     self.assertIn('100/100', stream.getvalue())
 
+  def test_ui_small_file_finished_without_start(self):
+    """Tests files whose start is reported in their finished message."""
+    current_time_ms = self.start_time
+    status_queue = Queue.Queue()
+    stream = StringIO.StringIO()
+    ui_controller = UIController(custom_time=current_time_ms)
+    ui_thread = UIThread(status_queue, stream, ui_controller)
+    for i in range(10):
+      current_time_ms += 200
+      PutToQueueWithTimeout(
+          status_queue,
+          FileMessage(StorageUrlFromString('foo%s' % i),
+                      StorageUrlFromString('gs://bar%s' % i),
+                      current_time_ms, size=1024, finished=True,
+                      message_type=FileMessage.FILE_UPLOAD,
+                      start_time=current_time_ms - 100))
+    PutToQueueWithTimeout(
+        status_queue,
+        ProducerThreadMessage(10, 10 * 1024, current_time_ms, finished=True))
+    PutToQueueWithTimeout(status_queue, FinalMessage(current_time_ms))
+    PutToQueueWithTimeout(status_queue, ZERO_TASKS_TO_DO_ARGUMENT)
+    JoinThreadAndRaiseOnTimeout(ui_thread)
+    self.assertIn('[10 files][ 10.0 KiB/ 10.0 KiB]', stream.getvalue())
+    self.assertIn('Operation completed over 10 objects/10.0 KiB.',
+                  stream.getvalue())
+
+  def test_ui_batched_status_messages(self):
+    """Tests messages that a worker process sends in batches."""
+    current_time_ms = self.start_time
+    status_queue = Queue.Queue()
+    pending_batches = ProcessAndThreadSafeInt(False)
+    # Batches are only sent by the explicit Flush below, and every file's
+    # messages are sent.
+    batching_queue = BatchingStatusQueue(status_queue, pending_batches,
+                                         batch_period=3600, count_files=False)
+    for i in range(5):
+      src_url = StorageUrlFromString('foo%s' % i)
+      dst_url = StorageUrlFromString('gs://bar%s' % i)
+      current_time_ms += 200
+      batching_queue.put(FileMessage(
+          src_url, dst_url, current_time_ms, size=1024,
+          message_type=FileMessage.FILE_UPLOAD))
+      for processed_bytes in (256, 512, 768):
+        current_time_ms += 10
+        batching_queue.put(ProgressMessage(1024, processed_bytes, src_url,
+                                           current_time_ms, dst_url=dst_url))
+      current_time_ms += 200
+      batching_queue.put(FileMessage(
+          src_url, dst_url, current_time_ms, size=1024, finished=True,
+          message_type=FileMessage.FILE_UPLOAD))
+    self.assertTrue(status_queue.empty())
+    self.assertEqual(1, pending_batches.GetValue())
+    batching_queue.Flush()
+    self.assertEqual(0, pending_batches.GetValue())
+    batch = status_queue.get_nowait()
+    self.assertIsInstance(batch, StatusMessageBatch)
+    # Each file's progress messages were coalesced into the latest one.
+    self.assertEqual(15, len(batch.messages))
+    self.assertEqual([768] * 5, [message.processed_bytes
+                                 for message in batch.messages
+                                 if isinstance(message, ProgressMessage)])
+    self.assertIsInstance(batch.messages[2], FileMessage)
+
+    stream = StringIO.StringIO()
+    ui_controller = UIController(custom_time=self.start_time)
+    ui_thread = UIThread(status_queue, stream, ui_controller)
+    PutToQueueWithTimeout(status_queue, batch)
+    PutToQueueWithTimeout(
+        status_queue,
+        ProducerThreadMessage(5, 5 * 1024, current_time_ms, finished=True))
+    PutToQueueWithTimeout(status_queue, FinalMessage(current_time_ms))
+    PutToQueueWithTimeout(status_queue, ZERO_TASKS_TO_DO_ARGUMENT)
+    JoinThreadAndRaiseOnTimeout(ui_thread)
+    self.assertIn('Operation completed over 5 objects/5.0 KiB.',
+                  stream.getvalue())
+
+  def test_ui_batched_finished_files(self):
+    """Tests files that start and finish within a worker process's batch."""
+    current_time_ms = self.start_time
+    status_queue = Queue.Queue()
+    pending_batches = ProcessAndThreadSafeInt(False)
+    batching_queue = BatchingStatusQueue(status_queue, pending_batches,
+                                         batch_period=3600)
+    # This file's start is sent in a batch of its own.
+    long_src_url = StorageUrlFromString('foo_long')
+    long_dst_url = StorageUrlFromString('gs://bar_long')
+    batching_queue.put(FileMessage(
+        long_src_url, long_dst_url, current_time_ms, size=1024,
+        message_type=FileMessage.FILE_UPLOAD))
+    batching_queue.Flush()
+    for i in range(5):
+      src_url = StorageUrlFromString('foo%s' % i)
+      dst_url = StorageUrlFromString('gs://bar%s' % i)
+      current_time_ms += 200
+      batching_queue.put(FileMessage(
+          src_url, dst_url, current_time_ms, size=1024,
+          message_type=FileMessage.FILE_UPLOAD))
+      current_time_ms += 10
+      batching_queue.put(ProgressMessage(1024, 512, src_url, current_time_ms,
+                                         dst_url=dst_url))
+      current_time_ms += 200
+      batching_queue.put(FileMessage(
+          src_url, dst_url, current_time_ms, size=1024, finished=True,
+          message_type=FileMessage.FILE_UPLOAD))
+    current_time_ms += 200
+    batching_queue.put(FileMessage(
+        long_src_url, long_dst_url, current_time_ms, size=1024, finished=True,
+        message_type=FileMessage.FILE_UPLOAD))
+    batching_queue.Flush()
+    self.assertEqual(0, pending_batches.GetValue())
+    batches = [status_queue.get_nowait(), status_queue.get_nowait()]
+    # The 5 files that started and finished within the second batch are only
+    # counted.
+    self.assertEqual(2, len(batches[1].messages))
+    self.assertTrue(batches[1].messages[0].finished)
+    finished_files = batches[1].messages[1]
+    self.assertIsInstance(finished_files, FinishedFilesMessage)
+    self.assertEqual(5, finished_files.num_files)
+    self.assertEqual(5 * 1024, finished_files.size)
+    self.assertEqual(self.start_time + 200, finished_files.start_time)
+
+    stream = StringIO.StringIO()
+    ui_controller = UIController(custom_time=self.start_time)
+    ui_thread = UIThread(status_queue, stream, ui_controller)
+    for batch in batches:
+      PutToQueueWithTimeout(status_queue, batch)
+    PutToQueueWithTimeout(
+        status_queue,
+        ProducerThreadMessage(6, 6 * 1024, current_time_ms, finished=True))
+    PutToQueueWithTimeout(status_queue, FinalMessage(current_time_ms))
+    PutToQueueWithTimeout(status_queue, ZERO_TASKS_TO_DO_ARGUMENT)
+    JoinThreadAndRaiseOnTimeout(ui_thread)
+    self.assertIn('Operation completed over 6 objects/6.0 KiB.',
+                  stream.getvalue())
+    self.assertFalse(ui_controller.manager.individual_file_progress)
+
+  def test_ui_progress_callback_throttled(self):
+    """Tests that progress callbacks send a limited number of messages."""
+    status_queue = Queue.Queue()
+    src_url = StorageUrlFromString('gs://foo')
+    handler = FileProgressCallbackHandler(status_queue, start_byte=100,
+                                          override_total_size=1000,
+                                          src_url=src_url)
+    for last_byte_processed in range(200, 1200, 100):
+      handler.call(last_byte_processed, None)
+    messages = []
+    while not status_queue.empty():
+      messages.append(status_queue.get_nowait())
+    # The first and the final callbacks are always reported.
+    self.assertEqual([100, 1000],
+                     [message.processed_bytes for message in messages])
+
   def test_ui_empty_list(self):
     """Tests if status queue is empty after processed by UIThread."""
     status_queue = Queue.Queue()
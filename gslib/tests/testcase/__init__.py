@@ -18,4 +18,5 @@ from __future__ import absolute_import
 
 from gslib.tests.testcase.integration_testcase import GsUtilIntegrationTestCase
 from gslib.tests.testcase.integration_testcase import KmsTestingResources
+from gslib.tests.testcase.observer_testcase import GsUtilObserverUnitTestCase
 from gslib.tests.testcase.unit_testcase import GsUtilUnitTestCase
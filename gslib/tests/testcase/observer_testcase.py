@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Contains the base unit test case class for observers."""
+
+from __future__ import absolute_import
+
+from gslib.tests.testcase.unit_testcase import GsUtilUnitTestCase
+from gslib.tests.util import SetBotoConfigForTest
+from gslib.utils import observer_util
+
+import mock
+
+
+class GsUtilObserverUnitTestCase(GsUtilUnitTestCase):
+  """Base class for unit tests of observers (see gslib.utils.observer_util).
+
+  Each test starts with all registered observers stopped and empty, and
+  observers don't start threads or write their files at exit.
+  """
+
+  def setUp(self):
+    super(GsUtilObserverUnitTestCase, self).setUp()
+    for observer in observer_util.GetObservers():
+      self.addCleanup(self._RestoreObserver, observer,
+                      dict(observer.__dict__))
+      observer.Reset()
+    for target in ('atexit.register', 'gslib.utils.observer_util.StartThread'):
+      patcher = mock.patch(target)
+      patcher.start()
+      self.addCleanup(patcher.stop)
+
+  @staticmethod
+  def _RestoreObserver(observer, attributes):
+    observer.__dict__.clear()
+    observer.__dict__.update(attributes)
+
+  def StartObserver(self, config_option, output_path):
+    """Starts the observers configured with config_option set to output_path.
+
+    Args:
+      config_option: GSUtil option that starts the observer.
+      output_path: Value of the option, or None to leave it unset.
+
+    Returns:
+      output_path.
+    """
+    with SetBotoConfigForTest([('GSUtil', config_option, output_path)]):
+      observer_util.StartConfiguredObservers()
+    return output_path
@@ -102,6 +102,86 @@ class RetryableErrorMessage(StatusMessage):
              self.total_wait_sec, self.time, self.process_id, self.thread_id))
 
 
+class StatusMessageBatch(StatusMessage):
+  """Carries status messages a worker process buffered, in the order put."""
+
+  def __init__(self, messages, message_time, process_id=None):
+    """Creates a StatusMessageBatch.
+
+    Args:
+      messages: List of StatusMessages.
+      message_time: Float representing when message was created (seconds since
+          Epoch).
+      process_id: Process ID that produced this message (overridable for
+          testing).
+    """
+    super(StatusMessageBatch, self).__init__(message_time,
+                                             process_id=process_id)
+    self.messages = messages
+
+  def __str__(self):
+    """Returns a string with a valid constructor for this message."""
+    return ('%s([%s], %s, process_id=%s)' %
+            (self.__class__.__name__,
+             ', '.join(str(message) for message in self.messages), self.time,
+             self.process_id))
+
+
+class FinishedFilesMessage(StatusMessage):
+  """Counts files a worker process transferred within a single batch.
+
+  A worker process sends this in place of the FileMessages and
+  ProgressMessages of the files that started and finished between two of its
+  StatusMessageBatches, so that the UI's work doesn't grow with the number of
+  files.
+  """
+
+  def __init__(self, message_time, process_id=None):
+    """Creates a FinishedFilesMessage that doesn't count any files.
+
+    Args:
+      message_time: Float representing when message was created (seconds since
+          Epoch).
+      process_id: Process ID that produced this message (overridable for
+          testing).
+    """
+    super(FinishedFilesMessage, self).__init__(message_time,
+                                               process_id=process_id)
+    self.num_files = 0
+    # Total size of the files, in bytes.
+    self.size = 0
+    # When the first of the files started.
+    self.start_time = None
+    # Map of thread ID to a [bytes transferred, seconds elapsed] list for the
+    # files each thread transferred.
+    self.thread_totals = {}
+
+  def AddFile(self, size, start_time, end_time, thread_id):
+    """Counts a finished file.
+
+    Args:
+      size: Size of the file, in bytes.
+      start_time: When the file's transfer started (seconds since Epoch).
+      end_time: When the file's transfer finished (seconds since Epoch).
+      thread_id: Thread ID that transferred the file.
+    """
+    self.num_files += 1
+    self.size += size
+    if self.start_time is None or start_time < self.start_time:
+      self.start_time = start_time
+    self.time = max(self.time, end_time)
+    thread_total = self.thread_totals.setdefault(thread_id, [0, 0])
+    thread_total[0] += size
+    thread_total[1] += end_time - start_time
+
+  def __str__(self):
+    """Returns a string describing this message."""
+    return ('%s(%s, num_files=%s, size=%s, start_time=%s, thread_totals=%s, '
+            'process_id=%s)' %
+            (self.__class__.__name__, self.time, self.num_files, self.size,
+             self.start_time, self.thread_totals, self.process_id))
+
+
 class FinalMessage(StatusMessage):
   """Creates a FinalMessage.
 
@@ -164,7 +244,8 @@ class FileMessage(StatusMessage):
 
   def __init__(self, src_url, dst_url, message_time, size=None, finished=False,
                component_num=None, message_type=None,
-               bytes_already_downloaded=None, process_id=None, thread_id=None):
+               bytes_already_downloaded=None, process_id=None, thread_id=None,
+               start_time=None):
     """Creates a FileMessage.
 
     Args:
@@ -183,6 +264,8 @@ class FileMessage(StatusMessage):
       process_id: Process ID that produced this message (overridable for
           testing).
       thread_id: Thread ID that produced this message (overridable for testing).
+      start_time: For a finished file whose start wasn't reported in a message
+          of its own, when its transfer started (seconds since Epoch).
     """
 
     super(FileMessage, self).__init__(message_time, process_id=process_id,
@@ -194,16 +277,17 @@ class FileMessage(StatusMessage):
     self.finished = finished
     self.message_type = message_type
     self.bytes_already_downloaded = bytes_already_downloaded
+    self.start_time = start_time
 
   def __str__(self):
     """Returns a string with a valid constructor for this message."""
     return ('%s(\'%s\', \'%s\', %s, size=%s, finished=%s, component_num=%s, '
             'message_type=%s, bytes_already_downloaded=%s, process_id=%s, '
-            'thread_id=%s)' %
+            'thread_id=%s, start_time=%s)' %
             (self.__class__.__name__, self.src_url, self.dst_url,
              self.time, self.size, self.finished, self.component_num,
              self.message_type, self.bytes_already_downloaded, self.process_id,
-             self.thread_id))
+             self.thread_id, self.start_time))
 
 
 class ProgressMessage(StatusMessage):
@@ -343,3 +427,32 @@ class PerformanceSummaryMessage(StatusMessage):
     """Returns a string with a valid constructor for this message."""
     return ('%s(%s, %s)' %
             (self.__class__.__name__, self.time, self.uses_slice))
+
+
+class ObserverDataMessage(StatusMessage):
+  """Message class carrying the data a worker process's observers collected.
+
+  Worker processes send these so that the main process can merge their data
+  into the output of the observers (see gslib.utils.observer_util) that were
+  started, e.g., the report requested with GSUtil:perf_report.
+  """
+
+  def __init__(self, data, message_time, process_id=None):
+    """Creates an ObserverDataMessage.
+
+    Args:
+      data: Dict of observer name to the data the observer collected since
+          the process last sent its data.
+      message_time: Float representing when message was created (seconds since
+          Epoch).
+      process_id: Process ID that produced this message (overridable for
+          testing).
+    """
+    super(ObserverDataMessage, self).__init__(message_time,
+                                              process_id=process_id)
+    self.data = data
+
+  def __str__(self):
+    """Returns a string with a valid constructor for this message."""
+    return ('%s(%s, %s, process_id=%s)' %
+            (self.__class__.__name__, self.data, self.time, self.process_id))
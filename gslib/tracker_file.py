@@ -22,6 +22,7 @@ import re
 
 from boto import config
 from gslib.exception import CommandException
+from gslib.tracker_store import GetTrackerStore
 from gslib.utils.boto_util import GetGsutilStateDir
 from gslib.utils.boto_util import ResumableThreshold
 from gslib.utils.constants import UTF8
@@ -190,7 +191,9 @@ def GetSlicedDownloadTrackerFilePaths(dst_url, api_selector,
   """Gets a list of sliced download tracker file paths.
 
   The list consists of the parent tracker file path in index 0, and then
-  any existing component tracker files in [1:].
+  any existing component tracker files in [1:]. Component tracker files are
+  only used by sliced downloads from older versions of gsutil; current
+  versions record the completed byte ranges in the parent tracker file.
 
   Args:
     dst_url: Destination URL for tracker file.
@@ -207,15 +210,14 @@ def GetSlicedDownloadTrackerFilePaths(dst_url, api_selector,
 
   # If we don't know the number of components, check the tracker file.
   if num_components is None:
-    tracker_file = None
     try:
-      tracker_file = open(parallel_tracker_file_path, 'r')
-      num_components = json.load(tracker_file)['num_components']
-    except (IOError, ValueError):
+      tracker_file_data = json.loads(
+          GetTrackerStore().Read(parallel_tracker_file_path))
+      if 'completed_ranges' in tracker_file_data:
+        return tracker_file_paths
+      num_components = tracker_file_data['num_components']
+    except (IOError, KeyError, ValueError):
       return tracker_file_paths
-    finally:
-      if tracker_file:
-        tracker_file.close()
 
   for i in range(num_components):
     tracker_file_paths.append(GetTrackerFilePath(
@@ -246,8 +248,8 @@ def _HashAndReturnPath(res_tracker_file_name, tracker_file_type):
 
 
 def DeleteTrackerFile(tracker_file_name):
-  if tracker_file_name and os.path.exists(tracker_file_name):
-    os.unlink(tracker_file_name)
+  if tracker_file_name:
+    GetTrackerStore().Delete(tracker_file_name)
 
 
 def HashRewriteParameters(
@@ -319,24 +321,19 @@ def ReadRewriteTrackerFile(tracker_file_name, rewrite_params_hash):
     file exists, None otherwise (which will result in starting a new rewrite).
   """
   # Check to see if we already have a matching tracker file.
-  tracker_file = None
   if not rewrite_params_hash:
     return
   try:
-    tracker_file = open(tracker_file_name, 'r')
-    existing_hash = tracker_file.readline().rstrip('\n')
-    if existing_hash == rewrite_params_hash:
+    tracker_lines = GetTrackerStore().Read(tracker_file_name).split('\n')
+    if tracker_lines[0] == rewrite_params_hash:
       # Next line is the rewrite token.
-      return tracker_file.readline().rstrip('\n')
+      return tracker_lines[1] if len(tracker_lines) > 1 else ''
   except IOError as e:
     # Ignore non-existent file (happens first time a rewrite is attempted.
     if e.errno != errno.ENOENT:
       print('Couldn\'t read Copy tracker file (%s): %s. Restarting copy '
             'from scratch.' %
             (tracker_file_name, e.strerror))
-  finally:
-    if tracker_file:
-      tracker_file.close()
 
 
 def WriteRewriteTrackerFile(tracker_file_name, rewrite_params_hash,
@@ -400,16 +397,15 @@ def ReadOrCreateDownloadTrackerFile(src_obj_metadata, dst_url, logger,
   tracker_file_name = GetTrackerFilePath(dst_url, tracker_file_type,
                                          api_selector,
                                          component_num=component_num)
-  tracker_file = None
   # Check to see if we already have a matching tracker file.
   try:
-    tracker_file = open(tracker_file_name, 'r')
+    tracker_data = GetTrackerStore().Read(tracker_file_name)
     if tracker_file_type is TrackerFileType.DOWNLOAD:
-      etag_value = tracker_file.readline().rstrip('\n')
+      etag_value = tracker_data.split('\n', 1)[0]
       if etag_value == src_obj_metadata.etag:
         return tracker_file_name, existing_file_size
     elif tracker_file_type is TrackerFileType.DOWNLOAD_COMPONENT:
-      component_data = json.loads(tracker_file.read())
+      component_data = json.loads(tracker_data)
       if (component_data['etag'] == src_obj_metadata.etag and
           component_data['generation'] == src_obj_metadata.generation):
         return tracker_file_name, component_data['download_start_byte']
@@ -423,9 +419,6 @@ def ReadOrCreateDownloadTrackerFile(src_obj_metadata, dst_url, logger,
     if isinstance(e, ValueError) or e.errno != errno.ENOENT:
       logger.warn('Couldn\'t read download tracker file (%s): %s. Restarting '
                   'download from scratch.' % (tracker_file_name, str(e)))
-  finally:
-    if tracker_file:
-      tracker_file.close()
 
   # There wasn't a matching tracker file, so create one and then start the
   # download from scratch.
@@ -475,16 +468,15 @@ def GetDownloadStartByte(src_obj_metadata, dst_url, api_selector,
   tracker_file_name = GetTrackerFilePath(dst_url, tracker_file_type,
                                          api_selector,
                                          component_num=component_num)
-  tracker_file = None
   # Check to see if we already have a matching tracker file.
   try:
-    tracker_file = open(tracker_file_name, 'r')
+    tracker_data = GetTrackerStore().Read(tracker_file_name)
     if tracker_file_type is TrackerFileType.DOWNLOAD:
-      etag_value = tracker_file.readline().rstrip('\n')
+      etag_value = tracker_data.split('\n', 1)[0]
       if etag_value == src_obj_metadata.etag:
         return existing_file_size
     elif tracker_file_type is TrackerFileType.DOWNLOAD_COMPONENT:
-      component_data = json.loads(tracker_file.read())
+      component_data = json.loads(tracker_data)
       if (component_data['etag'] == src_obj_metadata.etag and
           component_data['generation'] == src_obj_metadata.generation):
         return component_data['download_start_byte']
@@ -493,10 +485,6 @@ def GetDownloadStartByte(src_obj_metadata, dst_url, api_selector,
     # If the file does not exist, there is not much we can do at this point.
     pass
 
-  finally:
-    if tracker_file:
-      tracker_file.close()
-
   # There wasn't a matching tracker file, which means our starting point is
   # start_byte.
   return start_byte
@@ -518,12 +506,42 @@ def WriteDownloadComponentTrackerFile(tracker_file_name, src_obj_metadata,
   _WriteTrackerFile(tracker_file_name, json.dumps(component_data))
 
 
+def WriteSlicedDownloadTrackerFile(tracker_file_name, etag, generation,
+                                   num_components, completed_ranges,
+                                   checkpoint=False):
+  """Creates or overwrites a sliced download tracker file on disk.
+
+  Args:
+    tracker_file_name: The name of the tracker file.
+    etag: The etag of the source object.
+    generation: The generation of the source object.
+    num_components: The number of parallel streams used for the download.
+    completed_ranges: Sorted list of non-overlapping [start_byte, end_byte]
+                      ranges of the object that have been written to the
+                      download file.
+    checkpoint: True if this only records progress of a download whose
+                tracker file was already created. Checkpoints may be batched
+                with other writes, and are dropped if the tracker file has
+                been deleted in the meantime.
+  """
+  tracker_file_data = {'etag': etag,
+                       'generation': generation,
+                       'num_components': num_components,
+                       'completed_ranges': completed_ranges}
+  try:
+    if checkpoint:
+      GetTrackerStore().Checkpoint(tracker_file_name,
+                                   json.dumps(tracker_file_data))
+    else:
+      GetTrackerStore().Write(tracker_file_name, json.dumps(tracker_file_data))
+  except (IOError, OSError) as e:
+    RaiseUnwritableTrackerFileException(tracker_file_name, e.strerror)
+
+
 def _WriteTrackerFile(tracker_file_name, data):
   """Creates a tracker file, storing the input data."""
   try:
-    with os.fdopen(os.open(tracker_file_name,
-                           os.O_WRONLY | os.O_CREAT, 0600), 'w') as tf:
-      tf.write(data)
+    GetTrackerStore().Write(tracker_file_name, data)
     return False
   except (IOError, OSError) as e:
     raise RaiseUnwritableTrackerFileException(tracker_file_name, e.strerror)
@@ -545,15 +563,13 @@ def GetUploadTrackerData(tracker_file_name, logger,
     Serialization data if the tracker file already exists (resume existing
     upload), None otherwise.
   """
-  tracker_file = None
   remove_tracker_file = False
   encryption_restart = False
 
   # If we already have a matching tracker file, get the serialization data
   # so that we can resume the upload.
   try:
-    tracker_file = open(tracker_file_name, 'r')
-    tracker_data = tracker_file.read()
+    tracker_data = GetTrackerStore().Read(tracker_file_name)
     tracker_json = json.loads(tracker_data)
     if tracker_json[ENCRYPTION_UPLOAD_TRACKER_ENTRY] != encryption_key_sha256:
       encryption_restart = True
@@ -577,8 +593,6 @@ def GetUploadTrackerData(tracker_file_name, logger,
       # If encryption key is still None, we can resume using the old format.
       return tracker_data
   finally:
-    if tracker_file:
-      tracker_file.close()
     if encryption_restart:
       logger.warn('Upload tracker file (%s) does not match current encryption '
                   'key. Restarting upload from scratch with a new tracker '
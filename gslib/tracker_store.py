@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Storage backends for resumable transfer tracker data.
+
+Tracker data is keyed by tracker file path (see gslib.tracker_file). The
+GSUtil:tracker_store option selects where it's kept:
+
+  files:  One file per tracker, at the tracker file path (the default).
+  sqlite: A single SQLite database in WAL mode in the tracker directory.
+          Writes and deletes are committed straight away, while progress
+          checkpoints are batched per process and committed together within
+          MAX_PENDING_WRITE_AGE. Entries that haven't been updated for
+          MAX_ENTRY_AGE are removed, and trackers that only exist as files,
+          e.g. from older versions of gsutil, are read and moved into the
+          database.
+
+Both backends report errors as IOError, like reading and writing files.
+"""
+
+from __future__ import absolute_import
+
+import atexit
+import errno
+import logging
+import os
+import threading
+import time
+
+from boto import config
+from gslib.utils import perf_util
+from gslib.utils.constants import UTF8
+
+try:
+  # pylint: disable=g-import-not-at-top
+  import sqlite3
+except ImportError:
+  sqlite3 = None
+
+
+class TrackerStoreType(object):
+  FILES = 'files'
+  SQLITE = 'sqlite'
+
+
+TRACKER_STORE_DB_FILE_NAME = 'trackers.db'
+
+# Pending checkpoints are committed once there are this many of them, or once
+# the oldest is this many seconds old.
+MAX_PENDING_WRITES = 100
+MAX_PENDING_WRITE_AGE = 2.0
+
+# Entries that haven't been written for this many seconds are removed.
+MAX_ENTRY_AGE = 7 * 24 * 60 * 60
+
+_tracker_store = None
+_tracker_store_lock = threading.Lock()
+
+
+def GetTrackerStore():
+  """Returns the TrackerStore configured for this gsutil invocation."""
+  global _tracker_store  # pylint: disable=global-statement
+  with _tracker_store_lock:
+    if _tracker_store is None:
+      store_type = config.get('GSUtil', 'tracker_store',
+                              TrackerStoreType.FILES)
+      if store_type == TrackerStoreType.SQLITE and sqlite3:
+        # Imported here to avoid a circular import.
+        # pylint: disable=g-import-not-at-top
+        from gslib.tracker_file import CreateTrackerDirIfNeeded
+        _tracker_store = SqliteTrackerStore(os.path.join(
+            CreateTrackerDirIfNeeded(), TRACKER_STORE_DB_FILE_NAME))
+        atexit.register(_tracker_store.Flush)
+      else:
+        if store_type == TrackerStoreType.SQLITE:
+          logging.getLogger().warn(
+              'The sqlite3 module is not available; storing tracker data in '
+              'files instead.')
+        _tracker_store = FileTrackerStore()
+    return _tracker_store
+
+
+def _ReadFile(file_name):
+  with open(file_name, 'r') as tracker_file:
+    return tracker_file.read()
+
+
+def _WriteFile(file_name, data):
+  with perf_util.PhaseTimer(perf_util.PHASE_TRACKER_WRITE,
+                            num_bytes=len(data)):
+    with os.fdopen(os.open(file_name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                           0600), 'w') as tracker_file:
+      tracker_file.write(data)
+
+
+def _DeleteFile(file_name):
+  if os.path.exists(file_name):
+    os.unlink(file_name)
+
+
+class FileTrackerStore(object):
+  """Stores each tracker in a file named by its key."""
+
+  def Read(self, key):
+    """Returns the tracker data for key, or raises IOError if there is none."""
+    return _ReadFile(key)
+
+  def Write(self, key, data):
+    """Creates or replaces the tracker data for key."""
+    _WriteFile(key, data)
+
+  def Checkpoint(self, key, data):
+    """Replaces the tracker data for key with newer progress.
+
+    Unlike Write, checkpoints may be committed later, and are dropped if the
+    tracker has been deleted by then.
+
+    Args:
+      key: Tracker key.
+      data: Tracker data string.
+    """
+    _WriteFile(key, data)
+
+  def Delete(self, key):
+    _DeleteFile(key)
+
+  def Flush(self):
+    """Commits writes that haven't been committed yet."""
+    pass
+
+
+class SqliteTrackerStore(object):
+  """Stores trackers in a SQLite database shared by all gsutil processes.
+
+  Each process uses its own connection. Writes and deletes are committed
+  before they return, so that a transfer can be resumed even if its process
+  is killed straight afterwards. Checkpoints are kept pending, and a timer
+  commits them once the oldest is MAX_PENDING_WRITE_AGE seconds old; callers
+  that need other processes to see a checkpoint straight away call Flush.
+  """
+
+  def __init__(self, db_path):
+    self._db_path = db_path
+    self._lock = threading.Lock()
+    self._pid = None
+    self._conn = None
+    # Maps keys to their latest pending (operation, data) pair.
+    self._pending = {}
+    self._oldest_pending_time = None
+    self._flush_timer = None
+
+  def _GetConnection(self):
+    """Returns this process's connection, opening it if needed."""
+    if self._pid != os.getpid():
+      # Forked processes don't share the parent's connection or writes.
+      self._pid = os.getpid()
+      self._conn = None
+      self._pending = {}
+      self._oldest_pending_time = None
+      self._flush_timer = None
+    if self._conn is None:
+      # Wait for other processes' transactions rather than failing.
+      conn = sqlite3.connect(self._db_path, timeout=60,
+                             check_same_thread=False)
+      conn.execute('PRAGMA journal_mode=WAL')
+      conn.execute('PRAGMA synchronous=NORMAL')
+      with conn:
+        conn.execute('CREATE TABLE IF NOT EXISTS trackers ('
+                     'key TEXT PRIMARY KEY, data BLOB, updated REAL)')
+        conn.execute('DELETE FROM trackers WHERE updated < ?',
+                     (time.time() - MAX_ENTRY_AGE,))
+      self._conn = conn
+    return self._conn
+
+  def _Call(self, func, *args):
+    """Calls func with the lock held, reporting database errors as IOError."""
+    with self._lock:
+      try:
+        return func(*args)
+      except sqlite3.Error as e:
+        raise IOError(None, 'Tracker database %s: %s' % (self._db_path, e))
+
+  def Read(self, key):
+    """Returns the tracker data for key, or raises IOError if there is none."""
+    return self._Call(self._Read, _DecodeKey(key))
+
+  def _Read(self, key):
+    if key in self._pending:
+      operation, data = self._pending[key]
+      if operation != 'delete':
+        return data
+    else:
+      row = self._GetConnection().execute(
+          'SELECT data FROM trackers WHERE key = ?', (key,)).fetchone()
+      if row:
+        return str(row[0])
+      if os.path.exists(key):
+        # Move a tracker file into the database, so that checkpoints apply.
+        data = _ReadFile(key)
+        self._AddPending(key, 'write', data)
+        self._Commit()
+        _DeleteFile(key)
+        return data
+    raise IOError(errno.ENOENT, os.strerror(errno.ENOENT), key)
+
+  def Write(self, key, data):
+    """Creates or replaces the tracker data for key."""
+    self._Call(self._Write, _DecodeKey(key), 'write', data)
+
+  def Checkpoint(self, key, data):
+    """Replaces the tracker data for key with newer progress.
+
+    Checkpoints are dropped if the tracker has been deleted by the time they
+    are committed.
+
+    Args:
+      key: Tracker key.
+      data: Tracker data string.
+    """
+    self._Call(self._Write, _DecodeKey(key), 'checkpoint', data)
+
+  def Delete(self, key):
+    self._Call(self._Write, _DecodeKey(key), 'delete', None)
+    _DeleteFile(key)
+
+  def _Write(self, key, operation, data):
+    self._GetConnection()
+    self._AddPending(key, operation, data)
+    if (operation != 'checkpoint' or
+        len(self._pending) >= MAX_PENDING_WRITES or
+        time.time() - self._oldest_pending_time >= MAX_PENDING_WRITE_AGE):
+      self._Commit()
+    elif self._flush_timer is None:
+      self._flush_timer = threading.Timer(MAX_PENDING_WRITE_AGE, self.Flush)
+      # Processes exit without waiting for the timer; Flush is also called
+      # at exit.
+      self._flush_timer.daemon = True
+      self._flush_timer.start()
+
+  def _AddPending(self, key, operation, data):
+    if not self._pending:
+      self._oldest_pending_time = time.time()
+    self._pending[key] = (operation, data)
+
+  def Flush(self):
+    """Commits writes that haven't been committed yet."""
+    self._Call(self._Commit)
+
+  def _Commit(self):
+    if self._pid != os.getpid():
+      return
+    if self._flush_timer is not None:
+      self._flush_timer.cancel()
+      self._flush_timer = None
+    if not self._pending:
+      return
+    now = time.time()
+    with perf_util.PhaseTimer(perf_util.PHASE_TRACKER_WRITE):
+      with self._GetConnection() as conn:
+        for key, (operation, data) in self._pending.iteritems():
+          if operation == 'write':
+            conn.execute('INSERT OR REPLACE INTO trackers VALUES (?, ?, ?)',
+                         (key, sqlite3.Binary(data), now))
+          elif operation == 'checkpoint':
+            conn.execute('UPDATE trackers SET data = ?, updated = ? '
+                         'WHERE key = ?', (sqlite3.Binary(data), now, key))
+          else:
+            conn.execute('DELETE FROM trackers WHERE key = ?', (key,))
+    self._pending = {}
+    self._oldest_pending_time = None
+
+
+def _DecodeKey(key):
+  if isinstance(key, unicode):
+    return key
+  return key.decode(UTF8)
@@ -28,6 +28,7 @@ from six.moves import queue as Queue
 from gslib.metrics import LogPerformanceSummaryParams
 from gslib.metrics import LogRetryableError
 from gslib.thread_message import FileMessage
+from gslib.thread_message import FinishedFilesMessage
 from gslib.thread_message import FinalMessage
 from gslib.thread_message import MetadataMessage
 from gslib.thread_message import PerformanceSummaryMessage
@@ -36,6 +37,8 @@ from gslib.thread_message import ProgressMessage
 from gslib.thread_message import RetryableErrorMessage
 from gslib.thread_message import SeekAheadMessage
 from gslib.thread_message import StatusMessage
+from gslib.thread_message import StatusMessageBatch
+from gslib.utils import observer_util
 from gslib.utils import parallelism_framework_util
 from gslib.utils.unit_util import DecimalShort
 from gslib.utils.unit_util import HumanReadableWithDecimalPlaces
@@ -593,38 +596,15 @@ class DataManager(StatusMessageManager):
       status_message: the FileMessage to be processed.
     """
     if not status_message.finished:
-      # File started.
-      if self.first_item and not self.custom_time:
-        # Set initial time.
-        self.refresh_message_time = status_message.time
-        self.start_time = self.refresh_message_time
-        self.last_throughput_time = self.refresh_message_time
-        self.first_item = False
-
-      # Gets file name (from src_url).
-      file_name = status_message.src_url.url_string
-      status_message.size = status_message.size if status_message.size else 0
-      # Creates a new entry on individual_file_progress.
-      self.individual_file_progress[file_name] = (
-          self._ProgressInformation(status_message.size))
-
-      if self.num_objects_source >= EstimationSource.INDIVIDUAL_MESSAGES:
-        # This ensures the file has not been counted on SeekAheadThread or
-        # in ProducerThread.
-        self.num_objects_source = EstimationSource.INDIVIDUAL_MESSAGES
-        self.num_objects += 1
-      if self.total_size_source >= EstimationSource.INDIVIDUAL_MESSAGES:
-        # This ensures the file size has not been counted on SeekAheadThread or
-        # in ProducerThread.
-        self.total_size_source = EstimationSource.INDIVIDUAL_MESSAGES
-        self.total_size += status_message.size
-
-      self.object_report_change = True
-
+      self._HandleFileStart(status_message, status_message.time)
     else:
       # File finished.
-      self.objects_finished += 1
       file_name = status_message.src_url.url_string
+      if file_name not in self.individual_file_progress:
+        # Small uploads report their start and end in a single message.
+        self._HandleFileStart(status_message,
+                              status_message.start_time or status_message.time)
+      self.objects_finished += 1
       file_progress = self.individual_file_progress[file_name]
       total_bytes_transferred = (file_progress.new_progress_sum +
                                  file_progress.existing_progress_sum)
@@ -639,6 +619,67 @@ class DataManager(StatusMessageManager):
           self.num_objects_source == EstimationSource.PRODUCER_THREAD_FINAL):
         self.final_message = True
 
+  def _HandleFileStart(self, status_message, start_time):
+    """Records the start of a file's transfer.
+
+    Args:
+      status_message: the FileMessage describing the file.
+      start_time: When the file's transfer started.
+    """
+    if self.first_item and not self.custom_time:
+      # Set initial time.
+      self.refresh_message_time = start_time
+      self.start_time = self.refresh_message_time
+      self.last_throughput_time = self.refresh_message_time
+      self.first_item = False
+
+    # Gets file name (from src_url).
+    file_name = status_message.src_url.url_string
+    status_message.size = status_message.size if status_message.size else 0
+    # Creates a new entry on individual_file_progress.
+    self.individual_file_progress[file_name] = (
+        self._ProgressInformation(status_message.size))
+
+    if self.num_objects_source >= EstimationSource.INDIVIDUAL_MESSAGES:
+      # This ensures the file has not been counted on SeekAheadThread or
+      # in ProducerThread.
+      self.num_objects_source = EstimationSource.INDIVIDUAL_MESSAGES
+      self.num_objects += 1
+    if self.total_size_source >= EstimationSource.INDIVIDUAL_MESSAGES:
+      # This ensures the file size has not been counted on SeekAheadThread or
+      # in ProducerThread.
+      self.total_size_source = EstimationSource.INDIVIDUAL_MESSAGES
+      self.total_size += status_message.size
+
+    self.object_report_change = True
+
+  def _HandleFinishedFiles(self, status_message):
+    """Handles a FinishedFilesMessage that counts files a process transferred.
+
+    Args:
+      status_message: the FinishedFilesMessage to be processed.
+    """
+    if self.first_item and not self.custom_time:
+      # Set initial time.
+      self.refresh_message_time = status_message.start_time
+      self.start_time = self.refresh_message_time
+      self.last_throughput_time = self.refresh_message_time
+      self.first_item = False
+    if self.num_objects_source >= EstimationSource.INDIVIDUAL_MESSAGES:
+      self.num_objects_source = EstimationSource.INDIVIDUAL_MESSAGES
+      self.num_objects += status_message.num_files
+    if self.total_size_source >= EstimationSource.INDIVIDUAL_MESSAGES:
+      self.total_size_source = EstimationSource.INDIVIDUAL_MESSAGES
+      self.total_size += status_message.size
+    self.objects_finished += status_message.num_files
+    self.total_progress += status_message.size
+    self.new_progress += status_message.size
+    self.last_progress_time = status_message.time
+    self.object_report_change = True
+    if (self.objects_finished == self.num_objects and
+        self.num_objects_source == EstimationSource.PRODUCER_THREAD_FINAL):
+      self.final_message = True
+
   def _IsFile(self, file_message):
     """Tells whether or not this FileMessage represent a file.
 
@@ -769,6 +810,11 @@ class DataManager(StatusMessageManager):
       # Progress info.
       self._HandleProgressMessage(status_message)
 
+    elif isinstance(status_message, FinishedFilesMessage):
+      # Files a worker process transferred between two of its batches.
+      self._HandleFinishedFiles(status_message)
+      LogPerformanceSummaryParams(finished_files_message=status_message)
+
     elif isinstance(status_message, RetryableErrorMessage):
       LogRetryableError(status_message)
 
@@ -870,7 +916,8 @@ class DataManager(StatusMessageManager):
       False otherwise.
     """
     if isinstance(status_message, (SeekAheadMessage, ProducerThreadMessage,
-                                   FileMessage, ProgressMessage, FinalMessage,
+                                   FileMessage, ProgressMessage,
+                                   FinishedFilesMessage, FinalMessage,
                                    RetryableErrorMessage,
                                    PerformanceSummaryMessage)):
       return True
@@ -984,12 +1031,20 @@ class UIController(object):
           self._HandleMessage(estimation_message, stream,
                               cur_time=estimation_message.time)
       return
+    if isinstance(status_message, StatusMessageBatch):
+      # Messages a worker process buffered and sent together.
+      for message in status_message.messages:
+        self.Call(message, stream, cur_time=cur_time)
+      return
     if self.dump_status_message_fp:
       # TODO: Add Unicode support to string methods on message classes.
       # Currently, dump will fail with a UnicodeEncodeErorr if the message
       # class contains a Unicode attribute.
       self.dump_status_message_fp.write(str(status_message))
       self.dump_status_message_fp.write('\n')
+    if observer_util.HandleMessage(status_message, self):
+      # Data from worker processes' observers only feeds their output.
+      return
     if not cur_time:
       cur_time = status_message.time
     if not self.manager:
@@ -1021,8 +1076,8 @@ class UIController(object):
         for estimation_message in self.early_estimation_messages:
           self._HandleMessage(estimation_message, stream, cur_time)
     if not self.manager.CanHandleMessage(status_message):
-      if (isinstance(status_message, FileMessage) or
-          isinstance(status_message, ProgressMessage)):
+      if isinstance(status_message, (FileMessage, ProgressMessage,
+                                     FinishedFilesMessage)):
         # We have to create a DataManager to handle this data message. This is
         # to avoid a possible race condition where MetadataMessages are sent
         # before data messages. As such, this means that the DataManager has
@@ -42,6 +42,7 @@ from gslib.utils.constants import DEFAULT_GCS_JSON_API_VERSION
 from gslib.utils.constants import DEFAULT_GSUTIL_STATE_DIR
 from gslib.utils.constants import SSL_TIMEOUT_SEC
 from gslib.utils.unit_util import HumanReadableToBytes
+from gslib.utils.unit_util import ONE_KIB
 from gslib.utils.unit_util import ONE_MIB
 
 import httplib2
@@ -206,6 +207,21 @@ def GetJsonResumableChunkSize():
   return chunk_size
 
 
+def GetJsonResumableMaxChunkSize():
+  """Returns the largest chunk size that resumable uploads may tune up to.
+
+  Chunk size tuning is disabled unless json_resumable_max_chunk_size is larger
+  than json_resumable_chunk_size.
+
+  Returns:
+    Chunk size in bytes, a multiple of 256KiB.
+  """
+  max_chunk_size = config.getint('GSUtil', 'json_resumable_max_chunk_size', 0)
+  if max_chunk_size % (1024*256L):
+    max_chunk_size += 1024*256L - (max_chunk_size % (1024*256L))
+  return max(max_chunk_size, GetJsonResumableChunkSize())
+
+
 def GetLastCheckedForGsutilUpdateTimestampFile():
   return os.path.join(GetGsutilStateDir(), '.last_software_update_check')
 
@@ -240,6 +256,12 @@ def GetMaxUploadCompressionBufferSize():
       config.get('GSUtil', 'max_upload_compression_buffer_size', '2GiB'))
 
 
+def GetTransferBufferMemory():
+  """Get the max amount of memory transfers may use to buffer object data."""
+  return HumanReadableToBytes(
+      config.get('GSUtil', 'transfer_buffer_memory', '512MiB'))
+
+
 def GetNewHttp(http_class=httplib2.Http, **kwargs):
   """Creates and returns a new httplib2.Http instance.
 
@@ -409,6 +431,10 @@ def ResumableThreshold():
   return config.getint('GSUtil', 'resumable_threshold', 8 * ONE_MIB)
 
 
+def SmallFileUploadThreshold():
+  return config.getint('GSUtil', 'small_file_upload_threshold', 64 * ONE_KIB)
+
+
 def UsingCrcmodExtension(crcmod):
   return (boto.config.get('GSUtil', 'test_assume_fast_crcmod', None) or
           (getattr(crcmod, 'crcmod', None) and
@@ -44,6 +44,12 @@ DEFAULT_GCS_JSON_API_VERSION = 'v1'
 
 DEFAULT_GSUTIL_STATE_DIR = os.path.expanduser(os.path.join('~', '.gsutil'))
 
+# Top-level options accepted before the command name, in getopt format.
+GSUTIL_LONG_OPTS = ['debug', 'detailedDebug', 'version', 'option', 'help',
+                    'header', 'multithreaded', 'quiet', 'testexceptiontraces',
+                    'trace-token=', 'perf-trace-token=']
+GSUTIL_SHORT_OPTS = 'dDvo:h:u:mq'
+
 GSUTIL_PUB_TARBALL = 'gs://pub/gsutil.tar.gz'
 
 # Number of seconds to wait before printing a long retry warning message.
@@ -19,13 +19,14 @@ from __future__ import absolute_import
 
 import base64
 from collections import namedtuple
-import csv
 import datetime
 import errno
 import gzip
 from hashlib import md5
+import itertools
 import json
 import logging
+import math
 import mimetypes
 from operator import attrgetter
 import os
@@ -46,6 +47,8 @@ from boto import config
 import crcmod
 
 import gslib
+from gslib.buffer_pool import GetTransferBufferPool
+from gslib.buffer_pool import TRANSFER_BUFFER_CHUNK_SIZE
 from gslib.cloud_api import AccessDeniedException
 from gslib.cloud_api import ArgumentException
 from gslib.cloud_api import CloudApi
@@ -58,25 +61,47 @@ from gslib.cloud_api import ResumableUploadAbortException
 from gslib.cloud_api import ResumableUploadException
 from gslib.cloud_api import ResumableUploadStartOverException
 from gslib.cloud_api import ServiceException
+from gslib.commands.compose import MAX_COMPONENT_COUNT
 from gslib.commands.compose import MAX_COMPOSE_ARITY
+from gslib.commands.config import DEFAULT_DAISY_CHAIN_BUFFER_SIZE
+from gslib.commands.config import DEFAULT_DAISY_CHAIN_DOWNLOAD_STREAMS
+from gslib.commands.config import DEFAULT_NO_CLOBBER_PREFETCH_MAX_OBJECTS
 from gslib.commands.config import DEFAULT_PARALLEL_COMPOSITE_UPLOAD_COMPONENT_SIZE
+from gslib.commands.config import DEFAULT_PARALLEL_COMPOSITE_UPLOAD_MAX_COMPONENTS
 from gslib.commands.config import DEFAULT_PARALLEL_COMPOSITE_UPLOAD_THRESHOLD
 from gslib.commands.config import DEFAULT_SLICED_OBJECT_DOWNLOAD_COMPONENT_SIZE
 from gslib.commands.config import DEFAULT_SLICED_OBJECT_DOWNLOAD_MAX_COMPONENTS
+from gslib.commands.config import DEFAULT_SLICED_OBJECT_DOWNLOAD_SLICE_SIZE
 from gslib.commands.config import DEFAULT_SLICED_OBJECT_DOWNLOAD_THRESHOLD
 from gslib.cs_api_map import ApiSelector
 from gslib.daisy_chain_wrapper import DaisyChainWrapper
 from gslib.exception import CommandException
 from gslib.exception import HashMismatchException
 from gslib.file_part import FilePart
+from gslib.manifest_store import GetManifestIndex
+from gslib.manifest_store import GetManifestIndexPath
+from gslib.manifest_store import GetManifestStoreType
+from gslib.manifest_store import GetManifestWriter
+from gslib.manifest_store import IterSuccessfulSources
+from gslib.manifest_store import ManifestStoreType
+from gslib.manifest_store import MissingManifestHeadersError
+from gslib.manifest_store import SUCCESSFUL_RESULTS
+from gslib.manifest_store import WriteManifestHeaderIfNeeded
 from gslib.parallel_tracker_file import GenerateComponentObjectPrefix
+from gslib.parallel_tracker_file import ObjectFromTracker
 from gslib.parallel_tracker_file import ReadParallelUploadTrackerFile
+from gslib.parallel_tracker_file import ReadParallelUploadTrackerIntermediates
 from gslib.parallel_tracker_file import ValidateParallelCompositeTrackerData
 from gslib.parallel_tracker_file import WriteComponentToParallelUploadTrackerFile
+from gslib.parallel_tracker_file import WriteIntermediateToParallelUploadTrackerFile
 from gslib.parallel_tracker_file import WriteParallelUploadTrackerFile
 from gslib.progress_callback import FileProgressCallbackHandler
 from gslib.progress_callback import ProgressCallbackWithTimeout
 from gslib.resumable_streaming_upload import ResumableStreamingJsonUploadWrapper
+from gslib.sliced_download_scheduler import GetSliceRanges
+from gslib.sliced_download_scheduler import SLICE_PROGRESS_SYNC_THRESHOLD
+from gslib.sliced_download_scheduler import SlicedDownloadRangeStolenException
+from gslib.sliced_download_scheduler import SlicedDownloadScheduler
 from gslib.storage_url import ContainsWildcard
 from gslib.storage_url import GenerationFromUrlAndString
 from gslib.storage_url import IsCloudSubdirPlaceholder
@@ -87,19 +112,22 @@ from gslib.thread_message import RetryableErrorMessage
 from gslib.tracker_file import DeleteDownloadTrackerFiles
 from gslib.tracker_file import DeleteTrackerFile
 from gslib.tracker_file import ENCRYPTION_UPLOAD_TRACKER_ENTRY
-from gslib.tracker_file import GetDownloadStartByte
 from gslib.tracker_file import GetTrackerFilePath
 from gslib.tracker_file import GetUploadTrackerData
 from gslib.tracker_file import RaiseUnwritableTrackerFileException
 from gslib.tracker_file import ReadOrCreateDownloadTrackerFile
 from gslib.tracker_file import SERIALIZATION_UPLOAD_TRACKER_ENTRY
 from gslib.tracker_file import TrackerFileType
-from gslib.tracker_file import WriteDownloadComponentTrackerFile
+from gslib.tracker_file import WriteSlicedDownloadTrackerFile
+from gslib.tracker_store import GetTrackerStore
 from gslib.utils import parallelism_framework_util
+from gslib.utils import perf_util
 from gslib.utils.boto_util import GetJsonResumableChunkSize
 from gslib.utils.boto_util import GetMaxRetryDelay
 from gslib.utils.boto_util import GetNumRetries
+from gslib.utils.boto_util import GetTransferBufferMemory
 from gslib.utils.boto_util import ResumableThreshold
+from gslib.utils.boto_util import SmallFileUploadThreshold
 from gslib.utils.boto_util import UsingCrcmodExtension
 from gslib.utils.cloud_api_helper import GetCloudApiInstance
 from gslib.utils.cloud_api_helper import GetDownloadSerializationData
@@ -111,6 +139,7 @@ from gslib.utils.encryption_helper import CryptoKeyWrapperFromKey
 from gslib.utils.encryption_helper import FindMatchingCSEKInBotoConfig
 from gslib.utils.encryption_helper import GetEncryptionKeyWrapper
 from gslib.utils.hashing_helper import Base64EncodeHash
+from gslib.utils.hashing_helper import CalculateB64EncodedCrc32cFromContents
 from gslib.utils.hashing_helper import CalculateB64EncodedMd5FromContents
 from gslib.utils.hashing_helper import CalculateHashesFromContents
 from gslib.utils.hashing_helper import CHECK_HASH_IF_FAST_ELSE_FAIL
@@ -134,6 +163,9 @@ from gslib.utils.system_util import CheckFreeSpace
 from gslib.utils.system_util import GetFileSize
 from gslib.utils.system_util import GetStreamFromFileUrl
 from gslib.utils.system_util import IS_WINDOWS
+from gslib.utils.system_util import PositionalWrite
+from gslib.utils.system_util import PositionalWriteAvailable
+from gslib.utils.system_util import PreallocateFile
 from gslib.utils.translation_helper import AddS3MarkerAclToObjectMetadata
 from gslib.utils.translation_helper import CopyObjectMetadata
 from gslib.utils.translation_helper import DEFAULT_CONTENT_TYPE
@@ -210,20 +242,35 @@ UPLOAD_RETURN_FIELDS = ['crc32c', 'customerEncryption', 'etag', 'generation',
 # tracker_file: tracker file for this component.
 # tracker_file_lock: tracker file lock for tracker file(s).
 # gzip_encoded: Whether to use gzip transport encoding for the upload.
+# intermediate: IntermediateCompositeObject that this component is composed
+#               into, or None if the components are composed directly into the
+#               final object.
 PerformParallelUploadFileToObjectArgs = namedtuple(
     'PerformParallelUploadFileToObjectArgs',
     'filename file_start file_length src_url dst_url canned_acl '
     'content_type tracker_file tracker_file_lock encryption_key_sha256 '
-    'gzip_encoded')
+    'gzip_encoded intermediate')
+
+# Uploads with more than MAX_COMPOSE_ARITY components, and pipelined uploads,
+# are composed in two levels: consecutive groups of components are composed
+# into intermediate objects, which are then composed into the final object.
+# object_name: Name of the temporary intermediate object.
+# component_names: Tuple of the names of the components composed into it, in
+#                  order.
+# delete_components: Whether to delete the components as soon as the
+#                    intermediate object is composed.
+IntermediateCompositeObject = namedtuple(
+    'IntermediateCompositeObject',
+    'object_name component_names delete_components')
 
 PerformSlicedDownloadObjectToFileArgs = namedtuple(
     'PerformSlicedDownloadObjectToFileArgs',
     'component_num src_url src_obj_metadata_json dst_url download_file_name '
-    'start_byte end_byte decryption_key')
+    'scheduler decryption_key')
 
 # This tuple is used only to encapsulate the arguments returned by
-#   _PerformSlicedDownloadObjectToFile.
-# component_num: Component number.
+#   _PerformSlicedDownloadObjectToFile for each byte range it downloads.
+# component_num: Component number, which is the range_id of the range.
 # crc32c: CRC32C hash value (integer) of the downloaded bytes
 # bytes_transferred: The number of bytes transferred, potentially less
 #   than the component size if the download was resumed.
@@ -232,10 +279,11 @@ PerformSlicedDownloadObjectToFileArgs = namedtuple(
 #    if the download was resumed.
 # server_encoding: Content-encoding string if it was detected that the server
 #    sent encoded bytes during transfer, None otherwise.
+# start_byte: The first byte of the component.
 PerformSlicedDownloadReturnValues = namedtuple(
     'PerformSlicedDownloadReturnValues',
     'component_num crc32c bytes_transferred component_total_size '
-    'server_encoding')
+    'server_encoding start_byte')
 
 # TODO: Refactor this file to be less cumbersome. In particular, some of the
 # different paths (e.g., uploading a file to an object vs. downloading an
@@ -251,6 +299,12 @@ GZIP_ALL_FILES = 'GZIP_ALL_FILES'
 # file.
 TRACKERFILE_UPDATE_THRESHOLD = TEN_MIB
 
+# Offset and size alignment required for O_DIRECT writes, and the size of the
+# page-aligned buffer used for them in sliced downloads, which is one chunk
+# from the transfer buffer pool.
+DIRECT_IO_ALIGNMENT = 4096
+DIRECT_IO_BUFFER_SIZE = TRANSFER_BUFFER_CHUNK_SIZE
+
 PARALLEL_COMPOSITE_SUGGESTION_THRESHOLD = 150 * 1024 * 1024
 
 # S3 requires special Multipart upload logic (that we currently don't implement)
@@ -342,12 +396,122 @@ def _PerformParallelUploadFileToObject(cls, args, thread_state=None):
         gsutil_api.prefer_api = orig_prefer_api
 
   component = ret[2]
-  WriteComponentToParallelUploadTrackerFile(
+  completed_components = WriteComponentToParallelUploadTrackerFile(
       args.tracker_file, args.tracker_file_lock, component, cls.logger,
       encryption_key_sha256=args.encryption_key_sha256)
+  if args.intermediate:
+    _ComposeIntermediateIfComplete(cls, args, completed_components, gsutil_api)
   return ret
 
 
+def _ComposeIntermediateIfComplete(cls, args, completed_components,
+                                   gsutil_api):
+  """Composes args.intermediate if all of its components have been uploaded.
+
+  The tracker file is updated under a lock, so exactly one worker (the one
+  whose update completes the group) sees all of the group's components in
+  completed_components. Composing here lets the intermediate objects be
+  composed while the rest of the file is still uploading. Failures are only
+  logged, since _DoParallelCompositeUpload composes any intermediate objects
+  that are missing from the tracker file once all components are uploaded.
+
+  Args:
+    cls: Calling Command class.
+    args: PerformParallelUploadFileToObjectArgs for the uploaded component.
+    completed_components: Components recorded in the tracker file, as returned
+        by WriteComponentToParallelUploadTrackerFile.
+    gsutil_api: gsutil Cloud API instance to use.
+  """
+  completed = dict((component.object_name, component)
+                   for component in completed_components)
+  component_names = args.intermediate.component_names
+  if not all(name in completed for name in component_names):
+    return
+  dst_bucket_url = StorageUrlFromString(args.dst_url.bucket_url_string)
+  try:
+    intermediate_url = _ComposeIntermediateObject(
+        args.intermediate.object_name,
+        [completed[name] for name in component_names], dst_bucket_url,
+        args.content_type, gsutil_api, GetEncryptionKeyWrapper(config))
+  except Exception as e:  # pylint: disable=broad-except
+    cls.logger.debug(
+        'Failed to compose intermediate object %s (it will be retried after '
+        'all components are uploaded): %s', args.intermediate.object_name, e)
+    return
+  if not args.intermediate.delete_components:
+    WriteIntermediateToParallelUploadTrackerFile(
+        args.tracker_file, args.tracker_file_lock, intermediate_url, cls.logger,
+        encryption_key_sha256=args.encryption_key_sha256)
+    return
+
+  # Stop tracking the components before deleting them, so that a resumed
+  # upload reuses the intermediate object instead of looking for them.
+  WriteIntermediateToParallelUploadTrackerFile(
+      args.tracker_file, args.tracker_file_lock, intermediate_url, cls.logger,
+      encryption_key_sha256=args.encryption_key_sha256,
+      composed_component_names=component_names)
+  for name in component_names:
+    try:
+      gsutil_api.DeleteObject(
+          dst_bucket_url.bucket_name, name,
+          generation=completed[name].generation or None,
+          provider=dst_bucket_url.scheme)
+    except NotFoundException:
+      pass
+    except Exception as e:  # pylint: disable=broad-except
+      cls.logger.warn('Failed to delete temporary object %s: %s', name, e)
+
+
+def _GetComposeSourceObjects(objects):
+  """Returns compose request source entries for a list of objects.
+
+  Args:
+    objects: List of StorageUrls or ObjectFromTracker tuples, in the order in
+        which they should be composed.
+
+  Returns:
+    List of ComposeRequest.SourceObjectsValueListEntry.
+  """
+  request_components = []
+  for obj in objects:
+    src_obj_metadata = (
+        apitools_messages.ComposeRequest.SourceObjectsValueListEntry(
+            name=obj.object_name))
+    if obj.generation:
+      src_obj_metadata.generation = long(obj.generation)
+    request_components.append(src_obj_metadata)
+  return request_components
+
+
+def _ComposeIntermediateObject(object_name, components, dst_bucket_url,
+                               content_type, gsutil_api, encryption_keywrapper):
+  """Composes components into a temporary intermediate object.
+
+  Args:
+    object_name: Name of the intermediate object.
+    components: List of StorageUrls or ObjectFromTracker tuples for the
+        components, in order.
+    dst_bucket_url: CloudUrl for the destination bucket.
+    content_type: Content type of the final object.
+    gsutil_api: gsutil Cloud API instance to use.
+    encryption_keywrapper: CryptoKeyWrapper for the components, if any.
+
+  Returns:
+    CloudUrl (with generation) of the intermediate object.
+  """
+  dst_obj_metadata = apitools_messages.Object(
+      name=object_name, bucket=dst_bucket_url.bucket_name,
+      contentType=content_type)
+  composed_object = gsutil_api.ComposeObject(
+      _GetComposeSourceObjects(components), dst_obj_metadata,
+      provider=dst_bucket_url.scheme, fields=['generation'],
+      encryption_tuple=encryption_keywrapper)
+  intermediate_url = dst_bucket_url.Clone()
+  intermediate_url.object_name = object_name
+  intermediate_url.generation = composed_object.generation
+  return intermediate_url
+
+
 CopyHelperOpts = namedtuple('CopyHelperOpts', [
     'perform_mv',
     'no_clobber',
@@ -934,23 +1098,32 @@ def _PartitionFile(fp, file_size, src_url, content_type, canned_acl,
   parallel_composite_upload_component_size = HumanReadableToBytes(
       config.get('GSUtil', 'parallel_composite_upload_component_size',
                  DEFAULT_PARALLEL_COMPOSITE_UPLOAD_COMPONENT_SIZE))
+  max_components = min(
+      config.getint('GSUtil', 'parallel_composite_upload_max_components',
+                    DEFAULT_PARALLEL_COMPOSITE_UPLOAD_MAX_COMPONENTS),
+      MAX_COMPONENT_COUNT)
+  pipelined = config.getbool('GSUtil', 'parallel_composite_upload_pipelined',
+                             False)
   (num_components, component_size) = _GetPartitionInfo(
-      file_size, MAX_COMPOSE_ARITY, parallel_composite_upload_component_size)
+      file_size, max_components, parallel_composite_upload_component_size)
+
+  # "Salt" the object name with something a user is very unlikely to have
+  # used in an object name, then hash the extended name to make sure
+  # we don't run into problems with name length. Using a deterministic
+  # naming scheme for the temporary components allows users to take
+  # advantage of resumable uploads for each component.
+  encoded_name = (PARALLEL_UPLOAD_STATIC_SALT + fp.name).encode(UTF8)
+  content_md5 = md5()
+  content_md5.update(encoded_name)
+  digest = content_md5.hexdigest()
+  temp_name_base = random_prefix + PARALLEL_UPLOAD_TEMP_NAMESPACE + digest
+  intermediates = _GetIntermediateCompositeObjects(
+      temp_name_base, num_components, pipelined=pipelined)
 
   dst_args = {}  # Arguments to create commands and pass to subprocesses.
   file_names = []  # Used for the 2-step process of forming dst_args.
   for i in range(num_components):
-    # "Salt" the object name with something a user is very unlikely to have
-    # used in an object name, then hash the extended name to make sure
-    # we don't run into problems with name length. Using a deterministic
-    # naming scheme for the temporary components allows users to take
-    # advantage of resumable uploads for each component.
-    encoded_name = (PARALLEL_UPLOAD_STATIC_SALT + fp.name).encode(UTF8)
-    content_md5 = md5()
-    content_md5.update(encoded_name)
-    digest = content_md5.hexdigest()
-    temp_file_name = (random_prefix + PARALLEL_UPLOAD_TEMP_NAMESPACE +
-                      digest + '_' + str(i))
+    temp_file_name = temp_name_base + '_' + str(i)
     tmp_dst_url = dst_bucket_url.Clone()
     tmp_dst_url.object_name = temp_file_name
 
@@ -964,13 +1137,55 @@ def _PartitionFile(fp, file_size, src_url, content_type, canned_acl,
     func_args = PerformParallelUploadFileToObjectArgs(
         fp.name, offset, file_part_length, src_url, tmp_dst_url, canned_acl,
         content_type, tracker_file, tracker_file_lock, encryption_key_sha256,
-        gzip_encoded)
+        gzip_encoded, intermediates[i] if intermediates else None)
     file_names.append(temp_file_name)
     dst_args[temp_file_name] = func_args
 
   return dst_args
 
 
+def _GetIntermediateCompositeObjects(temp_name_base, num_components,
+                                     pipelined=False):
+  """Groups the components of a parallel composite upload for composition.
+
+  Args:
+    temp_name_base: Common prefix of the temporary component names.
+    num_components: Number of components in the upload.
+    pipelined: If True, use groups of about sqrt(num_components) components
+        (so that groups are composed, and their components deleted, while
+        much of the file is still uploading), and delete each group's
+        components as soon as it is composed.
+
+  Returns:
+    List with the IntermediateCompositeObject containing each component,
+    indexed by component number, or an empty list if the components can be
+    composed directly into the final object.
+  """
+  max_group_size = MAX_COMPOSE_ARITY
+  if pipelined:
+    max_group_size = min(max_group_size,
+                         int(math.ceil(math.sqrt(num_components))))
+  if num_components <= max_group_size:
+    return []
+  # Use evenly sized groups so that no intermediate object is much smaller
+  # (and therefore composed much earlier) than the others.
+  num_groups = DivideAndCeil(num_components, max_group_size)
+  intermediates = []
+  group_start = 0
+  for group_num in range(num_groups):
+    group_end = group_start + num_components // num_groups
+    if group_num < num_components % num_groups:
+      group_end += 1
+    intermediate = IntermediateCompositeObject(
+        '%s_intermediate_%d' % (temp_name_base, group_num),
+        tuple('%s_%d' % (temp_name_base, i)
+              for i in range(group_start, group_end)),
+        pipelined)
+    intermediates.extend([intermediate] * (group_end - group_start))
+    group_start = group_end
+  return intermediates
+
+
 def _GetComponentNumber(component):
   """Gets component number from component CloudUrl.
 
@@ -993,6 +1208,8 @@ def _DoParallelCompositeUpload(fp, src_url, dst_url, dst_obj_metadata,
 
   The file is partitioned into parts, and then the parts are uploaded in
   parallel, composed to form the original destination object, and deleted.
+  Files with more than MAX_COMPOSE_ARITY parts are composed in two levels (see
+  IntermediateCompositeObject).
 
   Args:
     fp: The file object to be uploaded.
@@ -1027,23 +1244,24 @@ def _DoParallelCompositeUpload(fp, src_url, dst_url, dst_obj_metadata,
 
   (existing_enc_key_sha256, existing_prefix, existing_components) = (
       ReadParallelUploadTrackerFile(tracker_file_name, logger))
+  existing_intermediates = ReadParallelUploadTrackerIntermediates(
+      tracker_file_name)
 
   # Ensure that the tracker data is still valid (encryption keys match) and
   # perform any necessary cleanup.
-  (existing_prefix, existing_components) = ValidateParallelCompositeTrackerData(
+  (existing_prefix, existing_objects) = ValidateParallelCompositeTrackerData(
       tracker_file_name, existing_enc_key_sha256, existing_prefix,
-      existing_components, encryption_key_sha256, dst_bucket_url, command_obj,
-      logger, _DeleteTempComponentObjectFn, _RmExceptionHandler)
+      existing_components + existing_intermediates, encryption_key_sha256,
+      dst_bucket_url, command_obj, logger, _DeleteTempComponentObjectFn,
+      _RmExceptionHandler)
+  if not existing_objects:
+    existing_components = []
+    existing_intermediates = []
 
   random_prefix = (existing_prefix if existing_prefix is not None else
                    GenerateComponentObjectPrefix(
                        encryption_key_sha256=encryption_key_sha256))
 
-  # Create (or overwrite) the tracker file for the upload.
-  WriteParallelUploadTrackerFile(
-      tracker_file_name, random_prefix, existing_components,
-      encryption_key_sha256=encryption_key_sha256)
-
   # Protect the tracker file within calls to Apply.
   tracker_file_lock = parallelism_framework_util.CreateLock()
   # Dict to track component info so we may align FileMessage values
@@ -1055,9 +1273,29 @@ def _DoParallelCompositeUpload(fp, src_url, dst_url, dst_obj_metadata,
       dst_bucket_url, random_prefix, tracker_file_name, tracker_file_lock,
       encryption_key_sha256=encryption_key_sha256, gzip_encoded=gzip_encoded)
 
+  intermediates = sorted(
+      set(args.intermediate for args in dst_args.itervalues()
+          if args.intermediate), key=_GetComponentNumber)
+  (existing_intermediates, intermediates_to_delete) = (
+      _FilterExistingIntermediates(intermediates, existing_intermediates,
+                                   dst_args, dst_bucket_url, gsutil_api))
+  # The components of reused intermediate objects don't need to be uploaded
+  # (or kept, if they still exist).
+  reused_intermediate_names = set(intermediate.object_name for intermediate
+                                  in existing_intermediates)
+  composed_names = set()
+  for intermediate in intermediates:
+    if intermediate.object_name in reused_intermediate_names:
+      composed_names.update(intermediate.component_names)
+  component_args = dict((name, args) for name, args in dst_args.iteritems()
+                        if name not in composed_names)
+  composed_components = [(dst_args[name].dst_url, dst_args[name].file_length)
+                         for name in composed_names]
+
   (components_to_upload, existing_components, existing_objects_to_delete) = (
-      FilterExistingComponents(dst_args, existing_components, dst_bucket_url,
-                               gsutil_api))
+      FilterExistingComponents(component_args, existing_components,
+                               dst_bucket_url, gsutil_api))
+  existing_objects_to_delete.extend(intermediates_to_delete)
 
   # Assign a start message to each different component type
   for component in components_to_upload:
@@ -1070,7 +1308,7 @@ def _DoParallelCompositeUpload(fp, src_url, dst_url, dst_obj_metadata,
                     component_num=_GetComponentNumber(component.dst_url),
                     message_type=FileMessage.COMPONENT_TO_UPLOAD))
 
-  for component in existing_components:
+  for component in existing_components + composed_components:
     component_str = component[0].versionless_url_string
     components_info[component_str] = (FileMessage.EXISTING_COMPONENT,
                                       component[1])
@@ -1087,6 +1325,34 @@ def _DoParallelCompositeUpload(fp, src_url, dst_url, dst_obj_metadata,
         gsutil_api.status_queue,
         FileMessage(src_url, component, time.time(), finished=False,
                     message_type=FileMessage.EXISTING_OBJECT_TO_DELETE))
+
+  # Delete objects left over from a previous, failed run that can't be reused
+  # before uploading, so that the tracker file only lists objects that are
+  # valid for this upload. Workers rely on this to decide when a group of
+  # components is complete and can be composed into an intermediate object.
+  if existing_objects_to_delete:
+    try:
+      command_obj.Apply(
+          _DeleteTempComponentObjectFn, existing_objects_to_delete,
+          _RmExceptionHandler, arg_checker=gslib.command.DummyArgChecker,
+          parallel_operations_override=command_obj.ParallelOverrideReason.SLICE)
+    except Exception:  # pylint: disable=broad-except
+      logger.warn(
+          'Failed to delete some of the following temporary objects:\n' +
+          '\n'.join(url.url_string for url in existing_objects_to_delete))
+    for component in existing_objects_to_delete:
+      PutToQueueWithTimeout(
+          gsutil_api.status_queue,
+          FileMessage(src_url, component, time.time(), finished=True,
+                      message_type=FileMessage.EXISTING_OBJECT_TO_DELETE))
+
+  # Create (or overwrite) the tracker file for the upload.
+  WriteParallelUploadTrackerFile(
+      tracker_file_name, random_prefix,
+      [component[0] for component in existing_components],
+      encryption_key_sha256=encryption_key_sha256,
+      intermediates=existing_intermediates)
+
   # In parallel, copy all of the file parts that haven't already been
   # uploaded to temporary objects.
   cp_results = command_obj.Apply(
@@ -1100,38 +1366,45 @@ def _DoParallelCompositeUpload(fp, src_url, dst_url, dst_obj_metadata,
     uploaded_components.append(cp_result[2])
   components = uploaded_components + [i[0] for i in existing_components]
 
-  if len(components) == len(dst_args):
+  if len(components) == len(component_args):
     # Only try to compose if all of the components were uploaded successfully.
     # Sort the components so that they will be composed in the correct order.
     components = sorted(components, key=_GetComponentNumber)
-
-    request_components = []
-    for component_url in components:
-      src_obj_metadata = (
-          apitools_messages.ComposeRequest.SourceObjectsValueListEntry(
-              name=component_url.object_name))
-      if component_url.HasGeneration():
-        src_obj_metadata.generation = long(component_url.generation)
-      request_components.append(src_obj_metadata)
+    if intermediates:
+      intermediate_urls = _ComposeMissingIntermediates(
+          intermediates, components, dst_bucket_url,
+          dst_obj_metadata.contentType, tracker_file_name, tracker_file_lock,
+          gsutil_api, encryption_keywrapper, logger)
+    else:
+      intermediate_urls = []
 
     composed_object = gsutil_api.ComposeObject(
-        request_components, dst_obj_metadata, preconditions=preconditions,
+        _GetComposeSourceObjects(intermediate_urls or components),
+        dst_obj_metadata, preconditions=preconditions,
         provider=dst_url.scheme, fields=['crc32c', 'generation', 'size'],
         encryption_tuple=encryption_keywrapper)
 
     try:
       # Make sure only to delete things that we know were successfully
       # uploaded (as opposed to all of the objects that we attempted to
-      # create) so that we don't delete any preexisting objects, except for
-      # those that were uploaded by a previous, failed run and have since
-      # changed (but still have an old generation lying around).
-      objects_to_delete = components + existing_objects_to_delete
+      # create) so that we don't delete any preexisting objects.
+      objects_to_delete = components
+      if intermediates and intermediates[0].delete_components:
+        # Workers already deleted the components of the intermediate objects
+        # that they composed, and removed them from the tracker file.
+        with tracker_file_lock:
+          (_, _, tracked_components) = ReadParallelUploadTrackerFile(
+              tracker_file_name, logger)
+        tracked_names = set(component.object_name
+                            for component in tracked_components)
+        objects_to_delete = [component for component in components
+                             if component.object_name in tracked_names]
       command_obj.Apply(
-          _DeleteTempComponentObjectFn, objects_to_delete, _RmExceptionHandler,
-          arg_checker=gslib.command.DummyArgChecker,
+          _DeleteTempComponentObjectFn, objects_to_delete + intermediate_urls,
+          _RmExceptionHandler, arg_checker=gslib.command.DummyArgChecker,
           parallel_operations_override=command_obj.ParallelOverrideReason.SLICE)
       # Assign an end message to each different component type
-      for component in components:
+      for component in components + [url for (url, _) in composed_components]:
         component_str = component.versionless_url_string
         try:
           PutToQueueWithTimeout(
@@ -1144,12 +1417,6 @@ def _DoParallelCompositeUpload(fp, src_url, dst_url, dst_obj_metadata,
           PutToQueueWithTimeout(
               gsutil_api.status_queue,
               FileMessage(src_url, component, time.time(), finished=True))
-
-      for component in existing_objects_to_delete:
-        PutToQueueWithTimeout(
-            gsutil_api.status_queue,
-            FileMessage(src_url, component, time.time(), finished=True,
-                        message_type=FileMessage.EXISTING_OBJECT_TO_DELETE))
     except Exception:  # pylint: disable=broad-except
       # If some of the delete calls fail, don't cause the whole command to
       # fail. The copy was successful iff the compose call succeeded, so
@@ -1171,6 +1438,122 @@ def _DoParallelCompositeUpload(fp, src_url, dst_url, dst_obj_metadata,
   return elapsed_time, composed_object
 
 
+def _FilterExistingIntermediates(intermediates, existing_intermediates,
+                                 dst_args, bucket_url, gsutil_api):
+  """Determines which intermediate objects from a previous run can be reused.
+
+  An intermediate object can be reused if it is still part of the upload and
+  its CRC32C matches the corresponding part of the file. Its components don't
+  need to exist (pipelined uploads delete them once it is composed), so this
+  check requires a compiled crcmod; without one, the intermediate objects are
+  composed again.
+
+  Args:
+    intermediates: List of IntermediateCompositeObjects for this upload.
+    existing_intermediates: List of ObjectFromTracker objects for the
+        intermediate objects recorded in the tracker file.
+    dst_args: The map of file_name -> PerformParallelUploadFileToObjectArgs
+        calculated by partitioning the file.
+    bucket_url: CloudUrl for the destination bucket.
+    gsutil_api: gsutil Cloud API instance to use.
+
+  Returns:
+    reused_intermediates: List of ObjectFromTracker objects for the reusable
+        intermediate objects.
+    intermediates_to_delete: List of CloudUrls for the intermediate objects
+        that can't be reused.
+  """
+  planned = dict((intermediate.object_name, intermediate)
+                 for intermediate in intermediates)
+  reused_intermediates = []
+  intermediates_to_delete = []
+  for tracker_object in existing_intermediates:
+    intermediate = planned.pop(tracker_object.object_name, None)
+    if not (intermediate and UsingCrcmodExtension(crcmod) and
+            _IntermediateMatchesFile(intermediate, tracker_object, dst_args,
+                                     bucket_url, gsutil_api)):
+      url = bucket_url.Clone()
+      url.object_name = tracker_object.object_name
+      url.generation = tracker_object.generation
+      intermediates_to_delete.append(url)
+      continue
+    reused_intermediates.append(tracker_object)
+  return (reused_intermediates, intermediates_to_delete)
+
+
+def _IntermediateMatchesFile(intermediate, tracker_object, dst_args,
+                             bucket_url, gsutil_api):
+  """Returns True if an intermediate object matches its part of the file."""
+  first_component = dst_args[intermediate.component_names[0]]
+  length = sum(dst_args[name].file_length
+               for name in intermediate.component_names)
+  try:
+    cloud_crc32c = gsutil_api.GetObjectMetadata(
+        bucket_url.bucket_name, tracker_object.object_name,
+        generation=tracker_object.generation or None,
+        provider=bucket_url.scheme, fields=['crc32c']).crc32c
+  except Exception:  # pylint: disable=broad-except
+    # As with components, it doesn't matter what went wrong; just compose the
+    # intermediate object again.
+    return False
+  fp = FilePart(first_component.filename, first_component.file_start, length)
+  try:
+    return cloud_crc32c == CalculateB64EncodedCrc32cFromContents(fp)
+  finally:
+    fp.close()
+
+
+def _ComposeMissingIntermediates(intermediates, components, dst_bucket_url,
+                                 content_type, tracker_file_name,
+                                 tracker_file_lock, gsutil_api,
+                                 encryption_keywrapper, logger):
+  """Composes the intermediate objects that workers haven't composed.
+
+  Workers compose each intermediate object when its last component finishes
+  uploading, so this only composes intermediate objects whose components were
+  all reused from a previous run, or whose composition failed in the worker.
+
+  Args:
+    intermediates: Sorted list of IntermediateCompositeObjects for the upload.
+    components: List of CloudUrls for all of the uploaded components.
+    dst_bucket_url: CloudUrl for the destination bucket.
+    content_type: Content type of the final object.
+    tracker_file_name: The path to the parallel composite upload tracker file.
+    tracker_file_lock: The lock protecting access to the tracker file.
+    gsutil_api: gsutil Cloud API instance to use.
+    encryption_keywrapper: CryptoKeyWrapper for the components, if any.
+    logger: logging.Logger for outputting log messages.
+
+  Returns:
+    List of CloudUrls for the intermediate objects, in order.
+  """
+  with tracker_file_lock:
+    composed = dict(
+        (intermediate.object_name, intermediate) for intermediate in
+        ReadParallelUploadTrackerIntermediates(tracker_file_name))
+  components_by_name = dict((component.object_name, component)
+                            for component in components)
+  encryption_key_sha256 = (encryption_keywrapper.crypto_key_sha256
+                           if encryption_keywrapper else None)
+  intermediate_urls = []
+  for intermediate in intermediates:
+    if intermediate.object_name in composed:
+      intermediate_url = dst_bucket_url.Clone()
+      intermediate_url.object_name = intermediate.object_name
+      intermediate_url.generation = (
+          composed[intermediate.object_name].generation)
+    else:
+      intermediate_url = _ComposeIntermediateObject(
+          intermediate.object_name,
+          [components_by_name[name] for name in intermediate.component_names],
+          dst_bucket_url, content_type, gsutil_api, encryption_keywrapper)
+      WriteIntermediateToParallelUploadTrackerFile(
+          tracker_file_name, tracker_file_lock, intermediate_url, logger,
+          encryption_key_sha256=encryption_key_sha256)
+    intermediate_urls.append(intermediate_url)
+  return intermediate_urls
+
+
 def _ShouldDoParallelCompositeUpload(logger, allow_splitting, src_url, dst_url,
                                      file_size, gsutil_api, canned_acl=None,
                                      kms_keyname=None):
@@ -1538,7 +1921,7 @@ def _SetContentTypeFromFile(src_url, dst_obj_metadata):
 def _UploadFileToObjectNonResumable(src_url, src_obj_filestream,
                                     src_obj_size, dst_url, dst_obj_metadata,
                                     preconditions, gsutil_api,
-                                    gzip_encoded=False):
+                                    gzip_encoded=False, report_progress=True):
   """Uploads the file using a non-resumable strategy.
 
   This function does not support component transfers.
@@ -1552,14 +1935,17 @@ def _UploadFileToObjectNonResumable(src_url, src_obj_filestream,
     preconditions: Preconditions for the upload, if any.
     gsutil_api: gsutil Cloud API instance to use for the upload.
     gzip_encoded: Whether to use gzip transport encoding for the upload.
+    report_progress: Whether to post progress messages during the upload.
 
   Returns:
     Elapsed upload time, uploaded Object with generation, md5, and size fields
     populated.
   """
-  progress_callback = FileProgressCallbackHandler(
-      gsutil_api.status_queue, src_url=src_url, dst_url=dst_url,
-      operation_name='Uploading').call
+  progress_callback = None
+  if report_progress:
+    progress_callback = FileProgressCallbackHandler(
+        gsutil_api.status_queue, src_url=src_url, dst_url=dst_url,
+        operation_name='Uploading').call
 
   if global_copy_helper_opts.test_callback_file:
     with open(global_copy_helper_opts.test_callback_file, 'rb') as test_fp:
@@ -1629,19 +2015,14 @@ def _UploadFileToObjectResumable(src_url, src_obj_filestream,
     Args:
       serialization_data: Serialization data used in resuming the upload.
     """
-    tracker_file = None
     try:
-      tracker_file = open(tracker_file_name, 'w')
       tracker_data = {
           ENCRYPTION_UPLOAD_TRACKER_ENTRY: encryption_key_sha256,
           SERIALIZATION_UPLOAD_TRACKER_ENTRY: str(serialization_data)
       }
-      tracker_file.write(json.dumps(tracker_data))
-    except IOError as e:
+      GetTrackerStore().Write(tracker_file_name, json.dumps(tracker_data))
+    except (IOError, OSError) as e:
       RaiseUnwritableTrackerFileException(tracker_file_name, e.strerror)
-    finally:
-      if tracker_file:
-        tracker_file.close()
 
   # This contains the upload URL, which will uniquely identify the
   # destination object.
@@ -1958,10 +2339,17 @@ def _UploadFileToObject(
     elif 'no-transform' not in dst_obj_metadata.cacheControl.lower():
       dst_obj_metadata.cacheControl += ',no-transform'
 
-  if not is_component:
+  # Small files skip the resumable upload machinery and per-file progress
+  # reporting, and report their start along with their end, so that uploading
+  # many of them is dominated by the upload requests themselves.
+  small_file_upload = (not is_component and not src_url.IsStream() and
+                       not src_url.IsFifo() and
+                       upload_size < SmallFileUploadThreshold())
+  start_time = time.time()
+  if not is_component and not small_file_upload:
     PutToQueueWithTimeout(
         gsutil_api.status_queue,
-        FileMessage(upload_url, dst_url, time.time(),
+        FileMessage(upload_url, dst_url, start_time,
                     message_type=FileMessage.FILE_UPLOAD, size=upload_size,
                     finished=False))
   elapsed_time = None
@@ -1973,7 +2361,8 @@ def _UploadFileToObject(
       logger, allow_splitting, upload_url, dst_url, src_obj_size,
       gsutil_api, canned_acl=global_copy_helper_opts.canned_acl,
       kms_keyname=dst_obj_metadata.kmsKeyName)
-  non_resumable_upload = (upload_size < ResumableThreshold() or
+  non_resumable_upload = (small_file_upload or
+                          upload_size < ResumableThreshold() or
                           src_url.IsStream() or src_url.IsFifo())
 
   if ((src_url.IsStream() or src_url.IsFifo()) and
@@ -2003,7 +2392,8 @@ def _UploadFileToObject(
     return _UploadFileToObjectNonResumable(
         upload_url, wrapped_filestream, upload_size, dst_url,
         dst_obj_metadata, preconditions, gsutil_api,
-        gzip_encoded=gzip_encoded_file)
+        gzip_encoded=gzip_encoded_file,
+        report_progress=not small_file_upload)
 
   def CallResumableUpload():
     return _UploadFileToObjectResumable(
@@ -2054,7 +2444,8 @@ def _UploadFileToObject(
         gsutil_api.status_queue,
         FileMessage(upload_url, dst_url, time.time(),
                     message_type=FileMessage.FILE_UPLOAD,
-                    size=upload_size, finished=True))
+                    size=upload_size, finished=True,
+                    start_time=start_time if small_file_upload else None))
 
   return (elapsed_time, uploaded_object.size, result_url,
           uploaded_object.md5Hash)
@@ -2173,20 +2564,28 @@ def _ShouldDoSlicedDownload(download_strategy, src_obj_metadata,
 def _PerformSlicedDownloadObjectToFile(cls, args, thread_state=None):
   """Function argument to Apply for performing sliced downloads.
 
+  Each call is one of the download's parallel streams. It downloads byte
+  ranges claimed from the download's SlicedDownloadScheduler until there are
+  none left to claim or steal.
+
   Args:
     cls: Calling Command class.
     args: PerformSlicedDownloadObjectToFileArgs tuple describing the target.
     thread_state: gsutil Cloud API instance to use for the operation.
 
   Returns:
-    PerformSlicedDownloadReturnValues named-tuple filled with:
-    component_num: The component number for this download.
+    List of PerformSlicedDownloadReturnValues named-tuples, one for each range
+    downloaded, filled with:
+    component_num: The component number for this range.
     crc32c: CRC32C hash value (integer) of the downloaded bytes.
     bytes_transferred: The number of bytes transferred, potentially less
                        than the component size if the download was resumed.
     component_total_size: The number of bytes corresponding to the whole
                        component size, potentially more than bytes_transferred
                        if the download was resumed.
+    server_encoding: Content-encoding string if it was detected that the
+                     server sent encoded bytes during transfer, None otherwise.
+    start_byte: The first byte of the range.
   """
   gsutil_api = GetCloudApiInstance(cls, thread_state=thread_state)
   # Deserialize the picklable object metadata.
@@ -2194,21 +2593,67 @@ def _PerformSlicedDownloadObjectToFile(cls, args, thread_state=None):
                                               args.src_obj_metadata_json)
   hash_algs = GetDownloadHashAlgs(
       cls.logger, consider_crc32c=src_obj_metadata.crc32c)
-  digesters = dict((alg, hash_algs[alg]()) for alg in hash_algs or {})
 
-  (bytes_transferred, server_encoding) = (
-      _DownloadObjectToFileResumable(
-          args.src_url, src_obj_metadata, args.dst_url,
-          args.download_file_name, gsutil_api, cls.logger, digesters,
-          component_num=args.component_num, start_byte=args.start_byte,
-          end_byte=args.end_byte, decryption_key=args.decryption_key))
-
-  crc32c_val = None
-  if 'crc32c' in digesters:
-    crc32c_val = digesters['crc32c'].crcValue
-  return PerformSlicedDownloadReturnValues(
-      args.component_num, crc32c_val, bytes_transferred,
-      args.end_byte - args.start_byte + 1, server_encoding)
+  results = []
+  while True:
+    byte_range = args.scheduler.ClaimRange()
+    if byte_range is None:
+      break
+    if byte_range.stolen:
+      PutToQueueWithTimeout(
+          gsutil_api.status_queue,
+          FileMessage(args.src_url, args.dst_url, time.time(),
+                      size=byte_range.end_byte - byte_range.start_byte + 1,
+                      finished=False, component_num=byte_range.range_id,
+                      message_type=FileMessage.COMPONENT_TO_DOWNLOAD,
+                      bytes_already_downloaded=0))
+
+    digesters = dict((alg, hash_algs[alg]()) for alg in hash_algs or {})
+    end_byte = byte_range.end_byte
+    try:
+      (bytes_transferred, server_encoding) = (
+          _DownloadObjectToFileResumable(
+              args.src_url, src_obj_metadata, args.dst_url,
+              args.download_file_name, gsutil_api, cls.logger, digesters,
+              component_num=byte_range.range_id,
+              start_byte=byte_range.start_byte, end_byte=end_byte,
+              decryption_key=args.decryption_key,
+              sliced_download_range=byte_range, scheduler=args.scheduler))
+    except SlicedDownloadRangeStolenException as e:
+      # Another stream is downloading the rest of this range. The digesters
+      # have seen the bytes received after the new end of the range, so hash
+      # the part of the range that we kept from the file instead.
+      end_byte = e.end_byte
+      bytes_transferred = end_byte - byte_range.download_start_byte + 1
+      server_encoding = None
+      digesters = dict((alg, hash_algs[alg]()) for alg in hash_algs or {})
+      _UpdateDigestersFromFile(digesters, args.download_file_name,
+                               byte_range.start_byte, end_byte)
+
+    crc32c_val = None
+    if 'crc32c' in digesters:
+      crc32c_val = digesters['crc32c'].crcValue
+    results.append(PerformSlicedDownloadReturnValues(
+        byte_range.range_id, crc32c_val, bytes_transferred,
+        end_byte - byte_range.start_byte + 1, server_encoding,
+        byte_range.start_byte))
+  return results
+
+
+def _UpdateDigestersFromFile(digesters, file_name, start_byte, end_byte):
+  """Updates digesters with the bytes in the range [start_byte, end_byte]."""
+  with open(file_name, 'rb') as fp:
+    fp.seek(start_byte)
+    bytes_left = end_byte - start_byte + 1
+    with perf_util.PhaseTimer(perf_util.PHASE_HASHING) as timer:
+      while bytes_left > 0:
+        data = fp.read(min(DEFAULT_FILE_BUFFER_SIZE, bytes_left))
+        if not data:
+          break
+        bytes_left -= len(data)
+        timer.num_bytes += len(data)
+        for alg_name in digesters:
+          digesters[alg_name].update(data)
 
 
 def _MaintainSlicedDownloadTrackerFiles(src_obj_metadata, dst_url,
@@ -2220,9 +2665,8 @@ def _MaintainSlicedDownloadTrackerFiles(src_obj_metadata, dst_url,
   download. Upon an attempt at cross-process resumption, the contents of the
   sliced download tracker file are verified to make sure a resumption is
   possible and appropriate. In the case that a resumption should not be
-  attempted, existing component tracker files are deleted (to prevent child
-  processes from attempting resumption), and a new sliced download tracker
-  file is created.
+  attempted, existing tracker files are deleted, and a new sliced download
+  tracker file is created.
 
   Args:
     src_obj_metadata: Metadata from the source object. Must include etag and
@@ -2231,15 +2675,22 @@ def _MaintainSlicedDownloadTrackerFiles(src_obj_metadata, dst_url,
     download_file_name: Temporary file name to be used for the download.
     logger: for outputting log messages.
     api_selector: The Cloud API implementation used.
-    num_components: The number of components to perform this download with.
+    num_components: The number of parallel streams to perform this download
+                    with.
+
+  Returns:
+    (tracker_file_name, completed_ranges)
+    tracker_file_name: The sliced download tracker file name, or None if the
+                       download isn't resumable.
+    completed_ranges: List of [start_byte, end_byte] ranges of the object
+                      that have already been downloaded.
   """
   assert src_obj_metadata.etag
-  tracker_file = None
 
   # Only can happen if the resumable threshold is set higher than the
   # parallel transfer threshold.
   if src_obj_metadata.size < ResumableThreshold():
-    return
+    return None, []
 
   tracker_file_name = GetTrackerFilePath(dst_url,
                                          TrackerFileType.SLICED_DOWNLOAD,
@@ -2253,14 +2704,16 @@ def _MaintainSlicedDownloadTrackerFiles(src_obj_metadata, dst_url,
     # A parallel resumption should be attempted only if the destination file
     # size is exactly the same as the source size and the tracker file matches.
     if existing_file_size == src_obj_metadata.size:
-      tracker_file = open(tracker_file_name, 'r')
-      tracker_file_data = json.load(tracker_file)
+      tracker_file_data = json.loads(
+          GetTrackerStore().Read(tracker_file_name))
+      # Tracker files written by older versions of gsutil don't record
+      # completed ranges, so those downloads are restarted.
       if (tracker_file_data['etag'] == src_obj_metadata.etag and
           tracker_file_data['generation'] == src_obj_metadata.generation and
-          tracker_file_data['num_components'] == num_components):
-        return
+          tracker_file_data['num_components'] == num_components and
+          'completed_ranges' in tracker_file_data):
+        return tracker_file_name, tracker_file_data['completed_ranges']
       else:
-        tracker_file.close()
         logger.warn('Sliced download tracker file doesn\'t match for '
                     'download of %s. Restarting download from scratch.' %
                     dst_url.object_name)
@@ -2275,76 +2728,126 @@ def _MaintainSlicedDownloadTrackerFiles(src_obj_metadata, dst_url,
   finally:
     if fp:
       fp.close()
-    if tracker_file:
-      tracker_file.close()
 
-  # Delete component tracker files to guarantee download starts from scratch.
+  # Delete existing tracker files to guarantee download starts from scratch.
   DeleteDownloadTrackerFiles(dst_url, api_selector)
 
   # Create a new sliced download tracker file to represent this download.
-  try:
-    with open(tracker_file_name, 'w') as tracker_file:
-      tracker_file_data = {'etag': src_obj_metadata.etag,
-                           'generation': src_obj_metadata.generation,
-                           'num_components': num_components}
-      tracker_file.write(json.dumps(tracker_file_data))
-  except IOError as e:
-    RaiseUnwritableTrackerFileException(tracker_file_name, e.strerror)
+  WriteSlicedDownloadTrackerFile(
+      tracker_file_name, src_obj_metadata.etag, src_obj_metadata.generation,
+      num_components, [])
+  return tracker_file_name, []
+
+
+class _SlicedDownloadRangeProgress(object):
+  """Reports a stream's progress on one range to a SlicedDownloadScheduler.
+
+  Sinks for sliced downloads call ReserveWrite before writing each chunk, and
+  Update after writing it. Progress is reported to the scheduler at least
+  every SLICE_PROGRESS_SYNC_THRESHOLD bytes, which also tells the stream
+  whether the end of its range has been stolen, and the tracker file is
+  updated every TRACKERFILE_UPDATE_THRESHOLD bytes.
+  """
+
+  def __init__(self, scheduler, range_id, end_byte):
+    self._scheduler = scheduler
+    self._range_id = range_id
+    self._last_tracker_file_byte = None
+    # Forces a sync before the first write.
+    self._sync_byte = -1
+    self.end_byte = end_byte
+
+  def ReserveWrite(self, pos, length, written_pos):
+    """Returns how many of the length bytes starting at pos may be written.
+
+    Args:
+      pos: The offset of the first byte to be written.
+      length: The number of bytes to be written.
+      written_pos: All bytes of the range before this offset have been
+                   written to the file.
+
+    Returns:
+      The number of bytes before the end of the range, which is less than
+      length if the rest of the range was stolen.
+    """
+    if pos + length > self._sync_byte:
+      self.Update(pos, written_pos, sync=True)
+    return max(0, min(length, self.end_byte + 1 - pos))
+
+  def Update(self, pos, written_pos, sync=False):
+    """Records that all bytes before written_pos are in the file.
+
+    Args:
+      pos: The offset of the next byte to be received.
+      written_pos: All bytes of the range before this offset have been
+                   written to the file.
+      sync: If True, report progress to the scheduler even if no tracker file
+            update is due.
+    """
+    update_tracker_file = (
+        self._last_tracker_file_byte is None or
+        written_pos - self._last_tracker_file_byte >
+        TRACKERFILE_UPDATE_THRESHOLD or
+        (written_pos == self.end_byte + 1 and
+         self._last_tracker_file_byte != written_pos))
+    if sync or update_tracker_file:
+      end_byte = self._scheduler.UpdateProgress(
+          self._range_id, pos, written_pos,
+          update_tracker_file=update_tracker_file)
+      if end_byte is not None:
+        self.end_byte = end_byte
+      self._sync_byte = pos + SLICE_PROGRESS_SYNC_THRESHOLD
+      if update_tracker_file:
+        self._last_tracker_file_byte = written_pos
 
 
 class SlicedDownloadFileWrapper(object):
   """Wraps a file object to be used in GetObjectMedia for sliced downloads.
 
-  In order to allow resumability, the file object used by each thread in a
-  sliced object download should be wrapped using SlicedDownloadFileWrapper.
-  Passing a SlicedDownloadFileWrapper object to GetObjectMedia will allow the
-  download component tracker file for this component to be updated periodically,
-  while the downloaded bytes are normally written to file.
+  In order to allow resumability and work stealing, the file object used by
+  each stream in a sliced object download is wrapped using
+  SlicedDownloadFileWrapper (or replaced by a SlicedDownloadPwriteSink, where
+  positional writes are available). Passing a SlicedDownloadFileWrapper object
+  to GetObjectMedia will report the stream's progress to the download's
+  SlicedDownloadScheduler periodically, while the downloaded bytes are
+  normally written to file.
   """
 
-  def __init__(self, fp, tracker_file_name, src_obj_metadata, start_byte,
-               end_byte):
+  def __init__(self, fp, scheduler, range_id, start_byte, end_byte):
     """Initializes the SlicedDownloadFileWrapper.
 
     Args:
       fp: The already-open file object to be used for writing in
           GetObjectMedia. Data will be written to file starting at the current
           seek position.
-      tracker_file_name: The name of the tracker file for this component.
-      src_obj_metadata: Metadata from the source object. Must include etag and
-                        generation.
+      scheduler: The SlicedDownloadScheduler for the download.
+      range_id: The range_id of the range being downloaded.
       start_byte: The first byte to be downloaded for this parallel component.
       end_byte: The last byte to be downloaded for this parallel component.
     """
     self._orig_fp = fp
-    self._tracker_file_name = tracker_file_name
-    self._src_obj_metadata = src_obj_metadata
-    self._last_tracker_file_byte = None
+    self._progress = _SlicedDownloadRangeProgress(scheduler, range_id,
+                                                  end_byte)
     self._start_byte = start_byte
-    self._end_byte = end_byte
 
   def write(self, data):  # pylint: disable=invalid-name
     current_file_pos = self._orig_fp.tell()
-    assert (self._start_byte <= current_file_pos and
-            current_file_pos + len(data) <= self._end_byte + 1)
-
-    self._orig_fp.write(data)
+    assert self._start_byte <= current_file_pos
+    length = self._progress.ReserveWrite(current_file_pos, len(data),
+                                         current_file_pos)
+    self._orig_fp.write(data[:length])
     current_file_pos = self._orig_fp.tell()
-
-    threshold = TRACKERFILE_UPDATE_THRESHOLD
-    if (self._last_tracker_file_byte is None or
-        current_file_pos - self._last_tracker_file_byte > threshold or
-        current_file_pos == self._end_byte + 1):
-      WriteDownloadComponentTrackerFile(
-          self._tracker_file_name, self._src_obj_metadata, current_file_pos)
-      self._last_tracker_file_byte = current_file_pos
+    self._progress.Update(current_file_pos, current_file_pos)
+    if length < len(data):
+      raise SlicedDownloadRangeStolenException(self._progress.end_byte)
 
   def seek(self, offset, whence=os.SEEK_SET):  # pylint: disable=invalid-name
     if whence == os.SEEK_END:
-      self._orig_fp.seek(offset + self._end_byte + 1)
+      self._orig_fp.seek(offset + self._progress.end_byte + 1)
     else:
       self._orig_fp.seek(offset, whence)
-    assert self._start_byte <= self._orig_fp.tell() <= self._end_byte + 1
+    assert (self._start_byte <= self._orig_fp.tell() <=
+            self._progress.end_byte + 1)
 
   def tell(self):  # pylint: disable=invalid-name
     return self._orig_fp.tell()
@@ -2354,28 +2857,178 @@ class SlicedDownloadFileWrapper(object):
 
   def close(self):  # pylint: disable=invalid-name
     if self._orig_fp:
-      self._orig_fp.close()
+      try:
+        self._orig_fp.flush()
+        current_file_pos = self._orig_fp.tell()
+        self._progress.Update(current_file_pos, current_file_pos, sync=True)
+        # Commit this stream's checkpoints before the download can finish and
+        # delete its tracker file.
+        GetTrackerStore().Flush()
+      finally:
+        self._orig_fp.close()
+        self._orig_fp = None
+
+
+class SlicedDownloadPwriteSink(object):
+  """File-like object that writes one range of a sliced download.
+
+  Like SlicedDownloadFileWrapper, this can be passed to GetObjectMedia and
+  periodically reports the stream's progress to the download's
+  SlicedDownloadScheduler. Instead of seeking and writing through a buffered
+  file object, it writes each chunk directly to its offset in the download
+  file with pwrite, and only bytes that have been handed to the operating
+  system are recorded as downloaded.
+
+  If direct_io is True and the platform and filesystem support it, the aligned
+  middle of the range is written with O_DIRECT from a page-aligned buffer,
+  bypassing the page cache. The unaligned bytes at either end of the range
+  are written normally.
+  """
+
+  def __init__(self, download_file_name, scheduler, range_id, start_byte,
+               end_byte, direct_io=False):
+    """Initializes the SlicedDownloadPwriteSink.
+
+    Args:
+      download_file_name: Name of the download file, which must already exist.
+      scheduler: The SlicedDownloadScheduler for the download.
+      range_id: The range_id of the range being downloaded.
+      start_byte: The first byte to be downloaded for this parallel component.
+      end_byte: The last byte to be downloaded for this parallel component.
+      direct_io: Whether to try to write with O_DIRECT.
+    """
+    self._progress = _SlicedDownloadRangeProgress(scheduler, range_id,
+                                                  end_byte)
+    self._start_byte = start_byte
+    # Offset of the next byte to be received.
+    self._pos = start_byte
+    # All bytes before this offset have been written to the file; the bytes
+    # from here to self._pos are in self._buffer.
+    self._written_pos = start_byte
+    self._buffer = None
+    self._buffer_len = 0
+    self._transfer_buffer = None
+    self._direct_fd = None
+    self._fd = os.open(download_file_name,
+                       os.O_WRONLY | getattr(os, 'O_BINARY', 0))
+    if direct_io and hasattr(os, 'O_DIRECT'):
+      try:
+        self._direct_fd = os.open(download_file_name,
+                                  os.O_WRONLY | os.O_DIRECT)
+      except EnvironmentError:
+        # The filesystem doesn't support O_DIRECT; write normally.
+        pass
+      else:
+        self._transfer_buffer = GetTransferBufferPool().Acquire(
+            DIRECT_IO_BUFFER_SIZE)
+        # Pool chunks are anonymous mmaps, which are page-aligned, as O_DIRECT
+        # requires.
+        self._buffer = self._transfer_buffer.chunks[0]
+
+  def write(self, data):  # pylint: disable=invalid-name
+    assert self._start_byte <= self._pos
+    length = self._progress.ReserveWrite(self._pos, len(data),
+                                         self._written_pos)
+    if self._direct_fd is None:
+      PositionalWrite(self._fd, data, self._pos, length=length)
+      self._pos += length
+      self._written_pos = self._pos
+    else:
+      self._BufferDirectWrite(data[:length])
+      if self._pos == self._progress.end_byte + 1:
+        self._FlushBuffer()
+    self._progress.Update(self._pos, self._written_pos)
+    if length < len(data):
+      raise SlicedDownloadRangeStolenException(self._progress.end_byte)
+
+  def _BufferDirectWrite(self, data):
+    """Writes data via the aligned buffer, flushing it when it fills up."""
+    offset = 0
+    if not self._buffer_len:
+      # Write up to the next aligned offset through the page cache, so that
+      # the buffer always starts at an aligned file offset.
+      head_len = min(len(data), -self._pos % DIRECT_IO_ALIGNMENT)
+      if head_len:
+        PositionalWrite(self._fd, data[:head_len], self._pos)
+        self._pos += head_len
+        self._written_pos = self._pos
+        offset = head_len
+    while offset < len(data):
+      length = min(len(data) - offset, DIRECT_IO_BUFFER_SIZE - self._buffer_len)
+      self._buffer[self._buffer_len:self._buffer_len + length] = (
+          data[offset:offset + length])
+      self._buffer_len += length
+      self._pos += length
+      offset += length
+      if self._buffer_len == DIRECT_IO_BUFFER_SIZE:
+        PositionalWrite(self._direct_fd, self._buffer, self._written_pos)
+        self._written_pos = self._pos
+        self._buffer_len = 0
+
+  def _FlushBuffer(self):
+    """Writes any buffered bytes to the file."""
+    if not self._buffer_len:
+      return
+    aligned_len = self._buffer_len - self._buffer_len % DIRECT_IO_ALIGNMENT
+    if aligned_len:
+      PositionalWrite(self._direct_fd, self._buffer, self._written_pos,
+                      length=aligned_len)
+    if aligned_len < self._buffer_len:
+      PositionalWrite(self._fd, self._buffer[aligned_len:self._buffer_len],
+                      self._written_pos + aligned_len)
+    self._written_pos = self._pos
+    self._buffer_len = 0
+
+  def seek(self, offset, whence=os.SEEK_SET):  # pylint: disable=invalid-name
+    self._FlushBuffer()
+    if whence == os.SEEK_END:
+      offset += self._progress.end_byte + 1
+    elif whence == os.SEEK_CUR:
+      offset += self._pos
+    assert self._start_byte <= offset <= self._progress.end_byte + 1
+    self._pos = offset
+    self._written_pos = offset
+
+  def tell(self):  # pylint: disable=invalid-name
+    return self._pos
+
+  def flush(self):  # pylint: disable=invalid-name
+    self._FlushBuffer()
+
+  def close(self):  # pylint: disable=invalid-name
+    if self._fd is None:
+      return
+    try:
+      self._FlushBuffer()
+      self._progress.Update(self._pos, self._written_pos, sync=True)
+      GetTrackerStore().Flush()
+    finally:
+      os.close(self._fd)
+      self._fd = None
+      if self._direct_fd is not None:
+        os.close(self._direct_fd)
+        self._direct_fd = None
+      if self._transfer_buffer is not None:
+        self._transfer_buffer.Release()
+        self._transfer_buffer = None
+        self._buffer = None
 
 
-def _PartitionObject(src_url, src_obj_metadata, dst_url,
-                     download_file_name, decryption_key=None):
-  """Partitions an object into components to be downloaded.
+def _PartitionObject(src_obj_metadata):
+  """Decides how to divide an object into slices for a sliced download.
 
-  Each component is a byte range of the object. The byte ranges
-  of the returned components are mutually exclusive and collectively
-  exhaustive. The byte ranges are inclusive at both end points.
+  The number of parallel streams is decided as before sliced downloads used
+  dynamic slicing, but the object is divided into smaller slices that the
+  streams claim one at a time, so that streams that finish early can take
+  over work from slower ones.
 
   Args:
-    src_url: Source CloudUrl.
-    src_obj_metadata: Metadata from the source object with non-pickleable
-        fields removed.
-    dst_url: Destination FileUrl.
-    download_file_name: Temporary file name to be used for the download.
-    decryption_key: Base64-encoded decryption key for the source object, if any.
+    src_obj_metadata: Metadata from the source object.
 
   Returns:
-    components_to_download: A list of PerformSlicedDownloadObjectToFileArgs
-                            to be used in Apply for the sliced download.
+    (num_components, slice_size)
+    num_components: The number of parallel streams to download with.
+    slice_size: The size of each slice, except the last.
   """
   sliced_download_component_size = HumanReadableToBytes(
       config.get('GSUtil', 'sliced_object_download_component_size',
@@ -2388,22 +3041,11 @@ def _PartitionObject(src_url, src_obj_metadata, dst_url,
   num_components, component_size = _GetPartitionInfo(
       src_obj_metadata.size, max_components, sliced_download_component_size)
 
-  components_to_download = []
-  component_lengths = []
-  for i in range(num_components):
-    start_byte = i * component_size
-    end_byte = min((i + 1) * (component_size) - 1, src_obj_metadata.size - 1)
-    component_lengths.append(end_byte - start_byte + 1)
-
-    # We need to serialize src_obj_metadata for pickling since it can
-    # contain nested classes such as custom metadata.
-    src_obj_metadata_json = protojson.encode_message(src_obj_metadata)
-
-    components_to_download.append(
-        PerformSlicedDownloadObjectToFileArgs(
-            i, src_url, src_obj_metadata_json, dst_url, download_file_name,
-            start_byte, end_byte, decryption_key))
-  return components_to_download, component_lengths
+  slice_size = HumanReadableToBytes(
+      config.get('GSUtil', 'sliced_object_download_slice_size',
+                 DEFAULT_SLICED_OBJECT_DOWNLOAD_SLICE_SIZE))
+  slice_size = max(1, min(slice_size, component_size))
+  return num_components, slice_size
 
 
 def _DoSlicedDownload(src_url, src_obj_metadata, dst_url, download_file_name,
@@ -2411,8 +3053,10 @@ def _DoSlicedDownload(src_url, src_obj_metadata, dst_url, download_file_name,
                       api_selector, decryption_key=None, status_queue=None):
   """Downloads a cloud object to a local file using sliced download.
 
-  Byte ranges are decided for each thread/process, and then the parts are
-  downloaded in parallel.
+  The object is divided into slices, which are downloaded by a number of
+  parallel streams. Each stream claims slices from a shared
+  SlicedDownloadScheduler, and steals the unfinished end of other streams'
+  ranges once all slices have been claimed.
 
   Args:
     src_url: Source CloudUrl.
@@ -2437,50 +3081,73 @@ def _DoSlicedDownload(src_url, src_obj_metadata, dst_url, download_file_name,
   # so just discard the metadata.
   src_obj_metadata.customerEncryption = None
 
-  components_to_download, component_lengths = _PartitionObject(
-      src_url, src_obj_metadata, dst_url, download_file_name, decryption_key)
+  num_components, slice_size = _PartitionObject(src_obj_metadata)
+  tracker_file_name, completed_ranges = _MaintainSlicedDownloadTrackerFiles(
+      src_obj_metadata, dst_url, download_file_name, logger, api_selector,
+      num_components)
 
-  num_components = len(components_to_download)
-  _MaintainSlicedDownloadTrackerFiles(src_obj_metadata, dst_url,
-                                      download_file_name, logger,
-                                      api_selector, num_components)
-
-  # Resize the download file so each child process can seek to its start byte.
+  # Resize the download file so each stream can write at any offset, and
+  # allocate its disk space up front so that writing the slices in parallel
+  # doesn't fragment it.
   with open(download_file_name, 'ab') as fp:
     fp.truncate(src_obj_metadata.size)
-  # Assign a start FileMessage to each component
-  for (i, component) in enumerate(components_to_download):
-    size = component.end_byte - component.start_byte + 1
-
-    download_start_byte = GetDownloadStartByte(src_obj_metadata, dst_url,
-                                               api_selector,
-                                               component.start_byte, size, i)
-    bytes_already_downloaded = download_start_byte - component.start_byte
+    PreallocateFile(fp.fileno(), src_obj_metadata.size)
+
+  scheduler = SlicedDownloadScheduler(download_file_name)
+  byte_ranges = scheduler.Start(
+      GetSliceRanges(src_obj_metadata.size, slice_size, completed_ranges),
+      tracker_file_name=tracker_file_name, src_obj_metadata=src_obj_metadata,
+      num_components=num_components)
+
+  # Assign a start FileMessage to each initial range. Streams send these for
+  # the ranges they steal.
+  for byte_range in byte_ranges:
     PutToQueueWithTimeout(
         status_queue,
-        FileMessage(src_url, dst_url, time.time(), size=size,
-                    finished=False, component_num=i,
+        FileMessage(src_url, dst_url, time.time(),
+                    size=byte_range.end_byte - byte_range.start_byte + 1,
+                    finished=False, component_num=byte_range.range_id,
                     message_type=FileMessage.COMPONENT_TO_DOWNLOAD,
-                    bytes_already_downloaded=bytes_already_downloaded))
+                    bytes_already_downloaded=(byte_range.download_start_byte -
+                                              byte_range.start_byte)))
+
+  # We need to serialize src_obj_metadata for pickling since it can
+  # contain nested classes such as custom metadata.
+  src_obj_metadata_json = protojson.encode_message(src_obj_metadata)
+  streams = [
+      PerformSlicedDownloadObjectToFileArgs(
+          i, src_url, src_obj_metadata_json, dst_url, download_file_name,
+          scheduler, decryption_key)
+      for i in range(min(num_components, len(byte_ranges)))]
 
-  cp_results = command_obj.Apply(
-      _PerformSlicedDownloadObjectToFile, components_to_download,
-      copy_exception_handler, arg_checker=gslib.command.DummyArgChecker,
-      parallel_operations_override=command_obj.ParallelOverrideReason.SLICE,
-      should_return_results=True)
+  try:
+    stream_results = command_obj.Apply(
+        _PerformSlicedDownloadObjectToFile, streams,
+        copy_exception_handler, arg_checker=gslib.command.DummyArgChecker,
+        parallel_operations_override=command_obj.ParallelOverrideReason.SLICE,
+        should_return_results=True)
+  finally:
+    scheduler.Finish()
 
-  if len(cp_results) < num_components:
+  # Crc32c hashes have to be concatenated in the correct order, and the
+  # ranges must cover the whole object; they won't if any stream failed.
+  cp_results = sorted(itertools.chain.from_iterable(stream_results),
+                      key=attrgetter('start_byte'))
+  next_byte = 0
+  for cp_result in cp_results:
+    if cp_result.start_byte != next_byte:
+      break
+    next_byte += cp_result.component_total_size
+  if next_byte != src_obj_metadata.size:
     raise CommandException(
         'Some components of %s were not downloaded successfully. '
         'Please retry this download.' % dst_url.object_name)
 
-  # Crc32c hashes have to be concatenated in the correct order.
-  cp_results = sorted(cp_results, key=attrgetter('component_num'))
   crc32c = cp_results[0].crc32c
   if crc32c is not None:
-    for i in range(1, num_components):
-      crc32c = ConcatCrc32c(crc32c, cp_results[i].crc32c,
-                            component_lengths[i])
+    for cp_result in cp_results[1:]:
+      crc32c = ConcatCrc32c(crc32c, cp_result.crc32c,
+                            cp_result.component_total_size)
 
   bytes_transferred = 0
   expect_gzip = ObjectIsGzipEncoded(src_obj_metadata)
@@ -2509,7 +3176,8 @@ def _DoSlicedDownload(src_url, src_obj_metadata, dst_url, download_file_name,
 def _DownloadObjectToFileResumable(src_url, src_obj_metadata, dst_url,
                                    download_file_name, gsutil_api, logger,
                                    digesters, component_num=None, start_byte=0,
-                                   end_byte=None, decryption_key=None):
+                                   end_byte=None, decryption_key=None,
+                                   sliced_download_range=None, scheduler=None):
   """Downloads an object to a local file using the resumable strategy.
 
   Args:
@@ -2526,12 +3194,19 @@ def _DownloadObjectToFileResumable(src_url, src_obj_metadata, dst_url,
     start_byte: The first byte of a byte range for a sliced download.
     end_byte: The last byte of a byte range for a sliced download.
     decryption_key: Base64-encoded decryption key for the source object, if any.
+    sliced_download_range: For sliced downloads, the SlicedDownloadRange being
+                           downloaded.
+    scheduler: For sliced downloads, the download's SlicedDownloadScheduler.
 
   Returns:
     (bytes_transferred, server_encoding)
     bytes_transferred: Number of bytes transferred from server this call.
     server_encoding: Content-encoding string if it was detected that the server
                      sent encoded bytes during transfer, None otherwise.
+
+  Raises:
+    SlicedDownloadRangeStolenException: If the end of the range of a sliced
+        download was stolen by another stream.
   """
   if end_byte is None:
     end_byte = src_obj_metadata.size - 1
@@ -2553,10 +3228,15 @@ def _DownloadObjectToFileResumable(src_url, src_obj_metadata, dst_url,
     api_selector = gsutil_api.GetApiSelector(provider=src_url.scheme)
     existing_file_size = GetFileSize(fp)
 
-    tracker_file_name, download_start_byte = (
-        ReadOrCreateDownloadTrackerFile(src_obj_metadata, dst_url, logger,
-                                        api_selector, start_byte,
-                                        existing_file_size, component_num))
+    if is_sliced:
+      # The scheduler keeps track of the progress of sliced downloads.
+      tracker_file_name = None
+      download_start_byte = sliced_download_range.download_start_byte
+    else:
+      tracker_file_name, download_start_byte = (
+          ReadOrCreateDownloadTrackerFile(src_obj_metadata, dst_url, logger,
+                                          api_selector, start_byte,
+                                          existing_file_size))
 
     if download_start_byte < start_byte or download_start_byte > end_byte + 1:
       DeleteTrackerFile(tracker_file_name)
@@ -2592,14 +3272,16 @@ def _DownloadObjectToFileResumable(src_url, src_obj_metadata, dst_url,
               src_url=src_url, dst_url=dst_url,
               operation_name='Hashing').call)
 
-      while bytes_digested < total_bytes_to_digest:
-        bytes_to_read = min(DEFAULT_FILE_BUFFER_SIZE,
-                            total_bytes_to_digest - bytes_digested)
-        data = fp.read(bytes_to_read)
-        bytes_digested += bytes_to_read
-        for alg_name in digesters:
-          digesters[alg_name].update(data)
-        hash_callback.Progress(len(data))
+      with perf_util.PhaseTimer(perf_util.PHASE_HASHING,
+                                num_bytes=total_bytes_to_digest):
+        while bytes_digested < total_bytes_to_digest:
+          bytes_to_read = min(DEFAULT_FILE_BUFFER_SIZE,
+                              total_bytes_to_digest - bytes_digested)
+          data = fp.read(bytes_to_read)
+          bytes_digested += bytes_to_read
+          for alg_name in digesters:
+            digesters[alg_name].update(data)
+          hash_callback.Progress(len(data))
 
     elif not is_sliced:
       # Delete file contents and start entire object download from scratch.
@@ -2616,9 +3298,17 @@ def _DownloadObjectToFileResumable(src_url, src_obj_metadata, dst_url,
       with open(global_copy_helper_opts.test_callback_file, 'rb') as test_fp:
         progress_callback = pickle.loads(test_fp.read()).call
 
-    if is_sliced and src_obj_metadata.size >= ResumableThreshold():
-      fp = SlicedDownloadFileWrapper(fp, tracker_file_name, src_obj_metadata,
-                                     start_byte, end_byte)
+    if is_sliced:
+      if PositionalWriteAvailable():
+        fp.close()
+        fp = SlicedDownloadPwriteSink(
+            download_file_name, scheduler, component_num, start_byte,
+            end_byte,
+            direct_io=config.getbool('GSUtil',
+                                     'sliced_object_download_direct_io', False))
+      else:
+        fp = SlicedDownloadFileWrapper(fp, scheduler, component_num,
+                                       start_byte, end_byte)
 
     compressed_encoding = ObjectIsGzipEncoded(src_obj_metadata)
 
@@ -3060,35 +3750,54 @@ def _CopyObjToObjDaisyChainMode(src_url, src_obj_metadata, dst_url,
   compressed_encoding = ObjectIsGzipEncoded(src_obj_metadata)
   encryption_keywrapper = GetEncryptionKeyWrapper(config)
 
+  # Test hooks expect the download's progress to be reported in order, so
+  # they get a single download stream.
+  num_download_streams = 1
+  if not progress_callback:
+    num_download_streams = config.getint(
+        'GSUtil', 'daisy_chain_download_streams',
+        DEFAULT_DAISY_CHAIN_DOWNLOAD_STREAMS)
+  # The buffer comes out of the transfer buffer memory budget, so it can't be
+  # bigger than the whole budget.
+  max_buffer_size = min(
+      HumanReadableToBytes(config.get('GSUtil', 'daisy_chain_buffer_size',
+                                      DEFAULT_DAISY_CHAIN_BUFFER_SIZE)),
+      GetTransferBufferMemory())
+
   start_time = time.time()
   upload_fp = DaisyChainWrapper(
       src_url, src_obj_metadata.size, gsutil_api,
       compressed_encoding=compressed_encoding,
-      progress_callback=progress_callback, decryption_key=decryption_key)
+      progress_callback=progress_callback, decryption_key=decryption_key,
+      num_download_streams=num_download_streams,
+      max_buffer_size=max_buffer_size)
   uploaded_object = None
-  if src_obj_metadata.size == 0:
-    # Resumable uploads of size 0 are not supported.
-    uploaded_object = gsutil_api.UploadObject(
-        upload_fp, object_metadata=dst_obj_metadata,
-        canned_acl=global_copy_helper_opts.canned_acl,
-        preconditions=preconditions, provider=dst_url.scheme,
-        fields=UPLOAD_RETURN_FIELDS, size=src_obj_metadata.size,
-        encryption_tuple=encryption_keywrapper)
-  else:
-    # TODO: Support process-break resumes. This will resume across connection
-    # breaks and server errors, but the tracker callback is a no-op so this
-    # won't resume across gsutil runs.
-    # TODO: Test retries via test_callback_file.
-    uploaded_object = gsutil_api.UploadObjectResumable(
-        upload_fp, object_metadata=dst_obj_metadata,
-        canned_acl=global_copy_helper_opts.canned_acl,
-        preconditions=preconditions, provider=dst_url.scheme,
-        fields=UPLOAD_RETURN_FIELDS, size=src_obj_metadata.size,
-        progress_callback=FileProgressCallbackHandler(
-            gsutil_api.status_queue, src_url=src_url, dst_url=dst_url,
-            operation_name='Uploading').call,
-        tracker_callback=_DummyTrackerCallback,
-        encryption_tuple=encryption_keywrapper)
+  try:
+    if src_obj_metadata.size == 0:
+      # Resumable uploads of size 0 are not supported.
+      uploaded_object = gsutil_api.UploadObject(
+          upload_fp, object_metadata=dst_obj_metadata,
+          canned_acl=global_copy_helper_opts.canned_acl,
+          preconditions=preconditions, provider=dst_url.scheme,
+          fields=UPLOAD_RETURN_FIELDS, size=src_obj_metadata.size,
+          encryption_tuple=encryption_keywrapper)
+    else:
+      # TODO: Support process-break resumes. This will resume across
+      # connection breaks and server errors, but the tracker callback is a
+      # no-op so this won't resume across gsutil runs.
+      # TODO: Test retries via test_callback_file.
+      uploaded_object = gsutil_api.UploadObjectResumable(
+          upload_fp, object_metadata=dst_obj_metadata,
+          canned_acl=global_copy_helper_opts.canned_acl,
+          preconditions=preconditions, provider=dst_url.scheme,
+          fields=UPLOAD_RETURN_FIELDS, size=src_obj_metadata.size,
+          progress_callback=FileProgressCallbackHandler(
+              gsutil_api.status_queue, src_url=src_url, dst_url=dst_url,
+              operation_name='Uploading').call,
+          tracker_callback=_DummyTrackerCallback,
+          encryption_tuple=encryption_keywrapper)
+  finally:
+    upload_fp.close()
   end_time = time.time()
 
   try:
@@ -3286,6 +3995,96 @@ def GetDecryptionCSEK(src_url, src_obj_metadata):
     return decryption_key
 
 
+class DestinationNameSet(object):
+  """Names of the objects that existed under a destination when it was listed.
+
+  Used by cp -n (and mv -n) to answer "does the destination object exist?"
+  without a metadata GET per object. The destination prefix is listed once,
+  before copying starts. Since listings are returned in lexicographic order,
+  a listing that is cut short (after max_objects names) still answers
+  authoritatively for names up to the last one listed; only later names need
+  a per-object check.
+  """
+
+  def __init__(self, dst_url, gsutil_api, max_objects, logger):
+    """Lists the objects under dst_url.
+
+    Args:
+      dst_url: CloudUrl of the destination bucket or prefix.
+      gsutil_api: gsutil Cloud API instance to use for the listing.
+      max_objects: Maximum number of names to list and hold in memory.
+      logger: logging.Logger for outputting log messages.
+    """
+    self.provider = dst_url.scheme
+    self.bucket_name = dst_url.bucket_name
+    self.prefix = (dst_url.object_name or '').encode(UTF8)
+    # Names are stored as UTF-8 byte strings, whose ordering matches the
+    # order of the listing.
+    self.names = set()
+    # Last name listed if the listing was cut short, or None if it completed.
+    self.listed_through = None
+    last_name = None
+    for obj in gsutil_api.ListObjects(
+        self.bucket_name, prefix=dst_url.object_name or None,
+        provider=self.provider, fields=['items/name']):
+      if obj.datatype != CloudApi.CsObjectOrPrefixType.OBJECT:
+        continue
+      if len(self.names) >= max_objects:
+        self.listed_through = last_name
+        break
+      last_name = obj.data.name.encode(UTF8)
+      self.names.add(last_name)
+    logger.debug('Listed %d existing objects under %s%s.', len(self.names),
+                 dst_url, ' (partial)' if self.listed_through else '')
+
+  def ObjectExists(self, dst_url):
+    """Returns whether dst_url existed when the destination was listed.
+
+    Args:
+      dst_url: CloudUrl of a destination object.
+
+    Returns:
+      True or False, or None if the listing doesn't cover dst_url and the
+      caller must check for the object itself.
+    """
+    if (dst_url.scheme != self.provider or
+        dst_url.bucket_name != self.bucket_name):
+      return None
+    name = dst_url.object_name.encode(UTF8)
+    if not name.startswith(self.prefix):
+      return None
+    if name in self.names:
+      return True
+    if self.listed_through is not None and name > self.listed_through:
+      return None
+    return False
+
+
+def PrefetchDestinationNames(dst_url, gsutil_api, logger):
+  """Lists a no-clobber copy destination once, if doing so is worthwhile.
+
+  Args:
+    dst_url: StorageUrl of the copy destination.
+    gsutil_api: gsutil Cloud API instance to use for the listing.
+    logger: logging.Logger for outputting log messages.
+
+  Returns:
+    DestinationNameSet for dst_url, or None if the destination is not a
+    cloud bucket or prefix, prefetching is disabled, or the listing failed.
+  """
+  max_objects = config.getint('GSUtil', 'no_clobber_prefetch_max_objects',
+                              DEFAULT_NO_CLOBBER_PREFETCH_MAX_OBJECTS)
+  if (max_objects <= 0 or not dst_url.IsCloudUrl() or dst_url.IsProvider() or
+      ContainsWildcard(dst_url.url_string)):
+    return None
+  try:
+    return DestinationNameSet(dst_url, gsutil_api, max_objects, logger)
+  except Exception, e:  # pylint: disable=broad-except
+    # Fall back to checking each destination object.
+    logger.debug('Could not list existing objects under %s: %s', dst_url, e)
+    return None
+
+
 # pylint: disable=undefined-variable
 # pylint: disable=too-many-statements
 def PerformCopy(
@@ -3435,12 +4234,18 @@ def PerformCopy(
       if src_obj_size == os.path.getsize(dst_url.object_name):
         raise ItemExistsError()
     elif dst_url.IsCloudUrl():
-      try:
-        dst_object = gsutil_api.GetObjectMetadata(
-            dst_url.bucket_name, dst_url.object_name, provider=dst_url.scheme)
-      except NotFoundException:
-        dst_object = None
-      if dst_object:
+      # If the command listed the destination up front, use that listing.
+      dst_name_set = getattr(command_obj, 'dst_name_set', None)
+      dst_object_exists = (dst_name_set.ObjectExists(dst_url)
+                           if dst_name_set else None)
+      if dst_object_exists is None:
+        try:
+          dst_object_exists = bool(gsutil_api.GetObjectMetadata(
+              dst_url.bucket_name, dst_url.object_name,
+              provider=dst_url.scheme))
+        except NotFoundException:
+          dst_object_exists = False
+      if dst_object_exists:
         raise ItemExistsError()
 
   if dst_url.IsCloudUrl():
@@ -3533,7 +4338,12 @@ def PerformCopy(
 
 
 class Manifest(object):
-  """Stores the manifest items for the CpCommand class."""
+  """Stores the manifest items for the CpCommand class.
+
+  Rows are written by this process's ManifestWriter, which writes the rows
+  finished by concurrent threads together. Rows are always written before
+  SetResult returns.
+  """
 
   def __init__(self, path):
     # self.items contains a dictionary of rows
@@ -3542,8 +4352,14 @@ class Manifest(object):
     self.lock = parallelism_framework_util.CreateLock()
 
     self.manifest_path = os.path.expanduser(path)
-    self._ParseManifest()
-    self._CreateManifestFile()
+    # Path of the manifest's index, if it has one.
+    self.index_path = None
+    if GetManifestStoreType() == ManifestStoreType.SQLITE:
+      self._CreateManifestFile()
+      self._UpdateManifestIndex()
+    else:
+      self._ParseManifest()
+      self._CreateManifestFile()
 
   def _ParseManifest(self):
     """Load and parse a manifest file.
@@ -3553,50 +4369,45 @@ class Manifest(object):
     """
     try:
       if os.path.exists(self.manifest_path):
-        with open(self.manifest_path, 'rb') as f:
-          first_row = True
-          reader = csv.reader(f)
-          for row in reader:
-            if first_row:
-              try:
-                source_index = row.index('Source')
-                result_index = row.index('Result')
-              except ValueError:
-                # No header and thus not a valid manifest file.
-                raise CommandException(
-                    'Missing headers in manifest file: %s' % self.manifest_path)
-            first_row = False
-            source = row[source_index]
-            result = row[result_index]
-            if result in ['OK', 'skip']:
-              # We're always guaranteed to take the last result of a specific
-              # source url.
-              self.manifest_filter[source] = result
+        for source in IterSuccessfulSources(self.manifest_path):
+          self.manifest_filter[source] = True
+    except MissingManifestHeadersError:
+      raise CommandException(
+          'Missing headers in manifest file: %s' % self.manifest_path)
     except IOError:
       raise CommandException('Could not parse %s' % self.manifest_path)
 
+  def _UpdateManifestIndex(self):
+    """Brings the manifest's index up to date with the manifest file.
+
+    Only the rows added since the index was last updated are read, and the
+    index is then used to skip any files that have a skip or OK status.
+    """
+    try:
+      index_path = GetManifestIndexPath(self.manifest_path)
+      GetManifestIndex(self.manifest_path, index_path).Update()
+    except MissingManifestHeadersError:
+      raise CommandException(
+          'Missing headers in manifest file: %s' % self.manifest_path)
+    except (IOError, OSError) as e:
+      raise CommandException('Could not parse %s: %s' % (self.manifest_path, e))
+    self.index_path = index_path
+
   def WasSuccessful(self, src):
     """Returns whether the specified src url was marked as successful."""
+    if self.index_path:
+      try:
+        return GetManifestIndex(self.manifest_path,
+                                self.index_path).Contains(src)
+      except IOError as e:
+        raise CommandException('Could not read the index of %s: %s' %
+                               (self.manifest_path, e))
     return src in self.manifest_filter
 
   def _CreateManifestFile(self):
     """Opens the manifest file and assigns it to the file pointer."""
     try:
-      if ((not os.path.exists(self.manifest_path))
-          or (os.stat(self.manifest_path).st_size == 0)):
-        # Add headers to the new file.
-        with open(self.manifest_path, 'wb', 1) as f:
-          writer = csv.writer(f)
-          writer.writerow(['Source',
-                           'Destination',
-                           'Start',
-                           'End',
-                           'Md5',
-                           'UploadId',
-                           'Source Size',
-                           'Bytes Transferred',
-                           'Result',
-                           'Description'])
+      WriteManifestHeaderIfNeeded(self.manifest_path)
     except IOError:
       raise CommandException('Could not create manifest file.')
 
@@ -3641,12 +4452,13 @@ class Manifest(object):
         row_item['result'],
         row_item['description'].encode(UTF8)]
 
-    # Aquire a lock to prevent multiple threads writing to the same file at
-    # the same time. This would cause a garbled mess in the manifest file.
-    with self.lock:
-      with open(self.manifest_path, 'a', 1) as f:  # 1 == line buffered
-        writer = csv.writer(f)
-        writer.writerow(data)
+    try:
+      GetManifestWriter(self.manifest_path, self.lock,
+                        index_path=self.index_path).Write(
+                            data, row_item['result'] in SUCCESSFUL_RESULTS)
+    except IOError as e:
+      raise CommandException('Could not write to manifest file %s: %s' %
+                             (self.manifest_path, e))
 
   def _RemoveItemFromManifest(self, url):
     # Remove the item from the dictionary since we're done with it and
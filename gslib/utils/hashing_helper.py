@@ -27,6 +27,7 @@ from gslib.utils.boto_util import UsingCrcmodExtension
 from gslib.utils.constants import DEFAULT_FILE_BUFFER_SIZE
 from gslib.utils.constants import MIN_SIZE_COMPUTE_LOGGING
 from gslib.utils.constants import TRANSFER_BUFFER_SIZE
+from gslib.utils import perf_util
 
 
 SLOW_CRCMOD_WARNING = """
@@ -197,14 +198,16 @@ def CalculateHashesFromContents(fp, hash_dict, callback_processor=None):
     callback_processor: Optional callback processing class that implements
         Progress(integer amount of bytes processed).
   """
-  while True:
-    data = fp.read(DEFAULT_FILE_BUFFER_SIZE)
-    if not data:
-      break
-    for hash_alg in hash_dict.itervalues():
-      hash_alg.update(data)
-    if callback_processor:
-      callback_processor.Progress(len(data))
+  with perf_util.PhaseTimer(perf_util.PHASE_HASHING) as timer:
+    while True:
+      data = fp.read(DEFAULT_FILE_BUFFER_SIZE)
+      if not data:
+        break
+      for hash_alg in hash_dict.itervalues():
+        hash_alg.update(data)
+      timer.num_bytes += len(data)
+      if callback_processor:
+        callback_processor.Progress(len(data))
 
 
 def CalculateB64EncodedCrc32cFromContents(fp):
@@ -411,9 +414,10 @@ class HashingFileUploadWrapper(object):
 
     data = self._orig_fp.read(size)
     self._digesters_previous_mark = self._digesters_current_mark
-    for alg in self._digesters:
-      self._digesters_previous[alg] = self._digesters[alg].copy()
-      self._digesters[alg].update(data)
+    with perf_util.PhaseTimer(perf_util.PHASE_HASHING, num_bytes=len(data)):
+      for alg in self._digesters:
+        self._digesters_previous[alg] = self._digesters[alg].copy()
+        self._digesters[alg].update(data)
     self._digesters_current_mark += len(data)
     return data
 
@@ -497,10 +501,12 @@ class HashingFileUploadWrapper(object):
     self._digesters_previous_mark = self._digesters_current_mark
     bytes_remaining = bytes_to_read
     bytes_this_round = min(bytes_remaining, TRANSFER_BUFFER_SIZE)
-    while bytes_this_round:
-      data = self._orig_fp.read(bytes_this_round)
-      bytes_remaining -= bytes_this_round
-      for alg in self._digesters:
-        self._digesters[alg].update(data)
-      bytes_this_round = min(bytes_remaining, TRANSFER_BUFFER_SIZE)
+    with perf_util.PhaseTimer(perf_util.PHASE_HASHING,
+                              num_bytes=bytes_to_read):
+      while bytes_this_round:
+        data = self._orig_fp.read(bytes_this_round)
+        bytes_remaining -= bytes_this_round
+        for alg in self._digesters:
+          self._digesters[alg].update(data)
+        bytes_this_round = min(bytes_remaining, TRANSFER_BUFFER_SIZE)
     self._digesters_current_mark += bytes_to_read
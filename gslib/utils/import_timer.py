@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Utilities for reporting the time gsutil spends importing modules.
+
+When gsutil is run with -D, the gsutil wrapper script installs an import hook
+from this module before importing gslib.__main__, and prints the most
+expensive imports to stderr at exit. This is meant to make startup regressions
+(e.g., a command module eagerly importing a heavy library) easy to spot.
+
+This module must only depend on the Python standard library (and on
+gslib.utils.constants, which has the same restriction), since it is imported
+before the rest of gsutil.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import __builtin__
+import atexit
+import getopt
+import sys
+import timeit
+
+from gslib.utils.constants import GSUTIL_LONG_OPTS
+from gslib.utils.constants import GSUTIL_SHORT_OPTS
+
+# Number of imports listed in the report.
+NUM_IMPORTS_TO_REPORT = 20
+
+# Map of module name to the longest time (in seconds) taken to import it. The
+# first import of a module is the expensive one; later imports of the same
+# name are dictionary lookups and must not overwrite it.
+IMPORT_TIMES = {}
+
+_real_importer = __builtin__.__import__
+
+
+def DetailedDebugRequested(argv):
+  """Returns True if argv requests detailed debug output (-D).
+
+  Args:
+    argv: Command-line args, not including the program name.
+
+  Returns:
+    True if -D or --detailedDebug appears among the top-level options.
+  """
+  try:
+    opts, _ = getopt.getopt(argv, GSUTIL_SHORT_OPTS, GSUTIL_LONG_OPTS)
+  except getopt.GetoptError:
+    # gslib.__main__ reports option errors; there's nothing to measure here.
+    return False
+  return any(o in ('-D', '--detailedDebug') for o, _ in opts)
+
+
+def _TimedImporter(name, *args, **kwargs):
+  """Wrapper for the builtin __import__ that records import times."""
+  start_time = timeit.default_timer()
+  try:
+    return _real_importer(name, *args, **kwargs)
+  finally:
+    elapsed = timeit.default_timer() - start_time
+    if elapsed > IMPORT_TIMES.get(name, 0):
+      IMPORT_TIMES[name] = elapsed
+
+
+def GetImportTimeReport(num_imports=NUM_IMPORTS_TO_REPORT):
+  """Returns a printable report of the most expensive imports.
+
+  Times are inclusive: importing a module also counts the time spent importing
+  the modules it imports.
+
+  Args:
+    num_imports: Number of imports to include in the report.
+
+  Returns:
+    Report string.
+  """
+  lines = ['DEBUG: Most expensive imports (inclusive seconds):']
+  for name, elapsed in sorted(IMPORT_TIMES.items(), key=lambda item: item[1],
+                              reverse=True)[:num_imports]:
+    lines.append('DEBUG:   %8.4f  %s' % (elapsed, name))
+  return '\n'.join(lines) + '\n'
+
+
+def _WriteImportTimeReport():
+  sys.stderr.write(GetImportTimeReport())
+
+
+def InstallImportTimer():
+  """Starts recording import times and reports them to stderr at exit."""
+  if __builtin__.__import__ is _TimedImporter:
+    return
+  __builtin__.__import__ = _TimedImporter
+  atexit.register(_WriteImportTimeReport)
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Live metrics of a running gsutil command, in the Prometheus text format.
+
+When the GSUtil:metrics_textfile option is set, gsutil rewrites that file
+every few seconds while the command runs, and once more when it exits, with
+metrics of its progress in the Prometheus text exposition format. Pointing the
+Prometheus node exporter's textfile collector at the file's directory makes
+the metrics available to monitoring, e.g. to alert on stalled transfers.
+
+The metrics are taken from the status messages the UI controller handles,
+from the UI's progress and throughput, from the task and status queues, and
+from the task times recorded by perf_util.
+"""
+
+from __future__ import absolute_import
+
+import os
+import sys
+import time
+
+from gslib.thread_message import FileMessage
+from gslib.thread_message import RetryableErrorMessage
+from gslib.utils import observer_util
+from gslib.utils import perf_util
+
+# Seconds between rewrites of the metrics file.
+REWRITE_PERIOD_SEC = 5
+
+
+class _LiveMetricsObserver(observer_util.Observer):
+  """Writes the metrics file requested with GSUtil:metrics_textfile."""
+
+  def __init__(self):
+    super(_LiveMetricsObserver, self).__init__(
+        'live_metrics', config_option='metrics_textfile',
+        output_description='metrics')
+
+  def ResetData(self):
+    # UI controller whose manager tracks the command's progress.
+    self.ui_controller = None
+    # Map of error type to the number of retryable errors of that type.
+    self.retries = {}
+    # Keys of the transfers, and components of transfers, that have started
+    # but not finished.
+    self.in_flight = set()
+    # Number of threads performing tasks, and when they started.
+    self.worker_threads = 1
+    self.workers_start_time = None
+    self.task_queue = None
+    self.status_queue = None
+    self.reported_write_error = False
+
+  def OnStart(self):
+    # Task times give the workers' idle ratio.
+    perf_util.StartCounters()
+    observer_util.StartThread(_RewriteMetricsFile)
+
+  def HandleMessage(self, status_message, ui_controller):
+    with self.lock:
+      self.ui_controller = ui_controller
+      if isinstance(status_message, FileMessage):
+        if status_message.message_type in (
+            FileMessage.EXISTING_COMPONENT,
+            FileMessage.EXISTING_OBJECT_TO_DELETE):
+          return
+        key = (str(status_message.src_url), str(status_message.dst_url),
+               status_message.component_num, status_message.message_type)
+        if status_message.finished:
+          self.in_flight.discard(key)
+        else:
+          self.in_flight.add(key)
+      elif isinstance(status_message, RetryableErrorMessage):
+        self.retries[status_message.error_type] = (
+            self.retries.get(status_message.error_type, 0) + 1)
+
+  def WriteOutput(self, finished=True):
+    """Rewrites the metrics file with the current metrics.
+
+    The file is replaced rather than written in place, so that collectors
+    never read a partly-written file.
+
+    Args:
+      finished: True if the command has finished.
+    """
+    if not self.IsMainProcess() or not self.output_path:
+      return
+    tmp_path = '%s.%d.tmp' % (self.output_path, self.main_pid)
+    try:
+      with open(tmp_path, 'w') as tmp_file:
+        tmp_file.write(GetMetrics(finished=finished))
+      try:
+        os.rename(tmp_path, self.output_path)
+      except OSError:
+        # Windows can't rename over an existing file.
+        os.remove(self.output_path)
+        os.rename(tmp_path, self.output_path)
+    except (IOError, OSError) as e:
+      if not self.reported_write_error:
+        self.reported_write_error = True
+        sys.stderr.write('Could not write %s to %s: %s\n' %
+                         (self.output_description, self.output_path, e))
+
+
+_observer = observer_util.Register(_LiveMetricsObserver())
+
+
+def IsEnabled():
+  """Returns True if a metrics file is being written."""
+  return _observer.enabled
+
+
+def SetWorkers(num_threads, task_queue=None, status_queue=None):
+  """Sets the workers that perform the command's tasks.
+
+  Args:
+    num_threads: Number of threads performing tasks, across all processes.
+    task_queue: Queue of tasks waiting for a worker, if any.
+    status_queue: Queue of status messages waiting for the UI, if any.
+  """
+  if not _observer.enabled:
+    return
+  with _observer.lock:
+    _observer.worker_threads = num_threads
+    if _observer.workers_start_time is None:
+      _observer.workers_start_time = time.time()
+    _observer.task_queue = task_queue
+    _observer.status_queue = status_queue
+
+
+def _QueueSize(queue):
+  try:
+    return queue.qsize()
+  except (NotImplementedError, IOError, EOFError):
+    # qsize isn't implemented on macOS, and the manager process that holds
+    # the status queue may have exited.
+    return None
+
+
+def _Metric(lines, name, metric_type, help_text, samples):
+  """Adds a metric's lines in the text exposition format.
+
+  Args:
+    lines: List of lines to add to.
+    name: Metric name.
+    metric_type: 'counter' or 'gauge'.
+    help_text: Description of the metric.
+    samples: List of (label dict, value) pairs.
+  """
+  lines.append('# HELP %s %s' % (name, help_text))
+  lines.append('# TYPE %s %s' % (name, metric_type))
+  for labels, value in samples:
+    label_string = ','.join(
+        '%s="%s"' % (label, str(label_value).replace('\\', '\\\\')
+                     .replace('"', '\\"').replace('\n', '\\n'))
+        for label, label_value in sorted(labels.iteritems()))
+    lines.append('%s%s %s' % (name, '{%s}' % label_string if label_string
+                              else '', repr(float(value))))
+
+
+def GetMetrics(finished=False):
+  """Returns the current metrics, in the Prometheus text exposition format.
+
+  Args:
+    finished: True if the command has finished.
+
+  Returns:
+    Text of the metrics.
+  """
+  # Imported here to avoid a circular import.
+  # pylint: disable=g-import-not-at-top
+  from gslib.ui_controller import DataManager
+  now = time.time()
+  _, busy_seconds, _ = perf_util.GetPhaseTotals(perf_util.PHASE_TASK)
+  with _observer.lock:
+    ui_controller = _observer.ui_controller
+    manager = ui_controller.manager if ui_controller else None
+    retries = dict(_observer.retries)
+    num_in_flight = len(_observer.in_flight)
+    worker_threads = _observer.worker_threads
+    workers_start_time = _observer.workers_start_time
+    task_queue = _observer.task_queue
+    status_queue = _observer.status_queue
+  start_time = _observer.start_time
+
+  lines = []
+  _Metric(lines, 'gsutil_running', 'gauge',
+          '1 while the command runs, 0 once it has exited.',
+          [({}, 0 if finished else 1)])
+  _Metric(lines, 'gsutil_start_time_seconds', 'gauge',
+          'When the command started, in seconds since the Epoch.',
+          [({}, start_time)])
+  _Metric(lines, 'gsutil_update_time_seconds', 'gauge',
+          'When these metrics were written, in seconds since the Epoch.',
+          [({}, now)])
+  if manager:
+    _Metric(lines, 'gsutil_last_progress_time_seconds', 'gauge',
+            'When the command last made progress, in seconds since the '
+            'Epoch.', [({}, manager.last_progress_time or start_time)])
+    _Metric(lines, 'gsutil_objects_done_total', 'counter',
+            'Objects processed so far.', [({}, manager.objects_finished)])
+    _Metric(lines, 'gsutil_objects', 'gauge',
+            'Objects to process, as estimated so far.',
+            [({}, manager.num_objects)])
+    if isinstance(manager, DataManager):
+      _Metric(lines, 'gsutil_bytes_done_total', 'counter',
+              'Bytes transferred so far.', [({}, manager.GetProgress())])
+      _Metric(lines, 'gsutil_bytes', 'gauge',
+              'Bytes to transfer, as estimated so far.',
+              [({}, manager.total_size)])
+      _Metric(lines, 'gsutil_throughput_bytes_per_second', 'gauge',
+              'Throughput over the sliding window the progress line uses.',
+              [({}, manager.throughput)])
+    else:
+      _Metric(lines, 'gsutil_throughput_objects_per_second', 'gauge',
+              'Throughput over the sliding window the progress line uses.',
+              [({}, manager.throughput)])
+  _Metric(lines, 'gsutil_retries_total', 'counter',
+          'Retryable errors, by error type.',
+          [({'error_type': error_type}, count)
+           for error_type, count in sorted(retries.iteritems())])
+  _Metric(lines, 'gsutil_transfers_in_flight', 'gauge',
+          'Transfers and transfer components that have started but not '
+          'finished.', [({}, num_in_flight)])
+  for name, queue, help_text in (
+      ('gsutil_task_queue_depth', task_queue,
+       'Tasks waiting for a worker thread.'),
+      ('gsutil_status_queue_depth', status_queue,
+       'Status messages waiting for the UI thread.')):
+    # The queues may be gone once the command has finished.
+    size = _QueueSize(queue) if queue is not None and not finished else None
+    if size is not None:
+      _Metric(lines, name, 'gauge', help_text, [({}, size)])
+  _Metric(lines, 'gsutil_worker_threads', 'gauge',
+          'Threads performing tasks, across all processes.',
+          [({}, worker_threads)])
+  _Metric(lines, 'gsutil_worker_busy_seconds_total', 'counter',
+          'Time worker threads spent performing tasks, counted when each '
+          'task finishes.', [({}, busy_seconds)])
+  if workers_start_time is not None:
+    available_seconds = (now - workers_start_time) * worker_threads
+    idle_ratio = (1 - busy_seconds / available_seconds
+                  if available_seconds > 0 else 0.0)
+    _Metric(lines, 'gsutil_worker_idle_ratio', 'gauge',
+            'Fraction of worker thread time spent idle since the workers '
+            'started.', [({}, min(max(idle_ratio, 0.0), 1.0))])
+  return '\n'.join(lines) + '\n'
+
+
+def _RewriteMetricsFile():
+  while True:
+    _observer.WriteOutput(finished=False)
+    time.sleep(REWRITE_PERIOD_SEC)
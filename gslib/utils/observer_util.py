@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Observers of a gsutil command across all of its processes.
+
+An observer collects data about a running command (phase timers, a trace,
+live metrics, profiler samples), and is usually started by a GSUtil option
+that names the file it writes. Observers register themselves here, and the
+command framework drives every registered observer through the same steps:
+
+  - StartConfiguredObservers starts, in the main process, each observer whose
+    option is set;
+  - ResetForWorkerProcess discards the data each new worker process inherited
+    from its parent;
+  - SendToMainProcess sends the data worker processes collected to the main
+    process, in a single ObserverDataMessage on the status queue, after each
+    task;
+  - HandleMessage passes each status message to the observers in the main
+    process, and merges the data worker processes sent;
+  - and at exit, each observer writes its file in the main process.
+"""
+
+from __future__ import absolute_import
+
+import atexit
+import os
+import sys
+import threading
+import time
+
+from boto import config
+
+from gslib.thread_message import ObserverDataMessage
+from gslib.utils.parallelism_framework_util import PutToQueueWithTimeout
+
+# Registered observers, in the order they were registered.
+_observers = []
+
+
+class Observer(object):
+  """Base class for observers of a command.
+
+  Subclasses override the hooks that their data needs: OnStart,
+  ResetData, TakeWorkerData, MergeWorkerData, HandleMessage and Write.
+  """
+
+  def __init__(self, name, config_option=None, output_description=None):
+    """Instantiates an Observer.
+
+    Args:
+      name: Name of the observer, which identifies its data in
+          ObserverDataMessages.
+      config_option: GSUtil option whose value is the path of the file to
+          write the observer's output to, or None if the observer is only
+          started by code.
+      output_description: What the output file holds, for error messages.
+    """
+    self.name = name
+    self.config_option = config_option
+    self.output_description = output_description
+    self.Reset()
+
+  def Reset(self):
+    """Discards all state, as if the observer had never been started."""
+    self.enabled = False
+    self.output_path = None
+    self.start_time = None
+    self.main_pid = None
+    self.lock = threading.Lock()
+    self.ResetData()
+
+  def Start(self, output_path=None):
+    """Starts observing, and writes output_path at exit if it's set.
+
+    This must be called in the main process, before any worker processes are
+    started. Observers may be started more than once, e.g., for a file and
+    for another observer that uses their data, but only write one file.
+
+    Args:
+      output_path: Path of the file to write the observer's output to.
+    """
+    if output_path and self.output_path is None:
+      self.output_path = output_path
+      atexit.register(self.WriteOutput)
+    if not self.enabled:
+      self.start_time = time.time()
+      self.main_pid = os.getpid()
+      self.enabled = True
+      self.OnStart()
+
+  def IsMainProcess(self):
+    return os.getpid() == self.main_pid
+
+  def ResetForWorkerProcess(self):
+    """Discards the data a new worker process inherited from its parent."""
+    # Another thread may have held the lock when the process was forked.
+    self.lock = threading.Lock()
+    self.ResetData()
+
+  def WriteOutput(self):
+    """Writes the output file. Does nothing in worker processes."""
+    if not self.IsMainProcess() or not self.output_path:
+      return
+    try:
+      with open(self.output_path, 'w') as output_file:
+        self.Write(output_file)
+    except IOError as e:
+      sys.stderr.write('Could not write %s to %s: %s\n' %
+                       (self.output_description, self.output_path, e))
+
+  def OnStart(self):
+    """Called in the main process when the observer starts."""
+
+  def ResetData(self):
+    """Discards the data the observer has collected."""
+
+  def TakeWorkerData(self):
+    """Returns, and forgets, the data collected in a worker process.
+
+    Returns:
+      Picklable data for MergeWorkerData, or None if there is none to send.
+    """
+    return None
+
+  def MergeWorkerData(self, data, process_id):
+    """Adds data that a worker process sent to the main process's data.
+
+    Args:
+      data: Data returned by TakeWorkerData in the worker process.
+      process_id: ID of the worker process.
+    """
+
+  def HandleMessage(self, status_message, ui_controller):
+    """Called in the main process for each status message.
+
+    Args:
+      status_message: StatusMessage from the status queue.
+      ui_controller: UIController handling the message.
+    """
+
+  def Write(self, output_file):
+    """Writes the observer's output to an open file."""
+
+
+def Register(observer):
+  """Registers an observer, and returns it."""
+  _observers.append(observer)
+  return observer
+
+
+def GetObservers():
+  """Returns the registered observers."""
+  return list(_observers)
+
+
+def StartThread(target):
+  """Starts a daemon thread for an observer, e.g., to sample or write data."""
+  thread = threading.Thread(target=target)
+  thread.daemon = True
+  thread.start()
+
+
+def StartConfiguredObservers():
+  """Starts each registered observer whose GSUtil option is set."""
+  for observer in _observers:
+    if observer.config_option:
+      output_path = config.get('GSUtil', observer.config_option, None)
+      if output_path:
+        observer.Start(os.path.expanduser(output_path))
+
+
+def ResetForWorkerProcess():
+  """Resets the started observers in a new worker process."""
+  for observer in _observers:
+    if observer.enabled:
+      observer.ResetForWorkerProcess()
+
+
+def SendToMainProcess(status_queue):
+  """Sends the data a worker process's observers collected to the main process.
+
+  Does nothing in the main process, whose observers use their data directly.
+
+  Args:
+    status_queue: Status queue that the main process's UIThread reads from.
+  """
+  if not status_queue:
+    return
+  data = {}
+  for observer in _observers:
+    if observer.enabled and not observer.IsMainProcess():
+      observer_data = observer.TakeWorkerData()
+      if observer_data:
+        data[observer.name] = observer_data
+  if data:
+    PutToQueueWithTimeout(status_queue, ObserverDataMessage(data, time.time()))
+
+
+def HandleMessage(status_message, ui_controller):
+  """Passes a status message to the started observers.
+
+  Args:
+    status_message: StatusMessage from the status queue.
+    ui_controller: UIController handling the message.
+
+  Returns:
+    True if the message only carried data for the observers.
+  """
+  if isinstance(status_message, ObserverDataMessage):
+    for observer in _observers:
+      if observer.name in status_message.data:
+        observer.MergeWorkerData(status_message.data[observer.name],
+                                 status_message.process_id)
+    return True
+  for observer in _observers:
+    if observer.enabled:
+      observer.HandleMessage(status_message, ui_controller)
+  return False
@@ -20,11 +20,16 @@ from __future__ import print_function
 import collections
 import multiprocessing
 import threading
+import time
 import traceback
 
 from six.moves import queue as Queue
 
 import gslib
+from gslib.thread_message import FileMessage
+from gslib.thread_message import FinishedFilesMessage
+from gslib.thread_message import ProgressMessage
+from gslib.thread_message import StatusMessageBatch
 from gslib.utils import constants
 from gslib.utils import system_util
 
@@ -49,6 +54,21 @@ UI_THREAD_JOIN_TIMEOUT = 60
 
 ZERO_TASKS_TO_DO_ARGUMENT = ('There were no', 'tasks to do')
 
+# Maximum time a worker process's status messages are buffered before they're
+# sent to the global status queue, in seconds.
+STATUS_BATCH_PERIOD = 0.2
+
+# Number of buffered status messages at which a worker process sends them
+# without waiting for STATUS_BATCH_PERIOD to pass.
+MAX_STATUS_BATCH_SIZE = 500
+
+# Types of the FileMessages that describe whole files, rather than components.
+_FILE_MESSAGE_TYPES = frozenset((
+    FileMessage.FILE_DOWNLOAD, FileMessage.FILE_UPLOAD,
+    FileMessage.FILE_CLOUD_COPY, FileMessage.FILE_LOCAL_COPY,
+    FileMessage.FILE_DAISY_COPY, FileMessage.FILE_REWRITE,
+    FileMessage.FILE_HASH))
+
 # Multiprocessing manager used to coordinate across all processes. This
 # attribute is only present if multiprocessing is available, which can be
 # determined by calling CheckMultiprocessingAvailableAndInit().
@@ -127,6 +147,27 @@ class AtomicDict(object):
       self.dict[key] = val
       return val
 
+  def Modify(self, key, modifier):
+    """Atomically replaces the stored value with modifier(value).
+
+    Args:
+      key: lookup key for the value to replace.
+      modifier: Function that takes the stored value and returns its
+          replacement. It is called in the calling process, with the lock
+          held.
+
+    Returns:
+      The replacement value, or None if there is no value for the key, in
+      which case modifier isn't called.
+    """
+    with self.lock:
+      val = self.dict.get(key)
+      if val is None:
+        return None
+      val = modifier(val)
+      self.dict[key] = val
+      return val
+
 
 class ProcessAndThreadSafeInt(object):
   """This class implements a process and thread-safe integer.
@@ -161,14 +202,17 @@ class ProcessAndThreadSafeInt(object):
 
   def Increment(self):
     if self.multiprocessing_is_available:
-      self.value.value += 1
+      # Reading and writing value each take the lock, so += alone isn't atomic.
+      with self.value.get_lock():
+        self.value.value += 1
     else:
       with self.lock:
         self.value += 1
 
   def Decrement(self):
     if self.multiprocessing_is_available:
-      self.value.value -= 1
+      with self.value.get_lock():
+        self.value.value -= 1
     else:
       with self.lock:
         self.value -= 1
@@ -181,6 +225,178 @@ class ProcessAndThreadSafeInt(object):
         return self.value
 
 
+class BatchingStatusQueue(object):
+  """Sends a worker process's status messages to the status queue in batches.
+
+  Each put to a multiprocessing status queue is a round trip to the manager
+  process, and the UIThread makes another to get the message, so sending
+  messages one at a time costs CPU in every process for each object and
+  progress update. This queue buffers messages and sends them as
+  StatusMessageBatches at most STATUS_BATCH_PERIOD seconds apart. Progress
+  messages for a file or component that are still buffered are replaced by
+  newer ones, since each one reports the total progress so far.
+
+  Files that start and finish between two batches are counted in a single
+  FinishedFilesMessage at the end of the batch, in place of their
+  FileMessages and ProgressMessages. Only files whose transfer spans batches,
+  or that are split into components, are sent to the UI individually, so the
+  UI's work depends on how long the command runs rather than on how many
+  files it transfers.
+
+  pending_batches counts the buffers (across processes) that hold messages not
+  yet sent, so that the main process can wait for them before stopping the
+  UIThread.
+  """
+
+  def __init__(self, status_queue, pending_batches,
+               batch_period=STATUS_BATCH_PERIOD,
+               max_batch_size=MAX_STATUS_BATCH_SIZE, count_files=True):
+    """Initializes the queue, and starts a thread that sends its batches.
+
+    Args:
+      status_queue: Global status queue to send batches to.
+      pending_batches: ProcessAndThreadSafeInt counting the buffers with
+          messages that haven't been sent.
+      batch_period: Maximum time messages are buffered, in seconds.
+      max_batch_size: Number of buffered messages at which they're sent
+          right away.
+      count_files: If False, every file's FileMessages are sent, rather than
+          counting the files that finish within a batch. For consumers that
+          need each file's messages, such as traces.
+    """
+    self._status_queue = status_queue
+    self._pending_batches = pending_batches
+    self._batch_period = batch_period
+    self._max_batch_size = max_batch_size
+    self._count_files = count_files
+    self._lock = threading.Lock()
+    # Serializes sends, so that batches arrive in the order they were made.
+    self._send_lock = threading.Lock()
+    self._ResetBuffer()
+    send_thread = threading.Thread(target=self._SendPeriodically)
+    send_thread.daemon = True
+    send_thread.start()
+
+  def _ResetBuffer(self):
+    # Buffered messages. Messages of counted files are replaced by None.
+    self._messages = []
+    # Map of source URL string to a map of (destination URL string, component
+    # number) to the index in _messages of the file's or component's buffered
+    # ProgressMessage.
+    self._progress_indexes = {}
+    # Map of source URL string to the index in _messages of the file's
+    # buffered start FileMessage, for files that haven't sent other messages
+    # (such as components') since.
+    self._file_start_indexes = {}
+    # FinishedFilesMessage counting the files that finished within this
+    # buffer, if any did.
+    self._finished_files = None
+
+  # pylint: disable=invalid-name, unused-argument
+  def put(self, status_message, timeout=None):
+    """Buffers a status message; puts never block on the status queue."""
+    with self._lock:
+      if not self._messages and not self._finished_files:
+        self._pending_batches.Increment()
+      src_url_string = str(getattr(status_message, 'src_url', None))
+      if isinstance(status_message, ProgressMessage):
+        file_indexes = self._progress_indexes.setdefault(src_url_string, {})
+        key = (str(status_message.dst_url), status_message.component_num)
+        if key in file_indexes:
+          self._messages[file_indexes[key]] = status_message
+          return
+        file_indexes[key] = len(self._messages)
+      elif self._count_files and self._CountFinishedFile(status_message,
+                                                         src_url_string):
+        return
+      else:
+        # The file's later progress must stay after this message (e.g., the
+        # start of a component).
+        self._progress_indexes.pop(src_url_string, None)
+        self._file_start_indexes.pop(src_url_string, None)
+        if (isinstance(status_message, FileMessage) and
+            not status_message.finished and
+            status_message.message_type in _FILE_MESSAGE_TYPES):
+          self._file_start_indexes[src_url_string] = len(self._messages)
+      self._messages.append(status_message)
+      batch_full = len(self._messages) >= self._max_batch_size
+    if batch_full:
+      self.Flush()
+  # pylint: enable=invalid-name, unused-argument
+
+  def _CountFinishedFile(self, status_message, src_url_string):
+    """Counts a finished file whose start the UI hasn't been sent.
+
+    The file's buffered start and progress messages are dropped.
+
+    Args:
+      status_message: The message being put.
+      src_url_string: String of the message's source URL.
+
+    Returns:
+      True if status_message finished a file and was counted, in which case it
+      mustn't be buffered.
+    """
+    if not (isinstance(status_message, FileMessage) and
+            status_message.finished and
+            status_message.message_type in _FILE_MESSAGE_TYPES):
+      return False
+    if status_message.start_time is not None:
+      # Small uploads report their start and end in a single message.
+      start_time = status_message.start_time
+      size = status_message.size
+    elif src_url_string in self._file_start_indexes:
+      start_index = self._file_start_indexes.pop(src_url_string)
+      start_message = self._messages[start_index]
+      self._messages[start_index] = None
+      for index in self._progress_indexes.pop(src_url_string, {}).values():
+        self._messages[index] = None
+      start_time = start_message.time
+      # The UI uses the size the file started with.
+      size = start_message.size
+    else:
+      return False
+    if self._finished_files is None:
+      self._finished_files = FinishedFilesMessage(status_message.time)
+    self._finished_files.AddFile(size or 0, start_time, status_message.time,
+                                 status_message.thread_id)
+    return True
+
+  def Flush(self):
+    """Sends the buffered messages to the status queue."""
+    with self._send_lock:
+      with self._lock:
+        messages = [message for message in self._messages
+                    if message is not None]
+        if self._finished_files:
+          messages.append(self._finished_files)
+        self._ResetBuffer()
+      if not messages:
+        return
+      PutToQueueWithTimeout(self._status_queue,
+                            StatusMessageBatch(messages, time.time()))
+      self._pending_batches.Decrement()
+
+  def _SendPeriodically(self):
+    while True:
+      time.sleep(self._batch_period)
+      self.Flush()
+
+
+def WaitForStatusBatches(pending_batches, timeout=STATUS_QUEUE_OP_TIMEOUT):
+  """Waits until worker processes have sent their buffered status messages.
+
+  Args:
+    pending_batches: ProcessAndThreadSafeInt passed to the worker processes'
+        BatchingStatusQueues.
+    timeout: Maximum time to wait, in case a worker process exited with
+        messages in its buffer.
+  """
+  deadline = time.time() + timeout
+  while pending_batches.GetValue() > 0 and time.time() < deadline:
+    time.sleep(0.01)
+
+
 def _IncreaseSoftLimitForResource(resource_name, fallback_value):
   """Sets a new soft limit for the maximum number of open files.
 
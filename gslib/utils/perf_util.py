@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Timers and counters for the phases of a gsutil command.
+
+When the GSUtil:perf_report option is set, gsutil counts how many times each
+phase in PHASES ran, how long it took and how many bytes it processed, and
+writes a breakdown of them to that path at exit. Worker processes send their
+counters to the main process through gslib.utils.observer_util, so the report
+covers all of a command's processes.
+
+Phases nest (a task's time includes the requests it sends, for example), so
+their times don't add up to the command's run time.
+
+When a trace is requested (see gslib.utils.trace_util), runs of the phases
+in SPAN_PHASES are also kept as spans, which the trace takes with TakeSpans.
+
+Recording a phase is a dict update under an uncontended lock, and does
+nothing when neither a report nor a trace was requested, so timers can stay
+in hot paths.
+"""
+
+from __future__ import absolute_import
+
+import sys
+import threading
+import time
+
+from gslib.utils import observer_util
+from gslib.utils.unit_util import MakeHumanReadable
+
+PHASE_LISTING = 'listing'
+PHASE_STAT = 'stat'
+PHASE_HASHING = 'hashing'
+PHASE_DIFF = 'diff'
+PHASE_QUEUEING = 'queueing'
+PHASE_TASK = 'task'
+PHASE_CONNECT = 'connect'
+PHASE_REQUEST = 'request'
+PHASE_BODY_TRANSFER = 'body_transfer'
+PHASE_TRACKER_WRITE = 'tracker_write'
+PHASE_COMPOSE = 'compose'
+
+# Phases, in the order they're reported, and what each one measures.
+PHASES = [
+    (PHASE_LISTING, 'expanding arguments and listing files and objects'),
+    (PHASE_STAT, 'reading local file attributes'),
+    (PHASE_HASHING, 'computing checksums'),
+    (PHASE_DIFF, 'computing rsync differences'),
+    (PHASE_QUEUEING, 'adding tasks to the task queue'),
+    (PHASE_TASK, 'performing tasks'),
+    (PHASE_CONNECT, 'opening connections, including TLS handshakes'),
+    (PHASE_REQUEST, 'waiting for responses to requests'),
+    (PHASE_BODY_TRANSFER, 'sending and receiving object data'),
+    (PHASE_TRACKER_WRITE, 'writing resumable transfer state'),
+    (PHASE_COMPOSE, 'composing objects'),
+]
+
+# Phases that are kept as spans when a trace is requested. Phases that run
+# for every argument or buffer (e.g., hashing) would make traces too large.
+SPAN_PHASES = frozenset([PHASE_TASK, PHASE_CONNECT, PHASE_REQUEST,
+                         PHASE_BODY_TRANSFER, PHASE_TRACKER_WRITE,
+                         PHASE_COMPOSE])
+
+
+class _PerfObserver(observer_util.Observer):
+  """Records phases, and writes the report requested with GSUtil:perf_report."""
+
+  def __init__(self):
+    super(_PerfObserver, self).__init__(
+        'perf', config_option='perf_report',
+        output_description='performance report')
+
+  def Reset(self):
+    # Phases whose runs are kept in spans.
+    self.span_phases = frozenset()
+    super(_PerfObserver, self).Reset()
+
+  def ResetData(self):
+    # Map of phase to [count, seconds, bytes]. In worker processes, these are
+    # the counts recorded since the process last sent them to the main
+    # process.
+    self.counters = {}
+    # IDs of the worker processes whose counters have been merged.
+    self.worker_pids = set()
+    # Spans recorded since they were last taken by TakeSpans, as (phase,
+    # start time, seconds, bytes, thread ID) tuples.
+    self.spans = []
+
+  def TakeWorkerData(self):
+    with self.lock:
+      counters = self.counters
+      self.counters = {}
+    return counters
+
+  def MergeWorkerData(self, counters, process_id):
+    with self.lock:
+      self.worker_pids.add(process_id)
+      for phase, (count, seconds, num_bytes) in counters.iteritems():
+        counter = self.counters.setdefault(phase, [0, 0.0, 0])
+        counter[0] += count
+        counter[1] += seconds
+        counter[2] += num_bytes
+
+  def Write(self, output_file):
+    output_file.write(GetPerfReport())
+
+
+_observer = observer_util.Register(_PerfObserver())
+
+
+def IsEnabled():
+  """Returns True if phases are being recorded for a report or trace."""
+  return _observer.enabled
+
+
+def StartCounters():
+  """Starts recording phases, for a consumer other than the report.
+
+  This must be called in the main process, before any worker processes are
+  started.
+  """
+  _observer.Start()
+
+
+def StartSpans():
+  """Starts recording phases, keeping runs of SPAN_PHASES as spans.
+
+  This must be called in the main process, before any worker processes are
+  started.
+  """
+  _observer.span_phases = SPAN_PHASES
+  _observer.Start()
+
+
+def Record(phase, seconds, num_bytes=0, start_time=None):
+  """Adds one run of a phase to its counters.
+
+  Args:
+    phase: Phase name, one of the PHASE_* constants.
+    seconds: Time the phase took.
+    num_bytes: Number of bytes the phase processed.
+    start_time: When the run started (seconds since Epoch). If set and a
+        trace was requested, the run is also kept as a span.
+  """
+  if not _observer.enabled:
+    return
+  with _observer.lock:
+    counter = _observer.counters.get(phase)
+    if counter is None:
+      _observer.counters[phase] = [1, seconds, num_bytes]
+    else:
+      counter[0] += 1
+      counter[1] += seconds
+      counter[2] += num_bytes
+    if start_time is not None and phase in _observer.span_phases:
+      _observer.spans.append((phase, start_time, seconds, num_bytes,
+                              threading.current_thread().ident))
+
+
+class _PhaseTimer(object):
+  """Context manager that records the time spent in its block."""
+
+  def __init__(self, phase, num_bytes):
+    self.phase = phase
+    self.num_bytes = num_bytes
+    self._start_time = None
+
+  def __enter__(self):
+    self._start_time = time.time()
+    return self
+
+  def __exit__(self, unused_exc_type, unused_exc_value, unused_traceback):
+    Record(self.phase, time.time() - self._start_time, self.num_bytes,
+           start_time=self._start_time)
+
+
+class _NoOpPhaseTimer(object):
+  """Stand-in for _PhaseTimer when no report was requested.
+
+  One instance is shared by all threads, so it ignores num_bytes updates.
+  """
+
+  @property
+  def num_bytes(self):
+    return 0
+
+  @num_bytes.setter
+  def num_bytes(self, unused_value):
+    pass
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, unused_exc_type, unused_exc_value, unused_traceback):
+    pass
+
+
+_NO_OP_PHASE_TIMER = _NoOpPhaseTimer()
+
+
+def PhaseTimer(phase, num_bytes=0):
+  """Returns a context manager that records a run of phase.
+
+  Args:
+    phase: Phase name, one of the PHASE_* constants.
+    num_bytes: Number of bytes the phase processes. If it isn't known until
+        the block runs, the block can set the timer's num_bytes attribute.
+
+  Returns:
+    Context manager.
+  """
+  if not _observer.enabled:
+    return _NO_OP_PHASE_TIMER
+  return _PhaseTimer(phase, num_bytes)
+
+
+def TakeSpans():
+  """Returns the spans recorded in this process, and forgets them."""
+  with _observer.lock:
+    spans = _observer.spans
+    _observer.spans = []
+  return spans
+
+
+def GetPhaseTotals(phase):
+  """Returns the (count, seconds, bytes) recorded so far for a phase."""
+  with _observer.lock:
+    return tuple(_observer.counters.get(phase, (0, 0.0, 0)))
+
+
+def GetPerfReport():
+  """Returns a printable breakdown of the phases recorded so far."""
+  with _observer.lock:
+    counters = dict((phase, list(counter))
+                    for phase, counter in _observer.counters.iteritems())
+    num_processes = 1 + len(_observer.worker_pids)
+  elapsed = (time.time() - _observer.start_time if _observer.start_time
+             else 0.0)
+  lines = [
+      'Command: %s' % ' '.join(sys.argv),
+      'Elapsed time: %.3fs, processes: %d' % (elapsed, num_processes),
+      '',
+      '%-14s %10s %12s %10s %12s  %s' % ('Phase', 'Count', 'Total (s)',
+                                         'Mean (ms)', 'Bytes', 'Measures'),
+  ]
+  descriptions = dict(PHASES)
+  ordered_phases = [phase for phase, _ in PHASES]
+  ordered_phases.extend(sorted(set(counters) - set(ordered_phases)))
+  for phase in ordered_phases:
+    if phase not in counters:
+      continue
+    count, seconds, num_bytes = counters[phase]
+    lines.append('%-14s %10d %12.3f %10.3f %12s  %s' % (
+        phase, count, seconds, 1000.0 * seconds / count if count else 0.0,
+        MakeHumanReadable(num_bytes) if num_bytes else '-',
+        descriptions.get(phase, '')))
+  return '\n'.join(lines) + '\n'
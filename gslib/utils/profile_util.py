@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Sampling profiler for gsutil commands.
+
+When the GSUtil:profile option is set, a thread in each of the command's
+processes samples the stacks of the process's other threads every
+SAMPLE_INTERVAL seconds. Worker processes send their samples to the main
+process through gslib.utils.observer_util, after each task. At exit, the main
+process writes the samples of all processes to that path in the collapsed
+stack format that flamegraph.pl and speedscope (https://www.speedscope.app)
+read: one line per distinct stack, with its frames from the outermost in,
+separated by semicolons, then its sample count.
+
+Stacks are sampled whether or not their thread is running, so the time
+threads spend waiting (e.g., for a task, or for a response) shows up in the
+functions they're waiting in.
+"""
+
+from __future__ import absolute_import
+
+import os
+import sys
+import threading
+import time
+
+import gslib
+from gslib.utils import observer_util
+
+# Seconds between samples.
+SAMPLE_INTERVAL = 0.01
+
+_MAIN_PROCESS_FRAME = 'gsutil main process'
+_WORKER_PROCESS_FRAME = 'gsutil worker process'
+
+# Collapsed stack frame names, by code object.
+_frame_names = {}
+
+
+class _ProfileObserver(observer_util.Observer):
+  """Samples stacks for the profile requested with GSUtil:profile."""
+
+  def __init__(self):
+    super(_ProfileObserver, self).__init__('profile', config_option='profile',
+                                           output_description='profile')
+
+  def ResetData(self):
+    # Map of stack (a tuple of code objects, outermost first) to the number
+    # of times it was sampled. In worker processes, these are the samples
+    # taken since the process last sent them to the main process.
+    self.samples = {}
+    # Map of collapsed stack string to sample count, for the samples that
+    # worker processes sent.
+    self.worker_samples = {}
+
+  def OnStart(self):
+    observer_util.StartThread(_SampleForever)
+
+  def ResetForWorkerProcess(self):
+    super(_ProfileObserver, self).ResetForWorkerProcess()
+    # Threads don't survive a fork, so each worker process gets a sampler of
+    # its own.
+    observer_util.StartThread(_SampleForever)
+
+  def TakeWorkerData(self):
+    with self.lock:
+      samples = self.samples
+      self.samples = {}
+    return _CollapseSamples(samples, _WORKER_PROCESS_FRAME)
+
+  def MergeWorkerData(self, samples, unused_process_id):
+    with self.lock:
+      for stack, count in samples.iteritems():
+        self.worker_samples[stack] = (self.worker_samples.get(stack, 0) +
+                                      count)
+
+  def Write(self, output_file):
+    for stack, count in sorted(GetCollapsedStacks().iteritems()):
+      output_file.write('%s %d\n' % (stack, count))
+
+
+_observer = observer_util.Register(_ProfileObserver())
+
+
+def IsEnabled():
+  """Returns True if stacks are being sampled."""
+  return _observer.enabled
+
+
+def _SampleForever():
+  sampler_thread_id = threading.current_thread().ident
+  while True:
+    time.sleep(SAMPLE_INTERVAL)
+    TakeSample(exclude_thread_id=sampler_thread_id)
+
+
+def TakeSample(exclude_thread_id=None):
+  """Adds the current stack of each of this process's threads to the samples.
+
+  Args:
+    exclude_thread_id: ID of a thread not to sample, e.g., the caller's.
+  """
+  # pylint: disable=protected-access
+  frames = sys._current_frames()
+  # pylint: enable=protected-access
+  stacks = []
+  for thread_id, frame in frames.iteritems():
+    if thread_id == exclude_thread_id:
+      continue
+    stack = []
+    while frame is not None:
+      stack.append(frame.f_code)
+      frame = frame.f_back
+    stack.reverse()
+    stacks.append(tuple(stack))
+  with _observer.lock:
+    for stack in stacks:
+      _observer.samples[stack] = _observer.samples.get(stack, 0) + 1
+
+
+def _FrameName(code):
+  """Returns the collapsed stack frame name for a code object."""
+  name = _frame_names.get(code)
+  if name is None:
+    file_name = code.co_filename
+    if file_name.startswith(gslib.PROGRAM_FILES_DIR):
+      file_name = file_name[len(gslib.PROGRAM_FILES_DIR):].lstrip(os.sep)
+    # Semicolons separate frames, and the last space separates the count.
+    name = ('%s (%s:%d)' % (code.co_name, file_name, code.co_firstlineno)
+           ).replace(';', ':')
+    _frame_names[code] = name
+  return name
+
+
+def _CollapseSamples(samples, process_frame):
+  """Returns a dict of collapsed stack string to count for samples."""
+  collapsed = {}
+  for stack, count in samples.iteritems():
+    collapsed_stack = ';'.join(
+        [process_frame] + [_FrameName(code) for code in stack])
+    collapsed[collapsed_stack] = collapsed.get(collapsed_stack, 0) + count
+  return collapsed
+
+
+def GetCollapsedStacks():
+  """Returns the profile's samples as a dict of collapsed stack to count."""
+  with _observer.lock:
+    samples = dict(_observer.samples)
+    collapsed = dict(_observer.worker_samples)
+  for stack, count in _CollapseSamples(
+      samples, _MAIN_PROCESS_FRAME).iteritems():
+    collapsed[stack] = collapsed.get(stack, 0) + count
+  return collapsed
@@ -52,6 +52,51 @@ if IS_WINDOWS:
 else:
   IS_CP1252 = False
 
+# libc handle used to call pwrite(2) and fallocate(2), which Python 2 doesn't
+# expose in the os module. Loaded on first use by _GetLibc.
+_libc = None
+_libc_loaded = False
+
+
+def _GetLibc():
+  """Returns a ctypes handle to the C library, or None if unavailable."""
+  global _libc, _libc_loaded  # pylint: disable=global-statement
+  if not _libc_loaded:
+    _libc_loaded = True
+    if not IS_WINDOWS:
+      try:
+        import ctypes
+        import ctypes.util
+        _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+      except (ImportError, OSError):
+        _libc = None
+  return _libc
+
+
+def _GetLibcFunction(names, argtypes, restype):
+  """Returns the first of the named libc functions that exists, or None."""
+  libc = _GetLibc()
+  if libc is None:
+    return None
+  for name in names:
+    try:
+      func = getattr(libc, name)
+    except AttributeError:
+      continue
+    func.argtypes = argtypes
+    func.restype = restype
+    return func
+  return None
+
+
+def _GetPwrite():
+  """Returns libc's pwrite function, using 64-bit offsets where needed."""
+  import ctypes
+  return _GetLibcFunction(
+      ('pwrite64', 'pwrite'),
+      [ctypes.c_int, ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int64],
+      ctypes.c_ssize_t)
+
 
 def CheckFreeSpace(path):
   """Return path/drive free space (in bytes)."""
@@ -188,6 +233,49 @@ def GetGsutilClientIdAndSecret():
           'p3RlpR10xMFh9ZXBS/ZNLYUu')                  # gsutil secret
 
 
+def GetProcessCpuSeconds(pid):
+  """Returns the user and system CPU seconds a process has used, on Linux.
+
+  Args:
+    pid: ID of the process.
+
+  Returns:
+    The CPU seconds used by all of the process's threads, read from
+    /proc/<pid>/stat, or None if they aren't available.
+  """
+  try:
+    with open('/proc/%d/stat' % pid, 'r') as f:
+      stat = f.read()
+    # The command name may contain spaces, so split the fields after it.
+    fields = stat[stat.rindex(')') + 2:].split()
+    utime, stime = int(fields[11]), int(fields[12])
+    return float(utime + stime) / os.sysconf('SC_CLK_TCK')
+  except (IOError, ValueError, IndexError, OSError):
+    return None
+
+
+def GetProcessSyscallCount(pid):
+  """Returns the number of read and write system calls a process made.
+
+  Args:
+    pid: ID of the process.
+
+  Returns:
+    The read and write system calls (including those on sockets and files)
+    made by all of the process's threads, read from /proc/<pid>/io, or None
+    if they aren't available.
+  """
+  try:
+    counts = {}
+    with open('/proc/%d/io' % pid, 'r') as f:
+      for line in f:
+        name, _, value = line.partition(':')
+        counts[name] = int(value)
+    return counts['syscr'] + counts['syscw']
+  except (IOError, ValueError, KeyError):
+    return None
+
+
 def GetStreamFromFileUrl(storage_url, mode='rb'):
   if storage_url.IsStream():
     return sys.stdin
@@ -235,6 +323,81 @@ def IsRunningInteractively():
   return sys.stdout.isatty() and sys.stderr.isatty() and sys.stdin.isatty()
 
 
+def PositionalWrite(fd, data, offset, length=None):
+  """Writes data to a file at an offset without moving the file position.
+
+  This uses pwrite(2), so several threads can write to different parts of a
+  file without seeking, and without copying data into Python file buffers.
+
+  Args:
+    fd: File descriptor open for writing.
+    data: String, or writable buffer such as an mmap, containing the data.
+    offset: Offset in the file at which to write.
+    length: Number of bytes from the start of data to write; defaults to all
+        of data.
+
+  Raises:
+    OSError: if the write fails.
+  """
+  if length is None:
+    length = len(data)
+  if hasattr(os, 'pwrite'):
+    view = memoryview(data)
+    written = 0
+    while written < length:
+      written += os.pwrite(fd, view[written:length], offset + written)
+    return
+
+  import ctypes
+  pwrite = _GetPwrite()
+  if isinstance(data, str):
+    keep_alive = ctypes.c_char_p(data)
+    address = ctypes.cast(keep_alive, ctypes.c_void_p).value
+  else:
+    keep_alive = (ctypes.c_char * len(data)).from_buffer(data)
+    address = ctypes.addressof(keep_alive)
+  written = 0
+  while written < length:
+    result = pwrite(fd, address + written, length - written, offset + written)
+    if result < 0:
+      err = ctypes.get_errno()
+      if err == errno.EINTR:
+        continue
+      raise OSError(err, os.strerror(err))
+    written += result
+
+
+def PositionalWriteAvailable():
+  """Returns True if PositionalWrite is supported on this platform."""
+  return hasattr(os, 'pwrite') or (not IS_WINDOWS and _GetPwrite() is not None)
+
+
+def PreallocateFile(fd, size):
+  """Allocates disk space for the first size bytes of a file, if supported.
+
+  Allocating a file's blocks before writing several parts of it in parallel
+  lets the filesystem use contiguous extents instead of fragmenting the file.
+  This uses fallocate(2), which fails (rather than writing zeros, as
+  posix_fallocate does) on filesystems that don't support preallocation.
+
+  Args:
+    fd: File descriptor open for writing.
+    size: Number of bytes to allocate.
+
+  Returns:
+    True if the space was allocated, False if preallocation isn't supported
+    or failed.
+  """
+  if not IS_LINUX:
+    return False
+  import ctypes
+  fallocate = _GetLibcFunction(
+      ('fallocate64', 'fallocate'),
+      [ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64],
+      ctypes.c_int)
+  return fallocate is not None and fallocate(fd, 0, 0, size) == 0
+
+
 def StdinIterator():
   """A generator function that returns lines from stdin."""
   for line in sys.stdin:
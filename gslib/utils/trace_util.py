@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Trace files of a gsutil command's transfers.
+
+When the GSUtil:trace_file option is set, gsutil writes a trace of the command
+to that path at exit, in the Chrome trace event format that chrome://tracing
+and Perfetto (https://ui.perfetto.dev) load. The trace has:
+
+  - a span per file or object transfer, and per component or slice of one,
+    built from the FileMessages on the status queue;
+  - a span per task, connection, request and data transfer, and per tracker
+    file write and compose request, from the timers in perf_util;
+  - an instant event per retryable error, from RetryableErrorMessages.
+
+Events are tagged with the ID of the process and thread that produced them, so
+each worker thread gets a track of its own; gaps in a track are time the
+thread spent idle.
+"""
+
+from __future__ import absolute_import
+
+import json
+import sys
+import time
+
+from gslib.thread_message import FileMessage
+from gslib.thread_message import RetryableErrorMessage
+from gslib.utils import observer_util
+from gslib.utils import perf_util
+
+# Span names for each type of FileMessage that starts or finishes a transfer.
+_FILE_MESSAGE_SPAN_NAMES = {
+    FileMessage.FILE_DOWNLOAD: 'download',
+    FileMessage.FILE_UPLOAD: 'upload',
+    FileMessage.FILE_CLOUD_COPY: 'copy in the cloud',
+    FileMessage.FILE_LOCAL_COPY: 'local copy',
+    FileMessage.FILE_DAISY_COPY: 'daisy chain copy',
+    FileMessage.FILE_REWRITE: 'rewrite',
+    FileMessage.FILE_HASH: 'hash',
+    FileMessage.COMPONENT_TO_UPLOAD: 'upload component',
+    FileMessage.COMPONENT_TO_DOWNLOAD: 'download slice',
+}
+
+
+class _TraceObserver(observer_util.Observer):
+  """Records the trace requested with GSUtil:trace_file."""
+
+  def __init__(self):
+    super(_TraceObserver, self).__init__('trace', config_option='trace_file',
+                                         output_description='trace')
+
+  def OnStart(self):
+    perf_util.StartSpans()
+
+  def ResetData(self):
+    # Trace events recorded so far.
+    self.events = []
+    # Map of transfer key to the FileMessage that started it, for the
+    # transfers that haven't finished yet.
+    self.open_transfers = {}
+
+  def TakeWorkerData(self):
+    return perf_util.TakeSpans()
+
+  def MergeWorkerData(self, spans, process_id):
+    with self.lock:
+      _AddPhaseSpans(spans, process_id)
+
+  def HandleMessage(self, status_message, unused_ui_controller):
+    with self.lock:
+      if isinstance(status_message, FileMessage):
+        _HandleFileMessage(status_message)
+      elif isinstance(status_message, RetryableErrorMessage):
+        # The message is sent before the retry's back-off, which is taken by
+        # the request that follows, so retries are instants rather than spans.
+        self.events.append({
+            'name': 'retry',
+            'cat': 'retry',
+            'ph': 'i',
+            's': 't',
+            'ts': _Microseconds(status_message.time),
+            'pid': status_message.process_id,
+            'tid': status_message.thread_id,
+            'args': {
+                'error_type': status_message.error_type,
+                'num_retries': status_message.num_retries,
+                'total_wait_sec': status_message.total_wait_sec,
+            },
+        })
+
+  def Write(self, output_file):
+    # Events are written one per line, so traces of large commands can be
+    # read (and split) without a JSON parser.
+    output_file.write('{"displayTimeUnit": "ms", "otherData": %s,\n'
+                      '"traceEvents": [\n' % json.dumps(
+                          {'command': ' '.join(sys.argv),
+                           'start_time': self.start_time}))
+    output_file.write(',\n'.join(json.dumps(event, sort_keys=True)
+                                 for event in GetTraceEvents()))
+    output_file.write('\n]}\n')
+
+
+_observer = observer_util.Register(_TraceObserver())
+
+
+def IsEnabled():
+  """Returns True if a trace is being recorded."""
+  return _observer.enabled
+
+
+def _Microseconds(seconds_since_epoch):
+  """Returns a trace timestamp, relative to the start of the trace."""
+  return int((seconds_since_epoch - _observer.start_time) * 1000000)
+
+
+def _UrlString(url):
+  return url.url_string if hasattr(url, 'url_string') else url
+
+
+def _AddSpan(name, category, start_time, seconds, process_id, thread_id,
+             args=None):
+  event = {
+      'name': name,
+      'cat': category,
+      'ph': 'X',
+      'ts': _Microseconds(start_time),
+      'dur': max(int(seconds * 1000000), 0),
+      'pid': process_id,
+      'tid': thread_id,
+  }
+  if args:
+    event['args'] = args
+  _observer.events.append(event)
+
+
+def _TransferArgs(file_message, finished=True):
+  args = {'src': _UrlString(file_message.src_url)}
+  if file_message.dst_url:
+    args['dst'] = _UrlString(file_message.dst_url)
+  if file_message.size is not None:
+    args['size'] = file_message.size
+  if file_message.component_num is not None:
+    args['component'] = file_message.component_num
+  if file_message.bytes_already_downloaded:
+    args['bytes_already_downloaded'] = file_message.bytes_already_downloaded
+  if not finished:
+    args['finished'] = False
+  return args
+
+
+def _AddTransferSpan(start_message, end_time, finished=True):
+  _AddSpan(_FILE_MESSAGE_SPAN_NAMES[start_message.message_type], 'transfer',
+           start_message.time, end_time - start_message.time,
+           start_message.process_id, start_message.thread_id,
+           args=_TransferArgs(start_message, finished=finished))
+
+
+def _HandleFileMessage(file_message):
+  if file_message.message_type not in _FILE_MESSAGE_SPAN_NAMES:
+    return
+  key = (_UrlString(file_message.src_url), _UrlString(file_message.dst_url),
+         file_message.component_num, file_message.message_type)
+  if not file_message.finished:
+    _observer.open_transfers[key] = file_message
+    return
+  start_message = _observer.open_transfers.pop(key, None)
+  if start_message:
+    # Sizes may only be known once a transfer finishes.
+    if file_message.size is not None:
+      start_message.size = file_message.size
+    _AddTransferSpan(start_message, file_message.time)
+  elif file_message.start_time is not None:
+    # Small files are reported in a single message when they finish.
+    _AddSpan(_FILE_MESSAGE_SPAN_NAMES[file_message.message_type], 'transfer',
+             file_message.start_time,
+             file_message.time - file_message.start_time,
+             file_message.process_id, file_message.thread_id,
+             args=_TransferArgs(file_message))
+
+
+def _AddPhaseSpans(spans, process_id):
+  for phase, start_time, seconds, num_bytes, thread_id in spans:
+    _AddSpan(phase, 'phase', start_time, seconds, process_id, thread_id,
+             args={'bytes': num_bytes} if num_bytes else None)
+
+
+def GetTraceEvents():
+  """Returns the trace's events, including transfers that didn't finish."""
+  end_time = time.time()
+  with _observer.lock:
+    _AddPhaseSpans(perf_util.TakeSpans(), _observer.main_pid)
+    for start_message in _observer.open_transfers.itervalues():
+      _AddTransferSpan(start_message, end_time, finished=False)
+    _observer.open_transfers.clear()
+    events = list(_observer.events)
+  process_ids = sorted(set(event['pid'] for event in events))
+  for process_id in process_ids:
+    events.append({
+        'name': 'process_name',
+        'ph': 'M',
+        'pid': process_id,
+        'tid': 0,
+        'args': {'name': ('gsutil main process'
+                          if process_id == _observer.main_pid
+                          else 'gsutil worker process')},
+    })
+  return events
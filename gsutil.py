@@ -113,6 +113,19 @@ except ImportError:
 
 def RunMain():
   # pylint: disable=g-import-not-at-top
+  daemon_socket = os.environ.get('GSUTIL_DAEMON_SOCKET')
+  if daemon_socket:
+    # Run the command on a pre-initialized gsutil daemon if one is listening
+    # (see "gsutil help daemon"); otherwise run it in-process.
+    from gslib import daemon
+    return_code = daemon.RunCommandViaDaemon(daemon_socket, sys.argv[1:])
+    if return_code is not None:
+      sys.exit(return_code)
+  from gslib.utils import import_timer
+  if (not MEASURING_TIME_ACTIVE and
+      import_timer.DetailedDebugRequested(sys.argv[1:])):
+    # Report startup import costs as part of -D output.
+    import_timer.InstallImportTimer()
   import gslib.__main__
   sys.exit(gslib.__main__.main())
 
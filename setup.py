@@ -16,6 +16,7 @@
 
 """Setup installation module for gsutil."""
 
+import imp
 import os
 
 from setuptools import find_packages
@@ -113,6 +114,26 @@ def PlaceNeededFiles(self, target_dir):
     fp.write(mock_storage_contents)
 
 
+def RegenerateCommandRegistry(target_dir):
+  """Rebuilds gslib's command registry from the command modules being built.
+
+  This keeps the registry in sync with the set of commands actually shipped
+  (e.g., without the update command).
+
+  Args:
+    target_dir: Directory containing the gslib module being built.
+  """
+  registry_path = os.path.join(target_dir, 'gslib', 'command_registry.py')
+  if not os.path.isfile(registry_path):
+    return
+  # Load the module directly so we don't run gslib's package initialization.
+  registry = imp.load_source('gsutil_command_registry', registry_path)
+  registry.WriteCommandModuleMap(
+      registry.BuildCommandModuleMap(
+          os.path.join(target_dir, 'gslib', 'commands')),
+      registry_path=registry_path)
+
+
 class CustomBuildPy(build_py.build_py):
   """Excludes update command from package-installed versions of gsutil."""
 
@@ -124,6 +145,7 @@ class CustomBuildPy(build_py.build_py):
       # will be excluded by the MANIFEST file.
       if 'gslib/commands/update.py' in filename:
         os.unlink(filename)
+    RegenerateCommandRegistry(self.build_lib)
     build_py.build_py.byte_compile(self, files)
 
   def run(self):